@@ -1,22 +1,28 @@
 # api/app.py
 import logging
-from fastapi import FastAPI, HTTPException, Query 
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import asyncio
 
 from .config import config
 from .models import (
-    IngestRequest, IngestResponse, GhostNoteRequest, GhostNoteResponse,
+    IngestRequest, IngestJobResponse, GhostNoteRequest, GhostNoteResponse,
+    GhostNoteBatchRequest, GhostNoteBatchResponse, SummaryResponse,
     ChunkResponse, FeedbackRequest, FeedbackResponse, PodListResponse,
-    PodStateRequest, PodStateResponse, ErrorResponse,
+    PodStateRequest, PodStateResponse, PodStateListResponse, ErrorResponse,
     IntentRequest, IntentResponse,
 )
+from .ingest_jobs import QueueFull
 from .pipeline import (
-    ingest_url, search_ghost_notes, get_chunk_by_id, health_snapshot,
-    record_feedback, feedback_summary,
+    submit_ingest, get_ingest_job, wait_for_ingest_job, validate_ingest_request,
+    search_ghost_notes, search_ghost_notes_batch, get_summary, get_chunk_by_id, health_snapshot,
+    record_feedback, feedback_summary, record_pod_state, list_pod_states, flush_event_logs,
+    readiness, warm_up,
 )
-from .pods import list_watched_pods
+from .pods import list_watched_pods, stop_pod_informer
 from starlette.responses import JSONResponse
 from .intent import classify as classify_intent
 
@@ -25,11 +31,26 @@ from .intent import classify as classify_intent
 logging.basicConfig(level=config.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app):
+    # Models and the Chroma handle load lazily (api/pipeline.py); start
+    # loading them now, off the event loop, so uvicorn is serving /live
+    # straight away and /ready flips once they're in.
+    if config.WARMUP_ON_STARTUP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+    # Feedback and heartbeats are buffered (api/event_log.py); don't drop
+    # the last batch on the way out.
+    flush_event_logs()
+    stop_pod_informer()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="GhostKube Brain API",
     description="RAG-powered Kubernetes contextual onboarding",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -56,31 +77,74 @@ def health_check():
         **snapshot,
     }
     
-# Ingest Endpoint
-# Ingest a GitHub/documentation URL into the vector database.
+# Liveness / Readiness Endpoints (k8s/api-deployment.yaml)
+# /live only says the process is answering - no Chroma, no model - so a slow
+# warm-up or a Chroma outage never gets the pod restarted. /ready is 503 until
+# warm-up has loaded the embedding model and Chroma answers, which keeps the
+# pod out of the Service until a search would actually work.
+@app.get("/live")
+async def live():
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready(response: Response):
+    state = readiness()
+    if not state["ready"]:
+        response.status_code = 503
+    return state
+
+
+# Ingest Endpoints
+# Queue a GitHub/documentation URL for ingestion into the vector database.
     # **url**: URL to scrape (e.g., https://github.com/owner/repo)
     # **source_type**: Type of source ("repo", "pr", "slack", etc.)
     # **metadata**: Optional metadata to attach to ingested chunks
 #
-@app.post("/ingest", response_model=IngestResponse)
-async def ingest_endpoint(request: IngestRequest):
+# Returns 202 with a job immediately - a full fetch -> chunk -> embed -> upsert
+# on a big repo outlives every proxy timeout in front of this API. Poll
+# GET /ingest/{job_id} for progress. ?wait=true keeps the old blocking
+# behaviour for scripts: it returns once the job has finished, and a failed
+# ingest is a 400 as before.
+@app.post("/ingest", response_model=IngestJobResponse, status_code=202)
+async def ingest_endpoint(request: IngestRequest, response: Response, wait: bool = False):
     logger.info(f"Received ingest request for URL: {request.url}")
 
+    error = validate_ingest_request(request.url, request.source_type)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
     try:
-        result = await ingest_url(
+        job, coalesced = submit_ingest(
             url=request.url,
             source_type=request.source_type,
             metadata=request.metadata
         )
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error in ingest endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-    if result["status"] == "error":
-        raise HTTPException(status_code=400, detail=result["message"])
+    if wait:
+        # The job runs on its own worker thread; waiting on it from a helper
+        # thread keeps this event loop free for every other request.
+        job = await asyncio.to_thread(wait_for_ingest_job, job["job_id"])
+        if job["status"] == "failed":
+            raise HTTPException(status_code=400, detail=job["result"]["message"])
+        response.status_code = 200
+
+    return IngestJobResponse(**job, coalesced=coalesced)
+
+
+@app.get("/ingest/{job_id}", response_model=IngestJobResponse)
+def ingest_job_endpoint(job_id: str):
+    """Progress of one ingest job: phase, counters, throughput and ETA."""
+    job = get_ingest_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No ingest job with id {job_id}")
+    return IngestJobResponse(**job)
 
-    return IngestResponse(**result)
-    
 
 # Ghost Note Search Endpoint
 # Search for relevant ghost notes.    
@@ -97,6 +161,8 @@ def ghost_note_endpoint(request: GhostNoteRequest):
     - **top_results**: Number of results to return (default: 5)
     - **ghost_note_id**: Optional webhook-injected GHOST_NOTE_ID, e.g. "svc:auth-service",
       to scope results to chunks ingested with matching metadata.service
+    - **defer_summary**: Return without waiting on Groq; the summary is then
+      fetched from GET /ghost-note/summary/{chunk_id}
 
     Deliberately a plain `def`, not `async def`: search_ghost_notes() is
     synchronous and CPU-bound (embedding inference), so as a coroutine it would
@@ -111,6 +177,7 @@ def ghost_note_endpoint(request: GhostNoteRequest):
             query=request.query,
             top_results=request.top_results,
             ghost_note_id=request.ghost_note_id,
+            defer_summary=request.defer_summary,
         )
         return GhostNoteResponse(**result)
     
@@ -118,6 +185,47 @@ def ghost_note_endpoint(request: GhostNoteRequest):
         logger.error(f"Error in ghost-note endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+# Batch Ghost Note Search Endpoint
+# One round-trip for notes on many pods. Same threadpool reasoning as
+# ghost_note_endpoint above; responses come back in request order.
+@app.post("/ghost-note/batch", response_model=GhostNoteBatchResponse)
+def ghost_note_batch_endpoint(request: GhostNoteBatchRequest):
+    if len(request.requests) > config.SEARCH_BATCH_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {config.SEARCH_BATCH_MAX} searches per batch, got {len(request.requests)}",
+        )
+    logger.info(f"Received batch search: {len(request.requests)} queries")
+
+    try:
+        results = search_ghost_notes_batch(
+            [(r.query, r.top_results, r.ghost_note_id, r.defer_summary) for r in request.requests]
+        )
+        return GhostNoteBatchResponse(responses=[GhostNoteResponse(**r) for r in results])
+
+    except Exception as e:
+        logger.error(f"Error in ghost-note batch endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+# Deferred Summary Endpoint
+# The follow-up to a /ghost-note answered with summary_pending=true, keyed by
+# that response's top chunk_id. ?wait_ms= long-polls: the request is held
+# until the summary is done or the wait runs out, so a client needs one call
+# rather than a polling loop. Plain `def`: the wait blocks a threadpool
+# thread, never the event loop.
+@app.get("/ghost-note/summary/{chunk_id}", response_model=SummaryResponse)
+def ghost_note_summary_endpoint(chunk_id: str, wait_ms: int = Query(0, ge=0)):
+    state = get_summary(chunk_id, wait_ms=wait_ms)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"No summary requested for chunk {chunk_id}")
+    return SummaryResponse(
+        chunk_id=chunk_id,
+        status=state["status"],
+        summary=state["summary"],
+        summary_path=state["source_path"],
+        synthesized=state["synthesized"],
+    )
+
 # Chunk Lookup Endpoint
 # Direct by-ID fetch so the Note Detail page can render on a fresh/refreshed/
 # shared URL and not only when navigated to from an /ghost-note search result.
@@ -142,11 +250,18 @@ def get_chunk_endpoint(chunk_id: str):
 # missing/unreachable cluster - list_watched_pods() is best-effort and
 # degrades to an empty list, since this page just shows "no pods" rather than
 # taking the whole Brain API down over a Kubernetes API hiccup.
-# Plain `def`: the kubernetes client is a blocking HTTP call under the hood,
-# same threadpool reasoning as ghost_note_endpoint above.
+# Answered from a watch-fed cache (api/pods.py). Plain `def` all the same:
+# the first call waits on the cache's first LIST.
 @app.get("/pods", response_model=PodListResponse)
-def list_pods_endpoint():
-    return PodListResponse(pods=list_watched_pods())
+def list_pods_endpoint(
+    namespace: str | None = None,
+    limit: int | None = Query(None, ge=1),
+    continue_token: str | None = None,
+):
+    try:
+        return PodListResponse(**list_watched_pods(namespace, limit, continue_token))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # Feedback Endpoints
 # Plain `def` for the same reason as ghost_note_endpoint above: these do
@@ -175,10 +290,11 @@ def feedback_endpoint(request: FeedbackRequest):
 
 
 @app.get("/feedback/summary", response_model=FeedbackResponse)
-def feedback_summary_endpoint():
-    """Aggregate 👍/👎 counts - the PRD's relevance metric."""
+def feedback_summary_endpoint(chunk_id: str | None = None, query: str | None = None):
+    """Aggregate 👍/👎 counts - the PRD's relevance metric - and optionally
+    those for one chunk and one query."""
     try:
-        return FeedbackResponse(recorded=True, **feedback_summary())
+        return FeedbackResponse(recorded=True, **feedback_summary(chunk_id, query))
     except Exception as e:
         logger.error(f"Error in feedback summary endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -188,6 +304,8 @@ def feedback_summary_endpoint():
 # Best-effort heartbeat store for the sidecar the mutating webhook injects
 # into labeled pods. Appended as JSONL, same pattern as /feedback: event
 # data, not retrieval content, so it deliberately never touches Chroma.
+# Buffered and written in batches, so `recorded` means accepted, not yet
+# on disk.
 @app.post("/pod-state", response_model=PodStateResponse)
 def pod_state_endpoint(request: PodStateRequest):
     logger.info(
@@ -195,13 +313,25 @@ def pod_state_endpoint(request: PodStateRequest):
         f"ghost_note_id={request.ghost_note_id} status={request.status}"
     )
 
+    return PodStateResponse(recorded=record_pod_state(request.model_dump()))
+
+
+@app.get("/pod-state", response_model=PodStateListResponse)
+def pod_state_list_endpoint(
+    namespace: str | None = None,
+    ghost_note_id: str | None = None,
+    stale: bool | None = None,
+    stale_after_s: float | None = Query(None, gt=0),
+):
+    """Newest heartbeat per pod, optionally only one namespace's, one
+    ghost_note_id's, or only the stale (`stale=true`) or live (`stale=false`)
+    pods. Answered from an in-memory index (api/pod_state.py), so the cost is
+    the pods returned, not the size of the log."""
     try:
-        with open(config.POD_STATE_PATH, "a", encoding="utf-8") as f:
-            f.write(request.model_dump_json() + "\n")
-        return PodStateResponse(recorded=True)
-    except OSError as e:
-        logger.error(f"Could not write pod state: {str(e)}")
-        return PodStateResponse(recorded=False)
+        return list_pod_states(namespace, ghost_note_id, stale, stale_after_s)
+    except Exception as e:
+        logger.error(f"Error in pod state list endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
 # Root Endpoint
@@ -212,13 +342,19 @@ async def root():
         "message": "Welcome to GhostKube Brain API",
         "endpoints": {
             "health": "GET /health",
+            "live": "GET /live",
+            "ready": "GET /ready",
             "ingest": "POST /ingest",
+            "ingest_job": "GET /ingest/{job_id}",
             "search": "POST /ghost-note",
+            "search_batch": "POST /ghost-note/batch",
+            "search_summary": "GET /ghost-note/summary/{chunk_id}",
             "chunk": "GET /chunk/{chunk_id}",
             "pods": "GET /pods",
             "feedback": "POST /feedback",
             "feedback_summary": "GET /feedback/summary",
             "pod_state": "POST /pod-state",
+            "pod_state_list": "GET /pod-state",
             "intent": "POST /intent"
         },
         "docs": "/docs"
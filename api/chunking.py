@@ -143,6 +143,18 @@ def chunk_file(full_path: str, block: str):
     return chunks, metadatas
 
 
+def file_block(full_path: str, text: str) -> str:
+    """The block chunk_repo_document() cuts out of a scraped document for one file.
+
+    For callers that stream files one at a time into chunk_file() instead of
+    assembling a whole document first. The scraper writes each file as
+    `\n{FILE_HEADER}{path}\n{text}\n\n`, so the block between two headers
+    ends in three newlines; matching that keeps chunk IDs identical across the
+    streamed and document paths.
+    """
+    return f"{full_path}\n{text}\n\n\n"
+
+
 def chunk_repo_document(content: str):
     """Chunk a whole `repo_content.md`-style document.
 
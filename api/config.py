@@ -16,11 +16,42 @@ class Config:
     CHROMA_HOST = os.getenv("CHROMA_HOST", "")
     CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
     EMBED_MODEL_NAME = os.getenv("EMBED_MODEL_NAME", "all-MiniLM-L12-v2")
+    # How EMBED_MODEL_NAME is run - see api/embedder.py. "torch" is
+    # SentenceTransformer on PyTorch. "onnx" is ONNX Runtime on an export
+    # written by `python scripts/export_onnx.py` into EMBED_ONNX_DIR; set
+    # EMBED_ONNX_FILE=model_qint8.onnx for the dynamically quantized one
+    # (--quantize). A missing export falls back to torch with a warning.
+    # EMBED_THREADS sets the runtime's intra-op threads (torch or ONNX
+    # Runtime). 0 leaves its default with one API worker, and with several
+    # splits the pod's CPUs evenly between them - see api/embedder.py.
+    EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+    EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", f"./models/onnx/{EMBED_MODEL_NAME}")
+    EMBED_ONNX_FILE = os.getenv("EMBED_ONNX_FILE", "model.onnx")
+    EMBED_THREADS = int(os.getenv("EMBED_THREADS", 0))
+    # The embedding model and the Chroma handle are created on first use, not
+    # at import - see pipeline.warm_up(). With WARMUP_ON_STARTUP the app loads
+    # both in a background thread as soon as it starts, retrying every
+    # WARMUP_RETRY_S while Chroma is unreachable, and GET /ready answers 503
+    # until they're in. Off, the first request that needs them pays the load.
+    WARMUP_ON_STARTUP = _flag("WARMUP_ON_STARTUP", True)
+    WARMUP_RETRY_S = float(os.getenv("WARMUP_RETRY_S", 5))
     CHROMA_COLLECTION_NAME = os.getenv("CHROMA_COLLECTION_NAME", "repo_docs")
     LOG_LEVEL  =os.getenv("LOG_LEVEL", "INFO")
     # For Crawl4AI / GitHub
     GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
+    # How a GitHub repo is listed and downloaded - see api/github_fetch.py.
+    # "trees" (default) is one recursive Git Trees call plus raw downloads;
+    # "tarball" is a single streamed archive request; "contents" is the old
+    # one-request-per-directory walk, kept only as a benchmark baseline.
+    GITHUB_FETCH_MODE = os.getenv("GITHUB_FETCH_MODE", "trees")
     API_PORT = int(os.getenv("API_PORT", 8000))
+    # Processes serving the API under `gunicorn -c api/gunicorn_conf.py`. The
+    # torch model is loaded once before forking and shared copy-on-write;
+    # writes made by one worker reach the others' caches and vector index
+    # through api/index_state.py's WriteCounter. More than one needs
+    # CHROMA_HOST - an on-disk PersistentClient must not be opened by several
+    # processes at once.
+    API_WORKERS = int(os.getenv("API_WORKERS", 1))
 
     # Cross-encoder reranking is OFF by default because it was measured to make
     # retrieval WORSE on this domain: hit@1 fell 100% -> 83% on one repo and
@@ -35,16 +66,175 @@ class Config:
     # enough that pooling has something to work with; at ~20ms a query it's free.
     RETRIEVAL_POOL_SIZE = int(os.getenv("RETRIEVAL_POOL_SIZE", 30))
 
+    # LRU of query text -> embedding for /ghost-note. kubectl-ghost and the
+    # Console send the same pod-derived queries over and over, and each miss is
+    # a full model encode. An embedding never goes stale for a fixed model, so
+    # the TTL is off (0) by default; 0 entries disables the cache.
+    QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", 1024))
+    QUERY_EMBED_CACHE_TTL_S = float(os.getenv("QUERY_EMBED_CACHE_TTL_S", 0))
+
+    # Query encodes that miss the cache above are micro-batched: concurrent
+    # /ghost-note requests arriving within WINDOW_MS of each other (up to MAX
+    # of them) share one encode call - see api/embed_batcher.py. The window is
+    # the most a lone query waits; MAX=1 turns batching off.
+    QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", 2))
+    QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", 32))
+
+    # LRU of whole /ghost-note responses, keyed on query, top_results and the
+    # resolved service, and retired by the index generation every write to the
+    # collection bumps - see search_ghost_notes(). Writes by the other API
+    # workers bump it too; writes made by an unrelated process
+    # (embed_and_store.py against the same store) don't, so set a TTL if
+    # that's how this instance's index gets updated.
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 512))
+    SEARCH_CACHE_TTL_S = float(os.getenv("SEARCH_CACHE_TTL_S", 0))
+
+    # Searches scoped by a "svc:<name>" note ID. A per-service chunk-count
+    # index (api/index_state.py) decides before Chroma is touched whether the
+    # service has anything indexed at all; if not, the search goes unfiltered
+    # in one query instead of filtering, finding nothing and querying again.
+    # MODE "filter" (default) restricts results to the service. "boost" runs
+    # one unfiltered query BOOST_POOL_FACTOR times wider and multiplies the
+    # distance of same-service hits by BOOST, so other services can still
+    # surface when they match far better. The index is loaded by one metadata
+    # scan and kept exact by this process's writes; REFRESH_S re-scans to pick
+    # up writes made elsewhere (embed_and_store.py). 0 never re-scans.
+    SERVICE_SCOPE_MODE = os.getenv("SERVICE_SCOPE_MODE", "filter")
+    SERVICE_BOOST_POOL_FACTOR = int(os.getenv("SERVICE_BOOST_POOL_FACTOR", 3))
+    SERVICE_BOOST = float(os.getenv("SERVICE_BOOST", 0.7))
+    SERVICE_INDEX_REFRESH_S = float(os.getenv("SERVICE_INDEX_REFRESH_S", 600))
+
+    # Where /ghost-note's nearest-neighbour search runs. "chroma" (default)
+    # queries the collection. "numpy" answers from an in-process exact index
+    # (api/vector_index.py): memory-mapped vectors under VECTOR_INDEX_DIR, one
+    # subdirectory per collection, searched with a single matmul and no
+    # network hop. Chroma stays the source of truth - this process mirrors its
+    # writes into the index, and an index that disagrees with Chroma is
+    # rebuilt from it in the background while searches keep using Chroma.
+    # Safe to delete; so is switching back.
+    RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma")
+    VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "./vector_index")
+
+    # Approximate search for the "numpy" backend once the corpus outgrows an
+    # exact scan (several large repos plus PR history in one collection).
+    # VECTOR_INDEX_ANN "ivf" partitions the index into NLIST lists (0 =
+    # sqrt(rows)) once it holds ANN_MIN_ROWS chunks, and a query scans only its
+    # NPROBE nearest lists: fewer is faster, more is closer to exact. "" keeps
+    # every search exact. Pick NPROBE from `eval/run_eval.py --ann`, which
+    # reports recall against exact search for each setting - see api/ivf.py.
+    VECTOR_INDEX_ANN = os.getenv("VECTOR_INDEX_ANN", "")
+    VECTOR_INDEX_IVF_NLIST = int(os.getenv("VECTOR_INDEX_IVF_NLIST", 0))
+    VECTOR_INDEX_IVF_NPROBE = int(os.getenv("VECTOR_INDEX_IVF_NPROBE", 16))
+    VECTOR_INDEX_ANN_MIN_ROWS = int(os.getenv("VECTOR_INDEX_ANN_MIN_ROWS", 50000))
+
+    # Memory of the "numpy" backend's scan matrix, which a busy pod keeps
+    # resident (384 float32 per chunk). QUANTIZATION "int8" (per-dimension
+    # scale) scans a copy a quarter the size, "float16" half; the float32 rows
+    # stay on disk and the best RESCORE_FACTOR x n_results candidates are
+    # rescored from them, so returned distances are exact. "" scans float32.
+    # int8 is the one to pick: NumPy widens float16 slowly, so float16 saves
+    # memory but costs scan time. `eval/run_eval.py --quant` reports memory and
+    # hit@k for each - see api/quantize.py.
+    VECTOR_INDEX_QUANTIZATION = os.getenv("VECTOR_INDEX_QUANTIZATION", "")
+    VECTOR_INDEX_RESCORE_FACTOR = int(os.getenv("VECTOR_INDEX_RESCORE_FACTOR", 4))
+
+    # Most searches one POST /ghost-note/batch may carry. Each still gets its
+    # own pooling and synthesis call, so this bounds one request's Groq spend.
+    SEARCH_BATCH_MAX = int(os.getenv("SEARCH_BATCH_MAX", 100))
+
     # Ghost Note feedback lands here as JSONL - one append-only event per line.
     # Deliberately NOT a Chroma collection: this is event data, and writing it
     # into the vector store would pollute retrieval with records that are not
     # repository content.
     FEEDBACK_PATH = os.getenv("FEEDBACK_PATH", "./feedback.jsonl")
+    # The feedback counts are kept in memory and extended from the log's tail
+    # (api/feedback_counts.py). Every FEEDBACK_CHECKPOINT_EVERY events they are
+    # saved beside the log (<FEEDBACK_PATH>.counts.json), so a restart reads
+    # only the events since rather than the whole log. 0 never checkpoints.
+    FEEDBACK_CHECKPOINT_EVERY = int(os.getenv("FEEDBACK_CHECKPOINT_EVERY", 10000))
+
+    # Let 👍/👎 reorder search results. After file pooling each candidate's
+    # distance is scaled by 1 - WEIGHT * prior, where the prior is
+    # (up - down) / (up + down + PRIOR_VOTES): PRIOR_VOTES neutral votes damp
+    # a chunk's first few ratings, so one click can't swing it, and WEIGHT
+    # caps how far any amount of feedback can move it (0.2: at most 20% of
+    # its distance either way). Off by default - measure it first with
+    # `python eval/run_eval.py <queries> --feedback` against a real log.
+    FEEDBACK_RANKING_ENABLED = _flag("FEEDBACK_RANKING_ENABLED", False)
+    FEEDBACK_RANKING_WEIGHT = float(os.getenv("FEEDBACK_RANKING_WEIGHT", "0.2"))
+    FEEDBACK_RANKING_PRIOR_VOTES = float(os.getenv("FEEDBACK_RANKING_PRIOR_VOTES", "5"))
 
     # Shadow Sidecar heartbeats (PRD 4B) land here as JSONL, same append-only
     # pattern as feedback. Pod liveness/state, not retrieval content - never
     # written to Chroma.
     POD_STATE_PATH = os.getenv("POD_STATE_PATH", "./pod_state.jsonl")
+    # GET /pod-state answers from an in-memory latest-heartbeat-per-pod index
+    # (api/pod_state.py). A pod is stale once it hasn't been heard from in
+    # POD_STATE_STALE_S - three missed 30s heartbeats by default. Every
+    # POD_STATE_SNAPSHOT_S the index is saved beside the log
+    # (<POD_STATE_PATH>.latest.json), and rotated log segments older than
+    # POD_STATE_HISTORY_S are then deleted; 0 keeps them all.
+    POD_STATE_STALE_S = float(os.getenv("POD_STATE_STALE_S", "90"))
+    POD_STATE_SNAPSHOT_S = float(os.getenv("POD_STATE_SNAPSHOT_S", "60"))
+    POD_STATE_HISTORY_S = float(os.getenv("POD_STATE_HISTORY_S", "3600"))
+
+    # Both logs above are appended through a buffered writer
+    # (api/event_log.py) rather than an open/write/close per request. A
+    # batch is written once EVENT_LOG_FLUSH_BYTES are buffered or it has been
+    # open EVENT_LOG_FLUSH_INTERVAL_S, whichever is first - heartbeats can sit
+    # in memory that long, and an API crash loses at most that much of them.
+    # /feedback doesn't wait: it flushes its own batch before answering.
+    # EVENT_LOG_FSYNC: "none" (the OS flushes to disk when it likes),
+    # "rotate" (sync each segment as it's closed) or "batch" (sync every
+    # batch - survives a node crash, costs a disk flush per batch).
+    # A log past EVENT_LOG_MAX_BYTES is rotated to <path>.seg-<time>-<pid>,
+    # gzipped unless EVENT_LOG_COMPRESS is off; 0 never rotates.
+    # EVENT_LOG_KEEP > 0 deletes all but that many newest segments - the
+    # feedback counts are rebuilt from whatever segments remain, so leave it
+    # at 0 (keep everything) unless the checkpoint is trusted to cover them.
+    EVENT_LOG_FLUSH_BYTES = int(os.getenv("EVENT_LOG_FLUSH_BYTES", 64 * 1024))
+    EVENT_LOG_FLUSH_INTERVAL_S = float(os.getenv("EVENT_LOG_FLUSH_INTERVAL_S", "1.0"))
+    EVENT_LOG_FSYNC = os.getenv("EVENT_LOG_FSYNC", "none")
+    EVENT_LOG_MAX_BYTES = int(os.getenv("EVENT_LOG_MAX_BYTES", 64 * 1024 * 1024))
+    EVENT_LOG_COMPRESS = _flag("EVENT_LOG_COMPRESS", True)
+    EVENT_LOG_KEEP = int(os.getenv("EVENT_LOG_KEEP", 0))
+
+    # GET /pods is served from a watch-fed cache of the labeled pods
+    # (api/pods.py), not a cluster-wide LIST per request. The cache is
+    # rebuilt from a fresh LIST every PODS_RESYNC_S, fetched PODS_LIST_PAGE_SIZE
+    # pods per call; each WATCH is reopened after PODS_WATCH_TIMEOUT_S. The
+    # first /pods after startup waits up to PODS_READY_WAIT_S for that first
+    # LIST rather than answering "no pods" while it's still in flight.
+    PODS_RESYNC_S = float(os.getenv("PODS_RESYNC_S", "300"))
+    PODS_LIST_PAGE_SIZE = int(os.getenv("PODS_LIST_PAGE_SIZE", 500))
+    PODS_WATCH_TIMEOUT_S = int(os.getenv("PODS_WATCH_TIMEOUT_S", 300))
+    PODS_READY_WAIT_S = float(os.getenv("PODS_READY_WAIT_S", "5"))
+
+    # Per-source ingest manifests (path -> blob SHA -> chunk IDs), one JSON
+    # file per (source_url, source_type) under a subdirectory named after the
+    # collection - see api/ingest_manifest.py. Losing this directory is safe:
+    # the next ingest of each source just falls back to a full re-sync.
+    INGEST_MANIFEST_DIR = os.getenv("INGEST_MANIFEST_DIR", "./ingest_manifests")
+
+    # Ingest's chunk/embed/upsert stage runs on a dedicated bounded pool, off
+    # the event loop (api/executor.py). One worker by default: embedding
+    # already uses several torch threads, and a second concurrent ingest batch
+    # would only steal cores from /ghost-note's own query encodes. PENDING is
+    # how many more batches may queue before producers are made to wait.
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 1))
+    INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", 4))
+
+    # POST /ingest queues a background job (api/ingest_jobs.py). WORKERS is how
+    # many jobs run at once - one, so queued repos don't stack concurrent full
+    # ingests. QUEUE_SIZE bounds jobs waiting behind it (past that, /ingest
+    # answers 503), and HISTORY is how many finished jobs GET /ingest/{job_id}
+    # can still report on. The job table is a SQLite file at INGEST_JOBS_PATH
+    # that every API worker in the pod shares, so all three bounds are per
+    # pod and any worker can answer GET /ingest/{job_id}.
+    INGEST_JOBS_PATH = os.getenv("INGEST_JOBS_PATH", "./ingest_jobs.db")
+    INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", 1))
+    INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 32))
+    INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", 200))
 
     # Phase 8.5 PR ingestion: closed-and-merged PRs older than this are not
     # walked. All PRs is too much for a rate-limited walk on an active repo,
@@ -58,12 +248,44 @@ class Config:
     # never a 500.
     GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
     GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+    # Empty uses Groq's own endpoint; tests point it at a local fake.
+    GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
     SYNTHESIS_ENABLED = _flag("SYNTHESIS_ENABLED", True)
 
-    # JSON map of chunk_id -> synthesized result. Keyed by chunk_id because the
-    # same pod/chunk gets inspected repeatedly and re-generating an identical
-    # summary burns both latency budget and Groq's free-tier quota.
-    SYNTHESIS_CACHE_PATH = os.getenv("SYNTHESIS_CACHE_PATH", "./synthesis_cache.json")
+    # chunk_id -> synthesized result. Keyed by chunk_id because the same
+    # pod/chunk gets inspected repeatedly and re-generating an identical
+    # summary burns both latency budget and Groq's free-tier quota. Every
+    # summary is kept in a SQLite file at SYNTHESIS_CACHE_PATH (an old
+    # synthesis_cache.json beside it is imported once), the newest
+    # SYNTHESIS_CACHE_SIZE of them in memory as well - see api/synthesis.py.
+    # A chunk deleted from the index takes its summary with it.
+    SYNTHESIS_CACHE_PATH = os.getenv("SYNTHESIS_CACHE_PATH", "./synthesis_cache.db")
+    SYNTHESIS_CACHE_SIZE = int(os.getenv("SYNTHESIS_CACHE_SIZE", 2048))
+
+    # A Groq round-trip on a cache miss is far longer than the 800ms
+    # `kubectl ghost --timeout`. A search asking for defer_summary (or every
+    # search, with SYNTHESIS_DEFER on) returns its results straight away with
+    # summary_pending=true, and the summary is generated on one of
+    # SYNTHESIS_WORKERS background threads, to be fetched from
+    # GET /ghost-note/summary/{chunk_id}. Inline or deferred, concurrent
+    # misses for the same top chunk share one Groq call.
+    SYNTHESIS_DEFER = _flag("SYNTHESIS_DEFER", False)
+    SYNTHESIS_WORKERS = int(os.getenv("SYNTHESIS_WORKERS", 2))
+    # Longest a GET /ghost-note/summary/{chunk_id}?wait_ms= poll is held open.
+    SYNTHESIS_MAX_WAIT_MS = int(os.getenv("SYNTHESIS_MAX_WAIT_MS", 10000))
+
+    # Optional post-ingest stage: once an ingest job succeeds, summarise the
+    # chunks its searches are likeliest to land on - the top hit of the
+    # `kubectl ghost` search for each service the source is tagged with,
+    # then its chunks ranked by how often they drew feedback - up to
+    # SYNTHESIS_PRECOMPUTE_LIMIT of them, so no user pays the Groq round-trip
+    # for those. Groq calls are paced to SYNTHESIS_PRECOMPUTE_RPM, under the
+    # free tier's 30 requests/minute so live searches keep the rest.
+    # Progress shows on the ingest job (summaries_*) - see
+    # api/summary_warmer.py.
+    SYNTHESIS_PRECOMPUTE = _flag("SYNTHESIS_PRECOMPUTE", False)
+    SYNTHESIS_PRECOMPUTE_LIMIT = int(os.getenv("SYNTHESIS_PRECOMPUTE_LIMIT", 50))
+    SYNTHESIS_PRECOMPUTE_RPM = float(os.getenv("SYNTHESIS_PRECOMPUTE_RPM", 20))
 
         # Phase 13.2: optional Groq LLM reranker, MEASURED (not assumed) against
     # the bi-encoder-only baseline - see api/rerank_groq.py and the Phase 13.2
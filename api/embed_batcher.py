@@ -0,0 +1,98 @@
+"""Micro-batching for /ghost-note query embeddings.
+
+Every search used to call `embedding_model.encode(query)` on one string from
+its own threadpool worker. Under concurrency that is N single-row forward
+passes fighting over the same torch intra-op threads, when one N-row pass
+costs little more than a single row.
+
+Callers hand their text to `encode()` and block; one batcher thread takes the
+first waiting query, keeps collecting for up to `window_s` or until
+`max_batch` queries are waiting, encodes them in one call and hands each
+caller back its own vector. While a batch is encoding, new queries queue up
+and form the next batch, so under load batches fill even with a zero window.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    def __init__(self, encode_batch, window_s: float, max_batch: int, name: str = "embed-batcher"):
+        """`encode_batch(texts)` returns one vector per text, in order.
+        `max_batch` <= 1 disables batching: encode() calls it directly.
+        """
+        self._encode_batch = encode_batch
+        self.window_s = max(0.0, window_s)
+        self.max_batch = max_batch
+        self._name = name
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def encode(self, text: str):
+        """Embed one text, batched with whatever else arrives alongside it."""
+        if self.max_batch <= 1:
+            return self._encode_batch([text])[0]
+        self._ensure_thread()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _ensure_thread(self):
+        # Started lazily, on the first search.
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for text, _future in batch]
+            try:
+                vectors = self._encode_batch(texts)
+            except Exception as e:
+                logger.error("Batched query encode failed for %d queries: %s", len(batch), e)
+                for _text, future in batch:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+            for (_text, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "window_ms": self.window_s * 1000,
+                "max_batch": self.max_batch,
+                "batches": self.batches,
+                "queries": self.items,
+                "mean_batch": self.items / self.batches if self.batches else None,
+                "largest_batch": self.largest_batch,
+            }
@@ -0,0 +1,146 @@
+# api/embedder.py
+"""The bi-encoder behind every query and ingest embedding.
+
+Config.EMBED_BACKEND "torch" (default) is SentenceTransformer on PyTorch,
+float32 on CPU. "onnx" runs the same network on ONNX Runtime from an export
+made by scripts/export_onnx.py - optionally dynamically quantized to int8 -
+with the tokenizer and pooling done here, so serving needs neither torch nor
+transformers at import. Its vectors stay compatible with an index embedded
+by the torch path (cosine tolerance checked in tests/test_embedder.py), so
+switching backend does not need a re-ingest.
+
+Same fallback rule as the intent classifier: a missing or broken export
+logs a warning and serves the torch model instead of failing startup.
+
+Both runtimes default to one intra-op thread per core of the whole machine.
+With several API workers on a pod limited to a few CPUs that is workers x
+node-cores threads fighting over the quota, so thread_count() gives each
+worker its share of the CPUs this process may actually use.
+"""
+import json
+import logging
+import math
+import os
+import sys
+
+import numpy as np
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Written by scripts/export_onnx.py next to the model: what pooling and
+# normalization the SentenceTransformer pipeline applied after the network.
+EXPORT_CONFIG = "embedder.json"
+
+
+class OnnxEmbedder:
+    """encode() with SentenceTransformer's calling convention, on ONNX Runtime."""
+
+    def __init__(self, model_dir: str, file_name: str = "model.onnx", threads: int = 0):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, EXPORT_CONFIG), encoding="utf-8") as f:
+            config = json.load(f)
+        if config.get("pooling") != "mean":
+            raise ValueError(f"unsupported pooling {config.get('pooling')!r}; only mean pooling is exported")
+        self.normalize = bool(config.get("normalize", True))
+        self.max_seq_length = int(config["max_seq_length"])
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=int(config.get("pad_token_id", 0)))
+
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, file_name), options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        self.model_path = os.path.join(model_dir, file_name)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.session.get_outputs()[0].shape[-1])
+
+    def encode(self, sentences, batch_size: int = 32, **_kwargs) -> np.ndarray:
+        """One float32 vector per text (a single vector for a str). Extra
+        SentenceTransformer keyword arguments are accepted and ignored.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = np.zeros((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        # Like SentenceTransformer: batch texts of similar length so little
+        # of each batch is padding.
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            out[batch] = self._encode_batch([texts[i] for i in batch])
+        return out[0] if single else out
+
+    def _encode_batch(self, texts: list) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        tokens = self.session.run(None, {name: feeds[name] for name in self._inputs})[0]
+        mask = feeds["attention_mask"][:, :, None].astype(np.float32)
+        pooled = (tokens * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.normalize:
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on, capped by a cgroup v2 CPU quota - a
+    pod's limits.cpu, which the affinity mask doesn't reflect.
+    """
+    cpus = len(os.sched_getaffinity(0))
+    try:
+        with open("/sys/fs/cgroup/cpu.max", encoding="utf-8") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def thread_count() -> int:
+    """Intra-op threads per process: Config.EMBED_THREADS if set; otherwise,
+    with several Config.API_WORKERS, an even share of the CPUs; otherwise 0,
+    the runtime's own default.
+    """
+    if Config.EMBED_THREADS > 0:
+        return Config.EMBED_THREADS
+    if Config.API_WORKERS > 1:
+        return max(1, available_cpus() // Config.API_WORKERS)
+    return 0
+
+
+def set_torch_threads(threads: int) -> None:
+    """torch.set_num_threads(threads), if torch is loaded and threads > 0."""
+    if threads > 0 and "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def load_embedder():
+    """The embedding model Config selects, falling back to torch."""
+    threads = thread_count()
+    if Config.EMBED_BACKEND == "onnx":
+        try:
+            embedder = OnnxEmbedder(Config.EMBED_ONNX_DIR, Config.EMBED_ONNX_FILE, threads)
+            logger.info("Embedding with ONNX Runtime: %s", embedder.model_path)
+            return embedder
+        except Exception as e:
+            logger.warning(
+                "Could not load ONNX embedder from %s/%s, using the torch model: %s",
+                Config.EMBED_ONNX_DIR, Config.EMBED_ONNX_FILE, e,
+            )
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(Config.EMBED_MODEL_NAME)
+    set_torch_threads(threads)
+    return model
@@ -0,0 +1,362 @@
+"""Batched, buffered appends to a JSONL event log.
+
+POST /feedback and POST /pod-state each used to open their log, write one
+line and close it again, inside the request's threadpool thread - three
+syscalls and an inode lock per request, and with a heartbeat every 30s from
+every sidecar in the cluster, most of the API's syscalls. An EventLog holds
+records in memory instead, and one background thread writes them out in a
+single write() per batch: once `flush_bytes` have piled up, or every
+`flush_interval_s`, whichever comes first. append(wait=True) - what
+/feedback uses, since its response reports counts that include the event -
+flushes right away and blocks until its batch is on disk; requests arriving
+meanwhile share the next batch (group commit) rather than queueing a write
+each.
+
+Every API worker appends to the same file, so each batch is written under
+an exclusive flock(): a batch's lines land together, in order, and never
+interleaved with another worker's, even if write() comes back short. A
+worker that died mid-write can leave a half line at the end; the next batch
+starts by terminating it, so it reads as one malformed line (which readers
+skip) instead of gluing itself to the next record.
+
+`fsync` picks how durable a flushed batch is: "none" leaves it to the OS
+(the records survive an API crash, not a node crash), "rotate" syncs each
+segment as it's closed, "batch" syncs every batch.
+
+With `max_bytes` set, a log that has grown past it is renamed to a segment,
+`<path>.seg-<UTC time>-<pid>`, gzipped when `compress` is on (after which
+it's `...gz`), and a fresh file started; `keep` > 0 deletes all but that many
+of the newest segments. segments() lists them oldest first. A worker still
+holding the old file open notices the rename under the lock and reopens.
+
+Readers build on LogTail, which follows the live file and its rotations.
+"""
+import fcntl
+import glob
+import gzip
+import logging
+import os
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("none", "rotate", "batch")
+
+
+def segments(path: str) -> list[str]:
+    """Rotated segments of the log at `path`, oldest first."""
+    names = set(glob.glob(glob.escape(path) + ".seg-*"))
+    # Mid-compression, a segment can briefly exist both as itself and as
+    # its .gz: count it once, from the original.
+    return sorted(
+        name for name in names
+        if not name.endswith(".tmp") and not (name.endswith(".gz") and name[:-3] in names)
+    )
+
+
+def _segment_names(path: str) -> set[str]:
+    # A segment by the name it was rotated to, compressed since or not.
+    return {name[:-3] if name.endswith(".gz") else name for name in segments(path)}
+
+
+def open_segment(name: str):
+    """A binary file object over a segment, compressed or not."""
+    return gzip.open(name, "rb") if name.endswith(".gz") else open(name, "rb")
+
+
+class _Batch:
+    __slots__ = ("lines", "size", "started", "done", "error")
+
+    def __init__(self):
+        self.lines: list = []
+        self.size = 0
+        self.started = 0.0
+        self.done = threading.Event()
+        self.error = None
+
+
+class EventLog:
+    def __init__(self, path: str, flush_bytes: int = 64 * 1024, flush_interval_s: float = 1.0,
+                 fsync: str = "none", max_bytes: int = 0, compress: bool = True, keep: int = 0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, not {fsync!r}")
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_interval_s = flush_interval_s
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.keep = keep
+        self._batch = _Batch()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._urgent = False
+        self._write_lock = threading.Lock()
+        self._fd = None
+        self._thread = None
+        self.batches = 0
+        self.records = 0
+
+    def append(self, line: str, wait: bool = False) -> None:
+        """Buffer one record - a single line of JSON, no trailing newline.
+
+        wait=True returns once the record is written (fsynced too, with
+        fsync="batch") and raises the OSError if that failed; otherwise it
+        returns at once, and a failed write is only logged.
+        """
+        if "\n" in line:
+            raise ValueError("an event log record must be a single line")
+        data = line.encode("utf-8") + b"\n"
+        with self._lock:
+            if self._thread is None:
+                # Started lazily, so a forked API worker starts its own.
+                self._thread = threading.Thread(target=self._flusher, name="event-log", daemon=True)
+                self._thread.start()
+            batch = self._batch
+            if not batch.lines:
+                batch.started = time.monotonic()
+                self._wake.notify()  # start the flush interval
+            batch.lines.append(data)
+            batch.size += len(data)
+            if wait or batch.size >= self.flush_bytes:
+                self._urgent = True
+                self._wake.notify()
+        if wait:
+            batch.done.wait()
+            if batch.error is not None:
+                raise batch.error
+
+    def flush(self) -> None:
+        """Write out everything buffered so far, now, and wait for any write
+        (and segment compression) already under way."""
+        with self._lock:
+            batch, self._batch = self._batch, _Batch()
+        self._write(batch)
+        with self._write_lock:
+            pass
+
+    def stats(self) -> dict:
+        return {"path": self.path, "batches": self.batches, "records": self.records}
+
+    def _flusher(self):
+        while True:
+            with self._lock:
+                # A batch goes when it's full or waited on, or once it's
+                # been open flush_interval_s.
+                while not self._urgent:
+                    if not self._batch.lines:
+                        self._wake.wait()
+                        continue
+                    remaining = self._batch.started + self.flush_interval_s - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wake.wait(remaining)
+                self._urgent = False
+                batch, self._batch = self._batch, _Batch()
+            self._write(batch)
+
+    def _write(self, batch: _Batch) -> None:
+        if not batch.lines:
+            batch.done.set()
+            return
+        with self._write_lock:
+            segment = None
+            try:
+                segment = self._append_bytes(b"".join(batch.lines))
+                self.batches += 1
+                self.records += len(batch.lines)
+            except OSError as e:
+                logger.error("Could not write %d record(s) to %s: %s", len(batch.lines), self.path, e)
+                batch.error = e
+            finally:
+                batch.done.set()
+            if segment:
+                self._finish_segment(segment)
+
+    def _append_bytes(self, data: bytes) -> str | None:
+        """Append `data` under the file lock; the segment it rotated out, if any."""
+        while True:
+            fd = self._open()
+            stale = segment = None
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                stale = self._moved(fd)
+                if stale:
+                    # Another worker rotated the file: follow it to the new one.
+                    continue
+                size = os.fstat(fd).st_size
+                if size and os.pread(fd, 1, size - 1) != b"\n":
+                    data = b"\n" + data
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+                if self.fsync == "batch":
+                    os.fsync(fd)
+                if self.max_bytes and size + len(data) >= self.max_bytes:
+                    segment = self._rotate(fd)
+                return segment
+            finally:
+                # flock() belongs to the open file, so close only once unlocked.
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                if stale or segment:
+                    self._close()
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _moved(self, fd: int) -> bool:
+        try:
+            return os.stat(self.path).st_ino != os.fstat(fd).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _rotate(self, fd: int) -> str:
+        now = time.time()
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now)) + f".{int(now % 1 * 1e6):06d}Z"
+        segment = f"{self.path}.seg-{stamp}-{os.getpid()}"
+        if self.fsync != "none":
+            os.fsync(fd)
+        os.rename(self.path, segment)
+        return segment
+
+    def _finish_segment(self, segment: str) -> None:
+        try:
+            if self.compress:
+                tmp = f"{segment}.gz.tmp"
+                with open(segment, "rb") as src, gzip.open(tmp, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                if self.fsync != "none":
+                    with open(tmp, "rb") as f:
+                        os.fsync(f.fileno())
+                os.replace(tmp, segment + ".gz")
+                os.unlink(segment)
+            if self.keep > 0:
+                for old in segments(self.path)[:-self.keep]:
+                    os.unlink(old)
+        except OSError as e:
+            logger.warning("Could not compress or prune %s: %s", segment, e)
+
+
+class LogTail:
+    """Follows an EventLog's file as it grows, feeding each whole new line to
+    _apply() - the base of api/feedback_counts.py and api/pod_state.py.
+
+    The live file stays open between calls, so when it's rotated away the
+    rest of it is still read through that descriptor before moving on to
+    its successor - also when the rotated file has already been gzipped
+    and unlinked, which shows as a segment that wasn't there when it was
+    opened. A file replaced outright (unlinked, with no new segment) or
+    truncated is read again from scratch by _rebuild(): every segment,
+    oldest first, then the live file.
+    Not thread-safe; subclasses call _follow() under their own lock.
+    """
+
+    _READ_BLOCK = 1 << 20
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._inode = None
+        self._offset = 0
+        self._segments = set()
+
+    def _apply(self, line: bytes) -> None:
+        raise NotImplementedError
+
+    def _clear(self) -> None:
+        """Drop whatever has been built from the lines so far."""
+        raise NotImplementedError
+
+    def _follow(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if self._fd is not None and (stat is None or stat.st_ino != self._inode):
+            # The file being followed was rotated or replaced: finish it first.
+            self._read_live()
+            rotated = os.fstat(self._fd).st_nlink > 0 or self._rotated_away()
+            self._close()
+            if not rotated:
+                logger.info("Log %s was replaced; re-reading it", self.path)
+                self._rebuild()
+        if stat is None:
+            return
+        if self._fd is None:
+            try:
+                fd = os.open(self.path, os.O_RDONLY)
+            except FileNotFoundError:
+                return
+            inode = os.fstat(fd).st_ino
+            if self._inode not in (None, inode):
+                self._rebuild()  # positioned (by a checkpoint) in a file since rotated away
+            self._fd, self._inode = fd, inode
+            self._segments = _segment_names(self.path)
+        elif stat.st_size < self._offset:
+            logger.info("Log %s was truncated; re-reading it", self.path)
+            self._rebuild()
+            return self._follow()
+        self._read_live()
+
+    def _rotated_away(self) -> bool:
+        """Whether the unlinked file just read to its end was a rotated
+        segment gzipped since: a segment has appeared that wasn't there
+        when it was opened."""
+        if self._offset < os.fstat(self._fd).st_size:
+            return False
+        return bool(_segment_names(self.path) - self._segments)
+
+    def _rebuild(self) -> None:
+        """Start over: every rotated segment now, the live file on the next _follow()."""
+        self._clear()
+        self._close()
+        for name in segments(self.path):
+            try:
+                try:
+                    f = open_segment(name)
+                except FileNotFoundError:
+                    f = open_segment(name + ".gz")  # compressed since it was listed
+                with f:
+                    self._consume(iter(lambda: f.read(self._READ_BLOCK), b""))
+            except (OSError, EOFError) as e:
+                logger.warning("Skipping unreadable log segment %s: %s", name, e)
+
+    def _close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+        self._inode = None
+        self._offset = 0
+
+    def _read_live(self) -> None:
+        def blocks():
+            offset = self._offset
+            while block := os.pread(self._fd, self._READ_BLOCK, offset):
+                offset += len(block)
+                yield block
+
+        self._offset += self._consume(blocks())
+
+    def _consume(self, blocks) -> int:
+        """_apply() each whole line in `blocks`; returns the bytes they took."""
+        consumed = 0
+        pending = b""
+        for block in blocks:
+            block = pending + block
+            # Only whole lines: a line still being written (or torn by a
+            # crash) is left for the next read rather than misread.
+            cut = block.rfind(b"\n") + 1
+            for line in block[:cut].splitlines():
+                self._apply(line)
+            consumed += cut
+            pending = block[cut:]
+        return consumed
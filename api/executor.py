@@ -0,0 +1,66 @@
+"""A bounded worker pool for CPU-bound ingest work (chunk, embed, upsert).
+
+`ingest_url` is a coroutine, but embedding is pure CPU and the Chroma upserts
+block on I/O. Run inline they froze the uvicorn event loop for the whole
+ingest - /health probes timed out mid-ingest and Kubernetes restarted the pod.
+Everything blocking now runs here instead, and the loop only awaits it.
+
+Bounded twice over:
+- `max_workers` caps how many batches embed at once, so a burst of ingests
+  can't take every core away from /ghost-note's own encode calls.
+- `max_pending` caps how much work may be queued behind them. Past that,
+  `run()` waits for a slot *without* blocking the loop, which holds producers
+  back instead of letting them pile batches (and their memory) into an
+  unbounded queue.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BoundedExecutor:
+    def __init__(self, max_workers: int, max_pending: int, name: str):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` on the pool and await its result."""
+        if not self._slots.acquire(blocking=False):
+            # Full: park on the semaphore in a helper thread so the event loop
+            # keeps serving requests while this producer is held back.
+            await self._wait_for_slot()
+        try:
+            future = self._pool.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _f: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    async def _wait_for_slot(self) -> None:
+        # Cancelling the await (a client gone mid-ingest) doesn't stop the
+        # helper thread: it still takes the slot once one frees. Whichever
+        # side finishes second gives it back, or it would be lost for good.
+        lock = threading.Lock()
+        state = {"taken": False, "abandoned": False}
+
+        def acquire():
+            self._slots.acquire()
+            with lock:
+                if state["abandoned"]:
+                    self._slots.release()
+                else:
+                    state["taken"] = True
+
+        try:
+            await asyncio.to_thread(acquire)
+        except BaseException:
+            with lock:
+                state["abandoned"] = True
+                if state["taken"]:
+                    self._slots.release()
+            raise
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
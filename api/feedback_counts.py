@@ -0,0 +1,157 @@
+"""Running 👍/👎 counts over the feedback log: overall, per chunk, per query.
+
+record_feedback() used to append its event and then re-parse all of
+feedback.jsonl to count ups and downs, and GET /feedback/summary did the
+same, so every click cost O(all feedback ever recorded). The counts now live
+in memory. They are built once (by pipeline.warm_up(), or on first use) and
+then extended from the byte offset the log was last read to, so each call
+reads only the lines appended since - its own event included. Reading the
+tail rather than counting in-process is also what keeps every API worker's
+counts whole: the other workers' appends land in the same file.
+
+A rebuild at startup is the one full scan left, so every `checkpoint_every`
+events the counts are saved, with the offset they cover, to
+`<log>.counts.json`. Startup loads that and reads only the tail past it. A
+checkpoint that doesn't match the log - the log was replaced, truncated or
+rotated since - is ignored and the log re-read from the start.
+
+The log is written by an api/event_log.py EventLog, which can rotate it into
+segments; following it across rotations, and recounting it when it's been
+replaced, is event_log.LogTail's job.
+"""
+import json
+import logging
+import os
+import threading
+
+from .event_log import LogTail
+
+logger = logging.getLogger(__name__)
+
+def prior(up: int, down: int, prior_votes: float) -> float:
+    """A chunk's feedback in (-1, 1): its net votes, shrunk towards 0 by
+    `prior_votes` neutral ones so a handful of ratings counts for little."""
+    votes = up + down + prior_votes
+    return (up - down) / votes if votes > 0 else 0.0
+
+
+def _query_key(query: str) -> str:
+    # Same form as pipeline._normalize_query(): whitespace collapsed.
+    return " ".join(query.split())
+
+
+class FeedbackCounts(LogTail):
+    def __init__(self, path: str, checkpoint_every: int = 10000):
+        super().__init__(path)
+        self.checkpoint_path = path + ".counts.json"
+        self.checkpoint_every = checkpoint_every
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._clear()
+
+    def _clear(self) -> None:
+        self.up = 0
+        self.down = 0
+        self._chunks: dict = {}  # chunk_id -> [up, down]
+        self._queries: dict = {}  # normalized query -> [up, down]
+        self._since_checkpoint = 0
+
+    def load(self) -> None:
+        """Build the counts now (checkpoint, then the log past it) rather
+        than on first use."""
+        with self._lock:
+            self._catch_up()
+
+    def events(self) -> int:
+        """Ratings counted so far; changes whenever any count does."""
+        with self._lock:
+            self._catch_up()
+            return self.up + self.down
+
+    def totals(self) -> dict:
+        with self._lock:
+            self._catch_up()
+            return {"total_up": self.up, "total_down": self.down}
+
+    def for_chunk(self, chunk_id: str) -> tuple[int, int]:
+        """(up, down) for one chunk."""
+        return self.for_chunks([chunk_id])[0]
+
+    def for_chunks(self, chunk_ids: list) -> list[tuple[int, int]]:
+        """(up, down) for each of `chunk_ids`, after one read of the tail."""
+        with self._lock:
+            self._catch_up()
+            return [tuple(self._chunks.get(chunk_id, (0, 0))) for chunk_id in chunk_ids]
+
+    def for_query(self, query: str) -> tuple[int, int]:
+        """(up, down) across every chunk rated for `query`."""
+        with self._lock:
+            self._catch_up()
+            return tuple(self._queries.get(_query_key(query), (0, 0)))
+
+    def _catch_up(self) -> None:
+        if not self._loaded:
+            self._loaded = True
+            if not self._load_checkpoint():
+                self._rebuild()
+        self._follow()
+        if self._since_checkpoint >= self.checkpoint_every > 0:
+            self._save_checkpoint()
+
+    def _apply(self, line: bytes) -> None:
+        if not line.strip():
+            return
+        try:
+            event = json.loads(line)
+            rating = event["rating"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Skipping malformed feedback line")
+            return
+        if rating == "up":
+            slot = 0
+            self.up += 1
+        elif rating == "down":
+            slot = 1
+            self.down += 1
+        else:
+            return
+        chunk_id = event.get("chunk_id")
+        if chunk_id:
+            self._chunks.setdefault(chunk_id, [0, 0])[slot] += 1
+        query = event.get("query")
+        if query:
+            self._queries.setdefault(_query_key(query), [0, 0])[slot] += 1
+        self._since_checkpoint += 1
+
+    def _load_checkpoint(self) -> bool:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable feedback checkpoint %s: %s", self.checkpoint_path, e)
+            return False
+        if saved.get("inode") != stat.st_ino or saved.get("offset", 0) > stat.st_size:
+            logger.info("Feedback checkpoint doesn't match %s; recounting the log", self.path)
+            return False
+        self.up, self.down = saved["up"], saved["down"]
+        self._chunks, self._queries = saved["chunks"], saved["queries"]
+        self._inode, self._offset = saved["inode"], saved["offset"]
+        return True
+
+    def _save_checkpoint(self) -> None:
+        saved = {
+            "inode": self._inode, "offset": self._offset, "up": self.up, "down": self.down,
+            "chunks": self._chunks, "queries": self._queries,
+        }
+        tmp = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(saved, f, separators=(",", ":"))
+            os.replace(tmp, self.checkpoint_path)
+        except OSError as e:
+            logger.warning("Could not write feedback checkpoint %s: %s", self.checkpoint_path, e)
+        # Failed or not, wait another checkpoint_every events before the next try.
+        self._since_checkpoint = 0
@@ -0,0 +1,330 @@
+"""GitHub repository fetching, shared by scrape_repo.py (CLI) and POST /ingest.
+
+The original walk listed the repo one directory at a time through
+/repos/{owner}/{repo}/contents/{path}, awaiting every subdirectory in turn -
+one serialized API round-trip per directory before a single file body was
+downloaded. On a monorepo that is thousands of requests against a 5,000/hr
+budget (60/hr unauthenticated) and most of the ingest's wall-clock time.
+
+Two cheaper modes replace it:
+
+- "trees" (default): `ref` is first pinned to a commit SHA, then ONE recursive
+  Git Trees call at that commit lists every blob in the repo, `is_ignored` /
+  ALLOWED_EXTENSIONS are applied in memory, and only the survivors are
+  downloaded from raw.githubusercontent.com at the same commit - which does
+  not count against the API rate limit and is fetched with bounded
+  concurrency. Pinning keeps a push landing mid-ingest from mixing two
+  commits, so the listed blob SHAs always describe the bytes downloaded.
+- "tarball": ONE request streams the repo archive; members are filtered and
+  decoded as they arrive, so nothing else is requested at all. Also the
+  automatic fallback when GitHub truncates a very large tree listing.
+
+"contents" keeps the old directory walk, only so the fake-server benchmark in
+tests/test_github_fetch.py has something to measure against.
+
+Every mode yields (path, blob_sha, text) in the same order-stable way. The
+blob SHA is git's own content hash for the file, taken from the tree listing
+or recomputed from the archive bytes, so both modes agree on it.
+
+Deliberately free of crawl4ai: scrape_repo imports it at module level (~25s of
+Playwright startup), and the API must not pay that just to list a repo.
+"""
+import hashlib
+import itertools
+import logging
+import os
+import re
+import tarfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import requests
+
+from .chunking import ALLOWED_EXTENSIONS, is_ignored
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Overridable so tests can point both at a local fake server.
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+GITHUB_RAW_URL = os.getenv("GITHUB_RAW_URL", "https://raw.githubusercontent.com").rstrip("/")
+
+FETCH_MODES = ("trees", "tarball", "contents")
+
+# Bounds concurrent raw-file downloads so a large repo doesn't open hundreds of
+# sockets at once. Raw fetches don't spend API quota, so this is about being a
+# polite client, not about the rate limit.
+MAX_CONCURRENT_FETCHES = 10
+
+
+class RateLimitError(RuntimeError):
+    """Raised loudly on a 403 so a truncated scrape is never mistaken for a complete one."""
+
+
+def rate_limit_message(response) -> str:
+    remaining = response.headers.get("X-RateLimit-Remaining")
+    reset = response.headers.get("X-RateLimit-Reset")
+    detail = f"GitHub returned 403 (remaining={remaining})."
+    if reset:
+        try:
+            reset_ts = int(reset)
+            wait_s = max(0, reset_ts - int(time.time()))
+            reset_at = time.strftime("%H:%M:%S", time.localtime(reset_ts))
+            detail += f" Rate limit resets at {reset_at} (in {wait_s // 60}m {wait_s % 60}s)."
+        except ValueError:
+            detail += f" Rate limit resets at {reset}."
+    if not Config.GITHUB_TOKEN:
+        detail += " Set GITHUB_TOKEN to raise the limit from 60 to 5000 requests/hour."
+    return detail
+
+
+def build_headers() -> dict:
+    headers = {"Accept": "application/vnd.github+json"}
+    if Config.GITHUB_TOKEN:
+        headers["Authorization"] = f"Bearer {Config.GITHUB_TOKEN}"
+    return headers
+
+
+def is_wanted(full_path: str) -> bool:
+    """The fetch-time filter: allowlisted extension and not ignored."""
+    return full_path.endswith(ALLOWED_EXTENSIONS) and not is_ignored(full_path)
+
+
+def git_blob_sha(data: bytes) -> str:
+    """Git's blob object ID for `data` - what the Trees API reports as `sha`."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _api_get(url: str, headers: dict, **kwargs):
+    response = requests.get(url, headers=headers, timeout=30, **kwargs)
+    if response.status_code == 403:
+        raise RateLimitError(rate_limit_message(response))
+    return response
+
+
+_COMMIT_SHA = re.compile(r"[0-9a-f]{40}")
+
+
+def resolve_commit(owner: str, repo: str, headers: dict, ref: str = "HEAD") -> str:
+    """The commit SHA `ref` points at now, so everything fetched afterwards
+    sees the same commit. Falls back to `ref` itself if GitHub won't say (an
+    empty repository, say) - list_tree() then reports that in its own way."""
+    if _COMMIT_SHA.fullmatch(ref):
+        return ref
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/commits/{quote(ref, safe='')}"
+    response = _api_get(url, {**headers, "Accept": "application/vnd.github.sha"})
+    sha = response.text.strip() if response.status_code == 200 else ""
+    if not _COMMIT_SHA.fullmatch(sha):
+        logger.warning(
+            "Could not resolve %s of %s/%s to a commit - GitHub returned %s %s",
+            ref, owner, repo, response.status_code, response.reason,
+        )
+        return ref
+    return sha
+
+
+class TreeTruncated(Exception):
+    """The Trees API hit its size cap and returned a partial listing."""
+
+
+def list_tree(owner: str, repo: str, headers: dict, ref: str = "HEAD",
+              skipped: list | None = None) -> list[tuple[str, str]]:
+    """Return [(path, blob_sha)] for every wanted file, from one API call.
+
+    Raises TreeTruncated rather than returning a partial listing - a silently
+    incomplete corpus is the failure mode this whole module exists to avoid.
+    """
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/git/trees/{ref}"
+    response = _api_get(url, headers, params={"recursive": "1"})
+    if response.status_code != 200:
+        # 409 is GitHub's answer for an empty repository.
+        logger.warning(
+            "Could not list tree for %s/%s - GitHub returned %s %s",
+            owner, repo, response.status_code, response.reason,
+        )
+        return []
+
+    body = response.json()
+    if body.get("truncated"):
+        raise TreeTruncated(f"{owner}/{repo}")
+
+    entries = []
+    for item in body.get("tree", []):
+        if item.get("type") != "blob":
+            continue
+        if not is_wanted(item["path"]):
+            if skipped is not None:
+                skipped.append(item["path"])
+            continue
+        entries.append((item["path"], item["sha"]))
+    return entries
+
+
+def list_contents(owner: str, repo: str, headers: dict,
+                  skipped: list | None = None, ref: str = "HEAD") -> list[tuple[str, str]]:
+    """The legacy directory-by-directory Contents API walk.
+
+    One request per directory, strictly sequential. Kept only as the baseline
+    the fake-server benchmark measures "trees" and "tarball" against.
+    """
+    entries = []
+
+    def walk(path=""):
+        response = _api_get(f"{GITHUB_API_URL}/repos/{owner}/{repo}/contents/{quote(path)}",
+                            headers, params={"ref": ref})
+        if response.status_code != 200:
+            logger.warning(
+                "Skipping '%s' - GitHub returned %s %s",
+                path or "/", response.status_code, response.reason,
+            )
+            return
+
+        items = response.json()
+        if isinstance(items, dict):  # a file path was passed instead of a directory
+            items = [items]
+
+        subdirs = []
+        for item in items:
+            full_path = item["path"]
+            if is_ignored(full_path):
+                if skipped is not None:
+                    skipped.append(full_path)
+                continue
+            if item["type"] == "file":
+                if item["name"].endswith(ALLOWED_EXTENSIONS):
+                    entries.append((full_path, item["sha"]))
+            elif item["type"] == "dir":
+                subdirs.append(full_path)
+
+        for subdir in subdirs:
+            walk(subdir)
+
+    walk()
+    return entries
+
+
+def _fetch_raw(owner: str, repo: str, ref: str, entries: list[tuple[str, str]]):
+    """Download file bodies with bounded concurrency, yielding in listing order.
+
+    Only a sliding window of MAX_CONCURRENT_FETCHES * 2 downloads is ever in
+    flight or finished-but-unconsumed, so a slow consumer (the embedder) holds
+    the fetch back instead of every file body piling up in memory.
+
+    A single failed file is logged and skipped rather than failing the ingest,
+    the same tolerance the per-file fetch always had.
+    """
+    def fetch_one(entry):
+        full_path, sha = entry
+        try:
+            # Quoted: a path may hold a space, "#", "?" or "%".
+            url = f"{GITHUB_RAW_URL}/{owner}/{repo}/{ref}/{quote(full_path)}"
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+            return full_path, sha, response.text
+        except Exception as e:
+            logger.warning("Failed to fetch %s: %s", full_path, e)
+            return None
+
+    entries = iter(entries)
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES) as pool:
+        window = deque(
+            pool.submit(fetch_one, entry)
+            for entry in itertools.islice(entries, MAX_CONCURRENT_FETCHES * 2)
+        )
+        while window:
+            result = window.popleft().result()
+            entry = next(entries, None)
+            if entry is not None:
+                window.append(pool.submit(fetch_one, entry))
+            if result is not None:
+                yield result
+
+
+def iter_tarball(owner: str, repo: str, headers: dict, ref: str = "HEAD",
+                 skipped: list | None = None, known: dict | None = None,
+                 listed: dict | None = None):
+    """Stream the repo archive and yield (path, blob_sha, text) per wanted file.
+
+    Opened in tarfile's streaming mode ("r|gz") straight off the socket, so the
+    archive is never written to disk or held whole in memory.
+    """
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/tarball/{ref}"
+    response = _api_get(url, headers, stream=True)
+    if response.status_code != 200:
+        logger.warning(
+            "Could not download tarball for %s/%s - GitHub returned %s %s",
+            owner, repo, response.status_code, response.reason,
+        )
+        return
+
+    with response:
+        response.raw.decode_content = True
+        with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                # Members are prefixed with a "<owner>-<repo>-<sha>/" directory.
+                full_path = member.name.split("/", 1)[-1]
+                if not is_wanted(full_path):
+                    if skipped is not None:
+                        skipped.append(full_path)
+                    continue
+                data = archive.extractfile(member).read()
+                sha = git_blob_sha(data)
+                if listed is not None:
+                    listed[full_path] = sha
+                if known and known.get(full_path) == sha:
+                    continue
+                yield full_path, sha, data.decode("utf-8", errors="replace")
+
+
+def iter_repo_files(owner: str, repo: str, headers: dict | None = None,
+                    mode: str | None = None, ref: str = "HEAD",
+                    skipped: list | None = None, known: dict | None = None,
+                    listed: dict | None = None):
+    """Yield (path, blob_sha, text) for every indexable file in a GitHub repo.
+
+    `mode` is one of FETCH_MODES, defaulting to Config.GITHUB_FETCH_MODE.
+    Outside "tarball" (a single request, consistent on its own), `ref` is
+    resolved to its commit SHA first and both the listing and the downloads
+    use that.
+    `skipped`, if given, collects the paths the ignore rules dropped before
+    anything was downloaded. `known` maps path -> blob SHA already indexed:
+    files whose SHA still matches are not downloaded (not yielded, for the
+    tarball) - that is what makes a re-ingest incremental. `listed`, if given,
+    collects path -> blob SHA for every indexable file, yielded or not, so the
+    caller can tell unchanged files from deleted ones. Raises RateLimitError on
+    a 403.
+    """
+    headers = headers if headers is not None else build_headers()
+    mode = mode or Config.GITHUB_FETCH_MODE
+    if mode not in FETCH_MODES:
+        raise ValueError(f"Unknown GitHub fetch mode {mode!r}; expected one of {FETCH_MODES}")
+
+    if mode == "tarball":
+        yield from iter_tarball(owner, repo, headers, ref, skipped, known, listed)
+        return
+
+    ref = resolve_commit(owner, repo, headers, ref)
+    if mode == "contents":
+        entries = list_contents(owner, repo, headers, skipped, ref)
+    else:
+        try:
+            entries = list_tree(owner, repo, headers, ref, skipped)
+        except TreeTruncated:
+            logger.warning(
+                "Tree listing for %s/%s was truncated by GitHub; falling back to the tarball",
+                owner, repo,
+            )
+            yield from iter_tarball(owner, repo, headers, ref, skipped, known, listed)
+            return
+
+    logger.info("Found %d files in %s/%s (mode=%s)", len(entries), owner, repo, mode)
+    if listed is not None:
+        listed.update(entries)
+    if known:
+        entries = [(path, sha) for path, sha in entries if known.get(path) != sha]
+        logger.info("%d file(s) new or changed since the last ingest", len(entries))
+    yield from _fetch_raw(owner, repo, ref, entries)
@@ -0,0 +1,53 @@
+# api/gunicorn_conf.py
+"""Multi-process serving: `gunicorn -c api/gunicorn_conf.py api.app:app`.
+
+One uvicorn process serves searches from a threadpool, and the GIL plus one
+torch thread pool per process cap what a multi-core pod gets out of it.
+Config.API_WORKERS processes each get their own, without N copies of the
+model:
+
+- the app is imported once in the master (preload_app) and, for the torch
+  backend, the embedding model is loaded there too, before any worker is
+  forked - the weights are never written again, so the workers share those
+  pages copy-on-write. ONNX Runtime sessions don't survive a fork, so the
+  onnx backend loads per worker (the int8 export is a tenth of the size).
+- the master loads with one torch thread so no OpenMP pool exists to be
+  inherited half-alive; each worker then sets its share of the CPUs
+  (api/embedder.py thread_count()).
+- Chroma is never opened in the master: each worker makes its own client
+  in warm-up (the app lifespan still runs per worker).
+- the numpy backend's vector index is memory-mapped files, so every worker
+  scans the same page cache; writes coordinate through its lock file, and
+  api/index_state.py's WriteCounter tells each worker when another has
+  written.
+"""
+from api.config import Config
+from api.embedder import available_cpus, set_torch_threads, thread_count
+
+if Config.API_WORKERS > 1 and not Config.CHROMA_HOST:
+    raise RuntimeError(
+        "API_WORKERS > 1 needs CHROMA_HOST: several processes must not open one on-disk PersistentClient"
+    )
+
+bind = f"0.0.0.0:{Config.API_PORT}"
+workers = Config.API_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+loglevel = Config.LOG_LEVEL.lower()
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before the first fork.
+    if Config.EMBED_BACKEND != "torch":
+        return
+    import sentence_transformers  # noqa: F401 - brings in torch
+
+    from api import pipeline
+
+    set_torch_threads(1)
+    pipeline.get_embedding_model()
+    server.log.info("Embedding model loaded before fork; %d worker(s) will share it", workers)
+
+
+def post_fork(server, worker):
+    set_torch_threads(thread_count() or available_cpus())
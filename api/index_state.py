@@ -0,0 +1,212 @@
+"""What the search path needs to know about the collection, kept in-process.
+
+search_ghost_notes() used to call `collection.count()` before every query just
+to spot an empty index - in-cluster that is an extra HTTP round-trip to the
+Chroma StatefulSet on every /ghost-note. Nearly every write to the collection
+goes through pipeline._call_collection, so this state is updated there
+instead and the hot path only reads it:
+
+- `generation` goes up on every write, and is what response caches key on.
+- emptiness is tracked as known-non-empty / unknown. An upsert of at least one
+  record proves the index is non-empty; a delete (or a refreshed handle after
+  a Chroma restart) makes it unknown again, and the next search pays for one
+  `count()` to find out. A count of 0 is never kept: embed_and_store.py, the
+  pipeline CLI or another pod can fill the collection without this process
+  seeing the write, so an empty index is counted again on every search. In
+  steady state that is zero counts per search.
+- chunk counts per `service` metadata value, so a search scoped to
+  "svc:<name>" knows before touching Chroma whether the filter can match
+  anything. Loaded by one full metadata scan, then kept exact by each write:
+  _call_collection reads the metadata of the records a write touches first
+  and hands it to record_write(). Until the scan has run, service_count()
+  answers None and search falls back to filtering and re-querying on a miss.
+  An under-count would silently drop a pod's scoping, so anything that makes
+  the counts doubtful (a write without that pre-read, a handle reset)
+  unloads them rather than guessing.
+
+With several API workers (api/gunicorn_conf.py) a write lands in one process
+and every other one's state is stale. WriteCounter, created before the fork
+in shared memory, tells each process when another has written, and
+foreign_write() then keeps only what such a write can't have falsified: the
+generation moves (retiring cached responses), emptiness becomes unknown, and
+a zero service count stops being trusted until the next full scan - an
+over-count only costs a filtered query that falls back, an under-count would
+drop scoping.
+"""
+import multiprocessing
+import threading
+import time
+
+_INSERT_METHODS = ("add", "upsert")
+WRITE_METHODS = ("add", "upsert", "update", "delete")
+
+
+class IndexState:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.generation = 0
+        # None = unknown; ask Chroma on the next is_empty().
+        self._empty: bool | None = None
+        # service (None for unscoped chunks) -> chunk count; None = not loaded.
+        self._services: dict | None = None
+        self._services_loaded_at = 0.0
+        self._scan_claimed = False
+        # Writes by other processes seen so far, and how many had been seen
+        # when the running / the last installed scan started - counts from
+        # before one are doubtful.
+        self._foreign_writes = 0
+        self._scan_foreign_writes = 0
+        self._scanned_foreign_writes = 0
+
+    @property
+    def tracks_services(self) -> bool:
+        return self._services is not None
+
+    def record_write(self, method_name: str, kwargs: dict, previous: list | None = None) -> None:
+        """Note a successful write made through _call_collection.
+
+        `previous` is the metadata of the records the write touched, as they
+        were just before it - required to keep per-service counts exact.
+        """
+        with self._lock:
+            self.generation += 1
+            if method_name in _INSERT_METHODS and kwargs.get("ids"):
+                self._empty = False
+            elif method_name == "delete":
+                self._empty = None
+
+            if self._services is None:
+                return
+            if previous is None:
+                self._services = None
+                return
+            if method_name == "update" and kwargs.get("metadatas") is None:
+                return  # metadata untouched, so is every service count
+            for meta in previous:
+                self._add(meta, -1)
+            if method_name != "delete":
+                new = kwargs.get("metadatas") or [None] * len(kwargs.get("ids") or [])
+                for meta in new:
+                    self._add(meta, 1)
+            self._empty = sum(self._services.values()) == 0
+
+    def _add(self, meta: dict | None, delta: int) -> None:
+        service = (meta or {}).get("service")
+        count = self._services.get(service, 0) + delta
+        if count > 0:
+            self._services[service] = count
+        else:
+            self._services.pop(service, None)
+
+    def reset(self) -> None:
+        """The collection handle was replaced - assume nothing about it."""
+        with self._lock:
+            self.generation += 1
+            self._empty = None
+            self._services = None
+
+    def foreign_write(self) -> None:
+        """Another process wrote to the collection."""
+        with self._lock:
+            self.generation += 1
+            self._empty = None
+            self._foreign_writes += 1
+
+    def observe_count(self, count: int, generation: int) -> None:
+        """Record a count taken at `generation`, unless a write has landed since.
+        Only a non-empty count sticks; an empty one leaves it unknown."""
+        with self._lock:
+            if generation == self.generation:
+                self._empty = False if count else None
+
+    def is_empty(self, count) -> bool:
+        """Whether the index is empty. `count()` is called only when that is
+        not already known.
+        """
+        empty = self._empty
+        if empty is not None:
+            return empty
+        generation = self.generation
+        total = count()
+        self.observe_count(total, generation)
+        return total == 0
+
+    def service_count(self, service: str) -> int | None:
+        """Chunks tagged `service`, or None while the counts aren't loaded."""
+        with self._lock:
+            if self._services is None:
+                return None
+            count = self._services.get(service, 0)
+            if count == 0 and self._foreign_writes != self._scanned_foreign_writes:
+                return None
+            return count
+
+    def services(self) -> dict | None:
+        with self._lock:
+            if self._services is None:
+                return None
+            return {s: n for s, n in self._services.items() if s is not None}
+
+    def claim_service_scan(self, max_age_s: float) -> bool:
+        """True if the caller should run a scan now: the counts are missing or
+        older than `max_age_s`, and no other scan is under way.
+        """
+        with self._lock:
+            if self._scan_claimed:
+                return False
+            fresh = time.monotonic() - self._services_loaded_at < max_age_s
+            if self._services is not None and (max_age_s <= 0 or fresh):
+                return False
+            self._scan_claimed = True
+            self._scan_foreign_writes = self._foreign_writes
+            return True
+
+    def load_services(self, counts: dict | None) -> None:
+        """Install the result of a full scan (None if it failed). The caller
+        must have held off every write for the duration of the scan.
+        """
+        with self._lock:
+            self._scan_claimed = False
+            if counts is None:
+                return
+            self._scanned_foreign_writes = self._scan_foreign_writes
+            self._services = {s: n for s, n in counts.items() if n > 0}
+            self._services_loaded_at = time.monotonic()
+            if self._scanned_foreign_writes == self._foreign_writes:
+                self._empty = not self._services
+
+
+class WriteCounter:
+    """Writes to the collection, counted across every process forked from the
+    one that created this - a word of shared memory, so reading it on each
+    search is as cheap as reading an attribute.
+    """
+
+    def __init__(self):
+        self._shared = multiprocessing.RawValue("Q", 0)
+        self._shared_lock = multiprocessing.Lock()
+        self._lock = threading.Lock()
+        self._seen = 0
+
+    def record_write(self) -> bool:
+        """Count a write by this process. True if another process has written
+        since this one last looked.
+        """
+        with self._shared_lock:
+            self._shared.value += 1
+            value = self._shared.value
+        with self._lock:
+            foreign = value != self._seen + 1
+            self._seen = value
+        return foreign
+
+    def foreign_writes(self) -> bool:
+        """True if another process has written since this one last looked."""
+        value = self._shared.value
+        if value == self._seen:
+            return False
+        with self._lock:
+            if value <= self._seen:
+                return False
+            self._seen = value
+        return True
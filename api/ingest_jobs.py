@@ -0,0 +1,319 @@
+"""Background ingest jobs: a bounded queue, a job table, and progress snapshots.
+
+POST /ingest used to hold the HTTP request open for the whole fetch -> chunk ->
+embed -> upsert sequence, which on a large repo outlives every proxy timeout
+between the Console and the API. Now it enqueues a job and returns its ID, and
+GET /ingest/{job_id} reports the job's phase, counters, throughput and ETA.
+
+Jobs run on a small fixed set of worker threads, each driving the ingest
+coroutine on its own event loop - so a job keeps running after the request
+that submitted it has returned, whatever server (or TestClient) that request
+came through. One worker by default: two full ingests at once would only split
+the same embedding cores between them.
+
+The job table is a SQLite file (`path`) shared by every API worker process in
+the pod, not a dict in each: any gunicorn worker can report on a job another
+one accepted, and the queue bound, the `workers` bound on running jobs and
+coalescing all hold per pod. Each process starts its own threads on its first
+submission; they claim queued jobs under a write transaction, so a job runs
+exactly once. A running job whose process has died is marked failed the next
+time the table is looked at.
+
+A second submission for a (url, source_type) that is still queued or running
+joins the existing job instead of stacking another full ingest behind it. The
+newer request's `metadata` is not applied in that case - resubmit once the
+running job has finished to change it.
+"""
+import functools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from .pids import pid_alive
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL,
+    source_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner INTEGER,
+    job TEXT NOT NULL
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS ingest_jobs_status ON ingest_jobs (status, url, source_type)"
+
+# Idle worker threads look for jobs queued by another process this often;
+# their own process's submissions wake them at once.
+_POLL_S = 0.5
+# A job's counters change per file and per batch; write them at most this
+# often (a phase change always goes straight through).
+_PROGRESS_EVERY_S = 0.25
+
+
+class QueueFull(RuntimeError):
+    """Raised by submit() when the bounded job queue has no room."""
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class IngestJobQueue:
+    def __init__(self, run, workers: int, max_queued: int, history: int, path: str = ":memory:"):
+        """`run(url, source_type, metadata, progress)` performs one ingest and
+        returns its result dict; `progress(**fields)` updates the job's counters.
+        `path` is the SQLite file the pod's API workers share; ":memory:"
+        keeps the table to this process.
+        """
+        self._run = run
+        self._workers = workers
+        self._max_queued = max_queued
+        self._history = history
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._wake = threading.Condition()
+        self._threads: list = []
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per process, shared by its threads under _lock; a
+        # forked worker opens its own (and starts its own threads).
+        if self._pid != os.getpid():
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            conn.execute(_INDEX)
+            self._conn, self._pid, self._threads = conn, os.getpid(), []
+        return self._conn
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two processes
+        # can't both see a slot free (or a key unclaimed) and both take it.
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _ensure_workers(self):
+        # Started lazily: no threads exist until the first ingest is submitted.
+        if self._threads:
+            return
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._worker, name=f"ingest-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, url: str, source_type: str, metadata: dict | None) -> tuple[dict, bool]:
+        """Queue an ingest. Returns (job snapshot, coalesced)."""
+        with self._transaction() as conn:
+            self._ensure_workers()
+            self._reap(conn)
+            row = conn.execute(
+                "SELECT job FROM ingest_jobs WHERE url = ? AND source_type = ? AND status IN (?, ?)",
+                (url, source_type, *ACTIVE_STATUSES),
+            ).fetchone()
+            if row is not None:
+                return self._snapshot(json.loads(row[0])), True
+
+            queued = conn.execute("SELECT COUNT(*) FROM ingest_jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self._max_queued:
+                raise QueueFull(f"Ingest queue is full ({self._max_queued} jobs waiting)")
+
+            job_id = uuid.uuid4().hex
+            job = {
+                "job_id": job_id,
+                "url": url,
+                "source_type": source_type,
+                "status": "queued",
+                "phase": "queued",
+                "files_fetched": 0,
+                "chunks_total": 0,
+                "chunks_embedded": 0,
+                "summaries_status": None,
+                "summaries_planned": 0,
+                "summaries_done": 0,
+                "summaries_cached": 0,
+                "submitted_at": _now_iso(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "_metadata": metadata,
+                # Wall-clock, not monotonic: another process reads them.
+                "_embed_started": None,
+                "_finished": None,
+            }
+            conn.execute(
+                "INSERT INTO ingest_jobs (job_id, url, source_type, status, job) VALUES (?, ?, ?, ?, ?)",
+                (job_id, url, source_type, "queued", json.dumps(job)),
+            )
+            self._prune(conn)
+        with self._wake:
+            self._wake.notify()
+        return self._snapshot(job), False
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT status, owner, job FROM ingest_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, owner, job = row
+        if status == "running" and owner != os.getpid() and not pid_alive(owner):
+            with self._transaction() as conn:
+                self._reap(conn)
+            return self.get(job_id)
+        return self._snapshot(json.loads(job))
+
+    def wait(self, job_id: str, timeout: float | None = None) -> dict | None:
+        """Block until the job finishes (or `timeout` passes); return its snapshot."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] not in ACTIVE_STATUSES:
+                return job
+            remaining = _POLL_S if deadline is None else min(_POLL_S, deadline - time.monotonic())
+            if remaining <= 0:
+                return job
+            # Woken early when this process finishes a job; another
+            # process's is noticed on the next poll.
+            with self._wake:
+                self._wake.wait(remaining)
+
+    def _claim(self) -> dict | None:
+        """Take the oldest queued job, if fewer than `workers` are running
+        pod-wide."""
+        with self._transaction() as conn:
+            self._reap(conn)
+            running = conn.execute("SELECT COUNT(*) FROM ingest_jobs WHERE status = 'running'").fetchone()[0]
+            if running >= self._workers:
+                return None
+            row = conn.execute(
+                "SELECT job FROM ingest_jobs WHERE status = 'queued' ORDER BY seq LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            job = json.loads(row[0])
+            job.update(status="running", phase="fetching", started_at=_now_iso())
+            self._save(conn, job, owner=os.getpid())
+            return job
+
+    def _save(self, conn: sqlite3.Connection, job: dict, owner: int | None = None) -> None:
+        conn.execute(
+            "UPDATE ingest_jobs SET status = ?, owner = ?, job = ? WHERE job_id = ?",
+            (job["status"], owner, json.dumps(job), job["job_id"]),
+        )
+
+    def _progress(self, job: dict, written: list, **fields):
+        if fields.get("phase") == "embedding" and job["_embed_started"] is None:
+            job["_embed_started"] = time.time()
+        job.update(fields)
+        now = time.monotonic()
+        # Summary pre-computation reports after the job has finished, when
+        # nothing else would write its last counts.
+        finished = job["status"] not in ACTIVE_STATUSES
+        if finished or "phase" in fields or now - written[0] >= _PROGRESS_EVERY_S:
+            written[0] = now
+            with self._transaction() as conn:
+                self._save(conn, job, owner=None if finished else os.getpid())
+
+    def _worker(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logger.error("Could not claim an ingest job: %s", e)
+                job = None
+            if job is None:
+                with self._wake:
+                    self._wake.wait(_POLL_S)
+                continue
+
+            written = [time.monotonic()]
+            try:
+                result = self._run(
+                    job["url"], job["source_type"], job["_metadata"],
+                    functools.partial(self._progress, job, written),
+                )
+            except Exception as e:
+                logger.error("Ingest job %s crashed: %s", job["job_id"], e)
+                result = {
+                    "status": "error",
+                    "chunks_ingested": 0,
+                    "total_characters": 0,
+                    "message": f"Error: {str(e)}",
+                }
+
+            job["status"] = "succeeded" if result["status"] == "success" else "failed"
+            job["phase"] = "done"
+            job["finished_at"] = _now_iso()
+            job["_finished"] = time.time()
+            job["result"] = result
+            with self._transaction() as conn:
+                self._save(conn, job)
+            with self._wake:
+                self._wake.notify_all()
+
+    def _reap(self, conn: sqlite3.Connection) -> None:
+        # A process killed mid-ingest (OOM, a worker restart) leaves its job
+        # "running" forever, holding a slot and blocking resubmission.
+        rows = conn.execute("SELECT owner, job FROM ingest_jobs WHERE status = 'running'").fetchall()
+        for owner, raw in rows:
+            if owner == os.getpid() or pid_alive(owner):
+                continue
+            job = json.loads(raw)
+            logger.warning("Ingest job %s lost its worker process (pid %s)", job["job_id"], owner)
+            job.update(status="failed", phase="done", finished_at=_now_iso(), _finished=time.time(), result={
+                "status": "error",
+                "chunks_ingested": 0,
+                "total_characters": 0,
+                "message": "Error: the API worker running this ingest exited before it finished",
+            })
+            self._save(conn, job)
+
+    def _prune(self, conn: sqlite3.Connection):
+        # Keep every active job; drop the oldest finished ones past `history`.
+        total = conn.execute("SELECT COUNT(*) FROM ingest_jobs").fetchone()[0]
+        excess = max(0, total - self._history)
+        if excess:
+            conn.execute(
+                "DELETE FROM ingest_jobs WHERE seq IN (SELECT seq FROM ingest_jobs "
+                "WHERE status NOT IN (?, ?) ORDER BY seq LIMIT ?)",
+                (*ACTIVE_STATUSES, excess),
+            )
+
+    def _snapshot(self, job: dict) -> dict:
+        """Public view of a job, with throughput and ETA derived from counters."""
+        snapshot = {k: v for k, v in job.items() if not k.startswith("_")}
+        throughput = eta = None
+        if job["_embed_started"] is not None and job["chunks_embedded"]:
+            elapsed = (job["_finished"] or time.time()) - job["_embed_started"]
+            if elapsed > 0:
+                throughput = job["chunks_embedded"] / elapsed
+                remaining = max(0, job["chunks_total"] - job["chunks_embedded"])
+                eta = 0.0 if job["status"] not in ACTIVE_STATUSES else remaining / throughput
+        snapshot["throughput_chunks_per_s"] = throughput
+        snapshot["eta_s"] = eta
+        return snapshot
@@ -0,0 +1,150 @@
+"""Per-source ingest manifests: path -> git blob SHA -> chunk IDs.
+
+Re-ingesting a source used to delete every chunk it had ever written and
+re-embed the whole thing, even for a one-file diff - minutes of CPU embedding
+on a large repo to change two files. With a manifest the next ingest of the
+same (source_url, source_type) can tell which files are unchanged (same blob
+SHA, so GitHub files are not even downloaded), which changed, and which
+disappeared, and touch only the chunks of the last two groups.
+
+One JSON file per source under Config.INGEST_MANIFEST_DIR/<collection>/, keyed
+by a hash of (source_type, source_url). A manifest is only trusted when its
+fingerprint matches the current run - a different SCHEMA_VERSION, embedding
+model, or caller-supplied metadata means every existing chunk is stale, so a
+mismatch reads as "no manifest" and forces a full re-sync.
+"""
+import hashlib
+import json
+import logging
+import os
+
+from .chunking import SCHEMA_VERSION
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def fingerprint(extra_metadata: dict | None) -> str:
+    """Everything besides file content that decides what a stored chunk looks like."""
+    payload = json.dumps(
+        {
+            "schema": SCHEMA_VERSION,
+            "model": Config.EMBED_MODEL_NAME,
+            "metadata": extra_metadata or {},
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def manifest_path(source_url: str, source_type: str) -> str:
+    key = hashlib.sha256(f"{source_type}\n{source_url}".encode()).hexdigest()
+    return os.path.join(Config.INGEST_MANIFEST_DIR, Config.CHROMA_COLLECTION_NAME, f"{key}.json")
+
+
+def load(source_url: str, source_type: str, expected_fingerprint: str) -> dict | None:
+    """Return {path: {"sha": ..., "chunk_ids": [...]}}, or None if there is no
+    usable manifest (missing, unreadable, or written under another fingerprint).
+    """
+    path = manifest_path(source_url, source_type)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        logger.warning("Ingest manifest at %s is unreadable; doing a full re-sync", path)
+        return None
+    if data.get("version") != MANIFEST_VERSION or data.get("fingerprint") != expected_fingerprint:
+        logger.info("Ingest manifest for %s (%s) is out of date; doing a full re-sync", source_url, source_type)
+        return None
+    return data.get("files", {})
+
+
+def save(source_url: str, source_type: str, manifest_fingerprint: str, files: dict) -> None:
+    """Write atomically: a crash mid-write must leave the old manifest or the
+    new one, never a torn file that reads as "no manifest" and costs a full
+    re-embed - or worse, parses but lies.
+    """
+    path = manifest_path(source_url, source_type)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "source_url": source_url,
+                "source_type": source_type,
+                "fingerprint": manifest_fingerprint,
+                "files": files,
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not write ingest manifest to %s: %s", path, e)
+
+
+def discard(source_url: str, source_type: str) -> None:
+    """Forget a source's manifest so its next ingest is a full re-sync."""
+    try:
+        os.remove(manifest_path(source_url, source_type))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning("Could not remove ingest manifest for %s: %s", source_url, e)
+
+
+def needs_store(previous: dict | None, path: str, chunk_ids: list) -> bool:
+    """Whether a fetched path's chunks must be (re-)embedded this run.
+
+    Per path, so a streaming ingest can decide as each file arrives; plan_sync()
+    applies the same test to the whole run afterwards.
+    """
+    old = (previous or {}).get(path)
+    return old is None or old["chunk_ids"] != chunk_ids
+
+
+def plan_sync(previous: dict | None, new_ids_by_path: dict, fetched: set,
+              listed: dict | None = None):
+    """Decide what a re-ingest has to write and delete.
+
+    - `previous`: the loaded manifest files, or None for a first/full sync.
+    - `new_ids_by_path`: chunk IDs produced this run, per path.
+    - `fetched`: every path whose content was actually processed this run,
+      including ones the chunker dropped as near-empty.
+    - `listed`: for GitHub repos, path -> blob SHA for every file currently in
+      the repo; paths listed but not fetched were skipped as unchanged. None
+      for sources with no listing (PRs, single documents), where `fetched` is
+      the whole source.
+
+    Returns (files, changed_paths, stale_ids): the manifest to save, the paths
+    whose chunks must be upserted, and the chunk IDs to delete.
+    """
+    previous = previous or {}
+    current = listed.keys() if listed is not None else fetched
+
+    files, changed = {}, set()
+    for path in current:
+        if path in fetched:
+            ids = new_ids_by_path.get(path, [])
+            files[path] = {"sha": listed.get(path) if listed else None, "chunk_ids": ids}
+            if needs_store(previous, path, ids):
+                changed.add(path)
+        elif path in previous:
+            # Same blob SHA as last time - never downloaded, chunks kept as-is.
+            files[path] = previous[path]
+
+    stale = set()
+    for path, old in previous.items():
+        if path not in files or path in changed:
+            stale.update(old["chunk_ids"])
+    # Content-addressed IDs: a changed file can still share chunks with its
+    # previous version, and those must survive the delete.
+    for entry in files.values():
+        stale.difference_update(entry["chunk_ids"])
+
+    return files, changed, stale
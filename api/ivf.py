@@ -0,0 +1,82 @@
+"""Inverted-file (IVF) partitioning for the in-process vector index.
+
+An exact scan reads every vector for every query. Once several large repos
+and their PR histories share one collection that stops being cheap, so
+VectorIndex can optionally partition its rows: spherical k-means picks
+`nlist` centroids, every row is filed under its nearest one, and a query
+only scores the rows filed under its `nprobe` nearest centroids. `nprobe`
+is the recall/latency knob - scanning nprobe/nlist of the corpus - and
+`nprobe == nlist` is exact search again. eval/run_eval.py --ann measures
+recall against exact search for each setting.
+
+Pure NumPy on purpose: no native dependency in the image, and everything
+here is a few matmuls.
+"""
+import numpy as np
+
+KMEANS_ITERATIONS = 10
+# Training points per centroid - k-means on more than this barely moves
+# the centroids and costs linearly.
+SAMPLE_PER_LIST = 256
+ASSIGN_BLOCK = 32768
+
+
+def auto_nlist(rows: int) -> int:
+    """sqrt(rows) lists, the usual starting point for IVF."""
+    return int(max(1, min(65536, round(np.sqrt(rows)))))
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def assign(vectors, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest centroid for each row, in blocks to bound memory."""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK])
+        out[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def train(vectors, nlist: int, rows: np.ndarray | None = None, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over a sample of `vectors` (unit rows, memmap fine),
+    drawn from `rows` when given. Returns (nlist, dim) unit centroids.
+    """
+    rng = np.random.default_rng(seed)
+    if rows is None:
+        rows = np.arange(len(vectors))
+    n = len(rows)
+    nlist = min(nlist, n)
+    take = min(n, nlist * SAMPLE_PER_LIST)
+    data = np.asarray(vectors[np.sort(rng.choice(rows, take, replace=False))], dtype=np.float32)
+    centroids = data[rng.choice(take, nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        labels = assign(data, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        centroids[filled] = np.add.reduceat(data[order], starts, axis=0)
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            # Re-seed a dead centroid on a random point rather than lose the list.
+            centroids[empty] = data[rng.choice(take, len(empty), replace=False)]
+        centroids = _unit(centroids)
+    return centroids
+
+
+def inverted_lists(assignments: np.ndarray, nlist: int):
+    """(order, bounds): rows of list c are order[bounds[c]:bounds[c + 1]]."""
+    order = np.argsort(assignments, kind="stable")
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=nlist)))).astype(np.int64)
+    return order, bounds
+
+
+def probe(centroids: np.ndarray, query: np.ndarray, nprobe: int) -> np.ndarray:
+    """The `nprobe` lists whose centroids are closest to a unit query."""
+    scores = centroids @ query
+    nprobe = min(nprobe, len(centroids))
+    return np.argpartition(-scores, nprobe - 1)[:nprobe]
@@ -13,6 +13,39 @@ class IngestResponse(BaseModel):
     chunks_ingested: int
     total_characters: int
     message: str
+
+# Ingest job (POST /ingest returns one immediately; GET /ingest/{job_id} polls it)
+
+class IngestJobResponse(BaseModel):
+    job_id: str
+    url: str
+    source_type: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    # queued -> fetching -> embedding -> done. Fetching keeps going during
+    # "embedding": files stream through as the batches are embedded.
+    phase: str
+    files_fetched: int
+    chunks_total: int
+    chunks_embedded: int
+    # Post-ingest summary pre-computation (SYNTHESIS_PRECOMPUTE): None when
+    # it isn't run, else queued/running/done/failed. It carries on after the
+    # job itself has finished, so these keep moving after status "succeeded".
+    summaries_status: Optional[Literal["queued", "running", "done", "failed"]] = None
+    summaries_planned: int = 0
+    summaries_done: int = 0
+    # Planned chunks that were already summarised - no Groq call spent.
+    summaries_cached: int = 0
+    # Both None until the first embed batch has landed.
+    throughput_chunks_per_s: Optional[float] = None
+    eta_s: Optional[float] = None
+    submitted_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    # True when this submission joined a job already queued/running for the
+    # same (url, source_type) instead of starting another one.
+    coalesced: bool = False
+    # The finished ingest's outcome; None while the job is still active.
+    result: Optional[IngestResponse] = None
     
 # Ghost Note Endpoint
 
@@ -22,6 +55,10 @@ class GhostNoteRequest(BaseModel):
     # From the webhook-injected GHOST_NOTE_ID env var, e.g. "svc:auth-service".
     # Only the "svc:" form is understood today; anything else is ignored.
     ghost_note_id: Optional[str] = None
+    # Don't wait on Groq for a summary that isn't cached: answer with
+    # summary_pending=true and fetch it from GET /ghost-note/summary/{chunk_id}.
+    # None follows the server's SYNTHESIS_DEFER.
+    defer_summary: Optional[bool] = None
     
 class GhostNoteResult(BaseModel):
     # sha256 of the full chunk text - the same ID the chunk is stored under.
@@ -40,6 +77,30 @@ class GhostNoteResponse(BaseModel):
     summary: Optional[str] = None
     summary_path: Optional[str] = None
     synthesized: bool = False
+    # True when the summary was deferred and is still being generated; poll
+    # GET /ghost-note/summary/{results[0].chunk_id} for it.
+    summary_pending: bool = False
+
+
+# Deferred summary (GET /ghost-note/summary/{chunk_id})
+
+class SummaryResponse(BaseModel):
+    chunk_id: str
+    # "failed" carries the raw-chunk fallback, as an inline search would have.
+    status: Literal["pending", "ready", "failed"]
+    summary: Optional[str] = None
+    summary_path: Optional[str] = None
+    synthesized: bool = False
+
+
+# Batch search: many GhostNoteRequests in one round-trip (Cluster page,
+# dashboards). `responses` is in request order.
+
+class GhostNoteBatchRequest(BaseModel):
+    requests: List[GhostNoteRequest]
+
+class GhostNoteBatchResponse(BaseModel):
+    responses: List[GhostNoteResponse]
 
 
 # Chunk Lookup Endpoint (Note Detail direct-link support)
@@ -58,10 +119,18 @@ class FeedbackRequest(BaseModel):
     query: str
     rating: Literal["up", "down"]
 
+class Votes(BaseModel):
+    up: int
+    down: int
+
 class FeedbackResponse(BaseModel):
     recorded: bool
     total_up: int
     total_down: int
+    # Counts for the rated chunk / query: always on POST /feedback, on
+    # GET /feedback/summary when ?chunk_id= / ?query= ask for them.
+    chunk_votes: Optional[Votes] = None
+    query_votes: Optional[Votes] = None
 
 # Pod List Endpoint (Cluster page, Phase 12)
 
@@ -76,6 +145,9 @@ class PodInfo(BaseModel):
 
 class PodListResponse(BaseModel):
     pods: List[PodInfo]
+    # Pass back as ?continue_token= for the next page; None on the last one
+    # (always, without ?limit=).
+    continue_token: Optional[str] = None
 
 # Pod State Endpoint (Shadow Sidecar, PRD 4B)
 
@@ -89,6 +161,21 @@ class PodStateRequest(BaseModel):
 class PodStateResponse(BaseModel):
     recorded: bool
 
+class PodStateEntry(BaseModel):
+    namespace: str
+    pod: str
+    ghost_note_id: Optional[str] = None
+    status: Optional[str] = None
+    ts: Optional[str] = None  # the sidecar's clock
+    last_seen: str  # the API's: when the newest heartbeat arrived
+    age_s: float
+    stale: bool
+
+class PodStateListResponse(BaseModel):
+    pods: List[PodStateEntry]
+    count: int
+    stale_after_s: float
+
 # Error Response
     
 class ErrorResponse(BaseModel):
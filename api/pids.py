@@ -0,0 +1,20 @@
+"""Process liveness for state shared between API workers.
+
+api/ingest_jobs.py and api/summary_store.py record which worker process owns
+a running job or a summary in progress. A worker that dies (OOM, a gunicorn
+restart) leaves those rows behind; pid_alive() is how the others tell.
+"""
+import os
+
+
+def pid_alive(pid: int | None) -> bool:
+    """Whether a process with this pid exists. None or 0 is never alive."""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, under another user
+    return True
@@ -3,58 +3,380 @@ import hashlib
 import json
 import logging
 import os
+import threading
+import time
 from datetime import datetime, timezone
 
 import chromadb
 import requests
 from chromadb.errors import NotFoundError
-from sentence_transformers import SentenceTransformer
 
+from . import github_fetch
+from . import ingest_manifest
 from . import pr_ingest
 from . import synthesis
 from . import rerank_groq
-from .chunking import (
-    ALLOWED_EXTENSIONS, FILE_HEADER, SCHEMA_VERSION, chunk_repo_document, is_ignored,
-)
+from .chunking import SCHEMA_VERSION, chunk_file, file_block
 from .config import Config
+from .embed_batcher import EmbeddingBatcher
+from .embedder import load_embedder
+from .event_log import EventLog
+from .executor import BoundedExecutor
+from .feedback_counts import FeedbackCounts, prior
+from .index_state import WRITE_METHODS, IndexState, WriteCounter
+from .ingest_jobs import IngestJobQueue
+from .lru_cache import LRUCache
+from .pod_state import PodStateStore
+from .summary_warmer import SummaryWarmer
+from .vector_index import VectorIndex
 
 logger = logging.getLogger(__name__)
 
-# 1. Initialize Clients & Models
-# CHROMA_HOST set (in-cluster, Phase 9) -> talk to the ghostkube-chroma
-# StatefulSet over HTTP. Unset (local/compose) -> PersistentClient on disk.
-if Config.CHROMA_HOST:
-    client = chromadb.HttpClient(host=Config.CHROMA_HOST, port=Config.CHROMA_PORT)
-else:
-    client = chromadb.PersistentClient(path=Config.CHROMA_PATH)
-collection = client.get_or_create_collection(name=Config.CHROMA_COLLECTION_NAME)
+# 1. Clients & Models
+# Nothing heavy happens at import: the Chroma client and collection handle and
+# the embedding model are created on first use (get_collection(),
+# get_embedding_model()), and warm_up() - started in the background when the
+# app starts - makes that first use happen before traffic arrives. Importing
+# this module (every test, every script) no longer pays a model load, and the
+# API answers /live as soon as uvicorn binds; /ready reports when warm-up is
+# done.
+_client = None
+_collection = None
+_embedding_model = None
+# Held only while creating one of the above, so two first requests don't load
+# the model (or open the client) twice.
+_init_lock = threading.Lock()
+
+
+def _get_client():
+    # CHROMA_HOST set (in-cluster, Phase 9) -> talk to the ghostkube-chroma
+    # StatefulSet over HTTP. Unset (local/compose) -> PersistentClient on disk.
+    global _client
+    if _client is None:
+        with _init_lock:
+            if _client is None:
+                if Config.CHROMA_HOST:
+                    _client = chromadb.HttpClient(host=Config.CHROMA_HOST, port=Config.CHROMA_PORT)
+                else:
+                    _client = chromadb.PersistentClient(path=Config.CHROMA_PATH)
+    return _client
+
+
+def get_collection():
+    global _collection
+    if _collection is None:
+        client = _get_client()
+        with _init_lock:
+            if _collection is None:
+                _collection = client.get_or_create_collection(name=Config.CHROMA_COLLECTION_NAME)
+    return _collection
+
+
+def get_embedding_model():
+    """The bi-encoder - torch or ONNX Runtime, see api/embedder.py."""
+    global _embedding_model
+    if _embedding_model is None:
+        with _init_lock:
+            if _embedding_model is None:
+                _embedding_model = load_embedder()
+    return _embedding_model
+
+# Generation and emptiness of the collection, updated by every write that
+# goes through _call_collection and reset whenever the handle is refreshed -
+# see api/index_state.py. Anything cached from a search is keyed on the
+# generation it was computed at, so one write retires all of it at once.
+_index_state = IndexState()
+# Writes counted across API workers, in shared memory - created at import so
+# that under gunicorn's preload_app (api/gunicorn_conf.py) every worker
+# inherits the same counter. See _catch_up().
+_writes = WriteCounter()
+# Serializes writes with the metadata pre-read that keeps per-service counts
+# exact, and holds them off during a full service scan.
+_write_lock = threading.RLock()
+_SERVICE_SCAN_PAGE = 5000
+
+# In-process exact index answering searches when Config.RETRIEVAL_BACKEND is
+# "numpy" - see api/vector_index.py. Every write below is mirrored into it;
+# searches only use it once _sync_vector_index() has checked it against
+# Chroma (or rebuilt it), and go back to Chroma whenever that is in doubt.
+_vector_index = (
+    VectorIndex(
+        os.path.join(Config.VECTOR_INDEX_DIR, Config.CHROMA_COLLECTION_NAME),
+        ann=Config.VECTOR_INDEX_ANN,
+        nlist=Config.VECTOR_INDEX_IVF_NLIST,
+        nprobe=Config.VECTOR_INDEX_IVF_NPROBE,
+        ann_min_rows=Config.VECTOR_INDEX_ANN_MIN_ROWS,
+        quantization=Config.VECTOR_INDEX_QUANTIZATION,
+        rescore_factor=Config.VECTOR_INDEX_RESCORE_FACTOR,
+    )
+    if Config.RETRIEVAL_BACKEND == "numpy" else None
+)
+_vector_index_ready = threading.Event()
+_vector_index_sync = threading.Lock()
+_VECTOR_INDEX_PAGE = 1000
 
 
 def _call_collection(method_name: str, *args, **kwargs):
+    """Call a method on the collection, recording writes in `_index_state`
+    and mirroring them into `_vector_index`.
+
+    While per-service chunk counts are loaded, a write first reads the
+    metadata of the records it touches (one `get`, ingest-side only) so the
+    counts can be adjusted exactly. A delete by `where` always does the same
+    read: the vector index and the synthesis cache need to know which IDs went.
+    """
+    if method_name not in WRITE_METHODS:
+        return _call_raw(method_name, *args, **kwargs)
+    with _write_lock:
+        affected = None
+        if _index_state.tracks_services or (method_name == "delete" and kwargs.get("where") is not None):
+            affected = _affected(method_name, kwargs)
+        result = _call_raw(method_name, *args, **kwargs)
+        _index_state.record_write(method_name, kwargs, affected["metadatas"] if affected else None)
+        if _vector_index is not None:
+            _mirror_write(method_name, kwargs, affected)
+        if method_name == "delete":
+            synthesis.forget(affected["ids"] if affected else kwargs.get("ids") or [])
+        if _writes.record_write():
+            _foreign_write()
+    return result
+
+
+def _catch_up() -> None:
+    """Drop what another worker's writes may have made stale. One read of
+    shared memory when nothing changed.
+    """
+    if _writes.foreign_writes():
+        _foreign_write()
+
+
+def _foreign_write() -> None:
+    _index_state.foreign_write()
+    if _vector_index is not None:
+        try:
+            _vector_index.refresh()
+        except Exception as e:
+            logger.warning("Vector index reload failed, searching Chroma until it resyncs: %s", e)
+            _vector_index_ready.clear()
+
+
+def _affected(method_name: str, kwargs: dict) -> dict:
+    if method_name == "delete":
+        selector = {k: kwargs[k] for k in ("ids", "where") if kwargs.get(k) is not None}
+    else:
+        selector = {"ids": kwargs["ids"]}
+    return _call_raw("get", include=["metadatas"], **selector)
+
+
+def _mirror_write(method_name: str, kwargs: dict, affected: dict | None) -> None:
+    """Apply a write Chroma just accepted to the vector index. Anything it
+    can't mirror exactly takes the index out of service until a resync.
+    """
+    try:
+        if method_name == "delete":
+            _vector_index.delete(affected["ids"] if affected else kwargs.get("ids") or [])
+        elif method_name in ("add", "upsert") and kwargs.get("embeddings") is not None:
+            ids = kwargs["ids"]
+            _vector_index.upsert(
+                ids,
+                kwargs["embeddings"],
+                kwargs.get("documents") or [None] * len(ids),
+                kwargs.get("metadatas") or [None] * len(ids),
+            )
+        else:
+            raise ValueError(f"'{method_name}' without embeddings can't be mirrored")
+    except Exception as e:
+        logger.warning("Vector index out of step with Chroma, searching Chroma until it resyncs: %s", e)
+        _vector_index_ready.clear()
+
+
+def _call_raw(method_name: str, *args, **kwargs):
     """Call a method on the cached collection handle, transparently refreshing
     it once on a 404 and retrying.
 
-    The `collection` object is bound to a specific server-side collection ID
+    The collection handle is bound to a specific server-side collection ID
     at the time it was fetched. If the Chroma server loses that collection
     (e.g. the ghostkube-chroma StatefulSet pod restarts against an empty or
     reset store) the cached handle starts raising NotFoundError on every call
     even though a fresh get_or_create_collection() would succeed - without
     this, the API process would need a manual restart to recover.
     """
-    global collection
+    global _collection
     try:
-        return getattr(collection, method_name)(*args, **kwargs)
+        return getattr(get_collection(), method_name)(*args, **kwargs)
     except NotFoundError:
         logger.warning(
             "Cached Chroma collection handle is stale (server-side collection "
             "gone, likely a Chroma restart) - refreshing and retrying '%s'",
             method_name,
         )
-        collection = client.get_or_create_collection(name=Config.CHROMA_COLLECTION_NAME)
-        return getattr(collection, method_name)(*args, **kwargs)
+        _collection = _get_client().get_or_create_collection(name=Config.CHROMA_COLLECTION_NAME)
+        _index_state.reset()
+        _vector_index_ready.clear()
+        return getattr(_collection, method_name)(*args, **kwargs)
+
 
-# Embedding model (Bi-Encoder)
-embedding_model = SentenceTransformer(Config.EMBED_MODEL_NAME)
+def _scan_services() -> None:
+    """Count chunks per `service` across the whole collection, paging through
+    metadata only. Writes wait for the scan, so the counts it installs are
+    exact as of the moment it finishes.
+    """
+    counts: dict = {}
+    try:
+        with _write_lock:
+            offset = 0
+            while True:
+                page = _call_raw("get", include=["metadatas"], limit=_SERVICE_SCAN_PAGE, offset=offset)
+                for meta in page["metadatas"]:
+                    service = (meta or {}).get("service")
+                    counts[service] = counts.get(service, 0) + 1
+                if len(page["ids"]) < _SERVICE_SCAN_PAGE:
+                    break
+                offset += _SERVICE_SCAN_PAGE
+            _index_state.load_services(counts)
+        logger.info("Service index loaded: %d service(s), %d chunk(s)",
+                    len(counts) - (None in counts), sum(counts.values()))
+    except Exception as e:
+        logger.warning("Service index scan failed; scoped searches keep filtering blind: %s", e)
+        _index_state.load_services(None)
+
+
+def _service_present(service: str) -> bool | None:
+    """Whether any chunk carries `service`, or None while that isn't known yet.
+    Kicks off the (background) scan that answers it when it's missing or older
+    than Config.SERVICE_INDEX_REFRESH_S.
+    """
+    if _index_state.claim_service_scan(Config.SERVICE_INDEX_REFRESH_S):
+        threading.Thread(target=_scan_services, name="service-index-scan", daemon=True).start()
+    count = _index_state.service_count(service)
+    return None if count is None else count > 0
+
+
+def _sync_vector_index() -> None:
+    """Bring the vector index in line with Chroma: keep it if it holds exactly
+    Chroma's IDs, otherwise rebuild it from a paged read of every embedding.
+    Writes wait for it, like the service scan; searches keep using Chroma.
+    """
+    try:
+        # The index's own lock too: another worker may be checking or
+        # rebuilding the same files, and once it has, this one finds them in
+        # step instead of rebuilding again.
+        with _write_lock, _vector_index.locked():
+            ids = []
+            offset = 0
+            while True:
+                page = _call_raw("get", include=[], limit=_SERVICE_SCAN_PAGE, offset=offset)
+                ids.extend(page["ids"])
+                if len(page["ids"]) < _SERVICE_SCAN_PAGE:
+                    break
+                offset += _SERVICE_SCAN_PAGE
+            if len(ids) != len(_vector_index) or not all(chunk_id in _vector_index for chunk_id in ids):
+                logger.info("Rebuilding vector index from Chroma (%d chunks; index held %d)",
+                            len(ids), len(_vector_index))
+                _vector_index.clear()
+                for start in range(0, len(ids), _VECTOR_INDEX_PAGE):
+                    page = _call_raw("get", ids=ids[start:start + _VECTOR_INDEX_PAGE],
+                                     include=["embeddings", "documents", "metadatas"])
+                    _vector_index.upsert(page["ids"], page["embeddings"], page["documents"], page["metadatas"])
+            _vector_index_ready.set()
+        logger.info("Vector index in sync with Chroma: %d chunks", len(_vector_index))
+    except Exception as e:
+        logger.warning("Vector index sync failed; searches stay on Chroma: %s", e)
+    finally:
+        _vector_index_sync.release()
+
+
+def _use_vector_index() -> bool:
+    """Whether searches should go to the vector index right now. Starts the
+    background sync that makes it usable when it isn't yet.
+    """
+    if _vector_index is None:
+        return False
+    if _vector_index_ready.is_set():
+        return True
+    if _vector_index_sync.acquire(blocking=False):
+        threading.Thread(target=_sync_vector_index, name="vector-index-sync", daemon=True).start()
+    return False
+
+
+def _query_vectors(query_embeddings: list, n_results: int, where: dict | None = None) -> dict:
+    """Nearest chunks to each embedding - documents, metadatas and distances,
+    one list per embedding, as Chroma's `query` returns them. Served by the
+    in-process index when it's enabled and in sync, by Chroma otherwise.
+    """
+    if _use_vector_index():
+        try:
+            return _vector_index.query(query_embeddings, n_results, where)
+        except Exception as e:
+            logger.warning("Vector index query failed, falling back to Chroma: %s", e)
+    return _call_collection(
+        "query",
+        query_embeddings=query_embeddings,
+        n_results=n_results,
+        include=['documents', 'metadatas', 'distances'],
+        where=where,
+    )
+
+_query_embeddings = LRUCache(Config.QUERY_EMBED_CACHE_SIZE, Config.QUERY_EMBED_CACHE_TTL_S)
+_search_results = LRUCache(Config.SEARCH_CACHE_SIZE, Config.SEARCH_CACHE_TTL_S)
+
+
+def _encode_queries(texts: list) -> list:
+    return get_embedding_model().encode(texts).tolist()
+
+
+_query_batcher = EmbeddingBatcher(
+    _encode_queries,
+    window_s=Config.QUERY_BATCH_WINDOW_MS / 1000,
+    max_batch=Config.QUERY_BATCH_MAX,
+    name="query-embed-batcher",
+)
+
+
+def _normalize_query(query: str) -> str:
+    """Cache key form of a query: whitespace collapsed. The tokenizer splits on
+    whitespace anyway, so this never changes the vector. Case is deliberately
+    kept: lowercasing is only lossless for an uncased model, and
+    EMBED_MODEL_NAME is configurable.
+    """
+    return " ".join(query.split())
+
+
+def _embed_queries(queries: list) -> list:
+    """Embed many search queries: cache hits are reused, and every distinct
+    miss goes through ONE encode call rather than the per-query batcher.
+    """
+    keys = [_normalize_query(q) for q in queries]
+    found = {}
+    for key in keys:
+        if key not in found:
+            found[key] = _query_embeddings.get(key)
+    missing = [key for key, embedding in found.items() if embedding is None]
+    if missing:
+        for key, embedding in zip(missing, _encode_queries(missing)):
+            found[key] = embedding
+            _query_embeddings.put(key, embedding)
+    return [found[key] for key in keys]
+
+
+def _embed_query(query: str) -> list:
+    """Embed a search query, through the query-embedding LRU and, on a miss,
+    the micro-batcher.
+    """
+    key = _normalize_query(query)
+    embedding = _query_embeddings.get(key)
+    if embedding is None:
+        embedding = _query_batcher.encode(key)
+        _query_embeddings.put(key, embedding)
+    return embedding
+
+# Every blocking step of an ingest - chunking, embedding, Chroma writes - runs
+# here rather than on the event loop, see api/executor.py.
+_ingest_executor = BoundedExecutor(
+    max_workers=Config.INGEST_WORKERS,
+    max_pending=Config.INGEST_MAX_PENDING,
+    name="ingest",
+)
 
 # Cross-encoder reranking is off by default - it was measured to LOWER accuracy
 # on this domain (see Config.RERANK_ENABLED). Loaded lazily so the ~90MB model is
@@ -97,124 +419,111 @@ def _github_repo_parts(url: str):
     return tail[0], tail[1]
 
 
-async def _fetch_repo_document(owner: str, repo: str) -> str:
-    """Walk a GitHub repo recursively and return a repo_content.md-style document.
+# Chunks per encode call. Also the unit of memory a streaming ingest holds:
+# files are fetched and chunked only as fast as these batches are embedded.
+EMBED_BATCH_SIZE = 50
 
-    Reuses the extension allowlist, ignore patterns, auth headers and rate-limit
-    handling from the CLI scraper so both ingestion paths behave identically. The
-    import is deliberately lazy: scrape_repo imports crawl4ai, which pulls in
-    Playwright and costs ~25s, and the API must not pay that at startup.
-    """
-    import scrape_repo
 
-    headers = dict(scrape_repo.HEADERS)
-    if Config.GITHUB_TOKEN and "Authorization" not in headers:
-        headers["Authorization"] = f"Bearer {Config.GITHUB_TOKEN}"
+async def _iter_in_thread(iterator):
+    """Drain a blocking iterator from the event loop, one item per worker-thread
+    hop, so a network read inside it never stalls the loop.
+    """
+    done = object()
+    try:
+        while True:
+            item = await asyncio.to_thread(next, iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await asyncio.to_thread(close)
+
+
+async def _iter_source(url: str, source_type: str, parts, known: dict | None = None,
+                       listed: dict | None = None):
+    """Yield (path, block, extra_metadata) for each file, PR or document of a source.
+
+    `block` is what api.chunking.chunk_file() takes - the path line followed by
+    the content - so every source streams through the same chunker one item at
+    a time instead of being assembled into one repo_content.md-style string
+    first. That string was O(repo size) in memory, and building it with `+=`
+    copied it once per file.
+
+    GitHub repos go through api/github_fetch.py, the same code the CLI scraper
+    uses, so both ingestion paths see identical files. `known` / `listed` are
+    passed through to iter_repo_files(): files whose blob SHA matches `known`
+    are not downloaded, and `listed` collects the SHA of every file in the repo
+    - see ingest_url's incremental sync.
+    """
+    if source_type == "pr":
+        owner, repo = parts
+        async for item in pr_ingest.iter_pr_blocks(owner, repo):
+            yield item
+    elif parts:
+        owner, repo = parts
+        files = github_fetch.iter_repo_files(owner, repo, known=known, listed=listed)
+        async for full_path, _sha, text in _iter_in_thread(files):
+            yield full_path, file_block(full_path, text), None
+    else:
+        # Single document: the same block shape as a repo file, so it flows
+        # through the identical chunker instead of a parallel code path. Two
+        # trailing newlines, not file_block()'s three, to keep the chunk IDs
+        # this path has always produced.
+        response = await asyncio.to_thread(requests.get, url, timeout=30)
+        response.raise_for_status()
+        filename = url.rstrip('/').split("/")[-1] or url
+        yield filename, f"{filename}\n{response.text}\n\n", None
+
+
+def _chunk_block(full_path: str, block: str):
+    chunks, metadatas = chunk_file(full_path, block)
+    return chunks, metadatas, [get_chunk_id(c) for c in chunks]
+
+
+def _apply_extra_metadata(metadatas, extra_metadata: dict | None):
+    if not extra_metadata:
+        return
+    for meta in metadatas:
+        for key, value in extra_metadata.items():
+            # Chroma only accepts flat scalars, and the reserved keys below
+            # are what search depends on - never let a caller overwrite them.
+            # "service" is the notable non-reserved key: pass
+            # IngestRequest.metadata={"service": "auth-service"} at ingest
+            # time and search_ghost_notes() can later scope a query to it
+            # via GhostNoteRequest.ghost_note_id="svc:auth-service".
+            if key in ("path", "extension", "is_code", "schema"):
+                continue
+            if isinstance(value, (str, int, float, bool)):
+                meta[key] = value
+            elif value is not None:
+                meta[key] = str(value)
 
-    files = []
 
-    async def walk(path=""):
-        api_url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"
-        response = await asyncio.to_thread(
-            requests.get, api_url, headers=headers, timeout=30
-        )
-        if response.status_code == 403:
-            raise scrape_repo.RateLimitError(scrape_repo.rate_limit_message(response))
-        if response.status_code != 200:
-            logger.warning(
-                "Skipping '%s' - GitHub returned %s %s",
-                path or "/", response.status_code, response.reason,
-            )
-            return
+def _store_batch(batch_text, batch_meta):
+    """Embed one batch in a single encode call and upsert it. Blocking - runs
+    on the ingest executor, never on the event loop.
+    """
+    embeddings = get_embedding_model().encode(batch_text).tolist()
+    _call_collection(
+        "upsert",
+        ids=[get_chunk_id(t) for t in batch_text],
+        embeddings=embeddings,
+        documents=batch_text,
+        metadatas=batch_meta,
+    )
+    return len(batch_text)
 
-        items = response.json()
-        if isinstance(items, dict):
-            items = [items]
 
-        subdirs = []
-        for item in items:
-            full_path = item['path']
-            if is_ignored(full_path):
-                continue
-            if item['type'] == 'file':
-                if item['name'].endswith(ALLOWED_EXTENSIONS):
-                    files.append((item['download_url'], full_path))
-            elif item['type'] == 'dir':
-                subdirs.append(full_path)
-
-        for subdir in subdirs:
-            await walk(subdir)
-
-    await walk()
-    logger.info("Found %d files in %s/%s", len(files), owner, repo)
-
-    semaphore = asyncio.Semaphore(scrape_repo.MAX_CONCURRENT_FETCHES)
-    results = [None] * len(files)
-
-    async def fetch_one(index, file_url, full_path):
-        async with semaphore:
-            try:
-                r = await asyncio.to_thread(requests.get, file_url, timeout=30)
-                r.raise_for_status()
-                results[index] = (full_path, r.text)
-            except Exception as e:
-                logger.warning("Failed to fetch %s: %s", full_path, e)
-
-    await asyncio.gather(*(
-        fetch_one(i, u, p) for i, (u, p) in enumerate(files)
-    ))
-
-    document = f"# Repository: {owner}/{repo}\n\n"
-    for entry in results:
-        if entry is None:
-            continue
-        full_path, text = entry
-        document += f"\n{FILE_HEADER}{full_path}\n{text}\n\n"
-    return document
-
-
-def _store(chunks, metadatas, extra_metadata: dict | None):
-    """Embed a batch of chunks in one pass and upsert them."""
-    if not chunks:
-        return 0
-
-    if extra_metadata:
-        for meta in metadatas:
-            for key, value in extra_metadata.items():
-                # Chroma only accepts flat scalars, and the reserved keys below
-                # are what search depends on - never let a caller overwrite them.
-                # "service" is the notable non-reserved key: pass
-                # IngestRequest.metadata={"service": "auth-service"} at ingest
-                # time and search_ghost_notes() can later scope a query to it
-                # via GhostNoteRequest.ghost_note_id="svc:auth-service".
-                if key in ("path", "extension", "is_code", "schema"):
-                    continue
-                if isinstance(value, (str, int, float, bool)):
-                    meta[key] = value
-                elif value is not None:
-                    meta[key] = str(value)
-
-    batch_size = 50
-    stored = 0
-    for i in range(0, len(chunks), batch_size):
-        batch_text = chunks[i:i + batch_size]
-        batch_meta = metadatas[i:i + batch_size]
-        # Batch the encode: one call for the whole batch rather than one call
-        # per chunk inside a loop.
-        embeddings = embedding_model.encode(batch_text).tolist()
-        _call_collection(
-            "upsert",
-            ids=[get_chunk_id(t) for t in batch_text],
-            embeddings=embeddings,
-            documents=batch_text,
-            metadatas=batch_meta,
-        )
-        stored += len(batch_text)
-        logger.info("Stored %d/%d chunks", stored, len(chunks))
-    return stored
+def _report(progress, **fields):
+    """Forward ingest progress to an ingest job, if this ingest belongs to one."""
+    if progress is not None:
+        progress(**fields)
 
 
-async def ingest_url(url: str, source_type: str = "repo", metadata: dict | None = None) -> dict:
+async def ingest_url(url: str, source_type: str = "repo", metadata: dict | None = None,
+                     progress=None) -> dict:
     """Ingest a GitHub repository (recursively), its PR/issue history, or a
     single document URL.
 
@@ -222,78 +531,161 @@ async def ingest_url(url: str, source_type: str = "repo", metadata: dict | None
     so both write compatible records into one collection.
 
     POST /ingest {"url": "<repo>", "source_type": "pr"} routes to
-    pr_ingest.build_pr_document() instead of the file walk: closed-and-merged
+    pr_ingest.iter_pr_blocks() instead of the file walk: closed-and-merged
     PRs from the last Config.PR_LOOKBACK_MONTHS months, chunked through the
-    same chunk_repo_document() via the synthetic `pull/{n}` path.
+    same chunk_file() via the synthetic `pull/{n}` path.
+
+    Streaming: each file is chunked as it arrives and its chunks join the
+    current embed batch; a full batch is embedded and upserted before the next
+    file is pulled. Peak memory is one batch plus the fetcher's small download
+    window, whatever the size of the source - only chunk IDs (for the manifest)
+    are kept for the whole run.
+
+    Re-ingests are incremental: a per-source manifest (api/ingest_manifest.py)
+    records each path's blob SHA and chunk IDs, so only added or modified files
+    are fetched, chunked and embedded, and only the chunks of removed or
+    changed files are deleted. Without a trusted manifest every file is
+    re-embedded and whatever else the collection holds for the source is
+    deleted at the end.
+
+    `progress`, when given, is called with keyword updates (phase,
+    files_fetched, chunks_total, chunks_embedded) as the ingest advances - see
+    api/ingest_jobs.py. Fetching and embedding overlap, so chunks_total keeps
+    growing until the last file has been fetched.
     """
     try:
         logger.info("Starting ingestion for URL: %s (source_type=%s)", url, source_type)
 
         parts = _github_repo_parts(url)
-        pr_metadata_by_path: dict = {}
+        if source_type == "pr" and not parts:
+            return {
+                "status": "error",
+                "chunks_ingested": 0,
+                "total_characters": 0,
+                "message": f"source_type='pr' requires a GitHub repo URL, got: {url}",
+            }
 
-        if source_type == "pr":
-            if not parts:
+        manifest_fingerprint = ingest_manifest.fingerprint(metadata)
+        previous = ingest_manifest.load(url, source_type, manifest_fingerprint)
+        if previous is not None:
+            previous = await _ingest_executor.run(_verify_manifest, previous)
+
+        known = listed = None
+        if parts and source_type != "pr":
+            listed = {}
+            known = {path: entry["sha"] for path, entry in previous.items()} if previous else None
+
+        fetched: set = set()
+        new_ids_by_path: dict = {}
+        skipped: list = []
+        batch_chunks: list = []
+        batch_metas: list = []
+        total_characters = chunks_total = stored = 0
+
+        async def flush(count):
+            nonlocal stored
+            if stored == 0:
+                _report(progress, phase="embedding")
+            # One encode call per batch, awaited before the next is submitted,
+            # so one ingest never has more than one batch in flight and the
+            # executor's bound applies across all concurrent ingests.
+            stored += await _ingest_executor.run(
+                _store_batch, batch_chunks[:count], batch_metas[:count],
+            )
+            del batch_chunks[:count], batch_metas[:count]
+            logger.info("Stored %d/%d chunks", stored, chunks_total)
+            _report(progress, chunks_embedded=stored)
+
+        try:
+            async for path, block, item_metadata in _iter_source(url, source_type, parts, known, listed):
+                fetched.add(path)
+                total_characters += len(block)
+                _report(progress, files_fetched=len(fetched))
+
+                chunks, metadatas, chunk_ids = await _ingest_executor.run(_chunk_block, path, block)
+                del block
+                if not chunks:
+                    skipped.append(path)
+                    continue
+                new_ids_by_path[path] = chunk_ids
+                if not ingest_manifest.needs_store(previous, path, chunk_ids):
+                    continue
+
+                for meta in metadatas:
+                    meta["source_url"] = url
+                    meta["source_type"] = source_type
+                    if item_metadata:
+                        meta.update(item_metadata)
+                _apply_extra_metadata(metadatas, metadata)
+
+                batch_chunks.extend(chunks)
+                batch_metas.extend(metadatas)
+                chunks_total += len(chunks)
+                _report(progress, chunks_total=chunks_total)
+                while len(batch_chunks) >= EMBED_BATCH_SIZE:
+                    await flush(EMBED_BATCH_SIZE)
+            if batch_chunks:
+                await flush(len(batch_chunks))
+
+            if skipped:
+                logger.info("Skipped %d ignored/near-empty path(s)", len(skipped))
+
+            # A re-ingest where every file kept its blob SHA fetches nothing and
+            # produces no chunks - that is a successful no-op, not an empty source.
+            unchanged_repo = bool(previous and listed)
+            if not new_ids_by_path and not unchanged_repo:
                 return {
                     "status": "error",
                     "chunks_ingested": 0,
-                    "total_characters": 0,
-                    "message": f"source_type='pr' requires a GitHub repo URL, got: {url}",
+                    "total_characters": total_characters,
+                    "message": f"No indexable content found at {url}",
                 }
-            owner, repo = parts
-            document, pr_metadata_by_path = await pr_ingest.build_pr_document(owner, repo)
-        elif parts:
-            owner, repo = parts
-            document = await _fetch_repo_document(owner, repo)
-        else:
-            # Single document: wrap it in the same header format so it flows
-            # through the identical chunker instead of a parallel code path.
-            response = await asyncio.to_thread(requests.get, url, timeout=30)
-            response.raise_for_status()
-            filename = url.rstrip('/').split("/")[-1] or url
-            document = f"\n{FILE_HEADER}{filename}\n{response.text}\n\n"
-
-        chunks, metadatas, skipped = chunk_repo_document(document)
-        if skipped:
-            logger.info("Skipped %d ignored/near-empty path(s)", len(skipped))
-
-        if not chunks:
-            return {
-                "status": "error",
-                "chunks_ingested": 0,
-                "total_characters": len(document),
-                "message": f"No indexable content found at {url}",
-            }
 
-        for meta in metadatas:
-            meta["source_url"] = url
-            meta["source_type"] = source_type
-            pr_meta = pr_metadata_by_path.get(meta["path"])
-            if pr_meta:
-                meta.update(pr_meta)
-
-        # Re-ingesting a URL upserts chunks whose content is unchanged (same
-        # hash -> same ID) but silently leaves behind chunks from files that
-        # were since deleted or renamed in the source - upsert alone can only
-        # add/update, never remove. Clearing this URL's prior chunks first
-        # makes re-ingest a real sync instead of a monotonic append. Scoped to
-        # (source_url, source_type) rather than source_url alone because the
-        # same repo URL is ingested under both "repo" and "pr" - clearing
-        # unscoped would wipe one on a re-ingest of the other.
-        _call_collection(
-            "delete",
-            where={"$and": [{"source_url": url}, {"source_type": source_type}]},
+            files, changed, stale = ingest_manifest.plan_sync(previous, new_ids_by_path, fetched, listed)
+
+            if previous is None:
+                # No trusted manifest (first ingest, or schema/model/metadata
+                # changed): everything was just re-embedded, and upsert alone
+                # can only add/update, never remove - so whatever else the
+                # collection still holds for this source goes. Done last rather
+                # than first so a fetch that dies halfway leaves the old chunks
+                # searchable. Scoped to (source_url, source_type) rather than
+                # source_url alone because the same repo URL is ingested under
+                # both "repo" and "pr" - clearing unscoped would wipe one on a
+                # re-ingest of the other.
+                existing = await _ingest_executor.run(
+                    _call_collection,
+                    "get",
+                    where={"$and": [{"source_url": url}, {"source_type": source_type}]},
+                    include=[],
+                )
+                kept = {chunk_id for ids in new_ids_by_path.values() for chunk_id in ids}
+                stale = set(existing["ids"]) - kept
+            if stale:
+                await _ingest_executor.run(_call_collection, "delete", ids=sorted(stale))
+        except Exception:
+            # The collection may now be ahead of the manifest - never let a
+            # stale manifest vouch for it. The next ingest does a full re-sync.
+            ingest_manifest.discard(url, source_type)
+            raise
+
+        ingest_manifest.save(url, source_type, manifest_fingerprint, files)
+
+        unchanged = len(files) - len(changed)
+        removed = len(set(previous or {}) - set(files))
+        logger.info(
+            "Successfully stored %d chunks (%d file(s) changed, %d unchanged, %d removed, %d stale chunk(s) deleted)",
+            stored, len(changed), unchanged, removed, len(stale),
         )
 
-        stored = _store(chunks, metadatas, metadata)
-        files_seen = len({m["path"] for m in metadatas})
-        logger.info("Successfully stored %d chunks", stored)
-
         return {
             "status": "success",
             "chunks_ingested": stored,
-            "total_characters": len(document),
-            "message": f"Ingested {stored} chunks from {files_seen} file(s)/PR(s) at {url}",
+            "total_characters": total_characters,
+            "message": (
+                f"Ingested {stored} chunks from {len(changed)} changed file(s)/PR(s) at {url}"
+                f" ({unchanged} unchanged, {removed} removed)"
+            ),
         }
 
     except Exception as e:
@@ -306,6 +698,138 @@ async def ingest_url(url: str, source_type: str = "repo", metadata: dict | None
         }
 
 
+def _verify_manifest(files: dict) -> dict | None:
+    """Return `files` if every chunk it lists is still in the collection, else None.
+
+    The manifest lives outside Chroma, so the two can disagree - most often
+    after the ghostkube-chroma StatefulSet restarts against an empty store.
+    Trusting it then would skip every file on the strength of an unchanged blob
+    SHA and leave the source unindexed forever, so any mismatch downgrades the
+    ingest to a full re-sync instead. One `get` by ID, with nothing but the IDs
+    included.
+    """
+    ids = sorted({chunk_id for entry in files.values() for chunk_id in entry["chunk_ids"]})
+    if not ids:
+        return files
+    present = _call_collection("get", ids=ids, include=[])["ids"]
+    if len(set(present)) < len(ids):
+        logger.warning(
+            "Ingest manifest references %d chunk(s) missing from the collection; doing a full re-sync",
+            len(ids) - len(set(present)),
+        )
+        return None
+    return files
+
+
+def _run_ingest_job(url: str, source_type: str, metadata: dict | None, progress) -> dict:
+    # Each job worker thread drives its ingest on a private event loop, so the
+    # job outlives the request that queued it.
+    result = asyncio.run(ingest_url(url, source_type, metadata, progress=progress))
+    if (result["status"] == "success" and Config.SYNTHESIS_PRECOMPUTE
+            and Config.SYNTHESIS_ENABLED and Config.GROQ_API_KEY):
+        try:
+            _summary_warmer.submit(_hot_chunks(url, source_type, Config.SYNTHESIS_PRECOMPUTE_LIMIT), progress)
+        except Exception as e:
+            logger.warning("Could not plan summary pre-computation for %s: %s", url, e)
+    return result
+
+
+# Pre-computes summaries after an ingest job, paced to the Groq quota - see
+# api/summary_warmer.py.
+_summary_warmer = SummaryWarmer(
+    summarize=synthesis.synthesize,
+    is_cached=synthesis.is_cached,
+    per_minute=Config.SYNTHESIS_PRECOMPUTE_RPM,
+)
+
+
+def _hot_chunks(url: str, source_type: str, limit: int) -> list:
+    """The chunks of one ingested source likeliest to be a search's top hit,
+    best first, as (chunks, service_name) pairs for synthesis.synthesize().
+
+    First the top result of the search `kubectl ghost` runs for a pod of each
+    service the source is tagged with (query = service name, scoped by its
+    svc: note ID), with the same context that search would summarise. Then
+    the source's chunks that drew feedback, most events first and
+    service-tagged ones ahead on a tie - each summarised on its own.
+    """
+    stored = _call_collection(
+        "get",
+        where={"$and": [{"source_url": url}, {"source_type": source_type}]},
+        include=["metadatas"],
+    )
+    services = sorted({meta["service"] for meta in stored["metadatas"] if meta and meta.get("service")})
+
+    planned, seen = [], set()
+    for service in services:
+        results = _retrieve(service, 5, service, f"svc:{service}")  # 5: `kubectl ghost --top`'s default
+        if results and results[0]["chunk_id"] not in seen:
+            seen.add(results[0]["chunk_id"])
+            planned.append((results, service))
+
+    ours = {chunk_id: meta or {} for chunk_id, meta in zip(stored["ids"], stored["metadatas"])
+            if chunk_id not in seen}
+    rated = {chunk_id: up + down for chunk_id, (up, down) in zip(ours, _feedback.for_chunks(list(ours)))
+             if up + down}
+    hot = sorted(
+        rated, key=lambda chunk_id: (-rated[chunk_id], not ours[chunk_id].get("service"), chunk_id),
+    )[:max(0, limit - len(planned))]
+    if hot:
+        found = _call_collection("get", ids=hot, include=["documents", "metadatas"])
+        by_id = {chunk_id: (doc, meta) for chunk_id, doc, meta in
+                 zip(found["ids"], found["documents"], found["metadatas"])}
+        for chunk_id in hot:
+            if chunk_id in by_id:
+                doc, meta = by_id[chunk_id]
+                planned.append(([_as_result(doc, meta, 1.0)], (meta or {}).get("service")))
+    return planned[:limit]
+
+
+_ingest_jobs = IngestJobQueue(
+    run=_run_ingest_job,
+    workers=Config.INGEST_JOB_WORKERS,
+    max_queued=Config.INGEST_QUEUE_SIZE,
+    history=Config.INGEST_JOB_HISTORY,
+    path=Config.INGEST_JOBS_PATH,
+)
+
+
+def validate_ingest_request(url: str, source_type: str) -> str | None:
+    """Cheap checks worth failing at submit time rather than as a queued job.
+    Returns an error message, or None if the request can be queued.
+    """
+    if not url.strip().lower().startswith(("http://", "https://")):
+        return f"Not an http(s) URL: {url}"
+    if source_type == "pr" and not _github_repo_parts(url):
+        return f"source_type='pr' requires a GitHub repo URL, got: {url}"
+    return None
+
+
+def submit_ingest(url: str, source_type: str = "repo", metadata: dict | None = None) -> tuple[dict, bool]:
+    """Queue an ingest job; returns (job snapshot, coalesced). Raises
+    ingest_jobs.QueueFull when the queue is at capacity.
+    """
+    return _ingest_jobs.submit(url, source_type, metadata)
+
+
+def get_ingest_job(job_id: str) -> dict | None:
+    return _ingest_jobs.get(job_id)
+
+
+def wait_for_ingest_job(job_id: str, timeout: float | None = None) -> dict | None:
+    return _ingest_jobs.wait(job_id, timeout)
+
+
+def get_summary(chunk_id: str, wait_ms: int = 0) -> dict | None:
+    """The deferred summary for a search whose top result was `chunk_id`:
+    status "pending", "ready" or "failed" (with the raw-chunk fallback),
+    waiting up to `wait_ms` (capped at Config.SYNTHESIS_MAX_WAIT_MS) for a
+    pending one to finish. None if no summary was ever asked for.
+    """
+    wait_ms = min(max(0, wait_ms), Config.SYNTHESIS_MAX_WAIT_MS)
+    return synthesis.summary_status(chunk_id, wait_s=wait_ms / 1000)
+
+
 def get_chunk_by_id(chunk_id: str) -> dict | None:
     """Direct lookup for the Note Detail page's non-search entry point (a
     fresh/refreshed/shared URL, as opposed to a click-through from an
@@ -324,7 +848,8 @@ def get_chunk_by_id(chunk_id: str) -> dict | None:
     }
 
 
-def search_ghost_notes(query: str, top_results: int = 5, ghost_note_id: str | None = None) -> dict:
+def search_ghost_notes(query: str, top_results: int = 5, ghost_note_id: str | None = None,
+                       defer_summary: bool | None = None) -> dict:
     """Search for relevant chunks, optionally scoped to a webhook-resolved note ID.
 
     `ghost_note_id` is the raw GHOST_NOTE_ID env var the webhook injected,
@@ -335,148 +860,389 @@ def search_ghost_notes(query: str, top_results: int = 5, ghost_note_id: str | No
     param). Any other prefix, or no match at all, falls back to an
     unfiltered search rather than failing the request - a stale or
     unrecognized note ID should degrade to "search everything," not 500.
+
+    Whole responses are cached per (index generation, query, top_results,
+    service), so a repeated `kubectl ghost <pod>` against an unchanged index
+    skips encode, Chroma, pooling and synthesis entirely. Any write to the
+    collection bumps the generation, which retires every cached response;
+    with FEEDBACK_RANKING_ENABLED, so does every new rating. Failures are
+    never cached, and neither is a summary that fell back to the raw chunk
+    because the Groq call failed.
+
+    `defer_summary` (default Config.SYNTHESIS_DEFER) answers a synthesis
+    cache miss without waiting on Groq: `summary_pending` is true and the
+    summary is fetched later through get_summary() by the top chunk_id.
     """
     try:
         logger.info("Searching for query: %s", query)
 
-        if _call_collection("count") == 0:
-            return {"query": query, "results": []}
+        _catch_up()
+        service = _resolve_service(ghost_note_id)
+        # Read before searching: a write that lands mid-search bumps past
+        # this generation, so the possibly-stale response is never served.
+        cache_key = _search_cache_key(query, top_results, service)
+        cached = _search_results.get(cache_key)
+        if cached is not None:
+            return {**cached, "query": query}
 
-        service = None
-        if ghost_note_id and ghost_note_id.startswith("svc:"):
-            service = ghost_note_id[len("svc:"):] or None
+        response = _search_uncached(query, top_results, service, ghost_note_id, _defer(defer_summary))
+        _cache_search_response(cache_key, response)
+        return response
 
-        query_embedding = embedding_model.encode(query).tolist()
+    except Exception as e:
+        logger.error("Error during search: %s", e)
+        return {"query": query, "results": []}
 
-        # Retrieve a wide pool so the file-level pooling below has something to
-        # collapse.
-        search_results = _call_collection(
-            "query",
-            query_embeddings=[query_embedding],
-            n_results=Config.RETRIEVAL_POOL_SIZE,
-            include=['documents', 'metadatas', 'distances'],
-            where={"service": service} if service else None,
-        )
 
-        if service and not (search_results["documents"] and search_results["documents"][0]):
-            logger.warning(
-                "No chunks matched service=%r for ghost_note_id=%r; falling back to unfiltered search",
-                service, ghost_note_id,
-            )
-            search_results = _call_collection(
-                "query",
-                query_embeddings=[query_embedding],
-                n_results=Config.RETRIEVAL_POOL_SIZE,
-                include=['documents', 'metadatas', 'distances'],
-            )
+def search_ghost_notes_batch(searches: list[tuple]) -> list[dict]:
+    """Run many searches at once - the Cluster page and dashboards want notes
+    for dozens of pods per render.
 
-        if not (search_results["documents"] and search_results["documents"][0]):
-            return {"query": query, "results": []}
-
-        docs = search_results["documents"][0]
-        metas = search_results["metadatas"][0]
-        dists = search_results["distances"][0]
-
-        # File-level max-score pooling: keep only each path's single best chunk.
-        # Without this one file can occupy several of the top slots while the
-        # correct file sits just below the cut.
-        best = {}
-        for doc, meta, dist in zip(docs, metas, dists):
-            path = meta.get("path") or meta.get("source_url") or "unknown"
-            if path not in best or dist < best[path][2]:
-                best[path] = (doc, meta, dist)
-
-        candidates = sorted(best.values(), key=lambda x: x[2])
-
-        # Phase 13.2: the Groq reranker gets a wider pool (up to 10) than the
-        # final top_results slice - its whole point is pulling the true best
-        # answer up from outside the bi-encoder's naive top 5, so reordering
-        # only within top_results would defeat that.
-        if Config.GROQ_RERANK_ENABLED:
-            head, tail = candidates[:10], candidates[10:]
-            candidates = rerank_groq.rerank(query, head) + tail
-
-        pooled = candidates[:top_results]
-
-        if Config.RERANK_ENABLED:
-            reranker = get_reranker()
-            scores = reranker.predict([[query, doc] for doc, _, _ in pooled])
-            scored = [
-                (doc, meta, 1 / (1 + pow(2.718281828459045, -float(s))))
-                for (doc, meta, _), s in zip(pooled, scores)
-            ]
-            scored.sort(key=lambda x: x[2], reverse=True)
+    `searches` is a list of (query, top_results, ghost_note_id) or (query,
+    top_results, ghost_note_id, defer_summary), answered in the same order
+    with exactly what search_ghost_notes() would return for each. Searches
+    missing the response cache share one embedding call and one Chroma
+    `query` per service filter (several query_embeddings each), plus at most
+    one unfiltered `query` for every scoped search whose service matched
+    nothing. Pooling, reranking and synthesis stay per search.
+    """
+    _catch_up()
+    responses: list = [None] * len(searches)
+    pending = []
+    defers = []
+    for i, (query, top_results, ghost_note_id, *defer_summary) in enumerate(searches):
+        service = _resolve_service(ghost_note_id)
+        cache_key = _search_cache_key(query, top_results, service)
+        cached = _search_results.get(cache_key)
+        if cached is not None:
+            responses[i] = {**cached, "query": query}
         else:
-            # Derive relevance from vector distance so the response contract is
-            # unchanged whether or not reranking is on. Lower distance -> higher
-            # score, bounded to (0, 1].
-            scored = [(doc, meta, 1 / (1 + float(dist))) for doc, meta, dist in pooled]
-
-        results = [
-            {
-                # Hash the FULL chunk, not the truncated preview - this must
-                # match the ID the chunk was stored under so feedback can be
-                # tied back to it.
-                "chunk_id": get_chunk_id(doc),
-                "text": doc[:300] + "..." if len(doc) > 300 else doc,
-                "relevance_score": float(score),
-                "metadata": meta,
-            }
-            for doc, meta, score in scored
+            pending.append((i, query, top_results, service, ghost_note_id, cache_key))
+            defers.append(_defer(*defer_summary))
+
+    logger.info("Batch search: %d queries, %d answered from cache", len(searches), len(searches) - len(pending))
+    if not pending:
+        return responses
+
+    try:
+        for (i, *_rest, cache_key), response in zip(pending, _search_batch_uncached(pending, defers)):
+            _cache_search_response(cache_key, response)
+            responses[i] = response
+    except Exception as e:
+        logger.error("Error during batch search: %s", e)
+        for i, query, *_rest in pending:
+            responses[i] = {"query": query, "results": []}
+    return responses
+
+
+def _search_batch_uncached(pending: list, defers: list) -> list[dict]:
+    if _index_empty():
+        return [{"query": query, "results": [], "synthesized": False} for _i, query, *_rest in pending]
+
+    embeddings = _embed_queries([query for _i, query, *_rest in pending])
+
+    plans = [_scope_plan(service, ghost_note_id) for _i, _q, _top, service, ghost_note_id, _key in pending]
+    groups: dict = {}
+    for j, (where_service, _boost, n_results) in enumerate(plans):
+        groups.setdefault((where_service, n_results), []).append(j)
+
+    hits: list = [None] * len(pending)
+    fallback = []
+    for (where_service, n_results), members in groups.items():
+        found = _query_vectors(
+            [embeddings[j] for j in members],
+            n_results,
+            where={"service": where_service} if where_service else None,
+        )
+        for row, j in enumerate(members):
+            if where_service and not found["documents"][row]:
+                fallback.append(j)
+            else:
+                hits[j] = (found["documents"][row], found["metadatas"][row], found["distances"][row])
+
+    if fallback:
+        logger.warning(
+            "No chunks matched the service filter for %d batched search(es); falling back to unfiltered search",
+            len(fallback),
+        )
+        found = _query_vectors([embeddings[j] for j in fallback], Config.RETRIEVAL_POOL_SIZE)
+        for row, j in enumerate(fallback):
+            hits[j] = (found["documents"][row], found["metadatas"][row], found["distances"][row])
+
+    responses = []
+    for j, (_i, query, top_results, service, *_rest) in enumerate(pending):
+        docs, metas, dists = hits[j]
+        boost_service = plans[j][1]
+        if boost_service:
+            dists = _boost_service(metas, dists, boost_service)
+        results = _rank_hits(query, top_results, docs, metas, dists)
+        responses.append(_build_response(query, results, service, defers[j]))
+    return responses
+
+
+def _index_empty() -> bool:
+    return _index_state.is_empty(lambda: _call_collection("count"))
+
+
+def _defer(defer_summary: bool | None = None) -> bool:
+    return Config.SYNTHESIS_DEFER if defer_summary is None else defer_summary
+
+
+def _resolve_service(ghost_note_id: str | None) -> str | None:
+    if ghost_note_id and ghost_note_id.startswith("svc:"):
+        return ghost_note_id[len("svc:"):] or None
+    return None
+
+
+def _search_cache_key(query: str, top_results: int, service: str | None) -> tuple:
+    # With feedback ranking on, a new rating can reorder any search, so the
+    # ratings counted so far are part of the key too.
+    feedback = _feedback.events() if Config.FEEDBACK_RANKING_ENABLED else None
+    return (_index_state.generation, feedback, _normalize_query(query), top_results, service)
+
+
+def _cache_search_response(cache_key: tuple, response: dict) -> None:
+    # A summary that fell back to the raw chunk because Groq failed is not
+    # cached, so the next identical search retries synthesis - nor is one
+    # still pending, so the search after it lands picks the summary up.
+    synthesis_expected = Config.SYNTHESIS_ENABLED and Config.GROQ_API_KEY
+    if not response["results"] or response["synthesized"] or not synthesis_expected:
+        _search_results.put(cache_key, response)
+
+
+def _search_uncached(query: str, top_results: int, service: str | None,
+                     ghost_note_id: str | None, defer_summary: bool = False) -> dict:
+    results = _retrieve(query, top_results, service, ghost_note_id)
+    return _build_response(query, results, service, defer_summary)
+
+
+def _retrieve(query: str, top_results: int, service: str | None, ghost_note_id: str | None) -> list[dict]:
+    """A search's ranked results, without the summary."""
+    if _index_empty():
+        return []
+
+    query_embedding = _embed_query(query)
+    where_service, boost_service, n_results = _scope_plan(service, ghost_note_id)
+
+    # Retrieve a wide pool so the file-level pooling below has something to
+    # collapse.
+    search_results = _query_vectors(
+        [query_embedding],
+        n_results,
+        where={"service": where_service} if where_service else None,
+    )
+
+    # Only reachable while the service counts are still loading (or were
+    # written around by another process): the filter was tried blind.
+    if where_service and not (search_results["documents"] and search_results["documents"][0]):
+        logger.warning(
+            "No chunks matched service=%r for ghost_note_id=%r; falling back to unfiltered search",
+            where_service, ghost_note_id,
+        )
+        search_results = _query_vectors([query_embedding], Config.RETRIEVAL_POOL_SIZE)
+
+    if not (search_results["documents"] and search_results["documents"][0]):
+        return []
+
+    docs = search_results["documents"][0]
+    metas = search_results["metadatas"][0]
+    dists = search_results["distances"][0]
+    if boost_service:
+        dists = _boost_service(metas, dists, boost_service)
+    return _rank_hits(query, top_results, docs, metas, dists)
+
+
+def _scope_plan(service: str | None, ghost_note_id: str | None = None):
+    """How to run a search scoped to `service`: (where_service, boost_service,
+    n_results), decided in-process from the per-service chunk counts.
+
+    - No service, or one with no chunks at all: one unfiltered query. The old
+      path filtered first and only then re-queried unfiltered, so pods of a
+      never-ingested service always paid for two vector searches.
+    - Config.SERVICE_SCOPE_MODE == "boost": one unfiltered query over a pool
+      SERVICE_BOOST_POOL_FACTOR times wider, same-service hits boosted
+      in-process by _boost_service() - scoping as a preference, not a wall.
+    - Otherwise ("filter"): one query with where={"service": ...}.
+    """
+    if not service:
+        return None, None, Config.RETRIEVAL_POOL_SIZE
+    if _service_present(service) is False:
+        logger.info(
+            "No chunks carry service=%r (ghost_note_id=%r); searching unfiltered",
+            service, ghost_note_id,
+        )
+        return None, None, Config.RETRIEVAL_POOL_SIZE
+    if Config.SERVICE_SCOPE_MODE == "boost":
+        return None, service, Config.RETRIEVAL_POOL_SIZE * Config.SERVICE_BOOST_POOL_FACTOR
+    return service, None, Config.RETRIEVAL_POOL_SIZE
+
+
+def _boost_service(metas, dists, service: str) -> list:
+    """Scale down the distance of hits from `service` by Config.SERVICE_BOOST.
+    relevance_score is derived from distance, so it reflects the boost.
+    """
+    return [
+        dist * Config.SERVICE_BOOST if (meta or {}).get("service") == service else dist
+        for meta, dist in zip(metas, dists)
+    ]
+
+
+def _rank_hits(query: str, top_results: int, docs, metas, dists) -> list[dict]:
+    """Pool and score one query's raw Chroma hits into its top results."""
+    if not docs:
+        return []
+
+    # File-level max-score pooling: keep only each path's single best chunk.
+    # Without this one file can occupy several of the top slots while the
+    # correct file sits just below the cut.
+    best = {}
+    for doc, meta, dist in zip(docs, metas, dists):
+        path = meta.get("path") or meta.get("source_url") or "unknown"
+        if path not in best or dist < best[path][2]:
+            best[path] = (doc, meta, dist)
+
+    candidates = sorted(best.values(), key=lambda x: x[2])
+
+    if Config.FEEDBACK_RANKING_ENABLED:
+        candidates = rank_by_feedback(candidates)
+
+    # Phase 13.2: the Groq reranker gets a wider pool (up to 10) than the
+    # final top_results slice - its whole point is pulling the true best
+    # answer up from outside the bi-encoder's naive top 5, so reordering
+    # only within top_results would defeat that.
+    if Config.GROQ_RERANK_ENABLED:
+        head, tail = candidates[:10], candidates[10:]
+        candidates = rerank_groq.rerank(query, head) + tail
+
+    pooled = candidates[:top_results]
+
+    if Config.RERANK_ENABLED:
+        reranker = get_reranker()
+        scores = reranker.predict([[query, doc] for doc, _, _ in pooled])
+        scored = [
+            (doc, meta, 1 / (1 + pow(2.718281828459045, -float(s))))
+            for (doc, meta, _), s in zip(pooled, scores)
         ]
+        scored.sort(key=lambda x: x[2], reverse=True)
+    else:
+        # Derive relevance from vector distance so the response contract is
+        # unchanged whether or not reranking is on. Lower distance -> higher
+        # score, bounded to (0, 1].
+        scored = [(doc, meta, 1 / (1 + float(dist))) for doc, meta, dist in pooled]
+
+    return [_as_result(doc, meta, score) for doc, meta, score in scored]
+
+
+def rank_by_feedback(candidates: list) -> list:
+    """Reorder pooled (doc, meta, distance) candidates by their chunks' 👍/👎.
 
-        # One Groq call per search, scoped to the top result only - not one
-        # per result - to keep latency and free-tier quota bounded. Always
-        # returns a summary/source_path/synthesized triple; falls back to the
-        # raw top chunk internally if Groq is unavailable (see synthesis.py).
+    Each distance is scaled by 1 - FEEDBACK_RANKING_WEIGHT * prior (see
+    feedback_counts.prior()), so a well-rated chunk can overtake a slightly
+    closer one but never a much closer one, and an unrated chunk keeps its
+    distance. The counts are already in memory, so this costs one stat of
+    the feedback log plus a dict lookup per candidate. Shared with
+    eval/run_eval.py --feedback.
+    """
+    if not candidates:
+        return candidates
+    votes = _feedback.for_chunks([get_chunk_id(doc) for doc, _meta, _dist in candidates])
+    weight, prior_votes = Config.FEEDBACK_RANKING_WEIGHT, Config.FEEDBACK_RANKING_PRIOR_VOTES
+    adjusted = [
+        (doc, meta, dist * (1 - weight * prior(up, down, prior_votes)))
+        for (doc, meta, dist), (up, down) in zip(candidates, votes)
+    ]
+    return sorted(adjusted, key=lambda x: x[2])
+
+
+def _as_result(doc: str, meta: dict, score: float) -> dict:
+    return {
+        # Hash the FULL chunk, not the truncated preview - this must match
+        # the ID the chunk was stored under so feedback can be tied back to it.
+        "chunk_id": get_chunk_id(doc),
+        "text": doc[:300] + "..." if len(doc) > 300 else doc,
+        "relevance_score": float(score),
+        "metadata": meta,
+    }
+
+
+def _build_response(query: str, results: list[dict], service: str | None,
+                    defer_summary: bool = False) -> dict:
+    """Attach the top result's summary to a search's results."""
+    if not results:
+        return {"query": query, "results": [], "synthesized": False}
+
+    # One Groq call per search, scoped to the top result only - not one
+    # per result - to keep latency and free-tier quota bounded. Always
+    # returns a summary/source_path/synthesized triple; falls back to the
+    # raw top chunk internally if Groq is unavailable (see synthesis.py).
+    # Deferred, a miss comes back as None while Groq works in the background.
+    if defer_summary:
+        summary_result = synthesis.synthesize_later(results, service_name=service)
+        if summary_result is None:
+            return {
+                "query": query,
+                "results": results,
+                "summary": None,
+                "summary_path": None,
+                "synthesized": False,
+                "summary_pending": True,
+            }
+    else:
         summary_result = synthesis.synthesize(results, service_name=service)
 
-        return {
-            "query": query,
-            "results": results,
-            "summary": summary_result["summary"],
-            "summary_path": summary_result["source_path"],
-            "synthesized": summary_result["synthesized"],
-        }
+    return {
+        "query": query,
+        "results": results,
+        "summary": summary_result["summary"],
+        "summary_path": summary_result["source_path"],
+        "synthesized": summary_result["synthesized"],
+    }
 
-    except Exception as e:
-        logger.error("Error during search: %s", e)
-        return {"query": query, "results": []}
 
+def _event_log(path: str) -> EventLog:
+    return EventLog(
+        path,
+        flush_bytes=Config.EVENT_LOG_FLUSH_BYTES,
+        flush_interval_s=Config.EVENT_LOG_FLUSH_INTERVAL_S,
+        fsync=Config.EVENT_LOG_FSYNC,
+        max_bytes=Config.EVENT_LOG_MAX_BYTES,
+        compress=Config.EVENT_LOG_COMPRESS,
+        keep=Config.EVENT_LOG_KEEP,
+    )
 
-def _read_feedback():
-    """Yield every recorded feedback event. Tolerates a missing or partial file."""
-    path = Config.FEEDBACK_PATH
-    if not os.path.exists(path):
-        return
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                yield json.loads(line)
-            except json.JSONDecodeError:
-                # A torn final line from an interrupted write shouldn't take the
-                # whole summary down.
-                logger.warning("Skipping malformed feedback line")
 
+# Feedback and Shadow Sidecar heartbeats, appended in batches rather than an
+# open/write/close per request - see api/event_log.py.
+_feedback_log = _event_log(Config.FEEDBACK_PATH)
+_pod_state_log = _event_log(Config.POD_STATE_PATH)
 
-def feedback_summary() -> dict:
-    up = down = 0
-    for event in _read_feedback():
-        if event.get("rating") == "up":
-            up += 1
-        elif event.get("rating") == "down":
-            down += 1
-    return {"total_up": up, "total_down": down}
+# Newest heartbeat per pod, kept current from the pod-state log - see
+# api/pod_state.py.
+_pod_states = PodStateStore(Config.POD_STATE_PATH, Config.POD_STATE_HISTORY_S, Config.POD_STATE_SNAPSHOT_S)
+
+# 👍/👎 counts - overall, per chunk, per query - kept current from the
+# feedback log instead of re-reading it per call, see api/feedback_counts.py.
+_feedback = FeedbackCounts(Config.FEEDBACK_PATH, Config.FEEDBACK_CHECKPOINT_EVERY)
+
+
+def feedback_summary(chunk_id: str | None = None, query: str | None = None) -> dict:
+    """Overall counts, plus those for `chunk_id` and `query` when given."""
+    summary = _feedback.totals()
+    if chunk_id:
+        up, down = _feedback.for_chunk(chunk_id)
+        summary["chunk_votes"] = {"up": up, "down": down}
+    if query:
+        up, down = _feedback.for_query(query)
+        summary["query_votes"] = {"up": up, "down": down}
+    return summary
 
 
 def record_feedback(chunk_id: str, query: str, rating: str) -> dict:
     """Append one feedback event as JSONL.
 
     Append-only event data, kept out of Chroma on purpose: writing it into the
-    vector store would put non-repository records in the retrieval path.
+    vector store would put non-repository records in the retrieval path. The
+    counts returned include this event, and those for its chunk and query.
     """
     event = {
         "chunk_id": chunk_id,
@@ -485,21 +1251,145 @@ def record_feedback(chunk_id: str, query: str, rating: str) -> dict:
         "recorded_at": datetime.now(timezone.utc).isoformat(),
     }
     try:
-        with open(Config.FEEDBACK_PATH, "a", encoding="utf-8") as f:
-            f.write(json.dumps(event) + "\n")
+        # Waits for its batch to be written, so the counts below include it.
+        _feedback_log.append(json.dumps(event), wait=True)
         recorded = True
     except OSError as e:
         logger.error("Could not write feedback: %s", e)
         recorded = False
 
-    return {"recorded": recorded, **feedback_summary()}
+    return {"recorded": recorded, **feedback_summary(chunk_id, query)}
+
+
+def record_pod_state(state: dict) -> bool:
+    """Buffer one Shadow Sidecar heartbeat (a PodStateRequest's fields),
+    stamped with when it arrived - what staleness is judged by, rather than
+    the sidecar's own clock.
+
+    Doesn't wait for the write: a heartbeat repeats every interval anyway,
+    and a failed batch is logged by the writer. False only if the record
+    itself is unusable.
+    """
+    event = {**state, "received_at": datetime.now(timezone.utc).isoformat()}
+    try:
+        _pod_state_log.append(json.dumps(event))
+        return True
+    except ValueError as e:
+        logger.error("Could not record pod state: %s", e)
+        return False
+
+
+def list_pod_states(namespace: str | None = None, ghost_note_id: str | None = None,
+                    stale: bool | None = None, stale_after_s: float | None = None) -> dict:
+    """The newest heartbeat of every matching pod - see PodStateStore.latest()."""
+    if stale_after_s is None:
+        stale_after_s = Config.POD_STATE_STALE_S
+    # This worker's own buffered heartbeats first, so a GET right after a
+    # POST to the same worker sees it.
+    _pod_state_log.flush()
+    pods = _pod_states.latest(namespace, ghost_note_id, stale, stale_after_s)
+    return {"pods": pods, "count": len(pods), "stale_after_s": stale_after_s}
+
+
+def flush_event_logs() -> None:
+    """Write out buffered feedback and heartbeats - at shutdown."""
+    for log in (_feedback_log, _pod_state_log):
+        try:
+            log.flush()
+        except Exception as e:
+            logger.error("Could not flush %s: %s", log.path, e)
+
+
+# What warm_up() has done so far, for readiness().
+_warmup = {"started_at": None, "seconds": None, "error": None}
+
+
+def warm_up() -> None:
+    """Load the embedding model (and run it once - the first inference pays a
+    one-time cost of its own), open the collection, retrying every
+    Config.WARMUP_RETRY_S until both are in, then load the synthesis cache
+    (with synthesis on) and the feedback counts. Started in a background thread
+    when the app starts, so requests never wait on it: anything that arrives
+    first just loads what it needs itself, through the same singletons.
+    """
+    start = time.perf_counter()
+    _warmup["started_at"] = datetime.now(timezone.utc).isoformat()
+    encoded = False
+    while True:
+        try:
+            # Even when the model was loaded before a fork (api/gunicorn_conf.py):
+            # each worker's first inference starts its own thread pool.
+            if not encoded:
+                get_embedding_model().encode(["warm up"])
+                encoded = True
+            get_collection()
+            break
+        except Exception as e:
+            _warmup["error"] = str(e)
+            logger.warning("Warm-up incomplete, retrying in %ss: %s", Config.WARMUP_RETRY_S, e)
+            time.sleep(Config.WARMUP_RETRY_S)
+    if Config.SYNTHESIS_ENABLED and Config.GROQ_API_KEY:
+        synthesis.load_cache()
+    _feedback.load()
+    _pod_states.load()
+    _warmup["error"] = None
+    _warmup["seconds"] = round(time.perf_counter() - start, 3)
+    logger.info("Warm-up done in %.1fs", _warmup["seconds"])
+    # Start checking the in-process index against Chroma now rather than on
+    # the first search.
+    _use_vector_index()
+
+
+def readiness() -> dict:
+    """Whether this process can serve searches: the model is loaded and
+    Chroma answers. Never loads anything itself - that is warm_up()'s job -
+    so a probe can't stall behind a model load.
+    """
+    model_loaded = _embedding_model is not None
+    chroma_connected = False
+    if _collection is not None:
+        try:
+            _call_collection("count")
+            chroma_connected = True
+        except Exception as e:
+            logger.warning("Readiness check could not reach Chroma: %s", e)
+    return {
+        "ready": model_loaded and chroma_connected,
+        "model_loaded": model_loaded,
+        "chroma_connected": chroma_connected,
+        "warmup": dict(_warmup),
+    }
 
 
 def health_snapshot() -> dict:
     """Real health: actually touch Chroma so a broken store fails the check."""
+    caches = {
+        "index_generation": _index_state.generation,
+        "query_embeddings": _query_embeddings.stats(),
+        "search_results": _search_results.stats(),
+        "synthesis": synthesis.cache_stats(),
+    }
+    stats = {
+        "caches": caches,
+        "query_batcher": _query_batcher.stats(),
+        "event_logs": {"feedback": _feedback_log.stats(), "pod_state": _pod_state_log.stats()},
+    }
+    if _vector_index is not None:
+        stats["vector_index"] = {
+            "ready": _vector_index_ready.is_set(),
+            "chunks": len(_vector_index),
+            "dead_rows": _vector_index.dead,
+            "ivf_lists": _vector_index.ivf_lists,
+            "quantization": _vector_index.quantization or None,
+            "scan_bytes": _vector_index.scan_bytes,
+        }
     try:
+        generation = _index_state.generation
         count = _call_collection("count")
-        return {"status": "ok", "chroma_connected": True, "chunk_count": count}
+        # A probe's count is as good as a search's - keeps the emptiness
+        # check warm after deletes without a count on the search path.
+        _index_state.observe_count(count, generation)
+        return {"status": "ok", "chroma_connected": True, "chunk_count": count, **stats}
     except Exception as e:
         logger.error("Health check failed: %s", e)
-        return {"status": "error", "chroma_connected": False, "chunk_count": 0}
+        return {"status": "error", "chroma_connected": False, "chunk_count": 0, **stats}
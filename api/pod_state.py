@@ -0,0 +1,257 @@
+"""Latest state per pod, kept from the Shadow Sidecar heartbeat log.
+
+POST /pod-state appends every sidecar heartbeat to POD_STATE_PATH, and until
+now nothing read them back. A PodStateStore keeps the newest heartbeat per
+(namespace, pod) in memory. Like FeedbackCounts it follows the log's tail
+(event_log.LogTail) rather than what this process was sent, so every API
+worker sees every worker's heartbeats. The pods are indexed by namespace
+and by ghost_note_id, and held in the order they were last heard from, so
+GET /pod-state's filters walk only the pods they return (plus, for a
+staleness filter, the few within ORDER_SLACK_S of its cutoff) and never
+the log.
+
+On disk, the log itself is the history. Every `snapshot_every_s` the index is
+saved to `<log>.latest.json` with the position it covers, and then segments
+rotated out more than `history_s` ago are deleted: the snapshot already
+holds the last state of every pod they mention. A restart loads the snapshot
+and reads only the log past it. A rebuild starts from the snapshot and
+replays every remaining segment; re-reading heartbeats the snapshot already
+covers is harmless, since the newest one per pod wins however often it's
+seen.
+
+Sized for 10k pods heartbeating every 30s: ~330 lines a second to follow,
+about a kilobyte of index per pod, and - with the default 64MB segments and
+an hour of history - a few hundred MB of log on disk at most.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from .event_log import LogTail, segments
+
+logger = logging.getLogger(__name__)
+
+# Heartbeats reach the log in batches, one per worker, so the last-seen order
+# can be out by up to a flush interval; staleness scans look this far past
+# their cutoff before stopping.
+ORDER_SLACK_S = 10.0
+
+_FIELDS = ("namespace", "pod", "ghost_note_id", "status", "ts")
+
+
+def _epoch(value) -> float | None:
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+class PodStateStore(LogTail):
+    def __init__(self, path: str, history_s: float = 3600, snapshot_every_s: float = 60,
+                 clock=time.time):
+        super().__init__(path)
+        self.snapshot_path = path + ".latest.json"
+        self.history_s = history_s
+        self.snapshot_every_s = snapshot_every_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._snapshot_at = clock()
+        self._changed = False
+        self._reset_index()
+
+    def _reset_index(self) -> None:
+        # (namespace, pod) -> {namespace, pod, ghost_note_id, status, ts,
+        # last_seen}, least recently heard from first.
+        self._pods: OrderedDict = OrderedDict()
+        self._by_namespace: dict = {}  # namespace -> {(namespace, pod)}
+        self._by_note: dict = {}  # ghost_note_id -> {(namespace, pod)}
+
+    def load(self) -> None:
+        """Build the index now (snapshot, then the log past it) rather than
+        on first use."""
+        with self._lock:
+            self._catch_up()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._catch_up()
+            return len(self._pods)
+
+    def latest(self, namespace: str | None = None, ghost_note_id: str | None = None,
+               stale: bool | None = None, stale_after_s: float = 90) -> list[dict]:
+        """The newest state of each matching pod, sorted by (namespace, pod).
+
+        `stale` True keeps only pods not heard from in `stale_after_s`, False
+        only those that have been; each result carries its `last_seen`,
+        `age_s` and `stale`.
+        """
+        with self._lock:
+            self._catch_up()
+            now = self._clock()
+            cutoff = now - stale_after_s
+            if namespace is not None or ghost_note_id is not None:
+                sets = []
+                if namespace is not None:
+                    sets.append(self._by_namespace.get(namespace, ()))
+                if ghost_note_id is not None:
+                    sets.append(self._by_note.get(ghost_note_id, ()))
+                candidates = (self._pods[key] for key in min(sets, key=len))
+            elif stale:
+                candidates = self._oldest_until(cutoff + ORDER_SLACK_S)
+            elif stale is False:
+                candidates = self._newest_until(cutoff - ORDER_SLACK_S)
+            else:
+                candidates = iter(self._pods.values())
+
+            found = []
+            for pod in candidates:
+                if namespace is not None and pod["namespace"] != namespace:
+                    continue
+                if ghost_note_id is not None and pod["ghost_note_id"] != ghost_note_id:
+                    continue
+                is_stale = pod["last_seen"] < cutoff
+                if stale is not None and is_stale != stale:
+                    continue
+                found.append({
+                    **{field: pod[field] for field in _FIELDS},
+                    "last_seen": _iso(pod["last_seen"]),
+                    "age_s": round(now - pod["last_seen"], 3),
+                    "stale": is_stale,
+                })
+        found.sort(key=lambda pod: (pod["namespace"], pod["pod"]))
+        return found
+
+    def _oldest_until(self, seen_before: float):
+        for pod in self._pods.values():
+            if pod["last_seen"] >= seen_before:
+                return
+            yield pod
+
+    def _newest_until(self, seen_after: float):
+        for pod in reversed(self._pods.values()):
+            if pod["last_seen"] < seen_after:
+                return
+            yield pod
+
+    def _catch_up(self) -> None:
+        if not self._loaded:
+            self._loaded = True
+            self._load_snapshot()
+        self._follow()
+        if self._changed and self._clock() - self._snapshot_at >= self.snapshot_every_s:
+            self._save_snapshot()
+            self._prune()
+
+    def _apply(self, line: bytes) -> None:
+        if not line.strip():
+            return
+        try:
+            beat = json.loads(line)
+            key = (beat["namespace"], beat["pod"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Skipping malformed pod-state line")
+            return
+        # The API's receive time, not the sidecar's clock; ts only for lines
+        # written before received_at was recorded.
+        seen = _epoch(beat.get("received_at")) or _epoch(beat.get("ts"))
+        if seen is None:
+            logger.warning("Skipping pod-state line without a usable timestamp")
+            return
+        self._merge({**{field: beat.get(field) for field in _FIELDS}, "last_seen": seen}, key)
+
+    def _merge(self, pod: dict, key: tuple) -> None:
+        old = self._pods.get(key)
+        if old is not None:
+            if old["last_seen"] > pod["last_seen"]:
+                return
+            if old["ghost_note_id"] != pod["ghost_note_id"]:
+                self._discard(self._by_note, old["ghost_note_id"], key)
+        self._pods[key] = pod
+        self._pods.move_to_end(key)
+        self._by_namespace.setdefault(pod["namespace"], set()).add(key)
+        self._by_note.setdefault(pod["ghost_note_id"], set()).add(key)
+        self._changed = True
+
+    @staticmethod
+    def _discard(index: dict, value, key: tuple) -> None:
+        keys = index.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[value]
+
+    def _clear(self) -> None:
+        # A rebuild starts from the snapshot, not from nothing: segments
+        # pruned since are only in there.
+        self._reset_index()
+        self._read_snapshot()
+
+    def _read_snapshot(self) -> dict | None:
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            pods = saved["pods"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Ignoring unreadable pod-state snapshot %s: %s", self.snapshot_path, e)
+            return None
+        for pod in sorted(pods, key=lambda pod: pod["last_seen"]):
+            self._merge(pod, (pod["namespace"], pod["pod"]))
+        return saved
+
+    def _load_snapshot(self) -> None:
+        saved = self._read_snapshot()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if saved and stat and saved.get("inode") == stat.st_ino and saved.get("offset", 0) <= stat.st_size:
+            self._inode, self._offset = saved["inode"], saved["offset"]
+        else:
+            self._rebuild()
+
+    def _save_snapshot(self) -> None:
+        saved = {
+            "inode": self._inode, "offset": self._offset, "saved_at": _iso(self._clock()),
+            "pods": list(self._pods.values()),
+        }
+        tmp = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(saved, f, separators=(",", ":"))
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            logger.warning("Could not write pod-state snapshot %s: %s", self.snapshot_path, e)
+            return
+        finally:
+            self._snapshot_at = self._clock()
+            self._changed = False
+
+    def _prune(self) -> None:
+        # Only ever right after a snapshot of everything read so far - every
+        # segment older than the history window included.
+        if self.history_s <= 0:
+            return
+        cutoff = self._clock() - self.history_s
+        for name in segments(self.path):
+            try:
+                if os.stat(name).st_mtime < cutoff:
+                    os.unlink(name)
+                    logger.info("Pruned pod-state segment %s", name)
+            except FileNotFoundError:
+                pass  # another worker pruned it first
+            except OSError as e:
+                logger.warning("Could not prune pod-state segment %s: %s", name, e)
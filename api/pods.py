@@ -1,13 +1,43 @@
 # api/pods.py
+"""Labeled pods for GET /pods, served from a watch-fed cache.
+
+Listing every ghostkube.io/service pod cluster-wide on each request - and
+reloading the kubeconfig first - made the Cluster page slow on a big cluster
+and put its whole pod list on the API server per page view. A PodInformer
+does it the way client-go's informers do instead: one LIST (in pages of
+`page_size`) fills a table of ready-made PodInfo rows, then a WATCH from
+that LIST's resourceVersion applies each ADDED/MODIFIED/DELETED as it
+happens. A watch that ends (its `timeout_seconds`, or a dropped connection)
+resumes from the last resourceVersion it saw; one the API server has
+expired (410 Gone) relists. Every `resync_s` the table is rebuilt from a
+fresh LIST anyway, so an event lost in between can't linger. /pods then
+only slices the table, kept sorted by (namespace, name): a namespace is one
+contiguous run of it, and a page picks up after the last pod of the one
+before.
+
+Runs in one background thread per API worker, started on first use (so a
+forked worker starts its own). Best-effort like before: no config, an
+unreachable cluster or an RBAC denial is logged and retried every
+`retry_s`, and /pods lists whatever the table holds - nothing, until a
+LIST has succeeded.
+"""
+import bisect
 import logging
+import threading
+import time
 
-from kubernetes import client, config
+from kubernetes import client, config, watch
 from kubernetes.client.exceptions import ApiException
 
+from .config import Config
+from .models import PodInfo
+
 logger = logging.getLogger(__name__)
 
 GHOST_SERVICE_LABEL = "ghostkube.io/service"
 
+_GONE = 410
+
 
 def _load_k8s_config() -> bool:
     """Try in-cluster config first (running as a pod under Phase 9's
@@ -31,51 +61,250 @@ def _load_k8s_config() -> bool:
         return False
 
 
-def list_watched_pods() -> list[dict]:
-    """List every pod carrying the ghostkube.io/service label, cluster-wide.
+def _pod_info(pod) -> PodInfo:
+    service_label = (pod.metadata.labels or {}).get(GHOST_SERVICE_LABEL)
 
-    Best-effort: any failure (no kubeconfig, cluster unreachable, RBAC denial)
-    logs and returns an empty list rather than raising, so a laptop without a
-    running kind cluster - or a Deployment missing the Role Phase 9's README
-    calls out - doesn't take down the whole Brain API over a page that's
-    allowed to just show "no pods."
+    # The label alone doesn't prove the mutating webhook actually ran -
+    # this pod could predate the webhook, or the webhook could be down.
+    # The real signal is whether GHOST_NOTE_ID actually landed in a
+    # container's env (webhook/webhook.py::make_patch_for_pod).
+    ghost_note_id = None
+    for container in pod.spec.containers or []:
+        for env_var in container.env or []:
+            if env_var.name == "GHOST_NOTE_ID":
+                ghost_note_id = env_var.value
+                break
+        if ghost_note_id:
+            break
+
+    return PodInfo(
+        name=pod.metadata.name,
+        namespace=pod.metadata.namespace,
+        service_label=service_label,
+        ghost_note_id=ghost_note_id,
+        injected=ghost_note_id is not None,
+    )
+
+
+def _key(pod) -> tuple:
+    return (pod.metadata.namespace, pod.metadata.name)
+
+
+class PodInformer:
+    """A LIST+WATCH cache of the labeled pods.
+
+    `api` is a CoreV1Api (created once a config loads, when not given) and
+    `watch_factory` makes kubernetes.watch.Watch-likes - both there for
+    tests to swap in fakes.
     """
-    if not _load_k8s_config():
-        return []
 
-    try:
-        v1 = client.CoreV1Api()
-        pods = v1.list_pod_for_all_namespaces(label_selector=GHOST_SERVICE_LABEL)
-    except ApiException as e:
-        logger.warning("Kubernetes API call failed while listing pods: %s", e)
-        return []
-    except Exception as e:
-        logger.warning("Unexpected error listing pods: %s", e)
-        return []
-
-    results = []
-    for pod in pods.items:
-        service_label = (pod.metadata.labels or {}).get(GHOST_SERVICE_LABEL)
-
-        # The label alone doesn't prove the mutating webhook actually ran -
-        # this pod could predate the webhook, or the webhook could be down.
-        # The real signal is whether GHOST_NOTE_ID actually landed in a
-        # container's env (webhook/webhook.py::make_patch_for_pod).
-        ghost_note_id = None
-        for container in pod.spec.containers or []:
-            for env_var in container.env or []:
-                if env_var.name == "GHOST_NOTE_ID":
-                    ghost_note_id = env_var.value
-                    break
-            if ghost_note_id:
+    def __init__(self, api=None, watch_factory=watch.Watch, resync_s: float = 300,
+                 page_size: int = 500, watch_timeout_s: int = 300, retry_s: float = 10,
+                 clock=time.monotonic):
+        self.resync_s = resync_s
+        self.page_size = page_size
+        self.watch_timeout_s = watch_timeout_s
+        self.retry_s = retry_s
+        self._api = api
+        self._watch_factory = watch_factory
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pods: dict = {}  # (namespace, name) -> PodInfo
+        self._keys: list = []  # the same keys, sorted
+        self._resource_version = None
+        self._resync_at = 0.0
+        self._watch = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._attempted = threading.Event()  # a first LIST has succeeded or failed
+        self.synced = False
+        self.relists = 0
+        self.events = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="pod-informer", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        current = self._watch
+        if current is not None:
+            current.stop()
+
+    def wait_attempted(self, timeout: float) -> bool:
+        """Wait (up to `timeout`) for the first LIST to succeed or fail."""
+        return self._attempted.wait(timeout)
+
+    def page(self, namespace: str | None = None, limit: int | None = None,
+             after: tuple | None = None) -> tuple[list[PodInfo], tuple | None]:
+        """Pods sorted by (namespace, name), optionally one namespace's only,
+        starting after the (namespace, name) key `after`; at most `limit` of
+        them, with the key to pass as `after` for the next page (None once
+        there is none)."""
+        with self._lock:
+            keys = self._keys
+            start, end = 0, len(keys)
+            if namespace is not None:
+                # ("ns", anything) sorts before ("ns\0",) and after ("ns",).
+                start = bisect.bisect_left(keys, (namespace,))
+                end = bisect.bisect_left(keys, (namespace + "\0",))
+            if after is not None:
+                start = max(start, bisect.bisect_right(keys, after))
+            stop = end if limit is None else min(end, start + limit)
+            pods = [self._pods[key] for key in keys[start:stop]]
+            last = keys[stop - 1] if start < stop < end else None
+        return pods, last
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                if self._api is None:
+                    if not _load_k8s_config():
+                        self._attempted.set()
+                        self._stopped.wait(self.retry_s)
+                        continue
+                    self._api = client.CoreV1Api()
+                if self._resource_version is None or self._clock() >= self._resync_at:
+                    self._relist()
+                self._follow()
+            except ApiException as e:
+                if e.status == _GONE:
+                    logger.info("Pod watch expired (410 Gone); relisting")
+                    self._resource_version = None
+                    continue
+                logger.warning("Kubernetes API call failed while watching pods: %s", e)
+                self._attempted.set()
+                self._stopped.wait(self.retry_s)
+            except Exception as e:
+                logger.warning("Unexpected error watching pods: %s", e)
+                self._attempted.set()
+                self._stopped.wait(self.retry_s)
+
+    def _relist(self) -> None:
+        pods, token = {}, None
+        while True:
+            kwargs = {"label_selector": GHOST_SERVICE_LABEL, "limit": self.page_size}
+            if token:
+                kwargs["_continue"] = token
+            listed = self._api.list_pod_for_all_namespaces(**kwargs)
+            for pod in listed.items:
+                pods[_key(pod)] = _pod_info(pod)
+            token = listed.metadata._continue
+            if not token:
                 break
+        with self._lock:
+            self._pods, self._keys = pods, sorted(pods)
+        # Every page of a LIST is read at its first page's resourceVersion.
+        self._resource_version = listed.metadata.resource_version
+        self._resync_at = self._clock() + self.resync_s
+        self.synced = True
+        self.relists += 1
+        self._attempted.set()
+
+    def _follow(self) -> None:
+        """Apply watch events until the watch ends or the resync is due. An
+        expired resourceVersion raises ApiException 410, which _run() meets
+        with a relist."""
+        timeout = int(max(1, min(self.watch_timeout_s, self._resync_at - self._clock())))
+        self._watch = current = self._watch_factory()
+        stream = current.stream(
+            self._api.list_pod_for_all_namespaces,
+            label_selector=GHOST_SERVICE_LABEL,
+            resource_version=self._resource_version,
+            allow_watch_bookmarks=True,
+            timeout_seconds=timeout,
+            # A connection that dies silently would otherwise block the
+            # read forever; the server closes a healthy one at `timeout`.
+            _request_timeout=timeout + 30,
+        )
+        try:
+            for event in stream:
+                if self._stopped.is_set():
+                    break
+                if not event:
+                    continue  # a blank keep-alive line
+                kind, obj = event["type"], event["object"]
+                if kind == "ERROR":
+                    # Watch.stream raises these itself; a bare stream may not.
+                    raise ApiException(status=obj.get("code"), reason=obj.get("message"))
+                if kind == "BOOKMARK":
+                    # Only a resourceVersion to resume from, left undecoded.
+                    self._resource_version = obj["metadata"]["resourceVersion"]
+                    continue
+                if kind in ("ADDED", "MODIFIED"):
+                    self._put(obj)
+                elif kind == "DELETED":
+                    self._delete(obj)
+                self._resource_version = obj.metadata.resource_version
+                self.events += 1
+                if self._clock() >= self._resync_at:
+                    break
+        finally:
+            current.stop()
+            self._watch = None
+
+    def _put(self, pod) -> None:
+        key, info = _key(pod), _pod_info(pod)
+        with self._lock:
+            if key not in self._pods:
+                bisect.insort(self._keys, key)
+            self._pods[key] = info
+
+    def _delete(self, pod) -> None:
+        key = _key(pod)
+        with self._lock:
+            if self._pods.pop(key, None) is not None:
+                del self._keys[bisect.bisect_left(self._keys, key)]
+
+
+_informer = None
+_informer_lock = threading.Lock()
+
+
+def _pod_informer() -> PodInformer:
+    global _informer
+    with _informer_lock:
+        if _informer is None:
+            _informer = PodInformer(
+                resync_s=Config.PODS_RESYNC_S,
+                page_size=Config.PODS_LIST_PAGE_SIZE,
+                watch_timeout_s=Config.PODS_WATCH_TIMEOUT_S,
+            )
+    return _informer
+
+
+def _continue_key(token: str) -> tuple:
+    # Pod and namespace names are DNS labels: never a "/".
+    namespace, sep, name = token.partition("/")
+    if not sep or not namespace or not name:
+        raise ValueError(f"Invalid continue_token {token!r}")
+    return (namespace, name)
+
+
+def list_watched_pods(namespace: str | None = None, limit: int | None = None,
+                      continue_token: str | None = None) -> dict:
+    """The pods carrying the ghostkube.io/service label, sorted by
+    (namespace, name), from the PodInformer's table.
+
+    `namespace` keeps one namespace's; `limit` caps the page, and the
+    `continue_token` it returns (None on the last page) fetches the next.
+    The first call starts the informer and waits up to PODS_READY_WAIT_S for
+    its first LIST. Best-effort: with no kubeconfig, the cluster unreachable,
+    or an RBAC denial, the table is just empty, so a laptop without a
+    running kind cluster - or a Deployment missing the Role Phase 9's README
+    calls out - gets "no pods" rather than an error. A malformed
+    `continue_token` raises ValueError.
+    """
+    after = _continue_key(continue_token) if continue_token else None
+    informer = _pod_informer()
+    informer.start()
+    informer.wait_attempted(Config.PODS_READY_WAIT_S)
+    pods, last = informer.page(namespace, limit, after)
+    return {"pods": pods, "continue_token": "/".join(last) if last else None}
 
-        results.append({
-            "name": pod.metadata.name,
-            "namespace": pod.metadata.namespace,
-            "service_label": service_label,
-            "ghost_note_id": ghost_note_id,
-            "injected": ghost_note_id is not None,
-        })
 
-    return results
+def stop_pod_informer() -> None:
+    if _informer is not None:
+        _informer.stop()
@@ -2,18 +2,16 @@
 """PR and issue ingestion for Phase 8.5 - index the "why", not just the code.
 
 Walks closed-and-merged PRs from the last N months (Config.PR_LOOKBACK_MONTHS)
-for a GitHub repo and assembles one repo_content.md-style document out of
-each PR's title, body, review comments (/pulls/{n}/comments, which carry
+for a GitHub repo and turns each one into a repo_content.md-style block out of
+the PR's title, body, review comments (/pulls/{n}/comments, which carry
 file/line context) and discussion comments (/issues/{n}/comments), keyed to a
 stable synthetic path `pull/{n}` so api/chunking.py's path-based pooling and
 metadata plumbing work unchanged.
 
-Reuses scrape_repo's auth headers and 403 handling rather than a second
-client - see scrape_repo.HEADERS / RateLimitError / rate_limit_message. The
-import is lazy (inside functions, not at module level): scrape_repo imports
-crawl4ai at its own module level, which pulls in Playwright and costs ~25s,
-so importing api.pr_ingest itself must not pay that cost - only an actual
-network call does, same spirit as api/pipeline.py::_fetch_repo_document.
+Reuses the repo fetcher's auth headers and 403 handling rather than a second
+client - see api/github_fetch.py build_headers / RateLimitError /
+rate_limit_message. That module is deliberately free of crawl4ai (which pulls
+in Playwright and costs ~25s), so importing api.pr_ingest stays cheap.
 
 API JSON comments are the primary indexable text. Crawl4AI - the dependency
 kept around since Phase 2 specifically for JS-rendered content - is used only
@@ -29,6 +27,7 @@ import requests
 
 from .chunking import FILE_HEADER
 from .config import Config
+from .github_fetch import GITHUB_API_URL, RateLimitError, build_headers, rate_limit_message
 
 logger = logging.getLogger(__name__)
 
@@ -48,21 +47,12 @@ def _parse_ts(value: str | None):
     return datetime.fromisoformat(value.replace("Z", "+00:00"))
 
 
-def _build_headers():
-    import scrape_repo  # noqa: local import, see module docstring
-    headers = dict(scrape_repo.HEADERS)
-    if Config.GITHUB_TOKEN and "Authorization" not in headers:
-        headers["Authorization"] = f"Bearer {Config.GITHUB_TOKEN}"
-    return headers
-
-
 async def _get_json(url: str, headers: dict, params: dict | None = None):
-    import scrape_repo  # noqa: local import, see module docstring
     response = await asyncio.to_thread(
         requests.get, url, headers=headers, params=params, timeout=30
     )
     if response.status_code == 403:
-        raise scrape_repo.RateLimitError(scrape_repo.rate_limit_message(response))
+        raise RateLimitError(rate_limit_message(response))
     response.raise_for_status()
     return response.json()
 
@@ -77,8 +67,8 @@ async def list_merged_prs(owner: str, repo: str, months: int | None = None) -> l
     """
     months = months if months is not None else Config.PR_LOOKBACK_MONTHS
     cutoff = datetime.now(timezone.utc) - timedelta(days=months * 30)
-    headers = _build_headers()
-    url = f"https://api.github.com/repos/{owner}/{repo}/pulls"
+    headers = build_headers()
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/pulls"
 
     merged = []
     for page in range(1, MAX_PAGES + 1):
@@ -110,9 +100,9 @@ async def list_merged_prs(owner: str, repo: str, months: int | None = None) -> l
 
 async def fetch_pr_comments(owner: str, repo: str, number: int, headers: dict | None = None):
     """Return (review_comments, issue_comments) for one PR number."""
-    headers = headers or _build_headers()
-    review_url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{number}/comments"
-    issue_url = f"https://api.github.com/repos/{owner}/{repo}/issues/{number}/comments"
+    headers = headers or build_headers()
+    review_url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/pulls/{number}/comments"
+    issue_url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/issues/{number}/comments"
     review_comments, issue_comments = await asyncio.gather(
         _get_json(review_url, headers, params={"per_page": 100}),
         _get_json(issue_url, headers, params={"per_page": 100}),
@@ -177,23 +167,33 @@ def format_pr_block(pr: dict, review_comments: list[dict], issue_comments: list[
     return "\n".join(lines) + "\n\n"
 
 
-async def build_pr_document(
-    owner: str, repo: str, months: int | None = None, enrich_with_crawl4ai: bool = False
-) -> tuple[str, dict]:
-    """Return (document, extra_metadata_by_path) for every merged PR in scope.
+def _pr_metadata(pr: dict) -> dict:
+    return {
+        "pr_number": pr["number"],
+        "pr_title": pr.get("title") or "",
+        "pr_url": pr.get("html_url") or "",
+        "source_type": "pr",
+    }
 
-    `document` is one repo_content.md-style string, meant to be chunked by the
-    same api.chunking.chunk_repo_document() as everything else.
-    `extra_metadata_by_path` maps the synthetic "pull/{n}" path to per-PR
-    metadata (pr_number/pr_title/pr_url/source_type) to merge onto matching
-    chunks after chunking, since chunk_repo_document() has no way to carry
-    caller-supplied per-block metadata through on its own.
 
-    Called from api/pipeline.py::ingest_url() when source_type == "pr" -
-    i.e. POST /ingest {"url": "<repo>", "source_type": "pr"}.
+async def iter_pr_blocks(
+    owner: str, repo: str, months: int | None = None, enrich_with_crawl4ai: bool = False
+):
+    """Yield (path, block, extra_metadata) for every merged PR in scope.
+
+    `block` is format_pr_block() without its leading FILE_HEADER - exactly the
+    text chunk_repo_document() would cut out of build_pr_document()'s document -
+    so it goes straight into api.chunking.chunk_file() one PR at a time.
+    `extra_metadata` is the per-PR metadata (pr_number/pr_title/pr_url/
+    source_type) to merge onto that PR's chunks.
+
+    Comment fetches run MAX_CONCURRENT_PR_FETCHES at a time; PRs are yielded in
+    listing order as soon as each one's comments are in. Called from
+    api/pipeline.py::ingest_url() when source_type == "pr" - i.e. POST /ingest
+    {"url": "<repo>", "source_type": "pr"}.
     """
     prs = await list_merged_prs(owner, repo, months)
-    headers = _build_headers()
+    headers = build_headers()
     semaphore = asyncio.Semaphore(MAX_CONCURRENT_PR_FETCHES)
 
     async def process(pr):
@@ -205,22 +205,37 @@ async def build_pr_document(
                 logger.warning("Failed to fetch comments for PR #%d: %s", number, e)
                 review_comments, issue_comments = [], []
             crawled = await crawl_pr_thread(pr["html_url"]) if enrich_with_crawl4ai else None
-            return pr, review_comments, issue_comments, crawled
+            return format_pr_block(pr, review_comments, issue_comments, crawled)
+
+    tasks = [asyncio.create_task(process(pr)) for pr in prs]
+    try:
+        for pr, task in zip(prs, tasks):
+            block = await task
+            yield f"pull/{pr['number']}", block[len(FILE_HEADER):], _pr_metadata(pr)
+    finally:
+        # The consumer stopped early (error or cancellation): don't leave
+        # comment fetches running in the background.
+        for task in tasks:
+            task.cancel()
+
 
-    results = await asyncio.gather(*(process(pr) for pr in prs))
+async def build_pr_document(
+    owner: str, repo: str, months: int | None = None, enrich_with_crawl4ai: bool = False
+) -> tuple[str, dict]:
+    """Return (document, extra_metadata_by_path) for every merged PR in scope.
 
-    document = f"# Pull requests: {owner}/{repo}\n\n"
+    `document` is one repo_content.md-style string, meant to be chunked by the
+    same api.chunking.chunk_repo_document() as everything else.
+    `extra_metadata_by_path` maps the synthetic "pull/{n}" path to its
+    iter_pr_blocks() metadata. POST /ingest streams iter_pr_blocks() directly;
+    this whole-document form is for callers that want the text in one piece.
+    """
+    parts = [f"# Pull requests: {owner}/{repo}\n\n"]
     metadata_by_path = {}
-    for pr, review_comments, issue_comments, crawled in results:
-        number = pr["number"]
-        path = f"pull/{number}"
-        document += format_pr_block(pr, review_comments, issue_comments, crawled)
-        metadata_by_path[path] = {
-            "pr_number": number,
-            "pr_title": pr.get("title") or "",
-            "pr_url": pr.get("html_url") or "",
-            "source_type": "pr",
-        }
-
-    logger.info("Built PR document: %d PR(s), %d chars", len(prs), len(document))
+    async for path, block, pr_meta in iter_pr_blocks(owner, repo, months, enrich_with_crawl4ai):
+        parts.append(f"{FILE_HEADER}{block}")
+        metadata_by_path[path] = pr_meta
+
+    document = "".join(parts)
+    logger.info("Built PR document: %d PR(s), %d chars", len(metadata_by_path), len(document))
     return document, metadata_by_path
@@ -0,0 +1,61 @@
+"""Scalar quantization of the vector index's scan matrix.
+
+Every exact or IVF search reads the rows it scores, so for a full scan the
+whole float32 matrix (384 x 4 bytes per chunk) stays resident in the API
+pod's page cache - against a 2Gi request and a 4Gi limit. VectorIndex can
+keep a quantized copy and scan that instead: float16 halves it, int8 with a
+per-dimension scale quarters it. The float32 rows stay on disk and are only
+read for the few candidates rescored in full precision, so ranking at the
+top is unaffected unless quantization pushes a true hit out of the
+candidate pool.
+
+int8 codes are round(x / scale) per dimension, with scale the dimension's
+largest magnitude over the index / 127 - calibrated by VectorIndex, and
+1/127 (the bound for unit vectors) until then. Values past a stale
+calibration clip rather than wrap.
+"""
+import numpy as np
+
+KINDS = {"float16": np.float16, "int8": np.int8}
+# Rows converted back to float32 at a time while scanning - bounds the
+# temporary to ~25MB at 384 dims instead of a full float32 copy.
+SCAN_BLOCK = 16384
+CALIBRATION_SAMPLE = 100000
+
+
+def default_scale(dim: int) -> np.ndarray:
+    return np.full(dim, 1.0 / 127, dtype=np.float32)
+
+
+def calibrate(vectors, rows: np.ndarray, seed: int = 0) -> np.ndarray:
+    """Per-dimension int8 scale from a sample of `rows` of `vectors`."""
+    rng = np.random.default_rng(seed)
+    if len(rows) > CALIBRATION_SAMPLE:
+        rows = np.sort(rng.choice(rows, CALIBRATION_SAMPLE, replace=False))
+    peak = np.zeros(vectors.shape[1], dtype=np.float32)
+    for start in range(0, len(rows), SCAN_BLOCK):
+        block = np.abs(np.asarray(vectors[rows[start:start + SCAN_BLOCK]]))
+        peak = np.maximum(peak, block.max(axis=0))
+    peak[peak == 0] = 1.0
+    return (peak / 127).astype(np.float32)
+
+
+def encode(vectors: np.ndarray, kind: str, scale: np.ndarray | None) -> np.ndarray:
+    if kind == "int8":
+        return np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+    return vectors.astype(KINDS[kind])
+
+
+def scan(matrix, queries: np.ndarray, scale: np.ndarray | None, rows: np.ndarray | None = None) -> np.ndarray:
+    """Approximate dot products of `queries` with `matrix` rows (all, or
+    `rows`), shape (rows, queries), decoded a block at a time.
+    """
+    # x . q = sum(code * scale * q): fold the scale into the query once.
+    weights = (queries * scale if scale is not None else queries).T.astype(np.float32)
+    total = len(rows) if rows is not None else len(matrix)
+    out = np.empty((total, len(queries)), dtype=np.float32)
+    for start in range(0, total, SCAN_BLOCK):
+        end = min(start + SCAN_BLOCK, total)
+        block = matrix[rows[start:end]] if rows is not None else matrix[start:end]
+        out[start:end] = block.astype(np.float32) @ weights
+    return out
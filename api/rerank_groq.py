@@ -13,7 +13,7 @@ _client = None
 def _get_client():
     global _client
     if _client is None:
-        _client = Groq(api_key=Config.GROQ_API_KEY)
+        _client = Groq(api_key=Config.GROQ_API_KEY, base_url=Config.GROQ_BASE_URL)
     return _client
 
 
@@ -0,0 +1,189 @@
+"""Durable store behind the synthesis cache: chunk_id -> Groq summary.
+
+Used to be one JSON file that synthesize() parsed on every search and
+rewrote whole on every miss - cost growing with the cache, and two
+threadpool requests missing at once could interleave their writes into a
+torn file that then read as empty. A SQLite table instead: a lookup is one
+primary-key read, a new summary is one INSERT committed atomically, and WAL
+mode lets every API worker read while one writes. api/synthesis.py keeps the
+hot entries in memory in front of it.
+
+A JSON cache from before (same path, .json) is imported the first time the
+table is found empty, so the summaries already paid for in Groq quota
+survive the switch.
+
+Two smaller tables let every worker answer GET /ghost-note/summary/{chunk_id}
+for a summary another one is generating: `pending` marks one in progress (by
+the generating process's pid), `failed` keeps a failed one's fallback for a
+few minutes. api/synthesis.py writes both and only reads them for chunks it
+knows nothing about itself.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .pids import pid_alive
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    chunk_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    source_path TEXT,
+    created_at REAL NOT NULL
+)
+"""
+_PENDING_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending (
+    chunk_id TEXT PRIMARY KEY,
+    owner INTEGER NOT NULL,
+    started_at REAL NOT NULL
+)
+"""
+_FAILED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS failed (
+    chunk_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    source_path TEXT,
+    failed_at REAL NOT NULL
+)
+"""
+# A pending mark older than this is a generation that never settled (its
+# process wedged, or died and had its pid reused): ignored.
+PENDING_MAX_S = 120
+# SQLite caps bound parameters per statement; deletes go in slices this big.
+_DELETE_SLICE = 500
+
+
+class SummaryStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        with self._lock:
+            conn = self._connect()
+            if conn.execute("SELECT 1 FROM summaries LIMIT 1").fetchone() is None:
+                self._import_legacy(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per process, shared by its threads under _lock. A
+        # connection must not cross a fork, so a worker opens its own.
+        if self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            conn.execute(_PENDING_SCHEMA)
+            conn.execute(_FAILED_SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _import_legacy(self, conn: sqlite3.Connection) -> None:
+        legacy = os.path.splitext(self.path)[0] + ".json"
+        if legacy == self.path or not os.path.exists(legacy):
+            return
+        try:
+            with open(legacy, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            logger.warning("Legacy synthesis cache at %s is unreadable; not importing it", legacy)
+            return
+        rows = [
+            (chunk_id, entry["summary"], entry.get("source_path"), time.time())
+            for chunk_id, entry in entries.items()
+            if isinstance(entry, dict) and entry.get("synthesized") and entry.get("summary")
+        ]
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO summaries VALUES (?, ?, ?, ?)", rows)
+        logger.info("Imported %d synthesized summaries from %s", len(rows), legacy)
+
+    def get(self, chunk_id: str) -> dict | None:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT summary, source_path FROM summaries WHERE chunk_id = ?", (chunk_id,)
+            ).fetchone()
+        return None if row is None else _result(*row)
+
+    def put(self, chunk_id: str, result: dict) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)",
+                    (chunk_id, result["summary"], result["source_path"], time.time()),
+                )
+
+    def delete(self, chunk_ids) -> int:
+        chunk_ids = list(chunk_ids)
+        deleted = 0
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                for start in range(0, len(chunk_ids), _DELETE_SLICE):
+                    part = chunk_ids[start:start + _DELETE_SLICE]
+                    marks = ','.join('?' * len(part))
+                    deleted += conn.execute(f"DELETE FROM summaries WHERE chunk_id IN ({marks})", part).rowcount
+                    conn.execute(f"DELETE FROM failed WHERE chunk_id IN ({marks})", part)
+        return deleted
+
+    def mark_pending(self, chunk_id: str) -> None:
+        """This process has started generating `chunk_id`'s summary."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO pending VALUES (?, ?, ?)",
+                             (chunk_id, os.getpid(), time.time()))
+
+    def settle(self, chunk_id: str, failed: dict | None = None) -> None:
+        """`chunk_id`'s generation is over: put() has the summary, or it
+        failed and `failed` is the fallback served meanwhile."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM pending WHERE chunk_id = ?", (chunk_id,))
+                if failed is None:
+                    conn.execute("DELETE FROM failed WHERE chunk_id = ?", (chunk_id,))
+                else:
+                    conn.execute("INSERT OR REPLACE INTO failed VALUES (?, ?, ?, ?)",
+                                 (chunk_id, failed["summary"], failed["source_path"], time.time()))
+
+    def progress(self, chunk_id: str, failed_ttl_s: float) -> tuple[str, dict | None] | None:
+        """("pending", None) while some live process is generating the
+        summary, ("failed", fallback) for `failed_ttl_s` after a failure,
+        else None."""
+        with self._lock:
+            conn = self._connect()
+            pending = conn.execute(
+                "SELECT owner, started_at FROM pending WHERE chunk_id = ?", (chunk_id,)
+            ).fetchone()
+            failed = conn.execute(
+                "SELECT summary, source_path, failed_at FROM failed WHERE chunk_id = ?", (chunk_id,)
+            ).fetchone()
+        if pending is not None and time.time() - pending[1] < PENDING_MAX_S and pid_alive(pending[0]):
+            return "pending", None
+        if failed is not None and time.time() - failed[2] < failed_ttl_s:
+            return "failed", {"summary": failed[0], "source_path": failed[1], "synthesized": False}
+        return None
+
+    def recent(self, limit: int) -> list:
+        """The `limit` newest (chunk_id, result) pairs, oldest first."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT chunk_id, summary, source_path FROM summaries ORDER BY created_at DESC LIMIT ?",
+                (max(0, limit),),
+            ).fetchall()
+        return [(chunk_id, _result(summary, path)) for chunk_id, summary, path in reversed(rows)]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+
+def _result(summary: str, source_path: str | None) -> dict:
+    return {"summary": summary, "source_path": source_path, "synthesized": True}
@@ -0,0 +1,131 @@
+"""Summarise an ingest's most-served chunks before anyone asks for them.
+
+Synthesis is keyed by a search's top chunk, and the same few chunks - the
+top hit for each service's pods - are what `kubectl ghost` lands on again
+and again. Without this, the first user to reach each of them after an
+ingest pays the whole Groq round-trip. With Config.SYNTHESIS_PRECOMPUTE on,
+every successful ingest job hands its likeliest chunks here (picked by
+pipeline._hot_chunks), and their summaries are in the synthesis cache by
+the time the first search arrives.
+
+One worker thread per process works through the batches in order, and every
+Groq call it makes goes through one RateLimiter: the requests-per-minute
+quota is shared with live searches, so pre-computation paces itself to
+Config.SYNTHESIS_PRECOMPUTE_RPM and leaves them the rest. A chunk that is
+already summarised costs neither a call nor a slot. A failed call (a 429,
+usually) backs the worker off, and a few failures in a row end the batch
+rather than spend more quota retrying it.
+"""
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """At most `per_minute` acquisitions a minute, spaced evenly - no burst
+    at the start of each minute to trip the quota. `per_minute` <= 0 means
+    unlimited.
+    """
+
+    def __init__(self, per_minute: float, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Block until the next call may go; returns the seconds waited."""
+        with self._lock:
+            now = self._clock()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        wait = start - now
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        """Hold every acquisition for at least `seconds` from now."""
+        with self._lock:
+            self._next = max(self._next, self._clock() + seconds)
+
+
+class SummaryWarmer:
+    def __init__(self, summarize, is_cached, per_minute: float,
+                 max_failures: int = 3, backoff_s: float = 10.0):
+        """`summarize(chunks, service_name)` returns a synthesis result - see
+        synthesis.synthesize(); `is_cached(chunk_id)` says whether a summary
+        for that top chunk already exists.
+        """
+        self._summarize = summarize
+        self._is_cached = is_cached
+        self.limiter = RateLimiter(per_minute)
+        self.max_failures = max_failures
+        self.backoff_s = backoff_s
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, items: list, progress=None) -> None:
+        """Queue `items`, (chunks, service_name) pairs best first, each
+        `chunks` what synthesize() would be given for a search on it.
+        `progress(**fields)` receives summaries_status / summaries_planned /
+        summaries_done / summaries_cached as the batch advances.
+        """
+        _report(progress, summaries_status="queued", summaries_planned=len(items),
+                summaries_done=0, summaries_cached=0)
+        with self._lock:
+            if self._thread is None:
+                # Started lazily, so a forked API worker starts its own.
+                self._thread = threading.Thread(target=self._worker, name="summary-warmer", daemon=True)
+                self._thread.start()
+        self._queue.put((items, progress))
+
+    def join(self) -> None:
+        """Block until every submitted batch has been worked through."""
+        self._queue.join()
+
+    def _worker(self):
+        while True:
+            items, progress = self._queue.get()
+            try:
+                self._run(items, progress)
+            except Exception as e:
+                logger.error("Summary pre-computation crashed: %s", e)
+                _report(progress, summaries_status="failed")
+            finally:
+                self._queue.task_done()
+
+    def _run(self, items: list, progress) -> None:
+        _report(progress, summaries_status="running")
+        done = cached = failures = 0
+        for chunks, service_name in items:
+            if self._is_cached(chunks[0]["chunk_id"]):
+                cached += 1
+            else:
+                self.limiter.acquire()
+                if self._summarize(chunks, service_name)["synthesized"]:
+                    done += 1
+                    failures = 0
+                else:
+                    failures += 1
+                    if failures >= self.max_failures:
+                        logger.warning(
+                            "Summary pre-computation stopped after %d failed Groq calls in a row (%d of %d done)",
+                            failures, done, len(items),
+                        )
+                        _report(progress, summaries_status="failed", summaries_done=done, summaries_cached=cached)
+                        return
+                    self.limiter.pause(self.backoff_s * 2 ** (failures - 1))
+            _report(progress, summaries_done=done, summaries_cached=cached)
+        logger.info("Pre-computed %d summaries (%d were already cached)", done, cached)
+        _report(progress, summaries_status="done")
+
+
+def _report(progress, **fields):
+    if progress is not None:
+        progress(**fields)
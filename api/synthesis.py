@@ -1,11 +1,14 @@
 # api/synthesis.py
-import json
 import logging
-import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 
 from groq import Groq
 
 from .config import Config
+from .lru_cache import LRUCache
+from .summary_store import SummaryStore
 
 logger = logging.getLogger(__name__)
 
@@ -15,27 +18,105 @@ _client = None
 def _get_client():
     global _client
     if _client is None:
-        _client = Groq(api_key=Config.GROQ_API_KEY)
+        _client = Groq(api_key=Config.GROQ_API_KEY, base_url=Config.GROQ_BASE_URL)
     return _client
 
 
-def _load_cache() -> dict:
-    if not os.path.exists(Config.SYNTHESIS_CACHE_PATH):
-        return {}
-    try:
-        with open(Config.SYNTHESIS_CACHE_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, OSError):
-        logger.warning("Synthesis cache at %s is unreadable; starting empty", Config.SYNTHESIS_CACHE_PATH)
-        return {}
+# Summaries by the chunk_id of the top result: the newest
+# Config.SYNTHESIS_CACHE_SIZE in memory, every one in the SQLite store at
+# Config.SYNTHESIS_CACHE_PATH (api/summary_store.py). A memory miss is one
+# primary-key read, never a Groq call for a summary already paid for.
+_memory = LRUCache(Config.SYNTHESIS_CACHE_SIZE)
+_store = None
+_store_lock = threading.Lock()
 
 
-def _save_cache(cache: dict) -> None:
-    try:
-        with open(Config.SYNTHESIS_CACHE_PATH, "w", encoding="utf-8") as f:
-            json.dump(cache, f)
-    except OSError:
-        logger.warning("Could not write synthesis cache to %s", Config.SYNTHESIS_CACHE_PATH)
+def load_cache():
+    """Open the store and fill the in-memory tier from its newest entries -
+    once per process, from pipeline.warm_up() or else the first synthesis.
+    None if the store can't be opened: summaries are then cached in memory
+    only, and synthesis carries on.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                try:
+                    store = SummaryStore(Config.SYNTHESIS_CACHE_PATH)
+                    for chunk_id, result in store.recent(Config.SYNTHESIS_CACHE_SIZE):
+                        _memory.put(chunk_id, result)
+                    _store = store
+                    logger.info("Synthesis cache loaded: %d in memory of %d stored", len(_memory), len(store))
+                except Exception as e:
+                    logger.warning("Synthesis cache at %s unavailable; caching in memory only: %s",
+                                   Config.SYNTHESIS_CACHE_PATH, e)
+                    _store = False
+    return _store if _store is not False else None
+
+
+def _cached(chunk_id: str) -> dict | None:
+    result = _memory.get(chunk_id)
+    if result is None:
+        store = load_cache()
+        try:
+            result = store.get(chunk_id) if store is not None else None
+        except Exception as e:
+            logger.warning("Synthesis cache read failed: %s", e)
+        if result is not None:
+            _memory.put(chunk_id, result)
+    return result
+
+
+def _remember(chunk_id: str, result: dict) -> None:
+    _memory.put(chunk_id, result)
+    store = load_cache()
+    if store is not None:
+        try:
+            store.put(chunk_id, result)
+        except Exception as e:
+            logger.warning("Could not write synthesis cache to %s: %s", Config.SYNTHESIS_CACHE_PATH, e)
+
+
+def forget(chunk_ids) -> None:
+    """Drop the summaries of chunks that left the index."""
+    chunk_ids = list(chunk_ids)
+    for chunk_id in chunk_ids:
+        _memory.discard(chunk_id)
+        _failed.discard(chunk_id)
+    if not chunk_ids or not (Config.SYNTHESIS_ENABLED and Config.GROQ_API_KEY):
+        return
+    store = load_cache()
+    if store is not None:
+        try:
+            store.delete(chunk_ids)
+        except Exception as e:
+            logger.warning("Could not drop %d summaries from the synthesis cache: %s", len(chunk_ids), e)
+
+
+def is_cached(chunk_id: str) -> bool:
+    return _cached(chunk_id) is not None
+
+
+def cache_stats() -> dict:
+    return _memory.stats()
+
+
+# Summaries being generated right now, by cache key. A miss that finds one
+# already running joins its Future instead of calling Groq again, so a burst
+# of searches landing on the same top chunk - every pod of one service
+# crash-looping at once - costs one Groq call. Both this and _failed are
+# this process's own; they're mirrored into the store's pending/failed tables
+# so summary_status() in another API worker can see them too.
+_inflight: dict = {}
+_inflight_lock = threading.Lock()
+# Deferred summaries run here (Config.SYNTHESIS_WORKERS threads), created on
+# first use so a gunicorn worker starts its own after the fork.
+_background = None
+# Fallbacks from Groq calls that failed. Not cached - the next search
+# retries - but remembered for a few minutes so a summary_status() poll can
+# say the summary failed rather than that it never heard of the chunk.
+_FAILED_TTL_S = 300
+_failed = LRUCache(256, ttl_s=_FAILED_TTL_S)
 
 
 _SYSTEM_PROMPT = (
@@ -58,29 +139,181 @@ def _build_prompt(chunks: list[dict], service_name: str | None) -> str:
     )
 
 
+def _fallback(chunks: list[dict]) -> dict:
+    top = chunks[0]
+    source_path = top["metadata"].get("path") or top["metadata"].get("source_url") or "unknown"
+    summary = top["text"][:300] + "..." if len(top["text"]) > 300 else top["text"]
+    return {"summary": summary, "source_path": source_path, "synthesized": False}
+
+
 def synthesize(chunks: list[dict], service_name: str | None = None) -> dict:
     """Turn the top retrieved chunks into a short, cited summary.
 
     `chunks` is the same shape search_ghost_notes() already returns: a list of
     dicts with "chunk_id", "text", and "metadata" (metadata["path"] is the
     citation), pre-sorted by relevance. The top chunk decides the cache key
-    and the fallback/citation path.
+    and the fallback/citation path. Calls missing the cache for the same top
+    chunk at once share one Groq call.
+    """
+    known = _known(chunks)
+    if known is not None:
+        return known
+    future, owner = _join(chunks[0]["chunk_id"])
+    if owner:
+        _generate(chunks, service_name, future)
+    return future.result()
+
+
+def synthesize_later(chunks: list[dict], service_name: str | None = None) -> dict | None:
+    """synthesize() without waiting on Groq: the result if it is already
+    known (cached, or synthesis is off), otherwise None once a summary for
+    the top chunk is being generated in the background. Fetch it with
+    summary_status(chunks[0]["chunk_id"]).
+    """
+    known = _known(chunks)
+    if known is not None:
+        return known
+    future, owner = _join(chunks[0]["chunk_id"])
+    if owner:
+        try:
+            _background_pool().submit(_generate, chunks, service_name, future)
+        except RuntimeError as e:  # pool shut down with the interpreter
+            _settle(chunks[0]["chunk_id"], future, exception=e)
+    return None
+
+
+def summary_status(chunk_id: str, wait_s: float = 0) -> dict | None:
+    """Where the summary for `chunk_id` stands: "ready" with the cached
+    result, "failed" with the raw-chunk fallback, or "pending" if it is
+    still being generated after waiting up to `wait_s` for it. None if it
+    was never asked for (or failed long enough ago to be forgotten).
     """
+    with _inflight_lock:
+        future = _inflight.get(chunk_id)
+    if future is not None:
+        try:
+            result = future.result(timeout=wait_s)
+        except FutureTimeout:
+            return {"status": "pending", "summary": None, "source_path": None, "synthesized": False}
+        except Exception:
+            result = None
+        if result is not None:
+            return {"status": "ready" if result["synthesized"] else "failed", **result}
+    # Checked after _inflight: a finished summary is cached (or recorded as
+    # failed) before its Future leaves the table.
+    cached = _cached(chunk_id)
+    if cached is not None:
+        return {"status": "ready", **cached}
+    failed = _failed.get(chunk_id)
+    if failed is not None:
+        return {"status": "failed", **failed}
+    return _elsewhere(chunk_id, wait_s)
+
+
+def _elsewhere(chunk_id: str, wait_s: float) -> dict | None:
+    """summary_status() for a summary another API worker is generating (or
+    failed to), read from the store; None if none is."""
+    store = _shared_store()
+    if store is None:
+        return None
+    deadline = time.monotonic() + wait_s
+    while True:
+        try:
+            progress = store.progress(chunk_id, _FAILED_TTL_S)
+        except Exception as e:
+            logger.warning("Could not read shared synthesis progress: %s", e)
+            return None
+        if progress is None:
+            # Settled since the checks above, or never started anywhere.
+            cached = _cached(chunk_id)
+            return {"status": "ready", **cached} if cached is not None else None
+        state, fallback = progress
+        if state == "failed":
+            return {"status": "failed", **fallback}
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return {"status": "pending", "summary": None, "source_path": None, "synthesized": False}
+        time.sleep(min(0.1, remaining))
+
+
+def _shared_store():
+    if not (Config.SYNTHESIS_ENABLED and Config.GROQ_API_KEY):
+        return None
+    return load_cache()
+
+
+def _share(update) -> None:
+    """Apply `update(store)` - how a generation stands, for the other API
+    workers. Best-effort: this process's own answers don't depend on it."""
+    store = _shared_store()
+    if store is not None:
+        try:
+            update(store)
+        except Exception as e:
+            logger.warning("Could not share synthesis progress: %s", e)
+
+
+def _known(chunks: list[dict]) -> dict | None:
     if not chunks:
         return {"summary": "", "source_path": None, "synthesized": False}
+    if not Config.SYNTHESIS_ENABLED or not Config.GROQ_API_KEY:
+        return _fallback(chunks)
+    return _cached(chunks[0]["chunk_id"])
 
-    top = chunks[0]
-    source_path = top["metadata"].get("path") or top["metadata"].get("source_url") or "unknown"
-    fallback_summary = top["text"][:300] + "..." if len(top["text"]) > 300 else top["text"]
 
-    if not Config.SYNTHESIS_ENABLED or not Config.GROQ_API_KEY:
-        return {"summary": fallback_summary, "source_path": source_path, "synthesized": False}
+def _join(cache_key: str) -> tuple[Future, bool]:
+    """The Future for `cache_key`'s summary, and whether the caller created
+    it and so must generate it."""
+    with _inflight_lock:
+        future = _inflight.get(cache_key)
+        if future is not None:
+            return future, False
+        future = _inflight[cache_key] = Future()
+    _share(lambda store: store.mark_pending(cache_key))
+    return future, True
+
+
+def _background_pool() -> ThreadPoolExecutor:
+    global _background
+    if _background is None:
+        with _inflight_lock:
+            if _background is None:
+                _background = ThreadPoolExecutor(
+                    max_workers=max(1, Config.SYNTHESIS_WORKERS), thread_name_prefix="synthesis",
+                )
+    return _background
+
+
+def _generate(chunks: list[dict], service_name: str | None, future: Future) -> None:
+    cache_key = chunks[0]["chunk_id"]
+    try:
+        result = _complete(chunks, service_name)
+        if result["synthesized"]:
+            _remember(cache_key, result)
+            _failed.discard(cache_key)
+        else:
+            _failed.put(cache_key, result)
+    except Exception as e:
+        logger.error("Synthesis of %s failed: %s", cache_key[:12], e)
+        _settle(cache_key, future, exception=e)
+        return
+    _settle(cache_key, future, result=result)
+
 
-    cache_key = top["chunk_id"]
-    cache = _load_cache()
-    if cache_key in cache:
-        return cache[cache_key]
+def _settle(cache_key: str, future: Future, result: dict | None = None,
+            exception: Exception | None = None) -> None:
+    failed = result if result is not None and not result["synthesized"] else None
+    _share(lambda store: store.settle(cache_key, failed))
+    with _inflight_lock:
+        _inflight.pop(cache_key, None)
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
 
+
+def _complete(chunks: list[dict], service_name: str | None) -> dict:
+    fallback = _fallback(chunks)
     try:
         response = _get_client().chat.completions.create(
             model=Config.GROQ_MODEL,
@@ -91,15 +324,11 @@ def synthesize(chunks: list[dict], service_name: str | None = None) -> dict:
             max_tokens=80,
             temperature=0.2,
         )
-        result = {
+        return {
             "summary": response.choices[0].message.content.strip(),
-            "source_path": source_path,
+            "source_path": fallback["source_path"],
             "synthesized": True,
         }
     except Exception as e:
         logger.warning("Groq synthesis failed, falling back to raw chunk: %s", e)
-        return {"summary": fallback_summary, "source_path": source_path, "synthesized": False}
-
-    cache[cache_key] = result
-    _save_cache(cache)
-    return result
+        return fallback
@@ -0,0 +1,700 @@
+"""In-process exact vector index - the "numpy" retrieval backend.
+
+At this project's corpus sizes (tens to a few hundred thousand chunks) a
+brute-force scan is one matrix-vector product: ~40ms for 1M x 384 float32 on
+one core, and no network hop. Every /ghost-note otherwise goes to Chroma -
+in-cluster, over HTTP to the StatefulSet. With Config.RETRIEVAL_BACKEND ==
+"numpy", pipeline.py answers search queries from this index instead. Chroma
+remains the source of truth: every write through _call_collection is
+mirrored here, and an index that disagrees with Chroma is rebuilt from it.
+
+Layout, one directory per collection - every file append-only except the
+alive mask, so a search never sees a row move under it:
+
+- vectors.f32   unit-normalized float32 rows, memory-mapped
+- ids.bin       fixed-width (64 byte) chunk IDs
+- <column>.i32  int32 codes for the filterable metadata columns; 0 = missing
+- records.i64   (offset, length) of each row's JSON record in records.jsonl
+- records.jsonl {"document": ..., "metadata": ...} per row, read by offset
+- alive.u8      1 per live row; upserting or deleting an ID clears its old row
+- ivf_list.i32  IVF list of each row (-1 until the index is first partitioned)
+- ivf_centroids.f32  the IVF centroids, when partitioned - see api/ivf.py
+- vectors.f16 / vectors.i8 (+ int8_scale.f32)  the quantized scan copy, when
+                enabled - see api/quantize.py
+- header.json   dim, row count and code vocabularies. Replaced atomically
+                after the data files are written, so it is the commit point:
+                rows past its count are ignored on load.
+
+Several processes (API workers, see api/gunicorn_conf.py) may share one
+directory. Writes hold `<directory>.lock` with flock for their duration and
+first reload the index if another process has committed since this one last
+looked (the header file changed); readers call refresh() to catch up. The
+arrays are file-backed memory maps, so every process scans the same page
+cache rather than a private copy.
+
+Searches never wait for a write's work, only for the moment it is
+published: a write builds its files (new rows, a retrained IVF partition,
+a quantized copy, a compacted directory) while searches keep scanning the
+last snapshot, then swaps the new snapshot in under a short lock. A
+retrain or compaction run inside an ingest's upsert doesn't stall
+/ghost-note for its duration.
+
+Distances are squared L2 between unit vectors (2 - 2 * cosine) - the same
+numbers Chroma's default "l2" space gives for the unit-length embeddings
+sentence-transformers' MiniLM models produce, so relevance scores don't move
+when the backend changes.
+
+With ann="ivf", once the index holds `ann_min_rows` live rows it is
+partitioned by api/ivf.py and a query scores only the rows of its `nprobe`
+nearest lists. New rows are filed under their nearest existing centroid as
+they arrive; the partition is retrained from scratch each time the live row
+count doubles, so list balance follows the corpus. A filtered query whose
+probed lists hold fewer than n_results matching rows falls back to an exact
+scan of the filter's rows, which are few by then anyway.
+
+With quantization "float16" or "int8", searches scan a quantized copy of
+the rows and rescore the best `rescore_factor` x n_results candidates
+against the float32 rows, so returned distances are always full precision.
+int8 scales are recalibrated on the same doubling schedule as the IVF
+partition.
+"""
+import contextlib
+import fcntl
+import json
+import logging
+import mmap
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from . import ivf, quantize
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+ID_BYTES = 64
+# Metadata columns a `where` filter may use. Each gets a code array and a
+# vocabulary, and a boolean mask per value is computed once per write.
+FILTER_COLUMNS = ("service", "source_type")
+# Compact once this share of rows is dead (and at least COMPACT_MIN_DEAD).
+COMPACT_DEAD_FRACTION = 0.3
+COMPACT_MIN_DEAD = 1000
+# int8 scales are first calibrated at this many live rows (1/127 until then).
+CALIBRATE_MIN_ROWS = 1000
+
+
+# What _reset_memory() sets up: everything a compacted index hands over.
+_STATE = ("dim", "count", "vocab", "_codes", "_rows", "dead", "_snapshot", "_masks", "_ivf", "_quant")
+
+
+class UnsupportedFilter(ValueError):
+    """A `where` clause this index can't evaluate - callers fall back to Chroma."""
+
+
+def _where_terms(where: dict | None) -> list:
+    """Flatten a Chroma-style `where` of equality tests into (column, value) pairs."""
+    if not where:
+        return []
+    terms = []
+    for key, value in where.items():
+        if key == "$and":
+            for clause in value:
+                terms.extend(_where_terms(clause))
+            continue
+        if isinstance(value, dict):
+            if set(value) != {"$eq"}:
+                raise UnsupportedFilter(f"only equality filters are supported, got {where}")
+            value = value["$eq"]
+        if key not in FILTER_COLUMNS:
+            raise UnsupportedFilter(f"{key!r} is not an indexed column {FILTER_COLUMNS}")
+        terms.append((key, value))
+    return terms
+
+
+def _normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    def __init__(self, directory: str, ann: str = "", nlist: int = 0, nprobe: int = 16,
+                 ann_min_rows: int = 50000, quantization: str = "", rescore_factor: int = 4):
+        """`ann` "ivf" turns on approximate search past `ann_min_rows` live rows.
+        `nlist` 0 picks sqrt(rows) lists at each (re)training. `quantization`
+        "float16" or "int8" scans a quantized copy of the rows instead of the
+        float32 ones.
+        """
+        if quantization and quantization not in quantize.KINDS:
+            raise ValueError(f"unknown quantization {quantization!r}; expected one of {sorted(quantize.KINDS)}")
+        self.directory = directory
+        self.ann = ann
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ann_min_rows = ann_min_rows
+        self.quantization = quantization
+        self.rescore_factor = max(1, rescore_factor)
+        # _write_lock (with the lock file) is held by a write for as long as
+        # it runs; _lock only while it swaps in what it built, and by query().
+        self._write_lock = threading.RLock()
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_file = None
+        self._lock_pid = None
+        # Identity of header.json as of the last load or commit by this
+        # process - see locked().
+        self._stamp = False
+        with self.locked():
+            pass
+
+    # -- locking -----------------------------------------------------------
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Hold the index for writing, against other threads of this process
+        and, through the lock file, other processes. Reloads first if another
+        process has committed since this one last did.
+        """
+        with self._write_lock:
+            self._lock_depth += 1
+            try:
+                if self._lock_depth == 1:
+                    fcntl.flock(self._file_lock(), fcntl.LOCK_EX)
+                    if self._header_stamp() != self._stamp:
+                        with self._lock:
+                            loaded = self._load()
+                        if loaded and (self._quant or {}).get("kind", "") != self.quantization:
+                            self.requantize()
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._file_lock(), fcntl.LOCK_UN)
+
+    def _file_lock(self):
+        # Opened per process: a descriptor inherited across fork shares its
+        # flock with the parent, so it would exclude nothing.
+        if self._lock_pid != os.getpid():
+            path = self.directory.rstrip(os.sep) + ".lock"
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._lock_file = open(path, "a+b")
+            self._lock_pid = os.getpid()
+        return self._lock_file
+
+    def _header_stamp(self):
+        try:
+            st = os.stat(self._path("header.json"))
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def refresh(self) -> bool:
+        """Catch up with commits made by other processes. True if it reloaded."""
+        if self._header_stamp() == self._stamp:
+            return False
+        with self.locked():
+            return True
+
+    # -- persistence -------------------------------------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _reset_memory(self):
+        self.dim = None
+        self.count = 0
+        self.vocab = {column: [None] for column in FILTER_COLUMNS}
+        self._codes = {column: {None: 0} for column in FILTER_COLUMNS}
+        self._rows: dict = {}
+        self.dead = 0
+        self._snapshot = None
+        self._masks: dict = {}
+        # {"nlist", "trained_rows"} once partitioned, else None.
+        self._ivf: dict | None = None
+        # {"kind", "calibrated_rows"} while a quantized copy exists, else None.
+        self._quant: dict | None = None
+
+    def _load(self) -> bool:
+        """Read the committed index. False if there was none to read."""
+        self._reset_memory()
+        os.makedirs(self.directory, exist_ok=True)
+        self._stamp = self._header_stamp()
+        try:
+            with open(self._path("header.json"), "r", encoding="utf-8") as f:
+                header = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Vector index header at %s unreadable, starting empty: %s", self.directory, e)
+            self.clear()
+            return False
+        if header.get("version") != INDEX_VERSION or not self._files_hold(header):
+            logger.warning("Vector index at %s is from another version or incomplete; starting empty", self.directory)
+            self.clear()
+            return False
+
+        self.dim = header["dim"]
+        self.count = header["count"]
+        self.vocab = {column: [None] + header["vocab"].get(column, []) for column in FILTER_COLUMNS}
+        self._codes = {column: {v: i for i, v in enumerate(values)} for column, values in self.vocab.items()}
+        self._ivf = header.get("ivf")
+        if self._ivf and not self._holds(
+            "ivf_centroids.f32", self._ivf["nlist"] * self.dim * 4, exact=True
+        ):
+            logger.warning("IVF centroids at %s incomplete; searching exactly until retrained", self.directory)
+            self._ivf = None
+        self._quant = header.get("quantization")
+        if self._quant and not self._holds(self._quant_file(), self._quant_bytes(self.count)):
+            self._quant = None
+        self._remap()
+        ids, alive = self._snapshot["ids"], self._snapshot["alive"]
+        for row in np.flatnonzero(alive):
+            self._rows[ids[row].decode()] = int(row)
+        self.dead = self.count - len(self._rows)
+        return True
+
+    def _files_hold(self, header: dict) -> bool:
+        n, dim = header["count"], header["dim"] or 0
+        return all(self._holds(name, size) for name, size in self._sizes(n, dim).items())
+
+    def _sizes(self, n: int, dim: int) -> dict:
+        """Bytes each per-row file holds for `n` committed rows."""
+        return {
+            "vectors.f32": n * dim * 4, "ids.bin": n * ID_BYTES,
+            "records.i64": n * 16, "alive.u8": n, "ivf_list.i32": n * 4,
+            **{f"{column}.i32": n * 4 for column in FILTER_COLUMNS},
+        }
+
+    def _quant_file(self, kind: str | None = None) -> str:
+        kind = kind or self._quant["kind"]
+        return "vectors.f16" if kind == "float16" else "vectors.i8"
+
+    def _quant_bytes(self, n: int) -> int:
+        return n * (self.dim or 0) * np.dtype(quantize.KINDS[self._quant["kind"]]).itemsize
+
+    def _holds(self, name: str, size: int, exact: bool = False) -> bool:
+        try:
+            actual = os.path.getsize(self._path(name))
+        except OSError:
+            return size == 0
+        return actual == size if exact else actual >= size
+
+    def _write_header(self):
+        tmp = self._path("header.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "dim": self.dim,
+                "count": self.count,
+                "vocab": {column: values[1:] for column, values in self.vocab.items()},
+                "ivf": self._ivf,
+                "quantization": self._quant,
+            }, f)
+        os.replace(tmp, self._path("header.json"))
+        self._stamp = self._header_stamp()
+
+    def _map(self, name: str, dtype, shape, mode="r"):
+        if not shape[0]:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self._path(name), dtype=dtype, mode=mode, shape=shape)
+
+    def _remap(self):
+        """Re-open every array at the committed row count. Old snapshots stay
+        valid for searches already holding them.
+        """
+        n, dim = self.count, self.dim or 0
+        records = None
+        if n:
+            with open(self._path("records.jsonl"), "rb") as f:
+                records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._snapshot = {
+            "n": n,
+            "vectors": self._map("vectors.f32", np.float32, (n, dim)),
+            "ids": self._map("ids.bin", f"S{ID_BYTES}", (n,)),
+            "offsets": self._map("records.i64", np.int64, (n, 2)),
+            "alive": self._map("alive.u8", np.uint8, (n,), mode="r+"),
+            "codes": {column: self._map(f"{column}.i32", np.int32, (n,)) for column in FILTER_COLUMNS},
+            "records": records,
+            "ivf_lists": self._map("ivf_list.i32", np.int32, (n,)),
+            "centroids": (
+                np.fromfile(self._path("ivf_centroids.f32"), dtype=np.float32).reshape(-1, dim)
+                if self._ivf else None
+            ),
+            "quantized": (
+                self._map(self._quant_file(), quantize.KINDS[self._quant["kind"]], (n, dim))
+                if self._quant else None
+            ),
+            "scale": (
+                np.fromfile(self._path("int8_scale.f32"), dtype=np.float32)
+                if self._quant and self._quant["kind"] == "int8" else None
+            ),
+        }
+        self._masks = {}
+
+    def clear(self):
+        """Drop everything, on disk too - before a rebuild from Chroma."""
+        with self.locked():
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.directory, exist_ok=True)
+            with self._lock:
+                self._reset_memory()
+                self._stamp = None
+
+    # -- writes ------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._rows
+
+    @property
+    def scan_bytes(self) -> int:
+        """Size of the matrix a full scan reads - what stays resident under load."""
+        n, dim = self.count, self.dim or 0
+        return self._quant_bytes(n) if self._quant else n * dim * 4
+
+    @property
+    def ivf_lists(self) -> int | None:
+        """Lists in the current IVF partition, None while searches are exact."""
+        return self._ivf["nlist"] if self._ivf and self.ann == "ivf" else None
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        vectors = _normalize(embeddings)
+        with self.locked():
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"embedding dim {vectors.shape[1]} != index dim {self.dim}")
+            if self.quantization and self._quant is None:
+                self.requantize()
+
+            encoded_ids = []
+            for chunk_id in ids:
+                raw = chunk_id.encode()
+                if len(raw) > ID_BYTES:
+                    raise ValueError(f"chunk id longer than {ID_BYTES} bytes: {chunk_id!r}")
+                encoded_ids.append(raw)
+            codes = {
+                column: np.array([self._code(column, (meta or {}).get(column)) for meta in metadatas], dtype=np.int32)
+                for column in FILTER_COLUMNS
+            }
+            lines = [
+                json.dumps({"document": doc, "metadata": meta}, ensure_ascii=False).encode() + b"\n"
+                for doc, meta in zip(documents, metadatas)
+            ]
+            centroids = self._snapshot["centroids"] if self._snapshot else None
+            lists = ivf.assign(vectors, centroids) if centroids is not None else np.full(len(ids), -1, np.int32)
+            start = int(self._snapshot["offsets"][-1].sum()) if self.count else 0
+            # Truncate whatever an interrupted write left past the committed rows.
+            self._truncate_to_committed(start)
+            lengths = np.array([len(line) for line in lines], dtype=np.int64)
+            offsets = np.stack([start + np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths], axis=1)
+
+            self._append("vectors.f32", vectors.tobytes())
+            self._append("ids.bin", np.array(encoded_ids, dtype=f"S{ID_BYTES}").tobytes())
+            self._append("records.i64", offsets.astype(np.int64).tobytes())
+            self._append("alive.u8", np.ones(len(ids), dtype=np.uint8).tobytes())
+            self._append("ivf_list.i32", lists.tobytes())
+            if self._quant:
+                self._append(self._quant_file(),
+                             quantize.encode(vectors, self._quant["kind"], self._snapshot["scale"]).tobytes())
+            for column in FILTER_COLUMNS:
+                self._append(f"{column}.i32", codes[column].tobytes())
+            self._append("records.jsonl", b"".join(lines))
+
+            # The rows replaced go in the same swap that brings their successors in.
+            with self._lock:
+                self._kill([chunk_id for chunk_id in ids if chunk_id in self._rows])
+                for i, chunk_id in enumerate(ids):
+                    self._rows[chunk_id] = self.count + i
+                self.count += len(ids)
+                self._publish()
+            self._maintain()
+
+    def delete(self, ids):
+        with self.locked():
+            with self._lock:
+                killed = self._kill([chunk_id for chunk_id in ids if chunk_id in self._rows])
+                if killed:
+                    self._publish()
+            if killed:
+                self._maintain()
+
+    def _kill(self, ids) -> int:
+        if not ids:
+            return 0
+        alive = self._snapshot["alive"]
+        for chunk_id in ids:
+            alive[self._rows.pop(chunk_id)] = 0
+        self.dead += len(ids)
+        return len(ids)
+
+    def _code(self, column: str, value) -> int:
+        if value is not None and not isinstance(value, str):
+            value = str(value)
+        code = self._codes[column].get(value)
+        if code is None:
+            code = len(self.vocab[column])
+            self.vocab[column].append(value)
+            self._codes[column][value] = code
+        return code
+
+    def _append(self, name: str, data: bytes):
+        with open(self._path(name), "ab") as f:
+            f.write(data)
+
+    def _truncate_to_committed(self, records_end: int):
+        sizes = {**self._sizes(self.count, self.dim or 0), "records.jsonl": records_end}
+        if self._quant:
+            sizes[self._quant_file()] = self._quant_bytes(self.count)
+        for name, size in sizes.items():
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def _publish(self):
+        """Commit the header and switch searches to the new snapshot. Under _lock."""
+        alive = self._snapshot["alive"] if self._snapshot else None
+        if isinstance(alive, np.memmap):
+            alive.flush()
+        self._write_header()
+        self._remap()
+
+    def _maintain(self):
+        """Compact, retrain or recalibrate if the write just published made it due."""
+        if self.dead >= COMPACT_MIN_DEAD and self.dead > COMPACT_DEAD_FRACTION * self.count:
+            self.compact()
+            return
+        if self._ann_due():
+            self.train_ann()
+        if self._calibration_due():
+            self.requantize()
+
+    def _ann_due(self) -> bool:
+        if self.ann != "ivf" or len(self._rows) < self.ann_min_rows:
+            return False
+        return self._ivf is None or len(self._rows) >= 2 * self._ivf["trained_rows"]
+
+    def _calibration_due(self) -> bool:
+        if not self._quant or self._quant["kind"] != "int8" or len(self._rows) < CALIBRATE_MIN_ROWS:
+            return False
+        return len(self._rows) >= 2 * self._quant["calibrated_rows"]
+
+    def requantize(self, kind: str | None = None):
+        """(Re)build the quantized copy - as `kind` if given, else the index's
+        own setting - recalibrating int8 scales over the live rows. Called on
+        load when the setting changed, and by eval/run_eval.py --quant.
+        """
+        with self.locked():
+            if kind is not None:
+                self.quantization = kind
+            # Searches keep the copy they have mapped until the swap below.
+            for name in ("vectors.f16", "vectors.i8", "int8_scale.f32"):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            quant = None
+            if self.quantization and self.dim:
+                if self._snapshot is None:
+                    with self._lock:
+                        self._remap()
+                snap = self._snapshot
+                live = np.flatnonzero(snap["alive"]) if snap["n"] else np.array([], dtype=np.int64)
+                scale = None
+                if self.quantization == "int8":
+                    calibrated = len(live) >= CALIBRATE_MIN_ROWS
+                    scale = quantize.calibrate(snap["vectors"], live) if calibrated else quantize.default_scale(self.dim)
+                    scale.tofile(self._path("int8_scale.f32"))
+                logger.info("Quantizing vector index %s to %s (%d rows)", self.directory, self.quantization, snap["n"])
+                name = self._quant_file(self.quantization)
+                with open(self._path(name + ".tmp"), "wb") as f:
+                    for start in range(0, snap["n"], quantize.SCAN_BLOCK):
+                        block = np.asarray(snap["vectors"][start:start + quantize.SCAN_BLOCK])
+                        f.write(quantize.encode(block, self.quantization, scale).tobytes())
+                os.replace(self._path(name + ".tmp"), self._path(name))
+                quant = {
+                    "kind": self.quantization,
+                    "calibrated_rows": len(live) if self.quantization == "int8" and len(live) >= CALIBRATE_MIN_ROWS else 0,
+                }
+            with self._lock:
+                self._quant = quant
+                self._write_header()
+                self._remap()
+
+    def train_ann(self, nlist: int | None = None):
+        """Partition the live rows into IVF lists now, replacing any earlier
+        partition. Normally automatic as the index grows; eval/run_eval.py
+        calls it to sweep `nlist`.
+        """
+        with self.locked():
+            snap = self._snapshot
+            live = np.flatnonzero(snap["alive"]) if snap["n"] else np.array([], dtype=np.int64)
+            if not len(live):
+                return
+            nlist = nlist or self.nlist or ivf.auto_nlist(len(live))
+            logger.info("Training IVF for %s: %d lists over %d rows", self.directory, nlist, len(live))
+            centroids = ivf.train(snap["vectors"], nlist, rows=live)
+            lists = ivf.assign(snap["vectors"], centroids)
+            # Lists before centroids, header last. A crash in between leaves
+            # lists that don't match the centroids - lost recall, never wrong
+            # rows, until the next retrain; a torn centroid file is caught on load.
+            for name, array in (("ivf_list.i32", lists), ("ivf_centroids.f32", centroids)):
+                array.tofile(self._path(name + ".tmp"))
+                os.replace(self._path(name + ".tmp"), self._path(name))
+            with self._lock:
+                self._ivf = {"nlist": len(centroids), "trained_rows": len(live)}
+                self._write_header()
+                self._remap()
+
+    def compact(self):
+        """Rewrite the index with only its live rows.
+
+        Written to a sibling `<directory>.compact` as an index of its own,
+        then renamed into place; searches scan the old files until then.
+        """
+        with self.locked():
+            snap = self._snapshot
+            live = np.flatnonzero(snap["alive"]) if snap["n"] else np.array([], dtype=np.int64)
+            logger.info("Compacting vector index %s: %d live of %d rows", self.directory, len(live), self.count)
+            ids = [snap["ids"][row].decode() for row in live]
+            vectors = np.asarray(snap["vectors"][live])
+            documents, metadatas = self._read_records(snap, live)
+
+            base = self.directory.rstrip(os.sep)
+            staging, retired = base + ".compact", base + ".retired"
+            for leftover in (staging, retired):
+                shutil.rmtree(leftover, ignore_errors=True)
+            fresh = VectorIndex(staging, ann=self.ann, nlist=self.nlist, nprobe=self.nprobe,
+                                ann_min_rows=self.ann_min_rows, quantization=self.quantization,
+                                rescore_factor=self.rescore_factor)
+            if ids:
+                fresh.upsert(ids, vectors, documents, metadatas)
+            fresh._file_lock().close()
+
+            with self._lock:
+                os.rename(self.directory, retired)
+                os.rename(staging, self.directory)
+                # Its maps stay valid across the rename: same files, new path.
+                for name in _STATE:
+                    setattr(self, name, getattr(fresh, name))
+                self._stamp = self._header_stamp()
+            shutil.rmtree(retired, ignore_errors=True)
+            os.remove(staging + ".lock")
+
+    # -- search ------------------------------------------------------------
+
+    def _mask(self, snap, column: str, value) -> np.ndarray:
+        """Boolean row mask for column == value, cached until the next write."""
+        code = self._codes[column].get(value if value is None or isinstance(value, str) else str(value))
+        key = (column, code)
+        mask = self._masks.get(key)
+        if mask is None or len(mask) != snap["n"]:
+            mask = np.zeros(snap["n"], dtype=bool) if code is None else snap["codes"][column] == code
+            self._masks[key] = mask
+        return mask
+
+    def _inverted(self, snap):
+        """IVF (order, bounds) for this snapshot, cached until the next write."""
+        lists = self._masks.get("ivf")
+        if lists is None:
+            lists = ivf.inverted_lists(np.asarray(snap["ivf_lists"]), len(snap["centroids"]))
+            self._masks["ivf"] = lists
+        return lists
+
+    def _read_records(self, snap, rows):
+        documents, metadatas = [], []
+        records = snap["records"]
+        for offset, length in snap["offsets"][rows]:
+            record = json.loads(records[int(offset):int(offset) + int(length)])
+            documents.append(record["document"])
+            metadatas.append(record["metadata"])
+        return documents, metadatas
+
+    def query(self, query_embeddings, n_results: int, where: dict | None = None,
+              nprobe: int | None = None, exact: bool = False) -> dict:
+        """Top-k, shaped like Chroma's query() result (ids, documents,
+        metadatas, distances - one list per query embedding). Approximate once
+        the index is IVF-partitioned, unless `exact`; `nprobe` overrides the
+        index's own setting.
+        """
+        terms = _where_terms(where)
+        queries = _normalize(query_embeddings)
+        with self._lock:
+            snap = self._snapshot
+            mask = snap["alive"].astype(bool) if snap["n"] else np.zeros(0, dtype=bool)
+            for column, value in terms:
+                mask &= self._mask(snap, column, value)
+            inverted = None
+            if not exact and self.ann == "ivf" and snap["centroids"] is not None:
+                inverted = self._inverted(snap)
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        rows = np.flatnonzero(mask)
+        k = min(n_results, len(rows))
+        if k == 0:
+            for key in result:
+                result[key] = [[] for _ in range(len(queries))]
+            return result
+
+        if inverted is not None:
+            for query in queries:
+                self._add_hits(result, snap, *self._probe(snap, inverted, query, mask, rows, k, nprobe))
+            return result
+
+        # One matmul for all queries. Gather the candidate rows first when the
+        # filter leaves few of them; otherwise score everything and mask.
+        if len(rows) < snap["n"] // 2:
+            scores = self._scan(snap, queries, rows)
+        else:
+            scores = self._scan(snap, queries)
+            scores[~mask] = -np.inf
+            rows = None
+
+        for j, query in enumerate(queries):
+            self._add_hits(result, snap, rows, scores[:, j], k, query)
+        return result
+
+    def _scan(self, snap, queries: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        """(rows, queries) similarities - from the quantized copy if there is one."""
+        if snap["quantized"] is not None:
+            return quantize.scan(snap["quantized"], queries, snap["scale"], rows)
+        matrix = snap["vectors"][rows] if rows is not None else snap["vectors"]
+        return matrix @ queries.T
+
+    def _probe(self, snap, inverted, query, mask, rows, k, nprobe):
+        """(rows, scores, k) for one query, scanning only its nearest IVF lists."""
+        order, bounds = inverted
+        probed = ivf.probe(snap["centroids"], query, nprobe or self.nprobe)
+        candidates = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probed])
+        candidates = candidates[mask[candidates]]
+        if len(candidates) < k:
+            candidates = rows
+        return candidates, self._scan(snap, query[None, :], candidates)[:, 0], k, query
+
+    def _add_hits(self, result: dict, snap, rows, scores, k: int, query: np.ndarray):
+        """Append the top `k` of `scores` (over `rows`, or every row if None).
+        Scores from a quantized scan only shortlist: the best few times `k`
+        are rescored against the float32 rows before the final cut.
+        """
+        if snap["quantized"] is not None:
+            wide = min(len(scores), k * self.rescore_factor)
+            shortlist = np.argpartition(-scores, wide - 1)[:wide]
+            shortlist = shortlist[np.isfinite(scores[shortlist])]
+            rows = rows[shortlist] if rows is not None else shortlist
+            scores = snap["vectors"][rows] @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        picked = rows[top] if rows is not None else top
+        documents, metadatas = self._read_records(snap, picked)
+        result["ids"].append([snap["ids"][row].decode() for row in picked])
+        result["documents"].append(documents)
+        result["metadatas"].append(metadatas)
+        result["distances"].append(np.maximum(0.0, 2.0 - 2.0 * scores[top]).astype(float).tolist())
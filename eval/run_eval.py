@@ -12,6 +12,28 @@ away from the thing it is supposed to be measuring.
 Run from the repo root:
     python eval/run_eval.py eval/queries_meetme.json
 
+Add --ann to measure approximate search instead: the collection is copied
+into a throwaway IVF vector index (api/vector_index.py) and, for each
+nlist/nprobe setting, every query's top-k is compared with exact search -
+recall@k is the share of the exact top k that the approximate top k found -
+alongside the query set's own hit@k and the per-query latency:
+    python eval/run_eval.py eval/queries_meetme.json --ann
+ANN_NLISTS (comma-separated, default VECTOR_INDEX_IVF_NLIST or sqrt(chunks))
+and ANN_NPROBES pick the settings; ANN_SAMPLE stored chunks are used as extra
+queries so recall isn't measured on a dozen queries alone.
+
+--quant does the same for VECTOR_INDEX_QUANTIZATION: float32, float16 and
+int8 scan copies side by side, each with the size of the matrix a search
+scans, recall@k against float32 and the query set's hit@k:
+    python eval/run_eval.py eval/queries_meetme.json --quant
+
+--feedback scores the query set twice, without and with the feedback-aware
+ranking stage (pipeline.rank_by_feedback, FEEDBACK_RANKING_WEIGHT /
+FEEDBACK_RANKING_PRIOR_VOTES), using the 👍/👎 recorded in FEEDBACK_PATH:
+    FEEDBACK_PATH=./feedback.jsonl python eval/run_eval.py eval/queries_meetme.json --feedback
+Ratings given on these same queries will flatter the "with" column; a log
+collected on other traffic is the honest test.
+
 The query sets are incomplete (see the _comment entry in each JSON file); the
 published figures need the full 12 / 20 queries to reproduce.
 
@@ -22,20 +44,27 @@ index will correctly report near-zero.
 import json
 import os
 import sys
+import tempfile
+import time
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import chromadb
+import numpy as np
 from sentence_transformers import SentenceTransformer
 
 from search import MAX_DISTANCE, POOL_SIZE, expand_query, pool_by_file
-from api import rerank_groq
+from api import ivf, pipeline, rerank_groq
 from api.config import Config
+from api.vector_index import VectorIndex
 
 
 CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
 COLLECTION = os.getenv("CHROMA_COLLECTION_NAME", "repo_docs")
 EMBED_MODEL = os.getenv("EMBED_MODEL_NAME", "all-MiniLM-L12-v2")
+ANN_NPROBES = [int(n) for n in os.getenv("ANN_NPROBES", "1,2,4,8,16,32,64").split(",")]
+ANN_SAMPLE = int(os.getenv("ANN_SAMPLE", 200))
+RECALL_AT = (1, 10, POOL_SIZE)
 
 
 def load_queries(path):
@@ -57,32 +86,122 @@ def rank_of(expected_path, ranked):
     return None
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python eval/run_eval.py eval/queries_meetme.json")
-        return 1
-    query_file = sys.argv[1]
+def load_index(collection, directory):
+    """Copy every chunk of `collection` into a VectorIndex at `directory`;
+    returns the index and the IDs it holds.
+    """
+    index = VectorIndex(directory)
+    ids = []
+    page_size, offset = 1000, 0
+    while True:
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        index.upsert(page["ids"], page["embeddings"], page["documents"], page["metadatas"])
+        ids.extend(page["ids"])
+        if len(page["ids"]) < page_size:
+            return index, ids
+        offset += page_size
 
-    cases = load_queries(query_file)
-    if not cases:
-        print(f"No usable queries in {query_file}")
-        return 1
 
-    model = SentenceTransformer(EMBED_MODEL)
-    collection = chromadb.PersistentClient(path=CHROMA_PATH).get_or_create_collection(
-        name=COLLECTION
-    )
-    total_chunks = collection.count()
+def pooled_rank(results, row, expected):
+    if not results["documents"][row]:
+        return None
+    ranked = pool_by_file(results["documents"][row], results["distances"][row],
+                          results["metadatas"][row], top_k=5)
+    return rank_of(expected, ranked)
 
-    print(f"\nEval set : {query_file} ({len(cases)} queries)")
-    print(f"Index    : {COLLECTION} at {CHROMA_PATH} ({total_chunks} chunks)")
-    rerank_on = Config.GROQ_RERANK_ENABLED
-    print(f"Model    : {EMBED_MODEL}   pool={POOL_SIZE}  max_distance={MAX_DISTANCE}  "
-          f"groq_rerank={'on' if rerank_on else 'off'}\n")
+
+def sweep_queries(collection, model, cases, ids):
+    """Query embeddings for a sweep: the eval set's, then ANN_SAMPLE stored chunks."""
+    rng = np.random.default_rng(0)
+    sample = list(rng.choice(ids, min(ANN_SAMPLE, len(ids)), replace=False))
+    return np.vstack([
+        model.encode([expand_query(case["query"]) for case in cases]),
+        np.asarray(collection.get(ids=sample, include=["embeddings"])["embeddings"]),
+    ])
+
+
+def timed_queries(index, queries, **kwargs):
+    """One query() per embedding; merged results and the p50 latency."""
+    durations = []
+    results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+    for query in queries:
+        start = time.perf_counter()
+        found = index.query([query], n_results=POOL_SIZE, **kwargs)
+        durations.append(time.perf_counter() - start)
+        for key in results:
+            results[key].extend(found[key])
+    return results, sorted(durations)[len(durations) // 2]
+
+
+def sweep_header(label):
+    print(f"{label}  " + "  ".join(f"{f'recall@{k}':>9}" for k in RECALL_AT)
+          + f"  {'hit@1':>6}  {'hit@3':>6}  {'hit@5':>6}  {'p50 ms':>7}")
+    print("-" * (len(label) + 34 + 11 * len(RECALL_AT)))
+
+
+def sweep_row(label, found, exact, cases, seconds):
+    """recall@k of `found` against `exact` over every query, plus the eval
+    set's own hit@k (the first len(cases) queries) after file pooling.
+    """
+    recall = [np.mean([len(set(f[:k]) & set(e[:k])) / max(1, len(e[:k]))
+                       for f, e in zip(found["ids"], exact["ids"])]) for k in RECALL_AT]
+    ranks = [pooled_rank(found, i, case["expected_path"]) for i, case in enumerate(cases)]
+    hits = [sum(1 for r in ranks if r is not None and r <= k) / len(cases) for k in (1, 3, 5)]
+    print(f"{label}  " + "  ".join(f"{r:>9.1%}" for r in recall)
+          + "".join(f"  {h:>6.0%}" for h in hits) + f"  {seconds * 1000:>7.2f}")
+
+
+def ann_sweep(collection, model, cases):
+    """recall@k of IVF search against exact search, per nlist/nprobe setting."""
+    with tempfile.TemporaryDirectory() as directory:
+        index, ids = load_index(collection, directory)
+        queries = sweep_queries(collection, model, cases, ids)
+        exact = index.query(queries, n_results=POOL_SIZE, exact=True)
+        nlists = [int(n) for n in os.getenv("ANN_NLISTS", "").split(",") if n] or \
+            [Config.VECTOR_INDEX_IVF_NLIST or ivf.auto_nlist(len(index))]
+
+        print(f"ANN sweep: {len(cases)} eval queries + {len(queries) - len(cases)} sampled chunks, "
+              f"{len(index)} chunks\n")
+        sweep_header(f"{'nlist':>6}  {'nprobe':>6}  {'scanned':>7}")
+        found, seconds = timed_queries(index, queries, exact=True)
+        sweep_row(f"{'exact':>6}  {'-':>6}  {'100%':>7}", found, exact, cases, seconds)
+        index.ann = "ivf"
+        for nlist in nlists:
+            index.train_ann(nlist)
+            for nprobe in ANN_NPROBES:
+                if nprobe > index.ivf_lists:
+                    break
+                found, seconds = timed_queries(index, queries, nprobe=nprobe)
+                sweep_row(f"{index.ivf_lists:>6}  {nprobe:>6}  {nprobe / index.ivf_lists:>7.1%}",
+                          found, exact, cases, seconds)
+        print()
+
+
+def quant_sweep(collection, model, cases):
+    """Scan-matrix memory, recall@k against float32 and hit@k for each
+    quantization, rescoring at Config.VECTOR_INDEX_RESCORE_FACTOR.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        index, ids = load_index(collection, directory)
+        index.rescore_factor = Config.VECTOR_INDEX_RESCORE_FACTOR
+        queries = sweep_queries(collection, model, cases, ids)
+        exact = index.query(queries, n_results=POOL_SIZE)
+        full_bytes = index.scan_bytes
+
+        print(f"Quantization sweep: {len(cases)} eval queries + {len(queries) - len(cases)} sampled chunks, "
+              f"{len(index)} chunks, rescore x{index.rescore_factor}\n")
+        sweep_header(f"{'vectors':>8}  {'scan MB':>8}  {'memory':>7}")
+        for kind in ("", "float16", "int8"):
+            index.requantize(kind)
+            found, seconds = timed_queries(index, queries)
+            sweep_row(f"{kind or 'float32':>8}  {index.scan_bytes / 1e6:>8.1f}  {index.scan_bytes / full_bytes:>7.0%}",
+                      found, exact, cases, seconds)
+        print()
 
 
+def rank_cases(collection, model, cases, feedback=False):
+    """Each case's (query, expected, rank, top path) over the pooled top 5."""
     rows = []
-    hits = {1: 0, 3: 0, 5: 0}
     for case in cases:
         query, expected = case["query"], case["expected_path"]
         results = collection.query(
@@ -98,17 +217,84 @@ def main():
                                   results["distances"][0],
                                   results["metadatas"][0],
                                   top_k=10)
-        if rerank_on and ranked:
+        # Same order as the API: feedback after pooling, then the reranker.
+        if feedback and ranked:
+            candidates = [(doc, {"path": path}, score) for path, doc, score in ranked]
+            ranked = [(meta["path"], doc, score) for doc, meta, score in pipeline.rank_by_feedback(candidates)]
+        if Config.GROQ_RERANK_ENABLED and ranked:
             candidates = [(doc, {"path": path}, score) for path, doc, score in ranked]
             reranked = rerank_groq.rerank(query, candidates)
             ranked = [(meta["path"], doc, score) for doc, meta, score in reranked]
         ranked = ranked[:5]
-        rank = rank_of(expected, ranked)
+        rows.append((query, expected, rank_of(expected, ranked), ranked[0][0] if ranked else "(no result)"))
+    return rows
+
+
+def hits_at(rows, k):
+    return sum(1 for _q, _e, rank, _top in rows if rank is not None and rank <= k)
+
+
+def feedback_comparison(collection, model, cases):
+    """hit@k and MRR without and with feedback-aware ranking, and which
+    queries it moved."""
+    ratings = pipeline._feedback.events()
+    print(f"Feedback : {Config.FEEDBACK_PATH} ({ratings} ratings)   "
+          f"weight={Config.FEEDBACK_RANKING_WEIGHT}  prior_votes={Config.FEEDBACK_RANKING_PRIOR_VOTES}\n")
+    if not ratings:
+        print("No feedback recorded - both runs would be identical.\n")
+        return
+    without = rank_cases(collection, model, cases)
+    with_feedback = rank_cases(collection, model, cases, feedback=True)
+
+    n = len(cases)
+    print(f"{'':9}  {'hit@1':>6}  {'hit@3':>6}  {'hit@5':>6}  {'MRR':>6}")
+    for label, rows in (("without", without), ("with", with_feedback)):
+        mrr = sum(1 / rank for _q, _e, rank, _top in rows if rank) / n
+        print(f"{label:9}" + "".join(f"  {hits_at(rows, k) / n:>6.0%}" for k in (1, 3, 5)) + f"  {mrr:>6.3f}")
+
+    moved = [(before, after) for before, after in zip(without, with_feedback) if before[2] != after[2]]
+    print(f"\n{len(moved)} of {n} queries changed rank")
+    for (query, expected, before, _top), (_q, _e, after, _t) in moved:
+        print(f"  {before or '-':>2} -> {after or '-':<2}  {query}  ({expected})")
+    print()
+
+
+def main():
+    flags = ("--ann", "--quant", "--feedback")
+    args = [arg for arg in sys.argv[1:] if arg not in flags]
+    if not args:
+        print("Usage: python eval/run_eval.py eval/queries_meetme.json [--ann | --quant | --feedback]")
+        return 1
+    query_file = args[0]
+
+    cases = load_queries(query_file)
+    if not cases:
+        print(f"No usable queries in {query_file}")
+        return 1
+
+    model = SentenceTransformer(EMBED_MODEL)
+    collection = chromadb.PersistentClient(path=CHROMA_PATH).get_or_create_collection(
+        name=COLLECTION
+    )
+    total_chunks = collection.count()
+
+    print(f"\nEval set : {query_file} ({len(cases)} queries)")
+    print(f"Index    : {COLLECTION} at {CHROMA_PATH} ({total_chunks} chunks)")
+    rerank_on = Config.GROQ_RERANK_ENABLED
+    print(f"Model    : {EMBED_MODEL}   pool={POOL_SIZE}  max_distance={MAX_DISTANCE}  "
+          f"groq_rerank={'on' if rerank_on else 'off'}\n")
+
+    if "--ann" in sys.argv[1:]:
+        ann_sweep(collection, model, cases)
+        return 0
+    if "--quant" in sys.argv[1:]:
+        quant_sweep(collection, model, cases)
+        return 0
+    if "--feedback" in sys.argv[1:]:
+        feedback_comparison(collection, model, cases)
+        return 0
 
-        for k in (1, 3, 5):
-            if rank is not None and rank <= k:
-                hits[k] += 1
-        rows.append((query, expected, rank, ranked[0][0] if ranked else "(no result)"))
+    rows = rank_cases(collection, model, cases)
 
     width = max(len(r[0]) for r in rows)
     print(f"{'rank':>4}  {'query':{width}}  {'expected':28}  returned at rank 1")
@@ -120,7 +306,7 @@ def main():
     n = len(cases)
     print()
     for k in (1, 3, 5):
-        print(f"hit@{k}  {hits[k]}/{n} ({hits[k] / n:.0%})")
+        print(f"hit@{k}  {hits_at(rows, k)}/{n} ({hits_at(rows, k) / n:.0%})")
     print()
     return 0
 
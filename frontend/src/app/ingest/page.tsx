@@ -2,6 +2,7 @@
 
 import { useEffect, useState } from "react";
 import { ApiError, ingest, IngestRequest } from "@/lib/api";
+import { IngestJob, waitForIngestJob } from "@/lib/ingestJobs";
 import styles from "./page.module.css";
 import { LinkIcon, DocumentIcon, UploadIcon } from "./icons";
 
@@ -71,7 +72,7 @@ export default function IngestPage() {
   const [sourceType, setSourceType] = useState<"repo" | "pr">("repo");
   const [metadataText, setMetadataText] = useState("");
   const [status, setStatus] = useState<FormStatus>("idle");
-  const [loadingStep, setLoadingStep] = useState<1 | 2>(1);
+  const [progress, setProgress] = useState<IngestJob | null>(null);
   const [errorMessage, setErrorMessage] = useState<string | null>(null);
   const [lastResult, setLastResult] = useState<RecentJob | null>(null);
   const [recentJobs, setRecentJobs] = useState<RecentJob[]>([]);
@@ -83,7 +84,7 @@ export default function IngestPage() {
   async function handleSubmit(e: React.FormEvent) {
     e.preventDefault();
     setStatus("loading");
-    setLoadingStep(1);
+    setProgress(null);
     setErrorMessage(null);
     setLastResult(null);
 
@@ -98,13 +99,17 @@ export default function IngestPage() {
       }
     }
 
-    const stepTimer = setTimeout(() => setLoadingStep(2), 1200);
-
     const payload: IngestRequest = { url, source_type: sourceType, metadata };
 
     try {
-      const result = await ingest(payload);
-      clearTimeout(stepTimer);
+      // POST /ingest now answers 202 with a job rather than the finished
+      // ingest; poll GET /ingest/{job_id} until it's done.
+      const submitted = (await ingest(payload)) as unknown as IngestJob;
+      const finished = await waitForIngestJob(submitted, setProgress);
+      const result = finished.result;
+      if (finished.status === "failed" || !result) {
+        throw new Error(result?.message ?? "Ingest failed.");
+      }
       const job: RecentJob = {
         url,
         source_type: sourceType,
@@ -120,9 +125,10 @@ export default function IngestPage() {
       setUrl("");
       setMetadataText("");
     } catch (err) {
-      clearTimeout(stepTimer);
       const message =
-        err instanceof ApiError ? err.message : "Something went wrong.";
+        err instanceof ApiError || err instanceof Error
+          ? err.message
+          : "Something went wrong.";
       const job: RecentJob = {
         url,
         source_type: sourceType,
@@ -137,6 +143,8 @@ export default function IngestPage() {
   }
 
   const isLoading = status === "loading";
+  const phase = progress?.phase ?? "queued";
+  const embedding = phase === "embedding" || phase === "done";
 
   return (
     <div>
@@ -222,14 +230,26 @@ export default function IngestPage() {
         <div className={styles.steps}>
           <StepCard
             title="Scraping repository"
-            subtitle="Fetching data from the source..."
-            active={loadingStep === 1}
-            done={loadingStep > 1}
+            subtitle={
+              progress && phase !== "queued"
+                ? `Fetched ${progress.files_fetched} files...`
+                : "Waiting for a free ingest worker..."
+            }
+            active={!embedding}
+            done={embedding}
           />
           <StepCard
             title="Embedding and indexing"
-            subtitle="Generating embeddings and updating index..."
-            active={loadingStep === 2}
+            subtitle={
+              progress && embedding
+                ? `Embedded ${progress.chunks_embedded} of ${progress.chunks_total} chunks${
+                    progress.eta_s != null
+                      ? ` — about ${Math.ceil(progress.eta_s)}s left`
+                      : ""
+                  }...`
+                : "Generating embeddings and updating index..."
+            }
+            active={embedding}
             done={false}
           />
         </div>
@@ -0,0 +1,72 @@
+// POST /ingest answers 202 with a job right away; the ingest itself runs in
+// the background and GET /ingest/{job_id} reports how far it has got.
+
+const API_URL = process.env.NEXT_PUBLIC_API_URL ?? "http://localhost:8000";
+
+const POLL_INTERVAL_MS = 1000;
+
+export type IngestJobStatus = "queued" | "running" | "succeeded" | "failed";
+
+export interface IngestResult {
+  status: string;
+  chunks_ingested: number;
+  total_characters: number;
+  message: string;
+}
+
+export interface IngestJob {
+  job_id: string;
+  url: string;
+  source_type: string;
+  status: IngestJobStatus;
+  // queued -> fetching -> embedding -> done
+  phase: string;
+  files_fetched: number;
+  chunks_total: number;
+  chunks_embedded: number;
+  throughput_chunks_per_s: number | null;
+  eta_s: number | null;
+  submitted_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+  coalesced: boolean;
+  // Only once the job has finished.
+  result: IngestResult | null;
+}
+
+export function isFinished(job: IngestJob): boolean {
+  return job.status === "succeeded" || job.status === "failed";
+}
+
+export async function getIngestJob(jobId: string): Promise<IngestJob> {
+  const response = await fetch(
+    `${API_URL}/ingest/${encodeURIComponent(jobId)}`
+  );
+  if (!response.ok) {
+    let detail = `GET /ingest/${jobId} failed (${response.status})`;
+    try {
+      const body = await response.json();
+      if (typeof body?.detail === "string") detail = body.detail;
+    } catch {
+      // not JSON; keep the status line
+    }
+    throw new Error(detail);
+  }
+  return (await response.json()) as IngestJob;
+}
+
+// Poll until the job succeeds or fails, handing every snapshot to
+// `onProgress`. Resolves with the finished job; a failed job is returned,
+// not thrown - its result.message says why.
+export async function waitForIngestJob(
+  job: IngestJob,
+  onProgress: (job: IngestJob) => void
+): Promise<IngestJob> {
+  onProgress(job);
+  while (!isFinished(job)) {
+    await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+    job = await getIngestJob(job.job_id);
+    onProgress(job);
+  }
+  return job;
+}
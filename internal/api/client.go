@@ -18,6 +18,8 @@ type GhostNoteRequest struct {
 	Query       string `json:"query"`
 	TopResults  int    `json:"top_results"`
 	GhostNoteID string `json:"ghost_note_id,omitempty"`
+	// Nil leaves it to the server's SYNTHESIS_DEFER.
+	DeferSummary *bool `json:"defer_summary,omitempty"`
 }
 
 type GhostNoteResult struct {
@@ -33,6 +35,9 @@ type GhostNoteResponse struct {
 	Summary     string            `json:"summary,omitempty"`
 	SummaryPath string            `json:"summary_path,omitempty"`
 	Synthesized bool              `json:"synthesized,omitempty"`
+	// Set when DeferSummary answered before Groq did; the summary is then
+	// at GET /ghost-note/summary/{Results[0].ChunkID}.
+	SummaryPending bool `json:"summary_pending,omitempty"`
 }
 
 type FeedbackRequest struct {
@@ -95,10 +95,31 @@ PF_PID=$!
 trap 'kill $PF_PID 2>/dev/null || true' EXIT
 sleep 3
 
-curl -sf -X POST http://localhost:8000/ingest \
+# POST /ingest answers 202 with a job; poll it until the ingest has landed,
+# or kubectl ghost below races it and searches an empty index.
+JOB=$(curl -sf -X POST http://localhost:8000/ingest \
   -H "Content-Type: application/json" \
-  -d '{"url": "https://raw.githubusercontent.com/octocat/Hello-World/master/README", "metadata": {"service": "auth-service"}}' \
-  > /dev/null
+  -d '{"url": "https://raw.githubusercontent.com/octocat/Hello-World/master/README", "metadata": {"service": "auth-service"}}')
+JOB_ID=$(echo "$JOB" | sed -n 's/.*"job_id":"\([0-9a-f]*\)".*/\1/p')
+if [ -z "$JOB_ID" ]; then
+  echo "FAIL: /ingest returned no job: $JOB"
+  exit 1
+fi
+JOB_STATUS=""
+for _ in $(seq 1 90); do
+  JOB=$(curl -sf "http://localhost:8000/ingest/$JOB_ID")
+  # The job's own status is the first one in the body; result.status comes later.
+  JOB_STATUS=$(echo "$JOB" | grep -o '"status":"[a-z]*"' | head -1 | cut -d'"' -f4)
+  if [ "$JOB_STATUS" = "succeeded" ] || [ "$JOB_STATUS" = "failed" ]; then
+    break
+  fi
+  sleep 2
+done
+if [ "$JOB_STATUS" != "succeeded" ]; then
+  echo "FAIL: ingest job $JOB_ID ended as '${JOB_STATUS:-still running}': $JOB"
+  exit 1
+fi
+echo "Ingest job $JOB_ID succeeded"
 
 echo "==> kubectl ghost"
 NOTE=$("$ROOT_DIR/kubectl-ghost.exe" "$AUTH_POD" 2>&1) || NOTE="$(kubectl-ghost "$AUTH_POD" 2>&1)"
@@ -0,0 +1,120 @@
+# scripts/export_onnx.py
+"""Exports the embedding model to ONNX for Config.EMBED_BACKEND="onnx" (see
+api/embedder.py), optionally with a dynamically quantized int8 copy, then
+checks both against the torch model before anything serves them.
+
+Only the transformer runs in ONNX. Mean pooling and normalization are done by
+api/embedder.py, driven by the embedder.json written here, so the export
+fails loudly if the SentenceTransformer pipeline is anything other than
+Transformer -> mean Pooling (-> Normalize).
+
+Run from the repo root. Needs torch and sentence-transformers (in the API
+image) plus the exporter's own packages, which serving never imports:
+    pip install onnx onnxscript
+    python scripts/export_onnx.py              # model.onnx
+    python scripts/export_onnx.py --quantize   # + model_qint8.onnx
+Output goes to Config.EMBED_ONNX_DIR unless --out is given.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.config import Config  # noqa: E402
+from api.embedder import EXPORT_CONFIG, OnnxEmbedder  # noqa: E402
+
+# Min cosine to the torch vector, per file. fp32 ONNX is the same arithmetic
+# in a different runtime; int8 weights cost a little more.
+COSINE_TOLERANCE = {"model.onnx": 0.9999, "model_qint8.onnx": 0.98}
+SAMPLE_TEXTS = [
+    "CrashLoopBackOff after the auth-service rollout",
+    "FILE PATH: api/pipeline.py\nEXTENSION: .py\nCODE:\ndef ingest_url(url): ...",
+    "why does the payments worker retry on 429 from the ledger API",
+    "OOMKilled",
+    "kubectl describe pod billing-7d9f - readiness probe failing on /healthz " * 20,
+]
+
+
+class _TokenEmbeddings(torch.nn.Module):
+    def __init__(self, auto_model, input_names):
+        super().__init__()
+        self.auto_model = auto_model
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        return self.auto_model(**dict(zip(self.input_names, inputs))).last_hidden_state
+
+
+def export(model_name: str, out_dir: str, quantize: bool) -> list:
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer, pooling = model[0], model[1]
+    if pooling.get_pooling_mode_str() != "mean":
+        raise SystemExit(f"{model_name} uses {pooling.get_pooling_mode_str()} pooling; only mean is supported")
+    normalize = any(type(module).__name__ == "Normalize" for module in model)
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = transformer.tokenizer
+    tokenizer.save_pretrained(out_dir)
+    dummy = tokenizer(["export"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in dummy]
+    axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["token_embeddings"]}
+    path = os.path.join(out_dir, "model.onnx")
+    torch.onnx.export(
+        _TokenEmbeddings(transformer.auto_model.eval(), input_names),
+        tuple(dummy[name] for name in input_names),
+        path,
+        input_names=input_names,
+        output_names=["token_embeddings"],
+        dynamic_axes=axes,
+        opset_version=17,
+    )
+    files = ["model.onnx"]
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(path, os.path.join(out_dir, "model_qint8.onnx"), weight_type=QuantType.QInt8)
+        files.append("model_qint8.onnx")
+
+    with open(os.path.join(out_dir, EXPORT_CONFIG), "w", encoding="utf-8") as f:
+        json.dump({
+            "model": model_name,
+            "pooling": "mean",
+            "normalize": normalize,
+            "max_seq_length": model.max_seq_length,
+            "pad_token_id": tokenizer.pad_token_id or 0,
+        }, f, indent=2)
+    return files
+
+
+def min_cosine(reference: np.ndarray, candidate: np.ndarray) -> float:
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return float(np.min(np.sum(reference * candidate, axis=1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=Config.EMBED_MODEL_NAME)
+    parser.add_argument("--out", default=Config.EMBED_ONNX_DIR)
+    parser.add_argument("--quantize", action="store_true", help="also write model_qint8.onnx")
+    args = parser.parse_args()
+
+    files = export(args.model, args.out, args.quantize)
+    reference = SentenceTransformer(args.model, device="cpu").encode(SAMPLE_TEXTS)
+    failed = False
+    for name in files:
+        cosine = min_cosine(reference, OnnxEmbedder(args.out, name).encode(SAMPLE_TEXTS))
+        ok = cosine >= COSINE_TOLERANCE[name]
+        failed |= not ok
+        print(f"{name:18} min cosine to torch {cosine:.5f}  (need >= {COSINE_TOLERANCE[name]})  "
+              f"{'ok' if ok else 'FAIL'}")
+    print(f"\nWrote {', '.join(files)} to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
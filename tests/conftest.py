@@ -2,14 +2,20 @@
 
 Sets test-mode env vars at COLLECTION time, before any test module can import
 api.config / api.pipeline / api.app - Config reads these once at import, so
-setting them inside a fixture would be too late for the module-level Chroma
-client pipeline.py creates on import.
+setting them inside a fixture would be too late even though pipeline.py only
+opens its Chroma client on first use.
 """
 import os
 import tempfile
 
 os.environ.setdefault("CHROMA_PATH", tempfile.mkdtemp(prefix="ghostkube-test-chroma-"))
+os.environ.setdefault("INGEST_MANIFEST_DIR", tempfile.mkdtemp(prefix="ghostkube-test-manifests-"))
+os.environ.setdefault("VECTOR_INDEX_DIR", tempfile.mkdtemp(prefix="ghostkube-test-vector-index-"))
 os.environ.setdefault("SYNTHESIS_ENABLED", "0")
+os.environ.setdefault("FEEDBACK_PATH", os.path.join(tempfile.mkdtemp(prefix="ghostkube-test-feedback-"), "feedback.jsonl"))
+os.environ.setdefault("POD_STATE_PATH", os.path.join(tempfile.mkdtemp(prefix="ghostkube-test-pod-state-"), "pod_state.jsonl"))
+os.environ.setdefault("SYNTHESIS_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="ghostkube-test-synthesis-"), "cache.db"))
+os.environ.setdefault("INGEST_JOBS_PATH", os.path.join(tempfile.mkdtemp(prefix="ghostkube-test-ingest-jobs-"), "jobs.db"))
 os.environ.setdefault("GROQ_RERANK_ENABLED", "0")
 os.environ.setdefault("RERANK_ENABLED", "0")
 os.environ.setdefault("INTENT_MODEL_ENABLED", "0")
@@ -0,0 +1,154 @@
+"""A local stand-in for api.github.com and raw.githubusercontent.com.
+
+Serves one synthetic repo through the three listing styles api/github_fetch.py
+understands (Contents API walk, recursive Git Trees, tarball) plus raw file
+downloads, and counts every request by kind. HEAD resolves to COMMIT_SHA, and
+raw files are only served at that commit - a download from "HEAD" 404s, as
+it would after a push. `latency_s` is added to each
+response to stand in for a real network round-trip - that is what makes the
+serialized per-directory walk measurably slow, exactly as it is against GitHub.
+"""
+import io
+import json
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+from api.github_fetch import git_blob_sha
+
+COMMIT_SHA = "c0ffee" + "0" * 34
+
+
+class FakeGitHub:
+    def __init__(self, owner: str, repo: str, files: dict[str, str], latency_s: float = 0.0):
+        self.owner, self.repo = owner, repo
+        self.files = files
+        self.latency_s = latency_s
+        self.counts = {"commits": 0, "contents": 0, "trees": 0, "tarball": 0, "raw": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            for key in self.counts:
+                self.counts[key] = 0
+
+    @property
+    def api_requests(self) -> int:
+        return sum(count for kind, count in self.counts.items() if kind != "raw")
+
+    def _count(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+    def _directory(self, path: str):
+        prefix = f"{path}/" if path else ""
+        entries = {}
+        for full_path in self.files:
+            if not full_path.startswith(prefix):
+                continue
+            head = full_path[len(prefix):].split("/", 1)[0]
+            child = prefix + head
+            kind = "file" if child in self.files else "dir"
+            entries[child] = {
+                "name": head,
+                "path": child,
+                "type": kind,
+                "sha": git_blob_sha(self.files[child].encode()) if kind == "file" else "",
+            }
+        return list(entries.values())
+
+    def _tree(self):
+        return {
+            "sha": "HEAD",
+            "truncated": False,
+            "tree": [
+                {"path": p, "type": "blob", "sha": git_blob_sha(t.encode())}
+                for p, t in self.files.items()
+            ],
+        }
+
+    def _tarball(self) -> bytes:
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for full_path, text in self.files.items():
+                data = text.encode()
+                info = tarfile.TarInfo(f"{self.owner}-{self.repo}-abc123/{full_path}")
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+    def _handler(self):
+        fake = self
+        repo_prefix = f"/repos/{fake.owner}/{fake.repo}"
+        raw_prefix = f"/{fake.owner}/{fake.repo}/{COMMIT_SHA}/"
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body: bytes, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                time.sleep(fake.latency_s)
+                path = unquote(urlparse(self.path).path)
+
+                if path.startswith(f"{repo_prefix}/commits/"):
+                    fake._count("commits")
+                    return self._send(200, COMMIT_SHA.encode(), "application/vnd.github.sha")
+                if path.startswith(f"{repo_prefix}/contents"):
+                    fake._count("contents")
+                    sub = path[len(f"{repo_prefix}/contents"):].strip("/")
+                    return self._send(200, json.dumps(fake._directory(sub)).encode())
+                if path.startswith(f"{repo_prefix}/git/trees/"):
+                    fake._count("trees")
+                    return self._send(200, json.dumps(fake._tree()).encode())
+                if path.startswith(f"{repo_prefix}/tarball"):
+                    fake._count("tarball")
+                    return self._send(200, fake._tarball(), "application/x-gzip")
+                if path.startswith(raw_prefix):
+                    fake._count("raw")
+                    text = fake.files.get(path[len(raw_prefix):])
+                    if text is None:
+                        return self._send(404, b"Not Found", "text/plain")
+                    return self._send(200, text.encode(), "text/plain; charset=utf-8")
+                return self._send(404, b"{}")
+
+        return Handler
+
+
+def synthetic_repo(dirs: int = 20, files_per_dir: int = 5) -> dict[str, str]:
+    """A nested repo with some noise the fetch filter must drop."""
+    files = {"README.md": "# Synthetic repo\n\nUsed to benchmark GitHub fetch modes.\n"}
+    for d in range(dirs):
+        for f in range(files_per_dir):
+            files[f"services/svc{d}/pkg/module_{f}.py"] = (
+                f"def handler_{d}_{f}():\n    return 'service {d} module {f}'\n" * 3
+            )
+        files[f"services/svc{d}/node_modules/dep/index.js"] = "module.exports = 1;\n"
+        files[f"services/svc{d}/logo.png"] = "not really a png"
+    # Needs quoting in a URL: unquoted, "#" and "?" would cut the path short.
+    files["docs/release notes #2 (100% done?).md"] = "# Release notes\n"
+    files["package-lock.json"] = "{}"
+    return files
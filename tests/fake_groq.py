@@ -0,0 +1,97 @@
+"""A local stand-in for Groq's OpenAI-compatible chat completions endpoint.
+
+Point the real `groq` client at it with Config.GROQ_BASE_URL = fake.url. It
+answers every completion with a one-line summary naming the first file in
+the prompt, adds `latency_s` to each response to stand in for the model's
+round-trip, and - like the free tier - answers 429 once more than
+`requests_per_minute` calls land in a sliding minute. Every request is
+counted and timestamped, so tests can assert on both how many Groq calls
+were made and how they were paced.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGroq:
+    def __init__(self, latency_s: float = 0.0, requests_per_minute: int | None = None):
+        self.latency_s = latency_s
+        self.requests_per_minute = requests_per_minute
+        self.completions = 0
+        self.rate_limited = 0
+        self.request_times: list = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _admit(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self.request_times.append(now)
+            recent = [t for t in self.request_times if t > now - 60]
+            if self.requests_per_minute is not None and len(recent) > self.requests_per_minute:
+                self.rate_limited += 1
+                return False
+            self.completions += 1
+            return True
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload: dict, headers=()):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if self.path.rstrip("/") != "/openai/v1/chat/completions":
+                    return self._send(404, {"error": {"message": f"no route {self.path}"}})
+                time.sleep(fake.latency_s)
+                if not fake._admit():
+                    # x-should-retry stops the client retrying on its own, so
+                    # every 429 is one call the caller saw fail.
+                    return self._send(
+                        429,
+                        {"error": {"message": "Rate limit reached: requests per minute", "type": "requests"}},
+                        headers=[("x-should-retry", "false")],
+                    )
+                prompt = request["messages"][-1]["content"]
+                subject = prompt.split("# ", 1)[1].split("\n", 1)[0] if "# " in prompt else "the code"
+                return self._send(200, {
+                    "id": f"chatcmpl-{fake.completions}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "fake"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": f"Summary of {subject}."},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                })
+
+        return Handler
@@ -37,11 +37,12 @@ def test_ingest_then_search_round_trip(monkeypatch):
 
     monkeypatch.setattr(pipeline.requests, "get", lambda *a, **kw: _FakeResponse())
 
-    ingest_response = client.post("/ingest", json={"url": "https://example.com/doc.py"})
+    ingest_response = client.post("/ingest?wait=true", json={"url": "https://example.com/doc.py"})
     assert ingest_response.status_code == 200
     ingest_body = ingest_response.json()
-    assert ingest_body["status"] == "success"
-    assert ingest_body["chunks_ingested"] >= 1
+    assert ingest_body["status"] == "succeeded"
+    assert ingest_body["result"]["status"] == "success"
+    assert ingest_body["result"]["chunks_ingested"] >= 1
 
     search_response = client.post("/ghost-note", json={"query": "hello world function"})
     assert search_response.status_code == 200
@@ -55,3 +56,39 @@ def test_ingest_malformed_url_returns_400():
 
     assert response.status_code == 400
     assert "error" in response.json()
+
+
+def test_ingest_returns_job_immediately_and_unknown_job_is_404(monkeypatch):
+    class _FakeResponse:
+        text = "def queued():\n    return 'a job that is polled rather than awaited'\n"
+
+        def raise_for_status(self):
+            pass
+
+    monkeypatch.setattr(pipeline.requests, "get", lambda *a, **kw: _FakeResponse())
+
+    response = client.post("/ingest", json={"url": "https://example.com/queued.py"})
+
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert pipeline.wait_for_ingest_job(job_id, timeout=30)["status"] == "succeeded"
+    assert client.get(f"/ingest/{job_id}").json()["result"]["status"] == "success"
+    assert client.get("/ingest/does-not-exist").status_code == 404
+
+
+def test_live_and_ready_after_warm_up():
+    assert client.get("/live").json() == {"status": "ok"}
+
+    pipeline.warm_up()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["ready"] and body["model_loaded"] and body["chroma_connected"]
+    assert body["warmup"]["error"] is None
+
+
+def test_ready_is_503_until_the_model_is_loaded(monkeypatch):
+    monkeypatch.setattr(pipeline, "_embedding_model", None)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["model_loaded"] is False
@@ -1,4 +1,6 @@
-from api.chunking import CHUNK_SIZE, MIN_BODY_CHARS, FILE_HEADER, chunk_file, chunk_repo_document
+from api.chunking import (
+    CHUNK_SIZE, MIN_BODY_CHARS, FILE_HEADER, chunk_file, chunk_repo_document, file_block,
+)
 
 
 def test_chunk_file_below_min_body_chars_is_dropped():
@@ -58,3 +60,15 @@ def test_chunk_repo_document_skips_near_empty_file():
 
     assert "empty.py" in skipped
     assert all(m["path"] != "empty.py" for m in metadatas)
+
+
+def test_file_block_matches_block_cut_from_scraped_document():
+    body = "def handler():\n    return 'streamed and scraped agree'\n" * 40
+    document = "# Repository: acme/mono\n\n"
+    for path in ("src/a.py", "src/b.py"):
+        document += f"\n{FILE_HEADER}{path}\n{body}\n\n"
+
+    doc_chunks, _, _ = chunk_repo_document(document)
+    streamed, _ = chunk_file("src/a.py", file_block("src/a.py", body))
+
+    assert streamed == doc_chunks[:len(streamed)]
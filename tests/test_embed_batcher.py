@@ -0,0 +1,70 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from api.embed_batcher import EmbeddingBatcher
+
+
+def _recording_encoder(delay_s=0.0):
+    batches = []
+
+    def encode(texts):
+        batches.append(list(texts))
+        time.sleep(delay_s)
+        return [[float(len(t)), float(i)] for i, t in enumerate(texts)]
+
+    return encode, batches
+
+
+def test_concurrent_queries_share_one_encode_and_get_their_own_vector():
+    encode, batches = _recording_encoder(delay_s=0.02)
+    batcher = EmbeddingBatcher(encode, window_s=0.05, max_batch=64)
+    texts = [f"query number {i:03d}" + "x" * i for i in range(20)]
+    barrier = threading.Barrier(len(texts))
+
+    def search(text):
+        barrier.wait()
+        return text, batcher.encode(text)
+
+    with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+        results = list(pool.map(search, texts))
+
+    assert len(batches) < len(texts)
+    for text, vector in results:
+        assert vector[0] == float(len(text))
+    assert batcher.stats()["queries"] == len(texts)
+
+
+def test_batches_never_exceed_max_batch():
+    encode, batches = _recording_encoder(delay_s=0.01)
+    batcher = EmbeddingBatcher(encode, window_s=0.05, max_batch=4)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(batcher.encode, [f"q{i}" for i in range(16)]))
+
+    assert max(len(b) for b in batches) <= 4
+    assert batcher.stats()["largest_batch"] <= 4
+
+
+def test_max_batch_one_encodes_inline():
+    encode, batches = _recording_encoder()
+    batcher = EmbeddingBatcher(encode, window_s=0.05, max_batch=1)
+
+    assert batcher.encode("solo") == [4.0, 0.0]
+    assert batches == [["solo"]]
+    assert batcher._thread is None
+
+
+def test_encode_failure_reaches_every_caller_in_the_batch():
+    def broken(texts):
+        raise RuntimeError("model exploded")
+
+    batcher = EmbeddingBatcher(broken, window_s=0.01, max_batch=8)
+
+    with pytest.raises(RuntimeError, match="model exploded"):
+        batcher.encode("q")
+    # The batcher thread survives a failed batch.
+    with pytest.raises(RuntimeError):
+        batcher.encode("q again")
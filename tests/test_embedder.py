@@ -0,0 +1,146 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from api import embedder
+from api.embedder import OnnxEmbedder
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IS_CI = os.getenv("CI", "").lower() in ("1", "true", "yes")
+VOCAB = ["[PAD]", "[UNK]", "pod", "crash", "loop", "auth", "service", "ledger", "retry"]
+DIM = 8
+
+
+def _write_export(directory, normalize=True):
+    tokenizers = pytest.importorskip("tokenizers")
+    tokenizer = tokenizers.Tokenizer(
+        tokenizers.models.WordLevel({word: i for i, word in enumerate(VOCAB)}, unk_token="[UNK]")
+    )
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tokenizer.save(str(directory / "tokenizer.json"))
+    (directory / "model.onnx").write_bytes(b"")
+    (directory / embedder.EXPORT_CONFIG).write_text(json.dumps({
+        "model": "fake", "pooling": "mean", "normalize": normalize, "max_seq_length": 16, "pad_token_id": 0,
+    }))
+
+
+class _FakeSession:
+    """Stands in for onnxruntime.InferenceSession: token embedding = a fixed
+    row per token ID, so pooling is the only thing under test.
+    """
+    table = np.random.default_rng(0).standard_normal((len(VOCAB), DIM)).astype(np.float32)
+
+    def __init__(self, *_args, **_kwargs):
+        pass
+
+    def get_inputs(self):
+        return [type("Input", (), {"name": n})() for n in ("input_ids", "attention_mask")]
+
+    def get_outputs(self):
+        return [type("Output", (), {"shape": ["batch", "sequence", DIM]})()]
+
+    def run(self, _outputs, feeds):
+        return [self.table[feeds["input_ids"]]]
+
+
+def _reference(text):
+    ids = [VOCAB.index(w) if w in VOCAB else 1 for w in text.split()]
+    vector = _FakeSession.table[ids].mean(axis=0)
+    return vector / np.linalg.norm(vector)
+
+
+def test_onnx_embedder_mean_pools_unpadded_tokens(tmp_path, monkeypatch):
+    onnxruntime = pytest.importorskip("onnxruntime")
+    monkeypatch.setattr(onnxruntime, "InferenceSession", _FakeSession)
+    _write_export(tmp_path)
+    model = OnnxEmbedder(str(tmp_path))
+
+    single = model.encode("pod crash")
+    assert single.shape == (DIM,)
+    np.testing.assert_allclose(single, _reference("pod crash"), atol=1e-6)
+
+    # Batched with longer texts, a short text's padding must not leak into its
+    # mean, and results come back in input order despite length sorting.
+    texts = ["pod crash", "auth service crash loop retry", "ledger", "unknown words here"]
+    batch = model.encode(texts, batch_size=3)
+    assert batch.shape == (4, DIM)
+    for text, vector in zip(texts, batch):
+        np.testing.assert_allclose(vector, _reference(text), atol=1e-6)
+    assert model.encode([]).shape == (0, DIM)
+
+
+def test_onnx_backend_falls_back_to_torch_without_an_export(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedder.Config, "EMBED_BACKEND", "onnx")
+    monkeypatch.setattr(embedder.Config, "EMBED_ONNX_DIR", str(tmp_path / "missing"))
+    model = embedder.load_embedder()
+    assert not isinstance(model, OnnxEmbedder)
+    assert len(model.encode("pod crash")) == 384
+
+
+def _export(out_dir):
+    pytest.importorskip("torch")
+    pytest.importorskip("onnxruntime")
+    result = subprocess.run(
+        [sys.executable, "scripts/export_onnx.py", "--out", str(out_dir), "--quantize"],
+        cwd=ROOT, capture_output=True, text=True, timeout=900,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result.stdout
+
+
+# The ONNX vectors must be usable against an index embedded by the torch
+# model - that is what lets EMBED_BACKEND switch without a re-ingest.
+def test_onnx_export_matches_torch_within_tolerance(tmp_path):
+    print(_export(tmp_path))
+    from sentence_transformers import SentenceTransformer
+
+    sys.path.insert(0, os.path.join(ROOT, "scripts"))
+    from export_onnx import COSINE_TOLERANCE, SAMPLE_TEXTS, min_cosine
+
+    reference = SentenceTransformer(embedder.Config.EMBED_MODEL_NAME, device="cpu").encode(SAMPLE_TEXTS)
+    for name, tolerance in COSINE_TOLERANCE.items():
+        assert min_cosine(reference, OnnxEmbedder(str(tmp_path), name).encode(SAMPLE_TEXTS)) >= tolerance
+
+
+_BENCH = """
+import json, resource, sys, time
+from api.embedder import load_embedder
+texts = [f"pod {i} CrashLoopBackOff after rollout of auth-service revision {i}" for i in range(200)]
+model = load_embedder()
+model.encode(texts[:4])
+single = []
+for text in texts[:50]:
+    start = time.perf_counter(); model.encode(text); single.append(time.perf_counter() - start)
+start = time.perf_counter()
+for i in range(0, len(texts), 50):
+    model.encode(texts[i:i + 50])
+throughput = len(texts) / (time.perf_counter() - start)
+print(json.dumps({"p50_ms": sorted(single)[25] * 1000, "texts_per_s": throughput,
+                  "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+# Benchmark, not a gate: single-query p50, 50-text batch throughput and peak
+# RSS of each backend, each in a fresh process so one backend's imports don't
+# count against another's RSS. Needs the real model (and an export, made
+# here); opt in with RUN_EMBED_BENCH=1 and run with `pytest -s`.
+@pytest.mark.skipif(IS_CI or not os.getenv("RUN_EMBED_BENCH"), reason="set RUN_EMBED_BENCH=1; not on shared CI")
+def test_embedder_backends_benchmark(tmp_path):
+    _export(tmp_path)
+    for label, env in [
+        ("torch", {"EMBED_BACKEND": "torch"}),
+        ("onnx fp32", {"EMBED_BACKEND": "onnx", "EMBED_ONNX_FILE": "model.onnx"}),
+        ("onnx qint8", {"EMBED_BACKEND": "onnx", "EMBED_ONNX_FILE": "model_qint8.onnx"}),
+    ]:
+        result = subprocess.run(
+            [sys.executable, "-c", _BENCH], cwd=ROOT, capture_output=True, text=True, timeout=600,
+            env={**os.environ, "EMBED_ONNX_DIR": str(tmp_path), **env},
+        )
+        assert result.returncode == 0, result.stderr
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"\n{label:11} single p50={stats['p50_ms']:.1f}ms  batch={stats['texts_per_s']:.0f} texts/s  "
+              f"peak RSS={stats['peak_rss_mb']:.0f}MB")
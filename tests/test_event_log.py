@@ -0,0 +1,243 @@
+import gzip
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import pipeline
+from api.app import app
+from api.config import Config
+from api.event_log import EventLog, open_segment, segments
+from api.feedback_counts import FeedbackCounts
+
+IS_CI = os.getenv("CI", "").lower() in ("1", "true", "yes")
+
+client = TestClient(app)
+
+
+def _record(i, pad=0):
+    return json.dumps({"i": i, "pad": "x" * pad})
+
+
+def _read_all(path):
+    """Every line of the log, rotated segments first."""
+    lines = []
+    for name in segments(path):
+        with open_segment(name) as f:
+            lines.extend(f.read().decode().splitlines())
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            lines.extend(f.read().splitlines())
+    return lines
+
+
+def test_appends_are_buffered_and_written_as_one_batch(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    log = EventLog(path, flush_interval_s=60)
+    for i in range(100):
+        log.append(_record(i))
+    assert not os.path.exists(path) or os.path.getsize(path) == 0
+
+    log.flush()
+    assert [json.loads(line)["i"] for line in _read_all(path)] == list(range(100))
+    assert log.stats()["batches"] == 1
+
+
+def test_a_batch_goes_once_full_or_once_the_interval_is_up(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    log = EventLog(path, flush_bytes=1024, flush_interval_s=0.05)
+    log.append(_record(0))
+    time.sleep(0.3)
+    assert len(_read_all(path)) == 1
+
+    slow = EventLog(str(tmp_path / "full.jsonl"), flush_bytes=1024, flush_interval_s=60)
+    for i in range(20):
+        slow.append(_record(i, pad=100))
+    deadline = time.monotonic() + 5
+    while slow.stats()["records"] < 8 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert slow.stats()["records"] >= 8
+
+
+def test_waiting_appends_are_on_disk_when_they_return_and_share_batches(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    log = EventLog(path, flush_interval_s=60)
+    threads = [threading.Thread(target=log.append, args=(_record(i),), kwargs={"wait": True}) for i in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(json.loads(line)["i"] for line in _read_all(path)) == list(range(50))
+    assert log.stats()["batches"] <= 50
+
+
+def test_a_torn_tail_is_terminated_not_glued_to_the_next_record(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(_record(0) + "\n" + '{"i": 1, "pa')
+    log = EventLog(path)
+    log.append(_record(2), wait=True)
+
+    assert _read_all(path) == [_record(0), '{"i": 1, "pa', _record(2)]
+    with pytest.raises(ValueError):
+        log.append("two\nlines")
+    with pytest.raises(ValueError):
+        EventLog(path, fsync="sometimes")
+
+
+def test_rotates_into_gzipped_segments_and_keeps_the_newest(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    log = EventLog(path, max_bytes=2000, fsync="rotate")
+    for i in range(200):
+        log.append(_record(i, pad=50), wait=True)
+
+    names = segments(path)
+    assert len(names) >= 5 and all(name.endswith(".gz") for name in names)
+    assert [json.loads(line)["i"] for line in _read_all(path)] == list(range(200))
+    with gzip.open(names[0]) as f:
+        assert f.read().endswith(b"\n")
+
+    pruned = EventLog(str(tmp_path / "pruned.jsonl"), max_bytes=2000, keep=2)
+    for i in range(200):
+        pruned.append(_record(i, pad=50), wait=True)
+    assert len(segments(pruned.path)) == 2
+
+
+def test_a_second_writer_follows_the_rotation(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    rotating = EventLog(path, max_bytes=500)
+    other = EventLog(path, max_bytes=0)
+    other.append(_record(0), wait=True)
+    for i in range(1, 11):
+        rotating.append(_record(i, pad=50), wait=True)
+    other.append(_record(11), wait=True)
+
+    assert segments(path)
+    with open(path, encoding="utf-8") as f:
+        assert json.loads(f.read().splitlines()[-1])["i"] == 11
+    assert sorted(json.loads(line)["i"] for line in _read_all(path)) == list(range(12))
+
+
+def _write_from_process(path, worker):
+    log = EventLog(path, flush_bytes=16 * 1024, max_bytes=256 * 1024)
+    for i in range(500):
+        log.append(json.dumps({"worker": worker, "i": i, "pad": "y" * 700}))
+    log.flush()
+
+
+def test_workers_sharing_one_log_never_interleave_lines(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    processes = [multiprocessing.get_context("fork").Process(target=_write_from_process, args=(path, w))
+                 for w in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    records = [json.loads(line) for line in _read_all(path)]
+    assert len(records) == 2000
+    for worker in range(4):
+        assert [r["i"] for r in records if r["worker"] == worker] == list(range(500))
+
+
+def test_feedback_counts_follow_the_log_across_rotations(tmp_path):
+    path = str(tmp_path / "feedback.jsonl")
+    log = EventLog(path, max_bytes=600)
+    counts = FeedbackCounts(path)
+    for i in range(60):
+        log.append(json.dumps({"chunk_id": f"c{i % 3}", "query": "q", "rating": "up" if i % 4 else "down"}),
+                   wait=True)
+        if i % 7 == 0:
+            counts.totals()
+
+    assert len(segments(path)) >= 3
+    assert counts.totals() == {"total_up": 45, "total_down": 15}
+    assert FeedbackCounts(path).for_chunks(["c0", "c1", "c2"]) == counts.for_chunks(["c0", "c1", "c2"])
+
+
+def test_a_gzipped_rotation_is_followed_without_a_rebuild(tmp_path, monkeypatch):
+    path = str(tmp_path / "feedback.jsonl")
+    log = EventLog(path, max_bytes=600, compress=True)
+    counts = FeedbackCounts(path)
+    counts.load()  # the one full read, with no checkpoint yet
+    rebuilds = []
+    rebuild = counts._rebuild
+    monkeypatch.setattr(counts, "_rebuild", lambda: rebuilds.append(1) or rebuild())
+    for i in range(60):
+        log.append(json.dumps({"chunk_id": "c0", "query": "q", "rating": "up"}), wait=True)
+        counts.totals()
+
+    assert len(segments(path)) >= 3 and all(name.endswith(".gz") for name in segments(path))
+    assert counts.totals() == {"total_up": 60, "total_down": 0}
+    assert rebuilds == []
+
+    # Replaced outright - no segment to account for it - is still re-read.
+    os.unlink(path)
+    log.append(json.dumps({"chunk_id": "c0", "query": "q", "rating": "down"}), wait=True)
+    counts.totals()
+    assert rebuilds == [1]
+
+
+def test_pod_state_heartbeats_are_buffered_then_flushed():
+    body = {"pod": "api-7f9c", "namespace": "default", "ghost_note_id": "svc:api", "status": "Running",
+            "ts": "2026-10-18T12:00:00Z"}
+    assert client.post("/pod-state", json=body).json() == {"recorded": True}
+
+    pipeline.flush_event_logs()
+    with open(Config.POD_STATE_PATH, encoding="utf-8") as f:
+        written = json.loads(f.read().splitlines()[-1])
+    assert written.pop("received_at") and written == body
+
+
+# Benchmark, not a gate: heartbeat-sized records appended from 16 threads,
+# one open/write/close per record (the old /pod-state) versus the buffered
+# writer. Run with `pytest -s` to see the numbers.
+@pytest.mark.skipif(IS_CI, reason="timing benchmark; not meaningful on shared CI runners")
+def test_event_log_throughput_benchmark(tmp_path):
+    record = json.dumps({"ghost_note_id": "svc:api", "pod": "api-7f9c-x2x9z", "namespace": "default",
+                         "status": "Running", "ts": "2026-10-18T12:00:00Z"})
+    per_thread, threads = 2000, 16
+
+    def per_request(path):
+        for _ in range(per_thread):
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(record + "\n")
+
+    def run(target, path):
+        workers = [threading.Thread(target=target, args=(path,)) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return per_thread * threads / (time.perf_counter() - start)
+
+    baseline = run(per_request, str(tmp_path / "per_request.jsonl"))
+    log = EventLog(str(tmp_path / "buffered.jsonl"))
+
+    def buffered(_path):
+        for _ in range(per_thread):
+            log.append(record)
+
+    buffered_rate = run(buffered, log.path)
+    log.flush()
+    feedback_log = EventLog(str(tmp_path / "waited.jsonl"))
+
+    def waited(_path):
+        for _ in range(per_thread // 10):
+            feedback_log.append(record, wait=True)
+
+    waited_rate = run(waited, feedback_log.path) / 10
+
+    assert len(_read_all(log.path)) == per_thread * threads
+    print(f"\n{per_thread * threads} records from {threads} threads: {baseline:,.0f}/s open-per-request, "
+          f"{buffered_rate:,.0f}/s buffered ({log.stats()['batches']} writes), "
+          f"{waited_rate:,.0f}/s waiting on each write ({feedback_log.stats()['batches']} writes "
+          f"for {per_thread // 10 * threads})")
+    assert buffered_rate > baseline
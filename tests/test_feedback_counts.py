@@ -0,0 +1,191 @@
+import json
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import pipeline
+from api.app import app
+from api.config import Config
+from api.event_log import EventLog
+from api.feedback_counts import FeedbackCounts
+
+IS_CI = os.getenv("CI", "").lower() in ("1", "true", "yes")
+
+client = TestClient(app)
+
+
+def _event(chunk_id="c1", query="how do retries work", rating="up"):
+    return json.dumps({"chunk_id": chunk_id, "query": query, "rating": rating}) + "\n"
+
+
+def _append(path, *lines):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(lines))
+
+
+@pytest.fixture
+def feedback(tmp_path, monkeypatch):
+    path = str(tmp_path / "feedback.jsonl")
+    monkeypatch.setattr(Config, "FEEDBACK_PATH", path)
+    monkeypatch.setattr(pipeline, "_feedback", FeedbackCounts(path))
+    monkeypatch.setattr(pipeline, "_feedback_log", EventLog(path))
+    return path
+
+
+def test_counts_per_chunk_and_per_query(tmp_path):
+    path = str(tmp_path / "feedback.jsonl")
+    _append(path, _event(), _event(rating="down"), _event("c2", "  how do   retries work "),
+            _event("c2", "other"), "not json\n", "\n")
+    counts = FeedbackCounts(path)
+
+    assert counts.totals() == {"total_up": 3, "total_down": 1}
+    assert counts.for_chunks(["c1", "c2", "c3"]) == [(1, 1), (2, 0), (0, 0)]
+    assert counts.for_query("how do retries work") == (2, 1)
+    assert counts.for_query("never asked") == (0, 0)
+
+
+def test_a_line_still_being_written_is_counted_once_complete(tmp_path):
+    path = str(tmp_path / "feedback.jsonl")
+    line = _event()
+    _append(path, _event("c0"), line[:10])
+    counts = FeedbackCounts(path)
+    assert counts.totals()["total_up"] == 1
+
+    _append(path, line[10:])
+    assert counts.totals()["total_up"] == 2
+    assert counts.for_chunk("c1") == (1, 0)
+
+
+def test_picks_up_appends_from_another_writer(tmp_path):
+    path = str(tmp_path / "feedback.jsonl")
+    counts = FeedbackCounts(path)
+    assert counts.totals() == {"total_up": 0, "total_down": 0}
+
+    # Another API worker appending to the same log.
+    _append(path, _event(), _event(rating="down"))
+    assert counts.totals() == {"total_up": 1, "total_down": 1}
+
+
+def test_checkpoint_plus_tail_matches_a_full_recount(tmp_path):
+    path = str(tmp_path / "feedback.jsonl")
+    _append(path, *[_event(f"c{i % 3}", f"q{i % 2}", "up" if i % 4 else "down") for i in range(25)])
+    FeedbackCounts(path, checkpoint_every=10).load()
+    assert os.path.exists(path + ".counts.json")
+    _append(path, _event("c9"), _event("c0", rating="down"))
+
+    resumed = FeedbackCounts(path, checkpoint_every=10)
+    full = FeedbackCounts(path, checkpoint_every=0)
+    for counts in (resumed, full):
+        counts.load()
+    assert resumed._offset == full._offset == os.path.getsize(path)
+    assert resumed.totals() == full.totals()
+    assert resumed.for_chunks(["c0", "c1", "c2", "c9"]) == full.for_chunks(["c0", "c1", "c2", "c9"])
+    assert resumed.for_query("q0") == full.for_query("q0")
+
+
+def test_a_replaced_log_is_recounted(tmp_path):
+    path = str(tmp_path / "feedback.jsonl")
+    _append(path, *[_event() for _ in range(5)])
+    counts = FeedbackCounts(path, checkpoint_every=1)
+    assert counts.totals()["total_up"] == 5
+
+    os.replace(_write_new(tmp_path, _event("c2", rating="down")), path)
+    assert counts.totals() == {"total_up": 0, "total_down": 1}
+    # The stale checkpoint isn't trusted by a fresh process either.
+    assert FeedbackCounts(path).for_chunks(["c1", "c2"]) == [(0, 0), (0, 1)]
+
+
+def _write_new(tmp_path, *lines):
+    new = str(tmp_path / "feedback.new")
+    _append(new, *lines)
+    return new
+
+
+def test_post_feedback_returns_the_chunk_and_query_counts(feedback):
+    _append(feedback, _event("c1", "retries", "down"))
+    body = client.post("/feedback", json={"chunk_id": "c1", "query": "retries", "rating": "up"}).json()
+    assert body == {"recorded": True, "total_up": 1, "total_down": 1,
+                    "chunk_votes": {"up": 1, "down": 1}, "query_votes": {"up": 1, "down": 1}}
+
+    assert client.get("/feedback/summary").json()["chunk_votes"] is None
+    assert client.get("/feedback/summary?chunk_id=c1").json()["chunk_votes"] == {"up": 1, "down": 1}
+    assert client.get("/feedback/summary?query=nope").json()["query_votes"] == {"up": 0, "down": 0}
+
+
+def test_feedback_ranking_lifts_a_well_rated_chunk_only_past_close_ones(feedback, monkeypatch):
+    monkeypatch.setattr(Config, "FEEDBACK_RANKING_ENABLED", True)
+    candidates = [("closest", {"path": "a.py"}, 0.50), ("close", {"path": "b.py"}, 0.55),
+                  ("far", {"path": "c.py"}, 0.90)]
+    assert [doc for doc, _meta, _dist in pipeline.rank_by_feedback(candidates)] == ["closest", "close", "far"]
+
+    _append(feedback, *[_event(pipeline.get_chunk_id(doc)) for doc in ("close", "far") for _ in range(10)])
+    ranked = pipeline.rank_by_feedback(candidates)
+    assert [doc for doc, _meta, _dist in ranked] == ["close", "closest", "far"]
+    assert ranked[1] == candidates[0]  # unrated: distance untouched
+
+    _append(feedback, *[_event(pipeline.get_chunk_id("closest"), rating="down") for _ in range(3)])
+    assert pipeline.rank_by_feedback(candidates)[1][2] > 0.50  # pushed further away
+
+
+def test_a_new_rating_retires_cached_searches_only_with_feedback_ranking(feedback, monkeypatch):
+    key = pipeline._search_cache_key("retries", 5, None)
+    _append(feedback, _event())
+    assert pipeline._search_cache_key("retries", 5, None) == key
+
+    monkeypatch.setattr(Config, "FEEDBACK_RANKING_ENABLED", True)
+    key = pipeline._search_cache_key("retries", 5, None)
+    assert pipeline._search_cache_key("retries", 5, None) == key
+    _append(feedback, _event())
+    assert pipeline._search_cache_key("retries", 5, None) != key
+
+
+# Benchmark, not a gate: the cost of one POST /feedback's counting against a
+# million-event log, re-parsing the whole file (as before) versus reading its
+# tail, and of a cold start with and without the checkpoint. Writes ~70MB to
+# tmp, so opt in with RUN_FEEDBACK_BENCH=1; run with `pytest -s` for numbers.
+@pytest.mark.skipif(IS_CI or not os.getenv("RUN_FEEDBACK_BENCH"),
+                    reason="set RUN_FEEDBACK_BENCH=1 to run; timing benchmark, not meaningful on CI")
+def test_feedback_counting_benchmark(tmp_path):
+    path = str(tmp_path / "feedback.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(1_000_000):
+            f.write(_event(f"chunk-{i % 5000}", f"query {i % 2000}", "up" if i % 3 else "down"))
+
+    def full_scan():
+        up = down = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                rating = json.loads(line).get("rating")
+                up += rating == "up"
+                down += rating == "down"
+        return up, down
+
+    start = time.perf_counter()
+    full_scan()
+    scan_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    FeedbackCounts(path, checkpoint_every=0).load()
+    cold_s = time.perf_counter() - start
+
+    checkpointed = FeedbackCounts(path, checkpoint_every=1)
+    checkpointed.load()
+    _append(path, *[_event("chunk-1") for _ in range(100)])
+    start = time.perf_counter()
+    resumed = FeedbackCounts(path, checkpoint_every=0)
+    resumed.load()
+    resume_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(100):
+        _append(path, _event("chunk-1"))
+        resumed.for_chunk("chunk-1")
+    per_post_s = (time.perf_counter() - start) / 100
+
+    print(f"\n1M events: full re-parse {scan_s * 1000:.0f}ms per POST before, "
+          f"{per_post_s * 1000:.2f}ms now; cold start {cold_s * 1000:.0f}ms, "
+          f"{resume_s * 1000:.0f}ms from a checkpoint")
+    assert per_post_s < scan_s / 100
+    assert resumed.totals()["total_up"] == full_scan()[0]
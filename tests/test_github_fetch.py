@@ -0,0 +1,121 @@
+import os
+import time
+
+import pytest
+
+from api import github_fetch
+from tests.fake_github import FakeGitHub, synthetic_repo
+
+IS_CI = os.getenv("CI", "").lower() in ("1", "true", "yes")
+
+
+@pytest.fixture
+def fake_github(monkeypatch):
+    with FakeGitHub("acme", "mono", synthetic_repo()) as fake:
+        monkeypatch.setattr(github_fetch, "GITHUB_API_URL", fake.url)
+        monkeypatch.setattr(github_fetch, "GITHUB_RAW_URL", fake.url)
+        yield fake
+
+
+def _fetch(mode, skipped=None):
+    return list(github_fetch.iter_repo_files("acme", "mono", headers={}, mode=mode, skipped=skipped))
+
+
+def _expected_paths(files):
+    return {p for p in files if github_fetch.is_wanted(p)}
+
+
+@pytest.mark.parametrize("mode", github_fetch.FETCH_MODES)
+def test_every_mode_yields_the_same_filtered_files(fake_github, mode):
+    results = _fetch(mode)
+
+    assert {path for path, _sha, _text in results} == _expected_paths(fake_github.files)
+    for path, sha, text in results:
+        assert text == fake_github.files[path]
+        assert sha == github_fetch.git_blob_sha(text.encode())
+
+
+def test_trees_mode_lists_the_repo_in_one_api_call(fake_github):
+    skipped = []
+
+    _fetch("trees", skipped)
+
+    # Pinning HEAD to a commit first; the listing itself is one call.
+    assert fake_github.counts["commits"] == 1
+    assert fake_github.counts["trees"] == 1
+    assert fake_github.counts["contents"] == 0
+    assert fake_github.counts["raw"] == len(_expected_paths(fake_github.files))
+    # Filtered in memory from the listing - ignored files are never downloaded.
+    assert "package-lock.json" in skipped
+    assert any("node_modules" in p for p in skipped)
+
+
+def test_tarball_mode_is_a_single_request(fake_github):
+    _fetch("tarball")
+
+    assert fake_github.counts == {"commits": 0, "contents": 0, "trees": 0, "tarball": 1, "raw": 0}
+
+
+def test_truncated_tree_falls_back_to_tarball(fake_github, monkeypatch):
+    def truncated(*args, **kwargs):
+        raise github_fetch.TreeTruncated("acme/mono")
+
+    monkeypatch.setattr(github_fetch, "list_tree", truncated)
+
+    results = _fetch("trees")
+
+    assert {path for path, _sha, _text in results} == _expected_paths(fake_github.files)
+    assert fake_github.counts["tarball"] == 1
+
+
+def test_unknown_mode_is_rejected(fake_github):
+    with pytest.raises(ValueError):
+        _fetch("svn")
+
+
+def test_a_push_mid_ingest_does_not_mix_commits(fake_github):
+    # Raw files are only served at the resolved commit, never at "HEAD".
+    results = _fetch("trees")
+
+    assert fake_github.counts["raw"] == len(results)
+    assert "docs/release notes #2 (100% done?).md" in {path for path, _sha, _text in results}
+
+
+def _run_modes(latency_s=0.0):
+    with FakeGitHub("acme", "mono", synthetic_repo(dirs=40), latency_s=latency_s) as fake:
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(github_fetch, "GITHUB_API_URL", fake.url)
+            mp.setattr(github_fetch, "GITHUB_RAW_URL", fake.url)
+            timings, api_calls = {}, {}
+            for mode in github_fetch.FETCH_MODES:
+                fake.reset_counts()
+                start = time.perf_counter()
+                _fetch(mode)
+                timings[mode] = time.perf_counter() - start
+                api_calls[mode] = fake.api_requests
+    return timings, api_calls
+
+
+def test_api_calls_per_mode_against_contents_walk():
+    _timings, api_calls = _run_modes()
+
+    assert api_calls["trees"] == 2  # resolve the commit, list the tree
+    assert api_calls["tarball"] == 1
+    assert api_calls["contents"] > 80
+
+
+# Benchmark against the legacy walk. Every fake response carries a simulated
+# network round-trip, so the numbers track API round-trips rather than local
+# CPU. Wall-clock orderings are noisy even locally, so opt-in: set
+# RUN_FETCH_BENCH=1 (and never on shared CI runners).
+@pytest.mark.skipif(IS_CI or not os.getenv("RUN_FETCH_BENCH"),
+                    reason="wall-clock benchmark; set RUN_FETCH_BENCH=1 to run it locally")
+def test_benchmark_trees_and_tarball_against_contents_walk():
+    timings, api_calls = _run_modes(latency_s=0.01)
+
+    print("\nGitHub fetch benchmark (40 dirs, 10ms simulated RTT):")
+    for mode in github_fetch.FETCH_MODES:
+        print(f"  {mode:9} {timings[mode] * 1000:8.1f} ms  {api_calls[mode]:4d} API request(s)")
+
+    assert timings["trees"] < timings["contents"]
+    assert timings["tarball"] < timings["contents"]
@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from api.ingest_jobs import IngestJobQueue, QueueFull
+
+
+def _ok(chunks=3):
+    return {"status": "success", "chunks_ingested": chunks, "total_characters": 10, "message": "ok"}
+
+
+def test_job_reports_progress_and_result():
+    def run(url, source_type, metadata, progress):
+        progress(files_fetched=2)
+        progress(phase="embedding", chunks_total=3)
+        progress(chunks_embedded=3)
+        return _ok()
+
+    jobs = IngestJobQueue(run, workers=1, max_queued=4, history=10)
+    job, coalesced = jobs.submit("https://github.com/acme/a", "repo", None)
+
+    assert coalesced is False
+    assert job["status"] == "queued"
+    done = jobs.wait(job["job_id"], timeout=5)
+    assert done["status"] == "succeeded"
+    assert done["phase"] == "done"
+    assert done["files_fetched"] == 2
+    assert done["chunks_embedded"] == done["chunks_total"] == 3
+    assert done["eta_s"] == 0.0
+    assert done["result"]["chunks_ingested"] == 3
+
+
+def test_duplicate_submission_coalesces_into_running_job():
+    release = threading.Event()
+    calls = []
+
+    def run(url, source_type, metadata, progress):
+        calls.append((url, source_type))
+        release.wait(5)
+        return _ok()
+
+    jobs = IngestJobQueue(run, workers=1, max_queued=4, history=10)
+    first, _ = jobs.submit("https://github.com/acme/a", "repo", None)
+    second, coalesced = jobs.submit("https://github.com/acme/a", "repo", None)
+    other, other_coalesced = jobs.submit("https://github.com/acme/a", "pr", None)
+    release.set()
+    jobs.wait(first["job_id"], timeout=5)
+    jobs.wait(other["job_id"], timeout=5)
+
+    assert coalesced is True
+    assert second["job_id"] == first["job_id"]
+    assert other_coalesced is False
+    assert calls == [("https://github.com/acme/a", "repo"), ("https://github.com/acme/a", "pr")]
+
+
+def test_full_queue_rejects_new_jobs():
+    release = threading.Event()
+    started = threading.Event()
+
+    def run(url, source_type, metadata, progress):
+        started.set()
+        release.wait(5)
+        return _ok()
+
+    jobs = IngestJobQueue(run, workers=1, max_queued=1, history=10)
+    jobs.submit("https://example.com/running", "repo", None)
+    assert started.wait(5)
+    jobs.submit("https://example.com/queued", "repo", None)
+
+    with pytest.raises(QueueFull):
+        jobs.submit("https://example.com/overflow", "repo", None)
+    release.set()
+
+
+def test_crashed_ingest_marks_job_failed():
+    def run(url, source_type, metadata, progress):
+        raise RuntimeError("boom")
+
+    jobs = IngestJobQueue(run, workers=1, max_queued=4, history=10)
+    job, _ = jobs.submit("https://example.com/x", "repo", None)
+
+    done = jobs.wait(job["job_id"], timeout=5)
+    assert done["status"] == "failed"
+    assert "boom" in done["result"]["message"]
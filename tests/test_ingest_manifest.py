@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from api import github_fetch, ingest_manifest, pipeline
+from api.config import Config
+from tests.fake_github import FakeGitHub, synthetic_repo
+
+
+@pytest.fixture
+def manifest_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "INGEST_MANIFEST_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_plan_sync_first_ingest_writes_everything():
+    files, changed, stale = ingest_manifest.plan_sync(
+        None, {"a.py": ["a1"], "b.py": ["b1", "b2"]}, fetched={"a.py", "b.py"},
+        listed={"a.py": "sha-a", "b.py": "sha-b"},
+    )
+
+    assert changed == {"a.py", "b.py"}
+    assert stale == set()
+    assert files["b.py"] == {"sha": "sha-b", "chunk_ids": ["b1", "b2"]}
+
+
+def test_plan_sync_touches_only_changed_and_removed_files():
+    previous = {
+        "same.py": {"sha": "s1", "chunk_ids": ["same1"]},
+        "edit.py": {"sha": "e1", "chunk_ids": ["edit-keep", "edit-old"]},
+        "gone.py": {"sha": "g1", "chunk_ids": ["gone1"]},
+    }
+    listed = {"same.py": "s1", "edit.py": "e2", "new.py": "n1"}
+
+    # same.py kept its blob SHA, so it was never fetched this run.
+    files, changed, stale = ingest_manifest.plan_sync(
+        previous,
+        {"edit.py": ["edit-keep", "edit-new"], "new.py": ["new1"]},
+        fetched={"edit.py", "new.py"},
+        listed=listed,
+    )
+
+    assert changed == {"edit.py", "new.py"}
+    assert files["same.py"] == previous["same.py"]
+    assert set(files) == {"same.py", "edit.py", "new.py"}
+    # A chunk the edited file still produces must not be deleted.
+    assert stale == {"edit-old", "gone1"}
+
+
+def test_plan_sync_without_listing_compares_chunk_ids():
+    previous = {"pull/1": {"sha": None, "chunk_ids": ["p1"]}, "pull/2": {"sha": None, "chunk_ids": ["p2"]}}
+
+    files, changed, stale = ingest_manifest.plan_sync(
+        previous, {"pull/1": ["p1"], "pull/3": ["p3"]}, fetched={"pull/1", "pull/3"},
+    )
+
+    assert changed == {"pull/3"}
+    assert stale == {"p2"}
+    assert set(files) == {"pull/1", "pull/3"}
+
+
+def test_manifest_round_trip_and_fingerprint_mismatch(manifest_dir):
+    fp = ingest_manifest.fingerprint({"service": "auth"})
+    files = {"a.py": {"sha": "s", "chunk_ids": ["c"]}}
+
+    ingest_manifest.save("https://github.com/acme/mono", "repo", fp, files)
+
+    assert ingest_manifest.load("https://github.com/acme/mono", "repo", fp) == files
+    assert ingest_manifest.load("https://github.com/acme/mono", "pr", fp) is None
+    other = ingest_manifest.fingerprint({"service": "billing"})
+    assert ingest_manifest.load("https://github.com/acme/mono", "repo", other) is None
+
+
+def test_reingest_embeds_only_the_changed_file(manifest_dir, monkeypatch):
+    repo_files = synthetic_repo(dirs=4)
+    url = "https://github.com/acme/incremental"
+
+    encoded = []
+    real_encode = pipeline.get_embedding_model().encode
+
+    def counting_encode(texts, *args, **kwargs):
+        encoded.extend(texts if isinstance(texts, list) else [texts])
+        return real_encode(texts, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline.get_embedding_model(), "encode", counting_encode)
+
+    with FakeGitHub("acme", "incremental", repo_files) as fake:
+        monkeypatch.setattr(github_fetch, "GITHUB_API_URL", fake.url)
+        monkeypatch.setattr(github_fetch, "GITHUB_RAW_URL", fake.url)
+
+        first = asyncio.run(pipeline.ingest_url(url))
+        assert first["status"] == "success"
+        first_embedded = len(encoded)
+        assert first_embedded == first["chunks_ingested"] > 0
+
+        # One modified file, one deleted file, nothing else touched.
+        repo_files["services/svc0/pkg/module_0.py"] = "def rewritten():\n    return 'a brand new body'\n" * 3
+        del repo_files["services/svc1/pkg/module_1.py"]
+        encoded.clear()
+        fake.reset_counts()
+
+        second = asyncio.run(pipeline.ingest_url(url))
+
+        assert second["status"] == "success"
+        assert fake.counts["raw"] == 1
+        assert encoded and all("services/svc0/pkg/module_0.py" in t for t in encoded)
+
+    stored = pipeline._call_collection("get", where={"source_url": url}, include=["metadatas"])
+    paths = {m["path"] for m in stored["metadatas"]}
+    assert "services/svc1/pkg/module_1.py" not in paths
+    assert "services/svc2/pkg/module_2.py" in paths
+    contents = pipeline._call_collection(
+        "get", where={"path": "services/svc0/pkg/module_0.py"}, include=["documents"],
+    )["documents"]
+    assert contents and all("brand new body" in doc for doc in contents)
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from api.app import app
+from api import pipeline
+from api.executor import BoundedExecutor
+
+# Each embed batch takes this long - a stand-in for real CPU-bound encoding of
+# 50 chunks. The ingest below runs several batches, so an event loop blocked
+# by it would hold /health for seconds.
+BATCH_DELAY_S = 0.5
+PROBE_BUDGET_S = 0.3
+
+
+def test_health_and_search_stay_responsive_during_large_ingest(monkeypatch):
+    doc_text = "".join(
+        f"def handler_{i}():\n    return 'responsiveness fixture payload number {i}'\n"
+        for i in range(4000)
+    )
+
+    class _FakeResponse:
+        text = doc_text
+
+        def raise_for_status(self):
+            pass
+
+    monkeypatch.setattr(pipeline.requests, "get", lambda *a, **kw: _FakeResponse())
+
+    embedding_started = threading.Event()
+    real_encode = pipeline.get_embedding_model().encode
+
+    def slow_batch_encode(texts, *args, **kwargs):
+        # Only ingest batches are slow; the search below encodes on its own
+        # batcher thread and must not be held up by this stand-in.
+        if threading.current_thread().name.startswith("ingest"):
+            embedding_started.set()
+            time.sleep(BATCH_DELAY_S)
+        return real_encode(texts, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline.get_embedding_model(), "encode", slow_batch_encode)
+
+    # One client, one portal: every request below shares the app's single event
+    # loop, exactly like uvicorn. Separate TestClient calls outside the context
+    # manager would each get their own loop and prove nothing.
+    with TestClient(app) as client:
+        submitted = client.post("/ingest", json={"url": "https://example.com/big_module.py"})
+        assert submitted.status_code == 202
+        job_id = submitted.json()["job_id"]
+        assert embedding_started.wait(timeout=30)
+
+        timings = {}
+        start = time.perf_counter()
+        health = client.get("/health")
+        timings["health"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        search = client.post("/ghost-note", json={"query": "payload number"})
+        timings["ghost-note"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        progress = client.get(f"/ingest/{job_id}").json()
+        timings["ingest-progress"] = time.perf_counter() - start
+
+        deadline = time.monotonic() + 120
+        job = progress
+        while job["status"] in ("queued", "running") and time.monotonic() < deadline:
+            time.sleep(0.1)
+            job = client.get(f"/ingest/{job_id}").json()
+
+    assert health.status_code == 200
+    assert search.status_code == 200
+    assert progress["status"] == "running", "ingest finished before the probes ran; the test proves nothing"
+    assert progress["phase"] == "embedding"
+    assert job["status"] == "succeeded"
+    assert job["chunks_embedded"] == job["chunks_total"] == job["result"]["chunks_ingested"]
+    assert job["throughput_chunks_per_s"] > 0
+    for name, elapsed in timings.items():
+        assert elapsed < PROBE_BUDGET_S, f"{name} took {elapsed:.3f}s during ingest: {timings}"
+
+
+def test_a_cancelled_wait_for_a_slot_gives_the_slot_back():
+    executor = BoundedExecutor(max_workers=1, max_pending=0, name="test-slots")
+    release = threading.Event()
+
+    async def scenario():
+        busy = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        waiting = asyncio.ensure_future(executor.run(lambda: "never"))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        release.set()
+        await busy
+
+    try:
+        asyncio.run(scenario())
+        # The cancelled waiter's helper thread took the freed slot; it must
+        # have been handed back.
+        assert executor._slots.acquire(timeout=2)
+    finally:
+        executor.shutdown()
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from api import github_fetch, pipeline
+
+# The full-size run streams a synthetic 500MB repo and takes a few minutes, so
+# it is opt-in: RUN_MEMORY_BENCH=1 pytest tests/test_ingest_streaming.py -s
+RUN_MEMORY_BENCH = os.getenv("RUN_MEMORY_BENCH", "").lower() in ("1", "true", "yes")
+FILE_BYTES = 10_000
+
+
+def _fake_fetch(files):
+    """Stand-in for github_fetch.iter_repo_files over an iterable of
+    (path, blob_sha, text), recording the listing the way the real one does.
+    """
+    def iter_repo_files(owner, repo, headers=None, known=None, listed=None, **kwargs):
+        for path, sha, text in files:
+            if listed is not None:
+                listed[path] = sha
+            yield path, sha, text
+    return iter_repo_files
+
+
+def _synthetic_files(total_mb: int):
+    """Lazily yield (path, blob_sha, text) totalling ~total_mb of source."""
+    line = "def handler():\n    return 'synthetic streaming corpus payload'\n"
+    for i in range(total_mb * 1_000_000 // FILE_BYTES):
+        text = f"# module {i}\n" + line * (FILE_BYTES // len(line))
+        yield f"services/svc{i % 50}/module_{i}.py", f"sha-{i}", text
+
+
+class _CountingCollection:
+    def __init__(self):
+        self.upserted = 0
+        self.deleted = []
+
+    def __call__(self, method_name, *args, **kwargs):
+        if method_name == "upsert":
+            self.upserted += len(kwargs["ids"])
+            return None
+        if method_name == "get":
+            return {"ids": ["left-over-from-an-older-ingest"]}
+        if method_name == "delete":
+            self.deleted.extend(kwargs.get("ids") or [])
+            return None
+        raise AssertionError(f"unexpected collection call: {method_name}")
+
+
+def _ingest_synthetic(monkeypatch, total_mb: int):
+    monkeypatch.setattr(github_fetch, "iter_repo_files", _fake_fetch(_synthetic_files(total_mb)))
+    # The model and the vector store are not what's measured here - only what
+    # the pipeline itself holds on to between fetch and upsert.
+    monkeypatch.setattr(
+        pipeline.get_embedding_model(), "encode",
+        lambda texts, *a, **kw: np.zeros((len(texts), 4), dtype=np.float32),
+    )
+    collection = _CountingCollection()
+    monkeypatch.setattr(pipeline, "_call_collection", collection)
+
+    tracemalloc.start()
+    try:
+        result = asyncio.run(pipeline.ingest_url(f"https://github.com/acme/synthetic-{total_mb}mb"))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, collection, peak
+
+
+@pytest.mark.parametrize("total_mb", [
+    20,
+    pytest.param(500, marks=pytest.mark.skipif(not RUN_MEMORY_BENCH, reason="set RUN_MEMORY_BENCH=1")),
+])
+def test_ingest_memory_is_bounded_by_batch_not_corpus(monkeypatch, total_mb):
+    result, collection, peak = _ingest_synthetic(monkeypatch, total_mb)
+    corpus_bytes = total_mb * 1_000_000
+
+    print(f"\n{total_mb}MB corpus: {result['chunks_ingested']} chunks, "
+          f"peak traced memory {peak / 1e6:.1f}MB")
+    assert result["status"] == "success"
+    assert collection.upserted == result["chunks_ingested"] > 0
+    assert result["total_characters"] >= corpus_bytes * 0.9
+    # The whole-document path held the corpus at least twice over (the string
+    # plus its chunks). What remains is no file content at all, only the
+    # 64-char chunk IDs the manifest records - ~113 bytes per ~1KB chunk.
+    assert peak < corpus_bytes * 0.4
+    assert collection.deleted == ["left-over-from-an-older-ingest"]
+
+
+def test_failed_full_sync_leaves_previous_chunks_searchable(monkeypatch):
+    url = "https://github.com/acme/flaky"
+    first = [("app.py", "sha-1", "def stable():\n    return 'still searchable after a failed re-ingest'\n" * 3)]
+    monkeypatch.setattr(github_fetch, "iter_repo_files", _fake_fetch(first))
+    assert asyncio.run(pipeline.ingest_url(url))["status"] == "success"
+
+    def dies_halfway():
+        yield "other.py", "sha-2", "def partial():\n    return 'fetched before the connection dropped'\n" * 3
+        raise ConnectionError("connection reset by peer")
+
+    monkeypatch.setattr(github_fetch, "iter_repo_files", _fake_fetch(dies_halfway()))
+    second = asyncio.run(pipeline.ingest_url(url, metadata={"service": "flaky"}))
+
+    assert second["status"] == "error"
+    stored = pipeline._call_collection("get", where={"source_url": url}, include=["metadatas"])
+    assert "app.py" in {m["path"] for m in stored["metadatas"]}
@@ -7,6 +7,8 @@ from fastapi.testclient import TestClient
 
 from api.app import app
 from api import pipeline
+from api.embed_batcher import EmbeddingBatcher
+from api.lru_cache import LRUCache
 
 client = TestClient(app)
 
@@ -29,7 +31,7 @@ def test_ghost_note_latency_under_budget_at_concurrency(monkeypatch):
             pass
 
     monkeypatch.setattr(pipeline.requests, "get", lambda *a, **kw: _FakeResponse())
-    ingest_response = client.post("/ingest", json={"url": "https://example.com/latency_seed.py"})
+    ingest_response = client.post("/ingest?wait=true", json={"url": "https://example.com/latency_seed.py"})
     assert ingest_response.status_code == 200
 
     def _timed_search(i):
@@ -48,3 +50,97 @@ def test_ghost_note_latency_under_budget_at_concurrency(monkeypatch):
 
     p95 = durations[max(0, int(len(durations) * 0.95) - 1)]
     assert p95 < LATENCY_BUDGET_S, f"p95 latency {p95:.3f}s exceeds {LATENCY_BUDGET_S}s budget: {durations}"
+
+
+def _percentile(durations, pct):
+    ordered = sorted(durations)
+    return ordered[max(0, int(len(ordered) * pct) - 1)]
+
+
+# Benchmark, not a gate: prints cold- and warm-cache latency for the query
+# embedding LRU at the same 10-thread concurrency as the budget test above.
+# Run with -s to see the numbers.
+@pytest.mark.skipif(IS_CI, reason="latency numbers are hardware-dependent; run locally, not on shared CI runners")
+def test_query_embedding_cache_cold_vs_warm_latency(monkeypatch):
+    doc_text = "def handler():\n    return 'seed content for the embedding cache benchmark'\n"
+
+    class _FakeResponse:
+        text = doc_text
+
+        def raise_for_status(self):
+            pass
+
+    monkeypatch.setattr(pipeline.requests, "get", lambda *a, **kw: _FakeResponse())
+    assert client.post("/ingest?wait=true", json={"url": "https://example.com/cache_seed.py"}).status_code == 200
+    client.post("/ghost-note", json={"query": "warm up"})
+
+    monkeypatch.setattr(pipeline, "_query_embeddings", LRUCache(maxsize=1024))
+    # Whole-response caching would answer the warm pass before the embedding
+    # cache is ever consulted - this measures the embedding cache alone.
+    monkeypatch.setattr(pipeline, "_search_results", LRUCache(maxsize=0))
+    queries = [f"why is pod payments-{i} crash looping" for i in range(CONCURRENCY * 5)]
+
+    def _timed_search(query):
+        start = time.perf_counter()
+        response = client.post("/ghost-note", json={"query": query})
+        assert response.status_code == 200
+        return time.perf_counter() - start
+
+    def _run():
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+            return list(pool.map(_timed_search, queries))
+
+    cold = _run()
+    cold_stats = pipeline._query_embeddings.stats()
+    warm = _run()
+    warm_stats = pipeline._query_embeddings.stats()
+
+    print(
+        f"\nquery-embedding cache @ {CONCURRENCY} threads, {len(queries)} searches: "
+        f"cold p50={_percentile(cold, 0.5) * 1000:.1f}ms p95={_percentile(cold, 0.95) * 1000:.1f}ms | "
+        f"warm p50={_percentile(warm, 0.5) * 1000:.1f}ms p95={_percentile(warm, 0.95) * 1000:.1f}ms"
+    )
+    assert cold_stats["misses"] == len(queries) and cold_stats["hits"] == 0
+    assert warm_stats["hits"] == len(queries)
+
+
+# Benchmark, not a gate: search throughput with and without query
+# micro-batching at 10/50/200 concurrent searches. Calls search_ghost_notes
+# directly - the TestClient's threadpool caps concurrency at 40. Run with -s.
+@pytest.mark.skipif(IS_CI, reason="throughput numbers are hardware-dependent; run locally, not on shared CI runners")
+def test_query_micro_batching_throughput(monkeypatch):
+    doc_text = "def handler():\n    return 'seed content for the micro-batching benchmark'\n"
+
+    class _FakeResponse:
+        text = doc_text
+
+        def raise_for_status(self):
+            pass
+
+    monkeypatch.setattr(pipeline.requests, "get", lambda *a, **kw: _FakeResponse())
+    assert client.post("/ingest?wait=true", json={"url": "https://example.com/batching_seed.py"}).status_code == 200
+    client.post("/ghost-note", json={"query": "warm up"})
+    monkeypatch.setattr(pipeline, "_search_results", LRUCache(maxsize=0))
+    monkeypatch.setattr(pipeline, "_query_embeddings", LRUCache(maxsize=0))
+
+    lines = []
+    for concurrency in (10, 50, 200):
+        for label, max_batch in (("unbatched", 1), ("batched", pipeline.Config.QUERY_BATCH_MAX)):
+            batcher = EmbeddingBatcher(
+                pipeline._encode_queries, pipeline.Config.QUERY_BATCH_WINDOW_MS / 1000, max_batch,
+            )
+            monkeypatch.setattr(pipeline, "_query_batcher", batcher)
+            queries = [f"why is {label} pod {i} crash looping" for i in range(concurrency * 3)]
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                responses = list(pool.map(pipeline.search_ghost_notes, queries))
+            elapsed = time.perf_counter() - start
+
+            assert all(r["results"] for r in responses)
+            stats = batcher.stats()
+            lines.append(
+                f"{concurrency:>3} concurrent, {label:>9}: {len(queries) / elapsed:7.1f} searches/s"
+                + (f" (mean batch {stats['mean_batch']:.1f})" if stats["batches"] else "")
+            )
+    print("\nquery micro-batching throughput:\n" + "\n".join(lines))
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from api import pipeline
+from api.lru_cache import LRUCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_ttl_expires_entries():
+    cache = LRUCache(maxsize=8, ttl_s=0.05)
+    cache.put("q", [0.1])
+    assert cache.get("q") == [0.1]
+    time.sleep(0.08)
+
+    assert cache.get("q") is None
+    assert len(cache) == 0
+
+
+def test_lru_size_zero_disables_caching():
+    cache = LRUCache(maxsize=0)
+    cache.put("q", 1)
+
+    assert cache.get("q") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_is_consistent_under_concurrent_use():
+    cache = LRUCache(maxsize=50)
+
+    def worker(n):
+        for i in range(2000):
+            key = (n * 7 + i) % 80
+            if cache.get(key) is None:
+                cache.put(key, key)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = cache.stats()
+    assert stats["size"] <= 50
+    assert stats["hits"] + stats["misses"] == 10 * 2000
+
+
+def test_repeated_query_is_encoded_once(monkeypatch):
+    monkeypatch.setattr(pipeline, "_query_embeddings", LRUCache(maxsize=16))
+    calls = []
+    real_encode = pipeline.get_embedding_model().encode
+
+    def counting_encode(texts, *args, **kwargs):
+        calls.append(texts)
+        return real_encode(texts, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline.get_embedding_model(), "encode", counting_encode)
+
+    first = pipeline._embed_query("why does auth-service crash")
+    second = pipeline._embed_query("  why does   auth-service crash\n")
+
+    assert first == second
+    assert calls == [["why does auth-service crash"]]
+    assert pipeline._query_embeddings.stats()["hits"] == 1
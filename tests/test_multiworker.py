@@ -0,0 +1,283 @@
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import requests
+
+from api import synthesis
+from api.config import Config
+from api.index_state import IndexState, WriteCounter
+from api.ingest_jobs import IngestJobQueue
+from api.lru_cache import LRUCache
+from api.vector_index import VectorIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IS_CI = os.getenv("CI", "").lower() in ("1", "true", "yes")
+DIM = 16
+_fork = multiprocessing.get_context("fork")
+
+
+def test_write_counter_sees_writes_from_a_forked_worker():
+    counter = WriteCounter()
+    assert counter.record_write() is False  # only this process has written
+
+    child = _fork.Process(target=counter.record_write)
+    child.start()
+    child.join()
+
+    assert counter.foreign_writes() is True
+    assert counter.foreign_writes() is False
+    child = _fork.Process(target=counter.record_write)
+    child.start()
+    child.join()
+    assert counter.record_write() is True
+
+
+def test_foreign_write_distrusts_zero_service_counts_until_rescanned():
+    state = IndexState()
+    assert state.claim_service_scan(600)
+    state.load_services({"auth": 3})
+    generation = state.generation
+
+    state.foreign_write()
+    assert state.generation > generation
+    assert state.is_empty(lambda: 7) is False  # emptiness re-asked
+    assert state.service_count("auth") == 3  # over-count: harmless
+    assert state.service_count("payments") is None  # may have been ingested elsewhere
+
+    assert state.claim_service_scan(1e-9)
+    state.load_services({"auth": 3, "payments": 2})
+    assert state.service_count("billing") == 0
+
+
+def _upsert_from_child(index, prefix, batches, size):
+    rng = np.random.default_rng(ord(prefix[0]))
+    for b in range(batches):
+        ids = [f"{prefix}-{b}-{i}" for i in range(size)]
+        index.upsert(ids, rng.standard_normal((size, DIM)), ids, [{"service": prefix}] * size)
+
+
+# Two workers forked from the process that opened the index - as under
+# gunicorn's preload_app - append to the same files at the same time.
+def test_vector_index_shared_by_forked_writers(tmp_path):
+    index = VectorIndex(str(tmp_path / "index"))
+    index.upsert(["parent"], np.ones((1, DIM)), ["parent"], [{"service": "parent"}])
+
+    children = [_fork.Process(target=_upsert_from_child, args=(index, name, 5, 20)) for name in ("a", "b")]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+        assert child.exitcode == 0
+
+    assert index.refresh() is True
+    assert len(index) == 201
+    assert VectorIndex(str(tmp_path / "index")).count == 201
+    hits = index.query(np.ones((1, DIM)), 1, where={"service": "b"})
+    assert hits["ids"][0][0].startswith("b-")
+    assert index.refresh() is False
+
+
+def _ingest_slowly(url, source_type, metadata, progress):
+    progress(phase="embedding", chunks_total=4)
+    for i in range(4):
+        time.sleep(0.2)
+        progress(chunks_embedded=i + 1)
+    return {"status": "success", "chunks_ingested": 4, "total_characters": 40, "message": "ok"}
+
+
+def _die_mid_ingest(url, source_type, metadata, progress):
+    progress(phase="embedding", chunks_total=4)
+    time.sleep(0.2)  # let the job ID reach the test first
+    os._exit(1)
+
+
+def _accept_job(path, run, url, conn):
+    jobs = IngestJobQueue(run, workers=1, max_queued=4, history=10, path=path)
+    job, _ = jobs.submit(url, "repo", None)
+    conn.send(job["job_id"])
+    # Stay up, as a gunicorn worker would, until the test is done with us.
+    conn.poll(30)
+
+
+# Two gunicorn workers share one job table: a job one accepted is polled,
+# coalesced into and queued behind through the other.
+def test_an_ingest_job_is_reported_by_the_worker_that_did_not_accept_it(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    conn, child_conn = _fork.Pipe()
+    child = _fork.Process(target=_accept_job, args=(path, _ingest_slowly, "https://github.com/acme/a", child_conn))
+    child.start()
+    assert conn.poll(10)
+    job_id = conn.recv()
+
+    other = IngestJobQueue(_ingest_slowly, workers=1, max_queued=4, history=10, path=path)
+    assert other.get(job_id)["url"] == "https://github.com/acme/a"
+    again, coalesced = other.submit("https://github.com/acme/a", "repo", None)
+    assert coalesced and again["job_id"] == job_id
+    behind, _ = other.submit("https://github.com/acme/b", "repo", None)
+
+    done = other.wait(job_id, timeout=30)
+    assert done["status"] == "succeeded"
+    assert done["chunks_embedded"] == 4 and done["result"]["chunks_ingested"] == 4
+    # INGEST_JOB_WORKERS=1 holds across both processes: b only started once a was done.
+    second = other.wait(behind["job_id"], timeout=30)
+    assert second["status"] == "succeeded"
+    assert second["started_at"] >= done["finished_at"]
+    conn.send("done")
+    child.join(30)
+    assert child.exitcode == 0
+
+
+def test_a_job_whose_worker_died_is_marked_failed(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    conn, child_conn = _fork.Pipe()
+    child = _fork.Process(target=_accept_job, args=(path, _die_mid_ingest, "https://github.com/acme/a", child_conn))
+    child.start()
+    assert conn.poll(10)
+    job_id = conn.recv()
+    child.join(30)
+
+    other = IngestJobQueue(_ingest_slowly, workers=1, max_queued=4, history=10, path=path)
+    job = other.wait(job_id, timeout=10)
+    assert job["status"] == "failed"
+    assert "exited" in job["result"]["message"]
+    # No longer blocks a resubmission.
+    assert other.submit("https://github.com/acme/a", "repo", None)[1] is False
+
+
+def _summarize_when_told(conn, chunks):
+    def create(**_kwargs):
+        conn.send("calling Groq")
+        conn.recv()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Retries on 429."))])
+
+    synthesis._get_client = lambda: SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    synthesis.synthesize(chunks)
+    conn.send("done")
+
+
+def test_a_summary_pending_in_one_worker_is_pending_in_another(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "SYNTHESIS_ENABLED", True)
+    monkeypatch.setattr(Config, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(Config, "SYNTHESIS_CACHE_PATH", str(tmp_path / "synthesis_cache.db"))
+    monkeypatch.setattr(synthesis, "_memory", LRUCache(64))
+    monkeypatch.setattr(synthesis, "_failed", LRUCache(64, ttl_s=300))
+    monkeypatch.setattr(synthesis, "_store", None)
+    chunks = [{"chunk_id": "mw-1", "text": "def retry(): ...", "metadata": {"path": "src/retry.py"}}]
+
+    conn, child_conn = _fork.Pipe()
+    child = _fork.Process(target=_summarize_when_told, args=(child_conn, chunks))
+    child.start()
+    assert conn.poll(10) and conn.recv() == "calling Groq"
+
+    assert synthesis.summary_status("mw-1")["status"] == "pending"
+    conn.send("answer")
+    done = synthesis.summary_status("mw-1", wait_s=10)
+    assert done["status"] == "ready" and done["summary"] == "Retries on 429."
+    assert conn.poll(10) and conn.recv() == "done"
+    child.join(30)
+    assert synthesis.summary_status("never-asked") is None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until(url, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise AssertionError(f"{url} never answered 200")
+
+
+def _seed(host, port, chunks):
+    import chromadb
+
+    from api.config import Config
+    from api.embedder import load_embedder
+
+    services = ["auth-service", "payments", "billing", "ledger"]
+    texts = [f"{services[i % 4]} handler {i}: retries the upstream call on 429 and logs the pod name"
+             for i in range(chunks)]
+    collection = chromadb.HttpClient(host=host, port=port).get_or_create_collection(Config.CHROMA_COLLECTION_NAME)
+    embeddings = load_embedder().encode(texts)
+    for start in range(0, chunks, 500):
+        end = min(start + 500, chunks)
+        collection.upsert(
+            ids=[f"chunk-{i}" for i in range(start, end)],
+            embeddings=embeddings[start:end].tolist(),
+            documents=texts[start:end],
+            metadatas=[{"service": services[i % 4], "path": f"src/{i}.py"} for i in range(start, end)],
+        )
+
+
+def _throughput(port, requests_total, concurrency):
+    def search(i):
+        start = time.perf_counter()
+        response = requests.post(f"http://127.0.0.1:{port}/ghost-note",
+                                 json={"query": f"why does pod {i} retry on 429"}, timeout=60)
+        assert response.status_code == 200
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(search, range(concurrency)))  # every worker warm
+        start = time.perf_counter()
+        latencies = sorted(pool.map(search, range(concurrency, concurrency + requests_total)))
+    return requests_total / (time.perf_counter() - start), latencies[len(latencies) // 2]
+
+
+# Benchmark, not a gate: /ghost-note throughput with 1, 2 and 4 gunicorn
+# workers against one Chroma server, caches off so every request embeds and
+# searches. Scaling is bounded by the cores the machine actually has -
+# printed alongside. Needs the `chroma` CLI and gunicorn; opt in with
+# RUN_WORKER_BENCH=1 and run with `pytest -s`.
+@pytest.mark.skipif(IS_CI or not os.getenv("RUN_WORKER_BENCH"), reason="set RUN_WORKER_BENCH=1; not on shared CI")
+def test_worker_scaling_benchmark():
+    from api.embedder import available_cpus
+
+    chroma_port = _free_port()
+    with tempfile.TemporaryDirectory() as data:
+        chroma = subprocess.Popen(
+            ["chroma", "run", "--path", data, "--port", str(chroma_port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_until(f"http://127.0.0.1:{chroma_port}/api/v2/heartbeat")
+            _seed("127.0.0.1", chroma_port, 5000)
+            print(f"\n{available_cpus()} CPU(s) available")
+            for workers in (1, 2, 4):
+                port = _free_port()
+                env = {
+                    **os.environ, "API_WORKERS": str(workers), "API_PORT": str(port),
+                    "CHROMA_HOST": "127.0.0.1", "CHROMA_PORT": str(chroma_port),
+                    "SEARCH_CACHE_SIZE": "0", "QUERY_EMBED_CACHE_SIZE": "0", "LOG_LEVEL": "WARNING",
+                }
+                server = subprocess.Popen(
+                    [sys.executable, "-m", "gunicorn", "-c", "api/gunicorn_conf.py", "api.app:app"],
+                    cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                )
+                try:
+                    _wait_until(f"http://127.0.0.1:{port}/ready")
+                    rate, p50 = _throughput(port, 400, concurrency=16)
+                finally:
+                    server.terminate()
+                    server.wait(timeout=60)
+                print(f"{workers} worker(s): {rate:7.1f} searches/s  p50={p50 * 1000:.0f}ms")
+        finally:
+            chroma.terminate()
+            chroma.wait(timeout=30)
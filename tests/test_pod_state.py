@@ -0,0 +1,165 @@
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import pipeline
+from api.app import app
+from api.event_log import EventLog, segments
+from api.pod_state import PodStateStore
+
+IS_CI = os.getenv("CI", "").lower() in ("1", "true", "yes")
+
+client = TestClient(app)
+
+NOW = 1_800_000_000.0
+
+
+def _beat(pod, namespace="shop", note="svc:cart", at=NOW, status="running"):
+    return json.dumps({
+        "namespace": namespace, "pod": pod, "ghost_note_id": note, "status": status,
+        "ts": "2026-10-18T00:00:00+00:00",
+        "received_at": datetime.fromtimestamp(at, timezone.utc).isoformat(),
+    }) + "\n"
+
+
+def _append(path, *lines):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(lines))
+
+
+def _store(path, **kwargs):
+    return PodStateStore(path, clock=lambda: NOW, **kwargs)
+
+
+def _names(pods):
+    return [(pod["namespace"], pod["pod"]) for pod in pods]
+
+
+def test_keeps_the_newest_heartbeat_per_pod(tmp_path):
+    path = str(tmp_path / "pod_state.jsonl")
+    _append(path, _beat("cart-1", at=NOW - 60), _beat("cart-1", at=NOW - 5, status="crashloop"),
+            _beat("cart-1", at=NOW - 30), "not json\n", _beat("cart-2", namespace="other", note="svc:other", at=NOW - 10))
+    store = _store(path)
+
+    pods = store.latest()
+    assert _names(pods) == [("other", "cart-2"), ("shop", "cart-1")]
+    assert pods[1]["status"] == "crashloop" and pods[1]["age_s"] == 5 and pods[1]["stale"] is False
+
+    # A pod re-labelled to another service moves index.
+    _append(path, _beat("cart-1", note="svc:checkout", at=NOW - 1))
+    assert store.latest(ghost_note_id="svc:cart") == []
+    assert _names(store.latest(ghost_note_id="svc:checkout")) == [("shop", "cart-1")]
+
+
+def test_filters_by_namespace_ghost_note_id_and_staleness(tmp_path):
+    path = str(tmp_path / "pod_state.jsonl")
+    _append(path,
+            _beat("a", at=NOW - 300), _beat("b", note="svc:pay", at=NOW - 200),
+            _beat("c", at=NOW - 20), _beat("d", namespace="ops", at=NOW - 1))
+    store = _store(path)
+
+    assert _names(store.latest(namespace="shop")) == [("shop", "a"), ("shop", "b"), ("shop", "c")]
+    assert _names(store.latest(namespace="shop", ghost_note_id="svc:cart")) == [("shop", "a"), ("shop", "c")]
+    assert _names(store.latest(stale=True, stale_after_s=90)) == [("shop", "a"), ("shop", "b")]
+    assert _names(store.latest(stale=False, stale_after_s=90)) == [("ops", "d"), ("shop", "c")]
+    assert _names(store.latest(namespace="shop", stale=True, stale_after_s=250)) == [("shop", "a")]
+    assert store.latest(namespace="nowhere") == []
+
+
+def test_snapshot_covers_pruned_segments(tmp_path):
+    path = str(tmp_path / "pod_state.jsonl")
+    log = EventLog(path, max_bytes=1000)
+    for i in range(30):
+        log.append(_beat(f"pod-{i}", at=NOW - 100 + i).strip(), wait=True)
+    log.flush()
+    old = segments(path)
+    assert old
+    for name in old:
+        os.utime(name, (NOW - 7200, NOW - 7200))
+
+    store = _store(path, history_s=3600, snapshot_every_s=0)
+    assert len(store) == 30
+    assert segments(path) == []
+    assert os.path.exists(path + ".latest.json")
+
+    # A restart reads the snapshot plus the tail; a rebuild (the live log
+    # replaced) still has the pruned segments' pods from the snapshot.
+    log.append(_beat("pod-new").strip(), wait=True)
+    assert len(_store(path)) == 31
+    os.unlink(path)
+    _append(path, _beat("pod-after"))
+    rebuilt = _store(path)
+    assert len(rebuilt) == 31
+    assert set(_names(rebuilt.latest(stale=True, stale_after_s=50))) == {("shop", f"pod-{i}") for i in range(30)}
+
+
+def test_get_pod_state_filters_what_the_sidecars_posted():
+    for pod, namespace in (("api-1", "get-test"), ("api-2", "get-test"), ("worker-1", "get-other")):
+        body = {"pod": pod, "namespace": namespace, "ghost_note_id": f"svc:{pod.split('-')[0]}",
+                "status": "running", "ts": "2026-10-18T12:00:00+00:00"}
+        assert client.post("/pod-state", json=body).json() == {"recorded": True}
+
+    body = client.get("/pod-state?namespace=get-test").json()
+    assert body["count"] == 2 and [pod["pod"] for pod in body["pods"]] == ["api-1", "api-2"]
+    assert body["pods"][0]["stale"] is False and body["pods"][0]["age_s"] < 60
+    assert client.get("/pod-state?ghost_note_id=svc:worker&stale=false").json()["count"] == 1
+    assert client.get("/pod-state?namespace=get-test&stale=true").json()["count"] == 0
+    assert client.get("/pod-state?stale_after_s=0").status_code == 422
+
+
+def _fleet(path, pods, beats):
+    """`beats` rounds of heartbeats, 30s apart, from `pods` pods - except every
+    50th, which last beat an hour before the first round."""
+    def beat(i, at):
+        return _beat(f"pod-{i}", namespace=f"ns-{i % 100}", note=f"svc:{i % 250}", at=at)
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(beat(i, NOW - 3600) for i in range(0, pods, 50))
+        for round_ in range(beats):
+            f.writelines(beat(i, NOW - 30 * (beats - round_)) for i in range(pods) if i % 50)
+
+
+def test_ten_thousand_pods(tmp_path):
+    path = str(tmp_path / "pod_state.jsonl")
+    _fleet(path, 10_000, 3)
+    store = _store(path)
+
+    assert len(store) == 10_000
+    assert len(store.latest(namespace="ns-7")) == 100
+    assert len(store.latest(ghost_note_id="svc:7")) == 40
+    assert len(store.latest(stale=True)) == 200  # every 50th pod stopped an hour ago
+    assert len(store.latest(stale=False)) == 9_800
+
+
+# Benchmark, not a gate: one namespace's pods (100 of 10k) looked up against
+# a log of 3 vs 30 heartbeats per pod, and a whole 30s round of heartbeats
+# followed. The lookup should not grow with the log. Run with `pytest -s`.
+@pytest.mark.skipif(IS_CI, reason="timing benchmark; not meaningful on shared CI runners")
+def test_pod_state_query_benchmark(tmp_path):
+    timings = {}
+    for beats in (3, 30):
+        path = str(tmp_path / f"pod_state_{beats}.jsonl")
+        _fleet(path, 10_000, beats)
+        store = _store(path)
+        start = time.perf_counter()
+        store.load()
+        load_s = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(100):
+            store.latest(namespace=f"ns-{i}")
+        timings[beats] = ((time.perf_counter() - start) / 100, load_s, os.path.getsize(path))
+
+    start = time.perf_counter()
+    _append(path, *[_beat(f"pod-{i}", namespace=f"ns-{i % 100}") for i in range(10_000)])
+    store.latest(namespace="ns-0")
+    round_s = time.perf_counter() - start
+
+    for beats, (query_s, load_s, size) in timings.items():
+        print(f"\n{beats * 10_000} heartbeats ({size / 1e6:.0f}MB): cold load {load_s * 1000:.0f}ms, "
+              f"one namespace {query_s * 1000:.2f}ms")
+    print(f"a full round of 10k heartbeats appended and followed: {round_s * 1000:.0f}ms")
+    assert timings[30][0] < timings[3][0] * 3
@@ -0,0 +1,228 @@
+import os
+import queue
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from kubernetes import client as k8s
+from kubernetes.client.exceptions import ApiException
+
+from api import pods
+from api.app import app
+from api.pods import GHOST_SERVICE_LABEL, PodInformer
+
+IS_CI = os.getenv("CI", "").lower() in ("1", "true", "yes")
+
+client = TestClient(app)
+
+_END = object()  # ends the current watch, as its timeout_seconds would
+
+
+def _pod(name, namespace="shop", injected=True, rv="1"):
+    env = [k8s.V1EnvVar(name="GHOST_NOTE_ID", value=f"svc:{name}")] if injected else []
+    return k8s.V1Pod(
+        metadata=k8s.V1ObjectMeta(name=name, namespace=namespace, resource_version=rv,
+                                  labels={GHOST_SERVICE_LABEL: name.split("-")[0]}),
+        spec=k8s.V1PodSpec(containers=[k8s.V1Container(name="app", env=env)]),
+    )
+
+
+class FakeCoreV1:
+    """list_pod_for_all_namespaces over a fixed set of pods, in pages."""
+
+    def __init__(self, listed, resource_version="100"):
+        self.listed = listed
+        self.resource_version = resource_version
+        self.lists = []
+
+    def list_pod_for_all_namespaces(self, label_selector=None, limit=None, _continue=None, **kwargs):
+        self.lists.append({"label_selector": label_selector, "limit": limit, "_continue": _continue})
+        start = int(_continue or 0)
+        end = start + limit if limit else len(self.listed)
+        return k8s.V1PodList(
+            items=self.listed[start:end],
+            metadata=k8s.V1ListMeta(resource_version=self.resource_version,
+                                    _continue=str(end) if end < len(self.listed) else None),
+        )
+
+
+class FakeWatch:
+    """A watch stream fed by the test: every watch opened shares one queue
+    of events, and records the kwargs it was opened with."""
+
+    def __init__(self):
+        self.events = queue.Queue()
+        self.opened = []
+
+    def __call__(self):
+        return self
+
+    def stream(self, func, **kwargs):
+        self.opened.append(kwargs)
+        while True:
+            event = self.events.get()
+            if event is _END:
+                return
+            if isinstance(event, Exception):
+                raise event
+            yield event
+
+    def stop(self):
+        pass
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _names(listed):
+    return [(pod.namespace, pod.name) for pod in listed]
+
+
+@pytest.fixture
+def informer_for():
+    started = []
+
+    def make(listed, **kwargs):
+        api, stream = FakeCoreV1(listed), FakeWatch()
+        informer = PodInformer(api=api, watch_factory=stream, retry_s=0.01, **kwargs)
+        informer.start()
+        started.append((informer, stream))
+        _wait_for(lambda: informer.synced)
+        return informer, api, stream
+
+    yield make
+    for informer, stream in started:
+        informer.stop()
+        stream.events.put(_END)
+
+
+def test_lists_then_applies_watch_events_from_the_lists_version(informer_for):
+    informer, api, stream = informer_for([_pod("cart-1"), _pod("api-1", injected=False)], page_size=1)
+    assert [call["_continue"] for call in api.lists] == [None, "1"]
+    assert api.lists[0]["label_selector"] == GHOST_SERVICE_LABEL
+    _wait_for(lambda: stream.opened)
+    assert stream.opened[0]["resource_version"] == "100"
+
+    listed, _ = informer.page()
+    assert _names(listed) == [("shop", "api-1"), ("shop", "cart-1")]
+    assert (listed[0].injected, listed[1].ghost_note_id) == (False, "svc:cart-1")
+
+    stream.events.put({"type": "ADDED", "object": _pod("web-1", namespace="edge", rv="101")})
+    stream.events.put({"type": "MODIFIED", "object": _pod("api-1", rv="102")})
+    stream.events.put({"type": "DELETED", "object": _pod("cart-1", rv="103")})
+    stream.events.put({"type": "BOOKMARK", "object": {"metadata": {"resourceVersion": "150"}}})
+    _wait_for(lambda: informer.events == 3)
+
+    listed, _ = informer.page()
+    assert _names(listed) == [("edge", "web-1"), ("shop", "api-1")]
+    assert listed[1].injected
+
+    # A watch that times out resumes from the last version seen, no relist.
+    _wait_for(lambda: informer._resource_version == "150")
+    stream.events.put(_END)
+    _wait_for(lambda: len(stream.opened) == 2)
+    assert stream.opened[1]["resource_version"] == "150"
+    assert len(api.lists) == 2
+
+
+def test_an_expired_watch_relists(informer_for):
+    informer, api, stream = informer_for([_pod("cart-1")])
+    _wait_for(lambda: stream.opened)
+    api.listed = [_pod("cart-2")]
+    api.resource_version = "200"
+    stream.events.put(ApiException(status=410, reason="Expired: too old resource version"))
+
+    _wait_for(lambda: informer.relists == 2)
+    assert _names(informer.page()[0]) == [("shop", "cart-2")]
+    _wait_for(lambda: len(stream.opened) == 2)
+    assert stream.opened[1]["resource_version"] == "200"
+
+
+def test_relists_once_the_resync_is_due(informer_for):
+    now = [0.0]
+    informer, api, stream = informer_for([_pod("cart-1")], resync_s=60, clock=lambda: now[0])
+    _wait_for(lambda: stream.opened)
+    assert stream.opened[0]["timeout_seconds"] == 60
+
+    api.listed = [_pod("cart-1"), _pod("cart-2")]
+    now[0] = 61
+    stream.events.put({"type": "MODIFIED", "object": _pod("cart-1", rv="101")})
+    _wait_for(lambda: informer.relists == 2)
+    assert _names(informer.page()[0]) == [("shop", "cart-1"), ("shop", "cart-2")]
+
+
+def test_pages_and_namespaces_slice_the_sorted_table(informer_for):
+    listed = [_pod(f"svc-{i:02d}", namespace=namespace) for namespace in ("b", "a", "c") for i in range(5)]
+    informer, _, _ = informer_for(listed)
+
+    first, after = informer.page(limit=4)
+    assert _names(first) == [("a", f"svc-{i:02d}") for i in range(4)]
+    rest, last = informer.page(limit=100, after=after)
+    assert len(rest) == 11 and last is None
+
+    in_b, after = informer.page(namespace="b", limit=3)
+    assert _names(in_b) == [("b", "svc-00"), ("b", "svc-01"), ("b", "svc-02")]
+    in_b, after = informer.page(namespace="b", limit=3, after=after)
+    assert _names(in_b) == [("b", "svc-03"), ("b", "svc-04")] and after is None
+    assert informer.page(namespace="missing") == ([], None)
+
+
+def test_pods_endpoint_pages_through_the_cache(informer_for, monkeypatch):
+    informer, _, _ = informer_for([_pod(f"cart-{i}", namespace=ns) for ns in ("shop", "edge") for i in range(3)])
+    monkeypatch.setattr(pods, "_informer", informer)
+
+    body = client.get("/pods", params={"limit": 2}).json()
+    assert [pod["name"] for pod in body["pods"]] == ["cart-0", "cart-1"]
+    assert body["continue_token"] == "edge/cart-1"
+
+    body = client.get("/pods", params={"limit": 2, "continue_token": body["continue_token"]}).json()
+    assert _names(pods.PodInfo(**pod) for pod in body["pods"]) == [("edge", "cart-2"), ("shop", "cart-0")]
+
+    body = client.get("/pods", params={"namespace": "shop"}).json()
+    assert len(body["pods"]) == 3 and body["continue_token"] is None
+    assert body["pods"][0] == {"name": "cart-0", "namespace": "shop", "service_label": "cart",
+                               "ghost_note_id": "svc:cart-0", "injected": True}
+
+    assert client.get("/pods", params={"continue_token": "no-slash"}).status_code == 400
+    assert client.get("/pods", params={"limit": 0}).status_code == 422
+
+
+def test_no_cluster_is_an_empty_list_without_waiting(monkeypatch):
+    monkeypatch.setattr(pods, "_load_k8s_config", lambda: False)
+    informer = PodInformer(retry_s=60)
+    monkeypatch.setattr(pods, "_informer", informer)
+    try:
+        start = time.monotonic()
+        assert client.get("/pods").json() == {"pods": [], "continue_token": None}
+        assert time.monotonic() - start < pods.Config.PODS_READY_WAIT_S
+    finally:
+        informer.stop()
+
+
+# Benchmark, not a gate: a 100-pod page out of 10k cached pods, paged and
+# filtered in memory. Run with `pytest -s` to see the numbers.
+@pytest.mark.skipif(IS_CI, reason="timing benchmark; not meaningful on shared CI runners")
+def test_cached_page_benchmark(informer_for):
+    listed = [_pod(f"svc-{i:05d}", namespace=f"ns-{i % 50:02d}") for i in range(10_000)]
+    start = time.perf_counter()
+    informer, _, _ = informer_for(listed)
+    list_s = time.perf_counter() - start
+
+    rounds = 1000
+    start = time.perf_counter()
+    after = None
+    for _ in range(rounds):
+        _, after = informer.page(limit=100, after=after)
+    page_ms = (time.perf_counter() - start) / rounds * 1000
+    start = time.perf_counter()
+    for i in range(rounds):
+        informer.page(namespace=f"ns-{i % 50:02d}", limit=100)
+    namespace_ms = (time.perf_counter() - start) / rounds * 1000
+
+    print(f"\n10k pods: initial list into the table {list_s:.2f}s, "
+          f"100-pod page {page_ms:.3f}ms, one namespace's page {namespace_ms:.3f}ms")
+    assert page_ms < 50
@@ -19,7 +19,7 @@ import chromadb
 import pytest
 
 from api.chunking import chunk_repo_document
-from api.pipeline import embedding_model, get_chunk_id
+from api.pipeline import get_chunk_id, get_embedding_model
 from search import POOL_SIZE, pool_by_file
 
 FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
@@ -43,7 +43,7 @@ def fixture_collection(tmp_path_factory):
     client = chromadb.PersistentClient(path=str(tmp_path))
     collection = client.get_or_create_collection(name="fixture_docs")
 
-    embeddings = embedding_model.encode(chunks).tolist()
+    embeddings = get_embedding_model().encode(chunks).tolist()
     collection.upsert(
         ids=[get_chunk_id(c) for c in chunks],
         embeddings=embeddings,
@@ -54,7 +54,7 @@ def fixture_collection(tmp_path_factory):
 
 
 def _search(collection, query, top_k=5):
-    query_embedding = embedding_model.encode(query).tolist()
+    query_embedding = get_embedding_model().encode(query).tolist()
     results = collection.query(query_embeddings=[query_embedding], n_results=POOL_SIZE)
     if not (results["documents"] and results["documents"][0]):
         return []
@@ -0,0 +1,101 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from api import pipeline
+from api.app import app
+from api.config import Config
+from api.lru_cache import LRUCache
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(pipeline, "_search_results", LRUCache(maxsize=64))
+    monkeypatch.setattr(pipeline, "_query_embeddings", LRUCache(maxsize=64))
+
+
+def _seed(path, service, text):
+    chunk = f"FILE PATH: {path}\nEXTENSION: .py\nCODE:\n{text}"
+    pipeline._call_collection(
+        "upsert",
+        ids=[pipeline.get_chunk_id(chunk)],
+        embeddings=[pipeline.get_embedding_model().encode(chunk).tolist()],
+        documents=[chunk],
+        metadatas=[{"path": path, "extension": ".py", "is_code": True, "schema": 2,
+                    "source_url": f"https://example.com/{path}", "source_type": "repo",
+                    "service": service}],
+    )
+
+
+def _record_calls(monkeypatch):
+    calls = {"query": 0, "encode": 0}
+    real_call = pipeline._call_collection
+    real_encode = pipeline._encode_queries
+
+    def counting_call(method_name, *args, **kwargs):
+        if method_name == "query":
+            calls["query"] += 1
+        return real_call(method_name, *args, **kwargs)
+
+    def counting_encode(texts):
+        calls["encode"] += 1
+        return real_encode(texts)
+
+    monkeypatch.setattr(pipeline, "_call_collection", counting_call)
+    monkeypatch.setattr(pipeline, "_encode_queries", counting_encode)
+    return calls
+
+
+SEARCHES = [
+    ("batch ledger reconciliation job", 3, "svc:batch-billing"),
+    ("batch login token refresh", 5, "svc:batch-auth"),
+    ("batch ledger reconciliation job", 3, "svc:never-ingested"),
+    ("batch login token refresh", 2, None),
+    ("batch ledger invoices totals", 3, "svc:batch-billing"),
+]
+
+
+def test_batch_matches_individual_searches_in_order(fresh_caches, monkeypatch):
+    _seed("batch/billing/ledger.py", "batch-billing", "def reconcile():\n    return 'batch ledger reconciliation job'\n")
+    _seed("batch/billing/invoices.py", "batch-billing", "def totals():\n    return 'batch ledger invoices totals'\n")
+    _seed("batch/auth/tokens.py", "batch-auth", "def refresh():\n    return 'batch login token refresh'\n")
+    pipeline._scan_services()
+
+    individual = [pipeline.search_ghost_notes(q, n, g) for q, n, g in SEARCHES]
+    monkeypatch.setattr(pipeline, "_search_results", LRUCache(maxsize=64))
+    monkeypatch.setattr(pipeline, "_query_embeddings", LRUCache(maxsize=64))
+    calls = _record_calls(monkeypatch)
+
+    batched = pipeline.search_ghost_notes_batch(SEARCHES)
+
+    assert batched == individual
+    # One encode for all distinct queries; one query per service scope. The
+    # never-ingested service is known to have no chunks, so it shares the
+    # unscoped query instead of filtering and falling back.
+    assert calls == {"query": 3, "encode": 1}
+    assert batched[0]["results"][0]["metadata"]["service"] == "batch-billing"
+    assert batched[2]["results"], "unknown service must fall back to unfiltered search"
+
+
+def test_batch_endpoint_preserves_order_and_serves_cache_hits(fresh_caches, monkeypatch):
+    _seed("batch/billing/ledger.py", "batch-billing", "def reconcile():\n    return 'batch ledger reconciliation job'\n")
+    body = {"requests": [{"query": q, "top_results": n, "ghost_note_id": g} for q, n, g in SEARCHES]}
+
+    first = client.post("/ghost-note/batch", json=body)
+    calls = _record_calls(monkeypatch)
+    second = client.post("/ghost-note/batch", json=body)
+
+    assert first.status_code == second.status_code == 200
+    assert [r["query"] for r in first.json()["responses"]] == [q for q, _, _ in SEARCHES]
+    assert second.json() == first.json()
+    assert calls == {"query": 0, "encode": 0}
+
+
+def test_batch_endpoint_rejects_oversized_batches(monkeypatch):
+    monkeypatch.setattr(Config, "SEARCH_BATCH_MAX", 2)
+    body = {"requests": [{"query": f"q{i}"} for i in range(3)]}
+
+    response = client.post("/ghost-note/batch", json=body)
+
+    assert response.status_code == 400
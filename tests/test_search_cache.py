@@ -0,0 +1,159 @@
+import time
+
+import chromadb
+import pytest
+
+from api import pipeline
+from api.config import Config
+from api.index_state import IndexState
+from api.lru_cache import LRUCache
+
+
+@pytest.fixture
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(pipeline, "_search_results", LRUCache(maxsize=64))
+    monkeypatch.setattr(pipeline, "_query_embeddings", LRUCache(maxsize=64))
+
+
+def _seed(url, text):
+    chunk = f"FILE PATH: {url}\nEXTENSION: .py\nCODE:\n{text}"
+    pipeline._call_collection(
+        "upsert",
+        ids=[pipeline.get_chunk_id(chunk)],
+        embeddings=[pipeline.get_embedding_model().encode(chunk).tolist()],
+        documents=[chunk],
+        metadatas=[{"path": url, "extension": ".py", "is_code": True, "schema": 2,
+                    "source_url": url, "source_type": "repo"}],
+    )
+
+
+def _count_searches(monkeypatch):
+    calls = []
+    real = pipeline._search_uncached
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "_search_uncached", counting)
+    return calls
+
+
+def test_repeated_search_is_served_from_cache(fresh_caches, monkeypatch):
+    _seed("cache/ledger.py", "def settle_ledger():\n    return 'nightly ledger settlement job'\n")
+    calls = _count_searches(monkeypatch)
+
+    first = pipeline.search_ghost_notes("nightly ledger settlement")
+    start = time.perf_counter()
+    second = pipeline.search_ghost_notes("  nightly   ledger settlement ")
+    elapsed = time.perf_counter() - start
+
+    assert len(calls) == 1
+    assert second["results"] == first["results"]
+    assert second["query"] == "  nightly   ledger settlement "
+    # Server-side cost of a hit: a dict lookup, no encode or Chroma round-trip.
+    assert elapsed < 0.001
+
+    pipeline.search_ghost_notes("nightly ledger settlement", top_results=1)
+    pipeline.search_ghost_notes("nightly ledger settlement", ghost_note_id="svc:ledger")
+    assert len(calls) == 3
+
+
+def test_any_index_write_invalidates_cached_results(fresh_caches, monkeypatch):
+    _seed("cache/refunds.py", "def issue_refund():\n    return 'refund issued to the card'\n")
+    calls = _count_searches(monkeypatch)
+
+    pipeline.search_ghost_notes("refund issued to the card")
+    generation = pipeline._index_state.generation
+    _seed("cache/refunds_v2.py", "def issue_refund_v2():\n    return 'refund issued to the card twice'\n")
+    assert pipeline._index_state.generation > generation
+
+    after_write = pipeline.search_ghost_notes("refund issued to the card")
+    assert len(calls) == 2
+    assert "cache/refunds_v2.py" in {r["metadata"]["path"] for r in after_write["results"]}
+
+    pipeline._call_collection("delete", where={"path": "cache/refunds_v2.py"})
+    after_delete = pipeline.search_ghost_notes("refund issued to the card")
+    assert len(calls) == 3
+    assert "cache/refunds_v2.py" not in {r["metadata"]["path"] for r in after_delete["results"]}
+
+
+def test_failed_synthesis_is_not_cached(fresh_caches, monkeypatch):
+    _seed("cache/quota.py", "def check_quota():\n    return 'quota exceeded for tenant'\n")
+    monkeypatch.setattr(Config, "SYNTHESIS_ENABLED", True)
+    monkeypatch.setattr(Config, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(
+        pipeline.synthesis, "synthesize",
+        lambda results, service_name=None: {"summary": "raw", "source_path": "x", "synthesized": False},
+    )
+    calls = _count_searches(monkeypatch)
+
+    pipeline.search_ghost_notes("quota exceeded for tenant")
+    pipeline.search_ghost_notes("quota exceeded for tenant")
+
+    assert len(calls) == 2
+
+
+def test_search_does_not_count_the_collection_per_request(fresh_caches, monkeypatch):
+    _seed("cache/roundtrips.py", "def one_round_trip():\n    return 'single chroma round trip per search'\n")
+    methods = []
+    real_call = pipeline._call_collection
+
+    def recording_call(method_name, *args, **kwargs):
+        methods.append(method_name)
+        return real_call(method_name, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "_call_collection", recording_call)
+
+    for i in range(3):
+        pipeline.search_ghost_notes(f"single chroma round trip {i}")
+
+    assert methods == ["query"] * 3
+
+
+def test_emptiness_is_rechecked_after_a_delete():
+    state = IndexState()
+    counts = []
+
+    def count():
+        counts.append(1)
+        return 0
+
+    # Empty is never remembered: a write this process didn't make could fill it.
+    assert state.is_empty(count) is True
+    assert state.is_empty(count) is True
+    assert len(counts) == 2
+
+    state.record_write("upsert", {"ids": ["a"]})
+    assert state.is_empty(count) is False
+    assert len(counts) == 2
+
+    state.record_write("delete", {"ids": ["a"]})
+    assert state.is_empty(count) is True
+    assert len(counts) == 3
+
+    state.observe_count(5, state.generation)
+    assert state.is_empty(count) is False
+    assert len(counts) == 3
+
+
+def test_an_out_of_band_upsert_after_an_empty_search_is_found(fresh_caches, monkeypatch):
+    collection = chromadb.EphemeralClient().create_collection(f"out-of-band-{time.time_ns()}")
+    monkeypatch.setattr(pipeline, "_collection", collection)
+    monkeypatch.setattr(pipeline, "_index_state", IndexState())
+    monkeypatch.setattr(pipeline, "_vector_index", None)
+
+    assert pipeline.search_ghost_notes("where is the retry policy")["results"] == []
+
+    # Written straight to Chroma, as embed_and_store.py or another pod would.
+    chunk = "FILE PATH: src/retry.py\nEXTENSION: .py\nCODE:\ndef retry_policy(): return 3\n"
+    collection.upsert(
+        ids=[pipeline.get_chunk_id(chunk)],
+        embeddings=[pipeline.get_embedding_model().encode(chunk).tolist()],
+        documents=[chunk],
+        metadatas=[{"path": "src/retry.py", "extension": ".py", "is_code": True, "schema": 2,
+                    "source_url": "src/retry.py", "source_type": "repo"}],
+    )
+
+    results = pipeline.search_ghost_notes("retry policy function")["results"]
+    assert [result["metadata"]["path"] for result in results] == ["src/retry.py"]
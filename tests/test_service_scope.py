@@ -0,0 +1,104 @@
+import pytest
+
+from api import pipeline
+from api.config import Config
+from api.lru_cache import LRUCache
+
+
+@pytest.fixture
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(pipeline, "_search_results", LRUCache(maxsize=64))
+    monkeypatch.setattr(pipeline, "_query_embeddings", LRUCache(maxsize=64))
+
+
+def _chunk(path, text):
+    return f"FILE PATH: {path}\nEXTENSION: .py\nCODE:\n{text}"
+
+
+def _seed(path, service, text):
+    chunk = _chunk(path, text)
+    meta = {"path": path, "extension": ".py", "is_code": True, "schema": 2,
+            "source_url": f"https://example.com/{path}", "source_type": "repo"}
+    if service:
+        meta["service"] = service
+    pipeline._call_collection(
+        "upsert",
+        ids=[pipeline.get_chunk_id(chunk)],
+        embeddings=[pipeline.get_embedding_model().encode(chunk).tolist()],
+        documents=[chunk],
+        metadatas=[meta],
+    )
+    return pipeline.get_chunk_id(chunk)
+
+
+def _record_queries(monkeypatch):
+    queries = []
+    real_call = pipeline._call_collection
+
+    def recording_call(method_name, *args, **kwargs):
+        if method_name == "query":
+            queries.append(kwargs)
+        return real_call(method_name, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "_call_collection", recording_call)
+    return queries
+
+
+def test_service_counts_follow_upserts_and_deletes():
+    pipeline._scan_services()
+    before = pipeline._index_state.service_count("scope-counts")
+
+    first = _seed("scope/counts/a.py", "scope-counts", "def a():\n    return 'service count fixture one'\n")
+    _seed("scope/counts/b.py", "scope-counts", "def b():\n    return 'service count fixture two'\n")
+    # Re-upserting an existing record must not count it twice.
+    _seed("scope/counts/a.py", "scope-counts", "def a():\n    return 'service count fixture one'\n")
+    assert pipeline._index_state.service_count("scope-counts") == before + 2
+
+    pipeline._call_collection("delete", ids=[first])
+    assert pipeline._index_state.service_count("scope-counts") == before + 1
+    pipeline._call_collection("delete", where={"service": "scope-counts"})
+    assert pipeline._index_state.service_count("scope-counts") == 0
+
+    # The incrementally maintained counts agree with a fresh scan.
+    maintained = pipeline._index_state.services()
+    pipeline._scan_services()
+    assert pipeline._index_state.services() == maintained
+
+
+def test_unknown_service_costs_one_unfiltered_query(fresh_caches, monkeypatch):
+    _seed("scope/known/ledger.py", "scope-known", "def ledger():\n    return 'scoped ledger lookups'\n")
+    pipeline._scan_services()
+    queries = _record_queries(monkeypatch)
+
+    response = pipeline.search_ghost_notes("scoped ledger lookups", ghost_note_id="svc:scope-never-ingested")
+
+    assert response["results"]
+    assert len(queries) == 1 and queries[0]["where"] is None
+
+
+def test_known_service_is_filtered_in_one_query(fresh_caches, monkeypatch):
+    _seed("scope/known/ledger.py", "scope-known", "def ledger():\n    return 'scoped ledger lookups'\n")
+    pipeline._scan_services()
+    queries = _record_queries(monkeypatch)
+
+    response = pipeline.search_ghost_notes("scoped ledger lookups", ghost_note_id="svc:scope-known")
+
+    assert len(queries) == 1 and queries[0]["where"] == {"service": "scope-known"}
+    assert {r["metadata"]["service"] for r in response["results"]} == {"scope-known"}
+
+
+def test_boost_mode_prefers_same_service_from_one_wide_query(fresh_caches, monkeypatch):
+    text = "def rotate():\n    return 'rotate the signing keys nightly'\n"
+    _seed("scope/boost/other.py", "scope-other", text)
+    _seed("scope/boost/mine.py", "scope-mine", text + "# mine\n")
+    pipeline._scan_services()
+    monkeypatch.setattr(Config, "SERVICE_SCOPE_MODE", "boost")
+    queries = _record_queries(monkeypatch)
+
+    response = pipeline.search_ghost_notes("rotate the signing keys nightly", ghost_note_id="svc:scope-mine")
+
+    assert len(queries) == 1 and queries[0]["where"] is None
+    assert queries[0]["n_results"] == Config.RETRIEVAL_POOL_SIZE * Config.SERVICE_BOOST_POOL_FACTOR
+    assert response["results"][0]["metadata"]["path"] == "scope/boost/mine.py"
+    # Boosting reorders; it does not hide other services.
+    assert "scope/boost/other.py" in {r["metadata"]["path"] for r in response["results"]}
@@ -0,0 +1,91 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IS_CI = os.getenv("CI", "").lower() in ("1", "true", "yes")
+
+_IMPORT = """
+import json, sys, time
+start = time.perf_counter()
+import api.app
+from api import pipeline
+print(json.dumps({
+    "import_s": time.perf_counter() - start,
+    "model_loaded": pipeline._embedding_model is not None,
+    "chroma_opened": pipeline._client is not None,
+    "heavy_modules": sorted(m for m in ("torch", "sentence_transformers", "onnxruntime") if m in sys.modules),
+}))
+"""
+
+
+def _import_app():
+    result = subprocess.run(
+        [sys.executable, "-c", _IMPORT], cwd=ROOT, capture_output=True, text=True, timeout=300,
+        env=os.environ.copy(),
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# Importing the app must not load the model or open Chroma - that is what
+# lets /live answer as soon as uvicorn binds, and what keeps every test that
+# imports api.app from paying a model load.
+def test_importing_the_app_loads_nothing_heavy():
+    stats = _import_app()
+    assert not stats["model_loaded"]
+    assert not stats["chroma_opened"]
+    assert stats["heavy_modules"] == []
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _poll(url, deadline):
+    """Seconds until `url` first answers 200, polling every 20ms."""
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start
+        except OSError:
+            pass
+        time.sleep(0.02)
+    raise AssertionError(f"{url} never answered 200")
+
+
+# Benchmark, not a gate: import time of api.app in a fresh interpreter, then
+# from launching uvicorn, time until /live answers (the liveness probe) and
+# until /ready does (model loaded, Chroma open - the readiness probe). Needs
+# the real embedding model. Run with `pytest -s` to see the numbers.
+@pytest.mark.skipif(IS_CI, reason="startup timings are hardware-dependent; run locally, not on shared CI runners")
+def test_startup_benchmark():
+    stats = _import_app()
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + 300
+        _poll(f"http://127.0.0.1:{port}/live", deadline)
+        live_s = time.perf_counter() - start
+        _poll(f"http://127.0.0.1:{port}/ready", deadline)
+        ready_s = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    print(f"\nimport api.app {stats['import_s'] * 1000:.0f}ms  /live after {live_s:.2f}s  "
+          f"/ready after {ready_s:.2f}s")
+    assert live_s < ready_s
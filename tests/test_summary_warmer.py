@@ -0,0 +1,157 @@
+import json
+import os
+import time
+
+import pytest
+
+from api import github_fetch, pipeline, synthesis
+from api.chunking import file_block
+from api.config import Config
+from api.feedback_counts import FeedbackCounts
+from api.lru_cache import LRUCache
+from api.summary_warmer import RateLimiter, SummaryWarmer
+from tests.fake_groq import FakeGroq
+
+IS_CI = os.getenv("CI", "").lower() in ("1", "true", "yes")
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_rate_limiter_spaces_calls_evenly_and_honours_a_pause():
+    clock = _Clock()
+    limiter = RateLimiter(30, clock=clock, sleep=clock.sleep)
+    assert [limiter.acquire() for _ in range(3)] == [0, 2.0, 2.0]
+    limiter.pause(10)
+    assert limiter.acquire() == 10
+    clock.now += 60
+    assert limiter.acquire() == 0
+
+
+def test_warmer_backs_off_then_gives_up_on_repeated_failures():
+    calls, progress = [], {}
+    warmer = SummaryWarmer(
+        summarize=lambda chunks, service: calls.append(chunks[0]["chunk_id"]) or {"synthesized": False},
+        is_cached=lambda chunk_id: chunk_id == "cached",
+        per_minute=0, max_failures=2, backoff_s=0.01,
+    )
+    items = [([{"chunk_id": chunk_id}], None) for chunk_id in ("cached", "a", "b", "c")]
+    warmer.submit(items, lambda **fields: progress.update(fields))
+    warmer.join()
+
+    assert calls == ["a", "b"]
+    assert progress == {"summaries_status": "failed", "summaries_planned": 4,
+                        "summaries_done": 0, "summaries_cached": 1}
+
+
+def _files(repo):
+    return {
+        f"warm/{name}.py": f"def {name}():\n    return '{name} step of the invoice pipeline for {repo}'\n"
+        for name in ("render", "charge", "refund", "retry", "export", "audit")
+    }
+
+
+def _iter_repo_files(owner, repo, headers=None, known=None, listed=None, **kwargs):
+    for path, text in _files(repo).items():
+        sha = f"sha-{repo}-{path}"
+        if listed is not None:
+            listed[path] = sha
+        yield path, sha, text
+
+
+@pytest.fixture
+def groq_server(tmp_path, monkeypatch):
+    with FakeGroq() as server:
+        monkeypatch.setattr(Config, "SYNTHESIS_ENABLED", True)
+        monkeypatch.setattr(Config, "SYNTHESIS_PRECOMPUTE", True)
+        monkeypatch.setattr(Config, "GROQ_API_KEY", "test-key")
+        monkeypatch.setattr(Config, "GROQ_BASE_URL", server.url)
+        monkeypatch.setattr(Config, "FEEDBACK_PATH", str(tmp_path / "feedback.jsonl"))
+        monkeypatch.setattr(pipeline, "_feedback", FeedbackCounts(Config.FEEDBACK_PATH))
+        monkeypatch.setattr(Config, "SYNTHESIS_CACHE_PATH", str(tmp_path / "synthesis_cache.db"))
+        monkeypatch.setattr(synthesis, "_client", None)
+        monkeypatch.setattr(synthesis, "_memory", LRUCache(64))
+        monkeypatch.setattr(synthesis, "_store", None)
+        monkeypatch.setattr(pipeline, "_search_results", LRUCache(64))
+        monkeypatch.setattr(pipeline, "_summary_warmer", SummaryWarmer(
+            synthesis.synthesize, synthesis.is_cached, per_minute=6000))
+        monkeypatch.setattr(github_fetch, "iter_repo_files", _iter_repo_files)
+        yield server
+
+
+def _rate(repo, path, times):
+    _chunks, _metas, chunk_ids = pipeline._chunk_block(path, file_block(path, _files(repo)[path]))
+    with open(Config.FEEDBACK_PATH, "a", encoding="utf-8") as f:
+        for _ in range(times):
+            f.write(json.dumps({"chunk_id": chunk_ids[0], "query": "q", "rating": "up"}) + "\n")
+    return chunk_ids[0]
+
+
+def test_ingest_precomputes_the_service_search_and_most_rated_chunks(groq_server):
+    refund = _rate("warm-billing", "warm/refund.py", 3)
+    audit = _rate("warm-billing", "warm/audit.py", 1)
+
+    job, _ = pipeline.submit_ingest("https://github.com/acme/warm-billing", "repo", {"service": "warm-billing"})
+    pipeline.wait_for_ingest_job(job["job_id"], timeout=60)
+    pipeline._summary_warmer.join()
+
+    done = pipeline.get_ingest_job(job["job_id"])
+    assert done["status"] == "succeeded"
+    assert done["summaries_status"] == "done"
+    # The service search's top hit, plus the rated chunks - once each, since
+    # the top hit may itself be one of them, depending on the embedder.
+    top = pipeline._retrieve("warm-billing", 5, "warm-billing", "svc:warm-billing")[0]["chunk_id"]
+    planned = {top, refund, audit}
+    assert done["summaries_planned"] == done["summaries_done"] + done["summaries_cached"] == len(planned)
+    assert groq_server.completions == done["summaries_done"]
+    assert all(synthesis.is_cached(chunk_id) for chunk_id in planned)
+
+    # What `kubectl ghost` on a warm-billing pod asks: already summarised.
+    before = groq_server.completions
+    response = pipeline.search_ghost_notes("warm-billing", 5, "svc:warm-billing")
+    assert response["synthesized"] is True
+    assert groq_server.completions == before
+
+
+def test_precompute_is_off_by_default(groq_server, monkeypatch):
+    monkeypatch.setattr(Config, "SYNTHESIS_PRECOMPUTE", False)
+    job, _ = pipeline.submit_ingest("https://github.com/acme/warm-billing-off", "repo", {"service": "warm-off"})
+    done = pipeline.wait_for_ingest_job(job["job_id"], timeout=60)
+
+    assert done["summaries_status"] is None
+    assert groq_server.completions == 0
+
+
+# Benchmark, not a gate: latency of the first search for each service after
+# an ingest, with and without pre-computation, against a fake Groq answering
+# in 300ms. Run with `pytest -s` to see the numbers.
+@pytest.mark.skipif(IS_CI, reason="timing benchmark; not meaningful on shared CI runners")
+def test_first_search_latency_benchmark(groq_server, monkeypatch):
+    groq_server.latency_s = 0.3
+    timings = {}
+    for precompute in (False, True):
+        monkeypatch.setattr(Config, "SYNTHESIS_PRECOMPUTE", precompute)
+        monkeypatch.setattr(synthesis, "_memory", LRUCache(64))
+        monkeypatch.setattr(synthesis, "_store", None)
+        monkeypatch.setattr(Config, "SYNTHESIS_CACHE_PATH", str(Config.FEEDBACK_PATH) + f".{precompute}.db")
+        services = [f"bench-{precompute}-{i}" for i in range(4)]
+        for service in services:
+            job, _ = pipeline.submit_ingest(f"https://github.com/acme/{service}", "repo", {"service": service})
+            pipeline.wait_for_ingest_job(job["job_id"], timeout=60)
+        pipeline._summary_warmer.join()
+        start = time.perf_counter()
+        for service in services:
+            pipeline.search_ghost_notes(service, 5, f"svc:{service}")
+        timings[precompute] = (time.perf_counter() - start) / len(services)
+
+    print(f"\nfirst search per service: {timings[False] * 1000:.0f}ms without pre-computation, "
+          f"{timings[True] * 1000:.0f}ms with")
+    assert timings[True] < timings[False]
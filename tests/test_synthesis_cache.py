@@ -0,0 +1,108 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from api import pipeline, synthesis
+from api.config import Config
+from api.lru_cache import LRUCache
+from api.summary_store import SummaryStore
+
+
+class _FakeGroq:
+    """Counts completions; the summary names the chunk it was asked about."""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, messages, **_kwargs):
+        with self._lock:
+            self.calls += 1
+        subject = messages[-1]["content"].split("# ", 1)[1].split("\n", 1)[0]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f" about {subject} "))])
+
+
+@pytest.fixture
+def groq(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "SYNTHESIS_ENABLED", True)
+    monkeypatch.setattr(Config, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(Config, "SYNTHESIS_CACHE_PATH", str(tmp_path / "synthesis_cache.db"))
+    monkeypatch.setattr(synthesis, "_memory", LRUCache(Config.SYNTHESIS_CACHE_SIZE))
+    monkeypatch.setattr(synthesis, "_store", None)
+    client = _FakeGroq()
+    monkeypatch.setattr(synthesis, "_get_client", lambda: client)
+    return client
+
+
+def _restart(monkeypatch):
+    """What a new process sees: empty memory, store not yet opened."""
+    monkeypatch.setattr(synthesis, "_memory", LRUCache(Config.SYNTHESIS_CACHE_SIZE))
+    monkeypatch.setattr(synthesis, "_store", None)
+
+
+def _chunks(chunk_id, path="src/auth.py"):
+    return [{"chunk_id": chunk_id, "text": "def login(): ...", "metadata": {"path": path}}]
+
+
+def test_summaries_survive_a_restart_without_another_groq_call(groq, monkeypatch):
+    first = synthesis.synthesize(_chunks("c1"))
+    assert first == {"summary": "about src/auth.py", "source_path": "src/auth.py", "synthesized": True}
+    assert synthesis.synthesize(_chunks("c1")) == first
+    assert groq.calls == 1
+
+    _restart(monkeypatch)
+    assert synthesis.synthesize(_chunks("c1")) == first
+    assert groq.calls == 1
+
+
+def test_memory_tier_is_bounded_and_misses_fall_through_to_the_store(groq, monkeypatch):
+    monkeypatch.setattr(synthesis, "_memory", LRUCache(2))
+    for i in range(5):
+        synthesis.synthesize(_chunks(f"c{i}", path=f"src/{i}.py"))
+    assert len(synthesis._memory) == 2
+    assert synthesis.synthesize(_chunks("c0", path="src/0.py"))["summary"] == "about src/0.py"
+    assert groq.calls == 5
+
+
+def test_concurrent_misses_all_land_in_the_store(groq):
+    threads = [
+        threading.Thread(target=synthesis.synthesize, args=(_chunks(f"c{i}", path=f"src/{i}.py"),))
+        for i in range(16)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store = SummaryStore(Config.SYNTHESIS_CACHE_PATH)
+    assert len(store) == 16
+    assert store.get("c7")["summary"] == "about src/7.py"
+
+
+def test_legacy_json_cache_is_imported_once(tmp_path):
+    (tmp_path / "cache.json").write_text(json.dumps({
+        "c1": {"summary": "kept", "source_path": "a.py", "synthesized": True},
+        "c2": {"summary": "raw chunk", "source_path": "b.py", "synthesized": False},
+    }))
+    store = SummaryStore(str(tmp_path / "cache.db"))
+    assert store.get("c1") == {"summary": "kept", "source_path": "a.py", "synthesized": True}
+    assert store.get("c2") is None
+    assert [chunk_id for chunk_id, _ in store.recent(10)] == ["c1"]
+
+
+def test_deleting_a_chunk_drops_its_summary(groq, monkeypatch):
+    chunk = "FILE PATH: src/gone.py\nEXTENSION: .py\nCODE:\ndef gone(): ..."
+    chunk_id = pipeline.get_chunk_id(chunk)
+    pipeline._call_collection(
+        "upsert", ids=[chunk_id], embeddings=[pipeline.get_embedding_model().encode(chunk).tolist()],
+        documents=[chunk], metadatas=[{"path": "src/gone.py", "source_url": "src/gone.py", "source_type": "repo"}],
+    )
+    synthesis.synthesize(_chunks(chunk_id, path="src/gone.py"))
+
+    pipeline._call_collection("delete", where={"source_url": "src/gone.py"})
+    assert synthesis._memory.get(chunk_id) is None
+    assert SummaryStore(Config.SYNTHESIS_CACHE_PATH).get(chunk_id) is None
+    synthesis.synthesize(_chunks(chunk_id, path="src/gone.py"))
+    assert groq.calls == 2
@@ -0,0 +1,131 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import pipeline, synthesis
+from api.app import app
+from api.config import Config
+from api.lru_cache import LRUCache
+
+client = TestClient(app)
+
+
+class _SlowGroq:
+    """Holds every completion until `release` is set, and counts them."""
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **_kwargs):
+        with self._lock:
+            self.calls += 1
+        assert self.release.wait(10)
+        if self.fail:
+            raise RuntimeError("429 Too Many Requests")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Retries on 429."))])
+
+
+@pytest.fixture
+def groq(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "SYNTHESIS_ENABLED", True)
+    monkeypatch.setattr(Config, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(Config, "SYNTHESIS_CACHE_PATH", str(tmp_path / "synthesis_cache.db"))
+    monkeypatch.setattr(synthesis, "_memory", LRUCache(64))
+    monkeypatch.setattr(synthesis, "_failed", LRUCache(64, ttl_s=300))
+    monkeypatch.setattr(synthesis, "_store", None)
+    monkeypatch.setattr(pipeline, "_search_results", LRUCache(maxsize=64))
+    fake = _SlowGroq()
+    monkeypatch.setattr(synthesis, "_get_client", lambda: fake)
+    yield fake
+    fake.release.set()
+
+
+def _chunks(chunk_id="c1"):
+    return [{"chunk_id": chunk_id, "text": "def retry(): ...", "metadata": {"path": "src/retry.py"}}]
+
+
+def test_a_burst_for_one_chunk_makes_one_groq_call(groq):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(synthesis.synthesize(_chunks()))) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)  # let the burst pile up behind the first call
+    groq.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert groq.calls == 1
+    assert len(results) == 20
+    assert all(r == {"summary": "Retries on 429.", "source_path": "src/retry.py", "synthesized": True}
+               for r in results)
+
+
+def test_deferred_summary_is_generated_once_in_the_background(groq):
+    assert synthesis.synthesize_later(_chunks()) is None
+    assert synthesis.synthesize_later(_chunks()) is None
+    assert synthesis.summary_status("c1")["status"] == "pending"
+
+    groq.release.set()
+    done = synthesis.summary_status("c1", wait_s=5)
+    assert done["status"] == "ready"
+    assert done["summary"] == "Retries on 429."
+    assert synthesis.synthesize_later(_chunks())["synthesized"] is True
+    assert groq.calls == 1
+
+
+def test_failed_deferred_summary_reports_the_fallback(groq):
+    groq.fail = True
+    groq.release.set()
+    synthesis.synthesize_later(_chunks())
+
+    failed = synthesis.summary_status("c1", wait_s=5)
+    assert failed["status"] == "failed"
+    assert failed["summary"] == "def retry(): ..."
+    assert synthesis.summary_status("c1")["status"] == "failed"
+    assert synthesis.summary_status("never-asked") is None
+
+
+def _seed(url, text):
+    chunk = f"FILE PATH: {url}\nEXTENSION: .py\nCODE:\n{text}"
+    pipeline._call_collection(
+        "upsert",
+        ids=[pipeline.get_chunk_id(chunk)],
+        embeddings=[pipeline.get_embedding_model().encode(chunk).tolist()],
+        documents=[chunk],
+        metadatas=[{"path": url, "extension": ".py", "source_url": url, "source_type": "repo"}],
+    )
+
+
+# Groq never answers until released, so a search that waited on it would
+# hang: the deferred one must come back with its results regardless.
+def test_deferred_search_answers_before_groq_then_serves_the_summary(groq):
+    _seed("defer/backoff.py", "def backoff():\n    return 'exponential backoff for the payment gateway'\n")
+
+    start = time.perf_counter()
+    response = client.post("/ghost-note", json={"query": "payment gateway backoff", "defer_summary": True})
+    assert time.perf_counter() - start < 5
+    body = response.json()
+    assert response.status_code == 200
+    assert body["results"] and body["summary_pending"] is True and body["summary"] is None
+
+    top = body["results"][0]["chunk_id"]
+    assert client.get(f"/ghost-note/summary/{top}").json()["status"] == "pending"
+    groq.release.set()
+    summary = client.get(f"/ghost-note/summary/{top}?wait_ms=5000").json()
+    assert summary == {"chunk_id": top, "status": "ready", "summary": "Retries on 429.",
+                       "summary_path": "defer/backoff.py", "synthesized": True}
+
+    again = client.post("/ghost-note", json={"query": "payment gateway backoff", "defer_summary": True}).json()
+    assert again["summary_pending"] is False and again["summary"] == "Retries on 429."
+    assert groq.calls == 1
+
+
+def test_summary_for_an_unknown_chunk_is_404():
+    assert client.get("/ghost-note/summary/not-a-chunk").status_code == 404
@@ -0,0 +1,391 @@
+import os
+import threading
+import time
+
+import chromadb
+import numpy as np
+import pytest
+
+from api import pipeline
+from api import vector_index as vector_index_module
+from api.lru_cache import LRUCache
+from api.vector_index import UnsupportedFilter, VectorIndex
+
+IS_CI = os.getenv("CI", "").lower() in ("1", "true", "yes")
+DIM = 16
+
+
+def _records(n, seed=0, services=("auth", "billing", None)):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    ids = [f"chunk-{seed}-{i}" for i in range(n)]
+    documents = [f"document {i}" for i in range(n)]
+    metadatas = []
+    for i in range(n):
+        meta = {"path": f"src/{i}.py", "source_type": "repo" if i % 2 else "pr"}
+        if services[i % len(services)]:
+            meta["service"] = services[i % len(services)]
+        metadatas.append(meta)
+    return ids, vectors, documents, metadatas
+
+
+def _brute_force(vectors, query, k, allowed=None):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = unit @ (query / np.linalg.norm(query))
+    if allowed is not None:
+        scores[~allowed] = -np.inf
+    return list(np.argsort(-scores, kind="stable")[:k])
+
+
+def test_exact_top_k_matches_brute_force(tmp_path):
+    ids, vectors, documents, metadatas = _records(500)
+    index = VectorIndex(str(tmp_path))
+    index.upsert(ids, vectors, documents, metadatas)
+    query = np.random.default_rng(1).standard_normal(DIM)
+
+    found = index.query([query], n_results=10)
+
+    expected = _brute_force(vectors, query, 10)
+    assert found["ids"][0] == [ids[i] for i in expected]
+    assert found["documents"][0] == [documents[i] for i in expected]
+    assert found["metadatas"][0] == [metadatas[i] for i in expected]
+    # Squared L2 between unit vectors, as Chroma's default space reports it.
+    unit = vectors[expected[0]] / np.linalg.norm(vectors[expected[0]])
+    assert found["distances"][0][0] == pytest.approx(
+        float(np.sum((unit - query / np.linalg.norm(query)) ** 2)), abs=1e-5
+    )
+    assert found["distances"][0] == sorted(found["distances"][0])
+
+
+def test_where_filters_use_metadata_columns(tmp_path):
+    ids, vectors, documents, metadatas = _records(300)
+    index = VectorIndex(str(tmp_path))
+    index.upsert(ids, vectors, documents, metadatas)
+    query = np.random.default_rng(2).standard_normal(DIM)
+
+    found = index.query([query], n_results=5, where={"service": "auth"})
+    allowed = np.array([m.get("service") == "auth" for m in metadatas])
+    assert found["ids"][0] == [ids[i] for i in _brute_force(vectors, query, 5, allowed)]
+
+    both = index.query([query], n_results=5, where={"$and": [{"service": "auth"}, {"source_type": {"$eq": "pr"}}]})
+    assert all(m["service"] == "auth" and m["source_type"] == "pr" for m in both["metadatas"][0])
+
+    assert index.query([query], n_results=5, where={"service": "never-ingested"})["ids"] == [[]]
+    with pytest.raises(UnsupportedFilter):
+        index.query([query], n_results=5, where={"path": "src/1.py"})
+
+
+def test_upsert_replaces_and_delete_removes(tmp_path):
+    ids, vectors, documents, metadatas = _records(50)
+    index = VectorIndex(str(tmp_path))
+    index.upsert(ids, vectors, documents, metadatas)
+
+    target = np.random.default_rng(3).standard_normal(DIM).astype(np.float32)
+    index.upsert([ids[7]], [target], ["rewritten"], [{"service": "moved"}])
+    index.delete([ids[0], ids[1], "not-indexed"])
+
+    assert len(index) == 48
+    found = index.query([target], n_results=50)
+    assert found["ids"][0][0] == ids[7] and found["documents"][0][0] == "rewritten"
+    assert ids[0] not in found["ids"][0] and ids[1] not in found["ids"][0]
+    assert len(found["ids"][0]) == 48
+
+
+def test_index_survives_reopen_and_ignores_uncommitted_rows(tmp_path):
+    ids, vectors, documents, metadatas = _records(40)
+    index = VectorIndex(str(tmp_path))
+    index.upsert(ids[:30], vectors[:30], documents[:30], metadatas[:30])
+    index.delete([ids[3]])
+    query = vectors[12]
+    before = index.query([query], n_results=5)
+
+    # A write that died after its data but before the header: rows past the
+    # committed count must not surface, and the next write overwrites them.
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(np.ones((2, DIM), dtype=np.float32).tobytes())
+    with open(tmp_path / "records.jsonl", "ab") as f:
+        f.write(b'{"document": "torn')
+
+    reopened = VectorIndex(str(tmp_path))
+    assert len(reopened) == 29
+    assert reopened.query([query], n_results=5) == before
+
+    reopened.upsert(ids[30:], vectors[30:], documents[30:], metadatas[30:])
+    assert len(reopened) == 39
+    assert reopened.query([vectors[35]], n_results=1)["documents"][0] == [documents[35]]
+
+
+def test_compaction_drops_dead_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index_module, "COMPACT_MIN_DEAD", 10)
+    ids, vectors, documents, metadatas = _records(40)
+    index = VectorIndex(str(tmp_path))
+    index.upsert(ids, vectors, documents, metadatas)
+    query = vectors[5]
+    before = index.query([query], n_results=10, where={"service": "auth"})
+
+    # A full re-sync re-upserts every ID; without compaction the files double.
+    index.upsert(ids, vectors, documents, metadatas)
+
+    assert index.dead == 0 and index.count == 40
+    after = index.query([query], n_results=10, where={"service": "auth"})
+    assert after["ids"] == before["ids"] and after["metadatas"] == before["metadatas"]
+    assert after["distances"][0] == pytest.approx(before["distances"][0], abs=1e-5)
+    assert os.path.getsize(tmp_path / "vectors.f32") == 40 * DIM * 4
+
+
+def _clustered(n, clusters=20, seed=0, dim=DIM, spread=0.3):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    vectors = centers[rng.integers(0, clusters, n)] + spread * rng.standard_normal((n, dim))
+    return vectors.astype(np.float32)
+
+
+def _recall(found, expected):
+    return np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found["ids"], expected["ids"])])
+
+
+def test_ivf_recall_rises_with_nprobe_and_full_probe_is_exact(tmp_path):
+    vectors = _clustered(4000)
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    index = VectorIndex(str(tmp_path), ann="ivf", nlist=32, ann_min_rows=1000)
+    for start in range(0, len(ids), 500):
+        index.upsert(ids[start:start + 500], vectors[start:start + 500],
+                     [""] * 500, [{"service": f"svc-{i % 7}"} for i in range(start, start + 500)])
+    # Partitioned at 1000 rows, retrained at 2000 and 4000.
+    assert index.ivf_lists == 32
+
+    queries = _clustered(50, seed=1)
+    exact = index.query(queries, n_results=10, exact=True)
+    recalls = [_recall(index.query(queries, n_results=10, nprobe=nprobe), exact) for nprobe in (1, 4, 32)]
+    assert recalls[0] <= recalls[1] <= recalls[2]
+    assert recalls[1] >= 0.9
+    assert index.query(queries, n_results=10, nprobe=32)["ids"] == exact["ids"]
+
+    # A filter that leaves too few rows in the probed lists still returns k.
+    filtered = index.query(queries[:5], n_results=10, where={"service": "svc-3"}, nprobe=1)
+    assert all(len(hits) == 10 for hits in filtered["ids"])
+
+
+def test_ivf_partition_persists_and_files_new_rows(tmp_path):
+    vectors = _clustered(2000)
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    index = VectorIndex(str(tmp_path), ann="ivf", nlist=16, ann_min_rows=1000)
+    index.upsert(ids, vectors, [""] * len(ids), [{}] * len(ids))
+    queries = _clustered(10, seed=2)
+    before = index.query(queries, n_results=5, nprobe=2)
+
+    reopened = VectorIndex(str(tmp_path), ann="ivf", nlist=16, ann_min_rows=1000)
+    assert reopened.ivf_lists == 16
+    assert reopened.query(queries, n_results=5, nprobe=2)["ids"] == before["ids"]
+
+    # Rows added after training are filed under their nearest list, not lost.
+    extra = _clustered(5, seed=3)
+    reopened.upsert([f"extra-{i}" for i in range(5)], extra, [""] * 5, [{}] * 5)
+    assert reopened.ivf_lists == 16
+    assert [hits[0] for hits in reopened.query(extra, n_results=1, nprobe=1)["ids"]] == \
+        [f"extra-{i}" for i in range(5)]
+
+
+@pytest.mark.parametrize("rebuild", ["train_ann", "compact"])
+def test_queries_are_served_while_the_index_is_rebuilt(tmp_path, monkeypatch, rebuild):
+    vectors = _clustered(2000)
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    index = VectorIndex(str(tmp_path / "index"), ann="ivf", nlist=16, ann_min_rows=1000)
+    index.upsert(ids, vectors, [f"doc {i}" for i in range(len(ids))], [{}] * len(ids))
+    index.delete(ids[:10])
+    expected = index.query(vectors[:20], n_results=5, nprobe=16)
+
+    # Hold the rebuild mid-way: k-means for a retrain, the staged rewrite for a compaction.
+    started, release = threading.Event(), threading.Event()
+    slow = vector_index_module.ivf.train if rebuild == "train_ann" else VectorIndex.upsert
+
+    def held(*args, **kwargs):
+        started.set()
+        assert release.wait(10)
+        return slow(*args, **kwargs)
+
+    if rebuild == "train_ann":
+        monkeypatch.setattr(vector_index_module.ivf, "train", held)
+    else:
+        monkeypatch.setattr(VectorIndex, "upsert", held)
+    worker = threading.Thread(target=getattr(index, rebuild))
+    worker.start()
+    try:
+        assert started.wait(10)
+        answered = []
+        reader = threading.Thread(target=lambda: answered.append(index.query(vectors[:20], n_results=5, nprobe=16)))
+        reader.start()
+        reader.join(5)
+        assert answered and answered[0] == expected
+    finally:
+        release.set()
+        worker.join(30)
+
+    assert index.query(vectors[:20], n_results=5, nprobe=16)["ids"] == expected["ids"]
+    if rebuild == "compact":
+        assert index.dead == 0 and index.count == len(ids) - 10
+        assert sorted(os.listdir(tmp_path)) == ["index", "index.lock"]
+
+
+@pytest.mark.parametrize("kind, ratio", [("float16", 2), ("int8", 4)])
+def test_quantized_scan_rescores_to_full_precision(tmp_path, kind, ratio):
+    vectors = _clustered(3000)
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    metadatas = [{"service": f"svc-{i % 5}"} for i in range(len(ids))]
+    full = VectorIndex(str(tmp_path / "full"))
+    quantized = VectorIndex(str(tmp_path / "quantized"), quantization=kind)
+    for index in (full, quantized):
+        for start in range(0, len(ids), 1000):
+            index.upsert(ids[start:start + 1000], vectors[start:start + 1000],
+                         [""] * 1000, metadatas[start:start + 1000])
+
+    assert quantized.scan_bytes * ratio == full.scan_bytes
+    queries = _clustered(40, seed=4)
+    expected = full.query(queries, n_results=10)
+    found = quantized.query(queries, n_results=10)
+    assert _recall(found, expected) >= 0.98
+    # Rescoring makes every returned distance the float32 one.
+    shared = []
+    for q in range(len(queries)):
+        exact = dict(zip(expected["ids"][q], expected["distances"][q]))
+        shared += [(d, exact[i]) for i, d in zip(found["ids"][q], found["distances"][q]) if i in exact]
+    assert shared and all(d == pytest.approx(e, abs=1e-5) for d, e in shared)
+    filtered = quantized.query(queries[:5], n_results=10, where={"service": "svc-2"})
+    assert all(m["service"] == "svc-2" for hits in filtered["metadatas"] for m in hits)
+
+    # Quantization is a setting, not part of the data: turning it off drops
+    # the copy, turning it back on rebuilds it.
+    plain = VectorIndex(str(tmp_path / "quantized"))
+    assert plain.scan_bytes == full.scan_bytes and plain.quantization == ""
+    assert not (tmp_path / "quantized" / "vectors.i8").exists()
+    again = VectorIndex(str(tmp_path / "quantized"), quantization=kind)
+    assert again.scan_bytes * ratio == full.scan_bytes
+    assert again.query(queries, n_results=10)["ids"] == found["ids"]
+
+
+def _seed(path, service, text):
+    chunk = f"FILE PATH: {path}\nEXTENSION: .py\nCODE:\n{text}"
+    meta = {"path": path, "extension": ".py", "is_code": True, "schema": 2,
+            "source_url": f"https://example.com/{path}", "source_type": "repo", "service": service}
+    pipeline._call_collection(
+        "upsert",
+        ids=[pipeline.get_chunk_id(chunk)],
+        embeddings=[pipeline.get_embedding_model().encode(chunk).tolist()],
+        documents=[chunk],
+        metadatas=[meta],
+    )
+    return pipeline.get_chunk_id(chunk)
+
+
+def test_numpy_backend_serves_the_same_results_as_chroma(tmp_path, monkeypatch):
+    _seed("vindex/ledger.py", "vindex-ledger", "def post_entry():\n    return 'double entry ledger posting'\n")
+    _seed("vindex/invoice.py", "vindex-billing", "def render_invoice():\n    return 'invoice pdf renderer'\n")
+
+    monkeypatch.setattr(pipeline, "_search_results", LRUCache(maxsize=0))
+    on_chroma = [
+        pipeline.search_ghost_notes("ledger posting"),
+        pipeline.search_ghost_notes("invoice renderer", ghost_note_id="svc:vindex-billing"),
+    ]
+
+    # Stale on-disk contents must be replaced by the sync, not trusted.
+    VectorIndex(str(tmp_path)).upsert(*_records(5))
+    index = VectorIndex(str(tmp_path))
+    monkeypatch.setattr(pipeline, "_vector_index", index)
+    ready = pipeline.threading.Event()
+    monkeypatch.setattr(pipeline, "_vector_index_ready", ready)
+    pipeline._vector_index_sync.acquire()
+    pipeline._sync_vector_index()
+    assert ready.is_set()
+    assert len(index) == pipeline._call_collection("count")
+
+    queries = []
+    real_call = pipeline._call_collection
+
+    def recording_call(method_name, *args, **kwargs):
+        if method_name == "query":
+            queries.append(kwargs)
+        return real_call(method_name, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "_call_collection", recording_call)
+    on_numpy = [
+        pipeline.search_ghost_notes("ledger posting"),
+        pipeline.search_ghost_notes("invoice renderer", ghost_note_id="svc:vindex-billing"),
+    ]
+    assert queries == []
+    for chroma_response, numpy_response in zip(on_chroma, on_numpy):
+        assert [r["chunk_id"] for r in numpy_response["results"]] == \
+            [r["chunk_id"] for r in chroma_response["results"]]
+        for a, b in zip(chroma_response["results"], numpy_response["results"]):
+            assert b["relevance_score"] == pytest.approx(a["relevance_score"], abs=1e-4)
+
+    # Writes through _call_collection land in the index as well.
+    added = _seed("vindex/refund.py", "vindex-billing", "def refund():\n    return 'refund ledger reversal'\n")
+    assert added in index
+    monkeypatch.setattr(pipeline, "_call_collection", real_call)
+    pipeline._call_collection("delete", where={"service": "vindex-billing"})
+    assert added not in index
+    assert len(index) == pipeline._call_collection("count")
+
+
+def _bench_collection(name, ids, vectors):
+    chroma = chromadb.EphemeralClient()
+    collection = chroma.get_or_create_collection(name=name)
+    step = 5000
+    for start in range(0, len(ids), step):
+        collection.add(ids=ids[start:start + step], embeddings=vectors[start:start + step])
+    return chroma, collection
+
+
+# Benchmark, not a gate: p50 latency of one top-30 query against Chroma and
+# against the in-process index at 10k, 100k and 1M 384-d chunks. 10k runs
+# locally with `pytest -s`; the larger sizes take minutes to load into
+# Chroma, so they're opt-in with RUN_VECTOR_BENCH=1.
+@pytest.mark.skipif(IS_CI, reason="latency benchmark is hardware-dependent; run locally, not on shared CI runners")
+@pytest.mark.parametrize("size", [
+    10_000,
+    pytest.param(100_000, marks=pytest.mark.skipif(not os.getenv("RUN_VECTOR_BENCH"), reason="set RUN_VECTOR_BENCH=1")),
+    pytest.param(1_000_000, marks=pytest.mark.skipif(not os.getenv("RUN_VECTOR_BENCH"), reason="set RUN_VECTOR_BENCH=1")),
+])
+def test_vector_index_latency_vs_chroma(tmp_path, size):
+    dim, n_queries, k = 384, 50, 30
+    # Clustered like real embeddings (files, then repos, share a topic);
+    # uniform random vectors have no structure for IVF to find.
+    vectors = _clustered(size, clusters=size // 100, seed=size, dim=dim, spread=0.8)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"{i:064x}" for i in range(size)]
+    queries = _clustered(n_queries, clusters=size // 100, seed=size, dim=dim, spread=0.8)[::-1].copy()
+
+    index = VectorIndex(str(tmp_path / "index"))
+    step = 50_000
+    for start in range(0, size, step):
+        end = start + step
+        index.upsert(ids[start:end], vectors[start:end], [""] * len(ids[start:end]),
+                     [{"service": f"svc-{i % 20}"} for i in range(start, min(end, size))])
+    _chroma, collection = _bench_collection(f"bench_{size}", ids, vectors)
+
+    def p50(run):
+        run(queries[0])
+        durations = []
+        for query in queries:
+            start = time.perf_counter()
+            run(query)
+            durations.append(time.perf_counter() - start)
+        return sorted(durations)[len(durations) // 2] * 1000
+
+    chroma_ms = p50(lambda q: collection.query(query_embeddings=[q.tolist()], n_results=k))
+    numpy_ms = p50(lambda q: index.query([q], n_results=k))
+    filtered_ms = p50(lambda q: index.query([q], n_results=k, where={"service": "svc-3"}))
+
+    exact = index.query(queries, n_results=k)
+    index.requantize("int8")
+    int8_ms = p50(lambda q: index.query([q], n_results=k))
+    int8_recall = _recall(index.query(queries, n_results=k), exact)
+    index.requantize("")
+    index.ann = "ivf"
+    index.train_ann()
+    ivf_ms = p50(lambda q: index.query([q], n_results=k))
+    recall = _recall(index.query(queries, n_results=k), exact)
+    print(f"\n{size:>9,} chunks  chroma p50={chroma_ms:.2f}ms  numpy p50={numpy_ms:.2f}ms  "
+          f"numpy filtered p50={filtered_ms:.2f}ms  ivf({index.ivf_lists} lists, nprobe={index.nprobe}) "
+          f"p50={ivf_ms:.2f}ms recall@{k}={recall:.2f}  "
+          f"int8 p50={int8_ms:.2f}ms recall@{k}={int8_recall:.2f} ({size * dim / 1e6:.0f}MB scanned vs {size * dim * 4 / 1e6:.0f}MB)")